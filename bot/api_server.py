@@ -1,26 +1,37 @@
-import json
 import logging
 import os
 import time
 import hmac
 import hashlib
 import base64
+import asyncio
 from aiohttp import web
 import aiohttp_cors
-from collections import defaultdict
 
-from bot.config import config
+from bot.config import get_config
 from bot.security_manager import security_manager
-from bot.security_headers import security_headers_middleware, create_content_hash
-
-# Настраиваем логирование для API сервера
+from bot.rate_limiter import rate_limiter
+from bot.security_headers import CACHE_IMMUTABLE, CACHE_REVALIDATE, security_headers_middleware
+from bot.catalog import (
+    CatalogSnapshot, CatalogWatcher, file_version, parse_fields, parse_product_ids, validate_products_data
+)
+from bot.catalog_events import catalog_event_hub, stream_events
+from bot.image_proxy import IMAGE_SIZES, ImageCache, has_image, image_response
+from bot.metrics import metrics_handler, metrics_middleware, rate_limit_rejections
+from bot.http_cache import cached_response
+from bot import json_codec
+from bot.json_codec import JSONDecodeError, json_response
+from bot.static_assets import StaticAssetCache, asset_response
+
+# Логирование настраивает запускающий скрипт (bot.logging_setup)
 logger = logging.getLogger(__name__)
-if not logger.handlers:
-    logging.basicConfig(level=getattr(logging, config.LOG_LEVEL), format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 # Путь к файлу с данными о продуктах
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PRODUCTS_DATA_FILE = os.path.join(BASE_DIR, 'data', 'products_scraped.json')
+DEFAULT_IMAGE_CACHE_DIR = os.path.join(BASE_DIR, 'data', 'image_cache')
+# Fingerprinted asset names as of server start
+ASSET_MANIFEST_FILE = os.path.join(BASE_DIR, 'data', 'asset-manifest.json')
 
 # ===== SECURITY CONFIGURATION =====
 # HMAC secret key for request signing (should be in environment variables)
@@ -31,8 +42,15 @@ HMAC_ALGORITHM = 'sha256'
 RATE_LIMIT_REQUESTS_PER_HOUR = 100  # Max requests per hour per IP
 RATE_LIMIT_BLOCK_DURATION = 3600    # Block duration in seconds (1 hour)
 
-# In-memory storage for rate limiting (in production, use Redis)
-rate_limit_storage = defaultdict(list)
+# Rate limit window for per-IP limits (seconds)
+RATE_LIMIT_WINDOW_SECONDS = 3600
+
+# Headers for responses that must never be cached (tokens, errors)
+NO_STORE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0'
+}
 
 # ===== HMAC SIGNATURE FUNCTIONS =====
 def generate_hmac_signature(data: str, secret: str) -> str:
@@ -50,23 +68,12 @@ def verify_hmac_signature(data: str, signature: str, secret: str) -> bool:
     return hmac.compare_digest(signature, expected_signature)
 
 # ===== RATE LIMITING FUNCTIONS =====
-def check_rate_limit(ip_address: str) -> bool:
+async def check_rate_limit(ip_address: str) -> bool:
     """Check if IP address is within rate limits"""
-    current_time = time.time()
-    
-    # Clean old entries
-    rate_limit_storage[ip_address] = [
-        timestamp for timestamp in rate_limit_storage[ip_address]
-        if current_time - timestamp < 3600  # Keep only last hour
-    ]
-    
-    # Check if limit exceeded
-    if len(rate_limit_storage[ip_address]) >= RATE_LIMIT_REQUESTS_PER_HOUR:
-        return False
-    
-    # Add current request
-    rate_limit_storage[ip_address].append(current_time)
-    return True
+    result = await rate_limiter.hit(f"ip:{ip_address}", RATE_LIMIT_REQUESTS_PER_HOUR, RATE_LIMIT_WINDOW_SECONDS)
+    if not result.allowed:
+        rate_limit_rejections.labels('ip').inc()
+    return result.allowed
 
 # ===== TOKEN GENERATION =====
 def generate_auth_token() -> dict:
@@ -86,49 +93,114 @@ async def get_auth_token(request):
     client_ip = request.remote
     
     # Basic rate limiting for token requests (more strict)
-    if not check_rate_limit(f"{client_ip}:token"):
+    if not await check_rate_limit(f"{client_ip}:token"):
         logger.warning(f"API: Token rate limit exceeded for IP {client_ip}")
-        return web.json_response({"error": "Token rate limit exceeded"}, status=429)
+        return json_response({"error": "Token rate limit exceeded"}, status=429)
     
     token_data = generate_auth_token()
-    logger.info(f"API: Generated auth token for IP {client_ip}")
+    logger.debug("API: Generated auth token for IP %s", client_ip)
     
-    return web.json_response(token_data, headers={
-        'Cache-Control': 'no-cache, no-store, must-revalidate',
-        'Pragma': 'no-cache',
-        'Expires': '0'
-    })
+    return json_response(token_data, headers=NO_STORE_HEADERS)
 
-# Путь к директории с файлами Web App
-WEB_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web_app')
-logger.info(f"API: Директория Web App: {WEB_APP_DIR}")
+def web_app_dir() -> str:
+    """Путь к директории с файлами Web App: собранная версия (scripts/build_web_app.py) или исходники."""
+    build_dir = get_config().WEB_APP_BUILD_DIR
+    if build_dir:
+        return os.path.join(BASE_DIR, build_dir)
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web_app')
+
+# Файлы Web App в памяти с готовыми ETag и сжатыми вариантами (создаются в setup_api_server)
+static_assets = None
 
 # Глобальная переменная для хранения данных о продуктах
 products_data = {}
 
-# API rate limiting store
-api_rate_limit_store = defaultdict(list)
+# Pre-serialized catalog responses built from products_data
+catalog_snapshot = None
+
+# Version of products_data (products file mtime, see catalog.file_version)
+products_data_version = None
+
+# Загрузка каталога в фоне, запущенная вместе с сервером (см. start_catalog_load)
+catalog_load_task = None
+
+# Начальная загрузка и наблюдатель применяют каталог по очереди (см. apply_products_data)
+catalog_apply_lock = asyncio.Lock()
+
+def read_products_data(path: str):
+    """Read and validate the products file and its version. Blocking - run it off the event loop."""
+    with open(path, 'rb') as f:
+        return validate_products_data(json_codec.load(f)), file_version(os.fstat(f.fileno()).st_mtime_ns)
 
 async def load_products_data_for_api():
-    """Загружает данные о продуктах из JSON-файла для API."""
-    global products_data
+    """Загружает данные о продуктах из JSON-файла для API, не блокируя цикл событий."""
+    loaded_before = products_data
+    new_products_data, version = {}, None
     if os.path.exists(PRODUCTS_DATA_FILE):
         try:
-            with open(PRODUCTS_DATA_FILE, 'r', encoding='utf-8') as f:
-                products_data = json.load(f)
+            new_products_data, version = await asyncio.to_thread(read_products_data, PRODUCTS_DATA_FILE)
             logger.info(f"API: Данные о продуктах успешно загружены из {PRODUCTS_DATA_FILE}.")
-        except json.JSONDecodeError as e:
+        except JSONDecodeError as e:
             logger.error(f"API: Ошибка при чтении JSON-файла '{PRODUCTS_DATA_FILE}': {e}")
-            products_data = {} # Сброс данных, если файл поврежден
+        except ValueError as e:
+            logger.error(f"API: Файл '{PRODUCTS_DATA_FILE}' не прошел проверку: {e}")
         except Exception as e:
             logger.error(f"API: Неизвестная ошибка при загрузке данных о продуктах: {e}")
-            products_data = {}
     else:
         logger.warning(f"API: Файл '{PRODUCTS_DATA_FILE}' не найден. API не сможет отдавать данные о продуктах.")
-        products_data = {}
+    # Пока файл читался, наблюдатель мог уже применить более новую версию - тогда эта загрузка отбрасывается
+    await apply_products_data(new_products_data, version, replaces=loaded_before)
+
+def start_catalog_load() -> asyncio.Task:
+    """Start loading the catalog in the background once; later calls return the same task.
+
+    The server listens meanwhile and /ready answers 503 until the catalog is in.
+    """
+    global catalog_load_task
+    if catalog_load_task is None:
+        catalog_load_task = asyncio.create_task(load_products_data_for_api())
+    return catalog_load_task
+
+async def apply_products_data(new_products_data: dict, version: int = None, replaces: dict = None) -> bool:
+    """Swap in a reloaded catalog. Requests already running keep the snapshot they took.
+
+    Applies run one at a time. With replaces, the data is dropped if products_data
+    is no longer that dict by the time the snapshot is built. Returns True if published.
+    """
+    global products_data, products_data_version, catalog_snapshot
+    if version is None:
+        version = catalog_watcher.version
+    async with catalog_apply_lock:
+        # Serialization, compression and deltas are CPU-bound - build the snapshot off the event loop
+        previous = catalog_snapshot
+        snapshot = await asyncio.to_thread(CatalogSnapshot, new_products_data, version, previous)
+        if replaces is not None and products_data is not replaces:
+            logger.info("API: Каталог уже обновлен более новой версией, загруженные данные отброшены")
+            return False
+        products_data, products_data_version, catalog_snapshot = snapshot.source, snapshot.version, snapshot
+    logger.info(f"API: Каталог обновлен до версии {snapshot.version}, категорий: {len(products_data)}")
+    # Открытые Web App получают изменение сразу, без опроса
+    catalog_event_hub.publish(snapshot, previous.version if previous is not None else None)
+    return True
+
+def get_catalog_snapshot() -> CatalogSnapshot:
+    """Return the serialized snapshot of products_data, rebuilding it if the data was replaced."""
+    global catalog_snapshot
+    if catalog_snapshot is None or catalog_snapshot.source is not products_data:
+        catalog_snapshot = CatalogSnapshot(products_data, products_data_version, catalog_snapshot)
+    return catalog_snapshot
+
+# Изображения продуктов с сайта пекарни: загружаются один раз и хранятся на диске (создается в setup_api_server)
+image_cache = None
+
+# Наблюдение за файлом продуктов: обновления парсера применяются без перезапуска.
+# Снимки для API строит только процесс, в котором настроен сервер (см. setup_api_server);
+# интервал опроса задается из CATALOG_RELOAD_INTERVAL перед запуском
+catalog_watcher = CatalogWatcher(PRODUCTS_DATA_FILE)
 
 async def check_api_rate_limit(request, action: str = "api_request") -> bool:
     """Check API rate limiting."""
+    config = get_config()
     if not config.ENABLE_RATE_LIMITING:
         return True
     
@@ -137,41 +209,58 @@ async def check_api_rate_limit(request, action: str = "api_request") -> bool:
     if not client_ip:
         client_ip = "unknown"
     
-    current_time = time.time()
     key = f"api_{client_ip}_{action}"
-    
-    # Clean old entries
-    api_rate_limit_store[key] = [
-        timestamp for timestamp in api_rate_limit_store[key]
-        if current_time - timestamp < config.RATE_LIMIT_WINDOW
-    ]
+    result = await rate_limiter.hit(key, config.RATE_LIMIT_MAX_REQUESTS, config.RATE_LIMIT_WINDOW)
     
     # Check if limit exceeded
-    if len(api_rate_limit_store[key]) >= config.RATE_LIMIT_MAX_REQUESTS:
+    if not result.allowed:
+        rate_limit_rejections.labels('api').inc()
         logger.warning(f"🚫 API rate limit exceeded for IP {client_ip}, action: {action}")
         security_manager._log_security_event("api_rate_limit_exceeded", {
             "client_ip": client_ip,
             "action": action,
-            "current_count": len(api_rate_limit_store[key])
+            "current_count": result.count
         })
         return False
     
-    # Add current request
-    api_rate_limit_store[key].append(current_time)
     return True
 
-async def get_products_for_webapp(request):
-    """Отдает данные о продуктах для Web App, с возможностью фильтрации по категории."""
+# Upper bound for /bot-app/api/products?ids=... (a cart never holds more distinct items)
+MAX_BATCH_PRODUCT_IDS = 100
+
+# Response header with the catalog version the body was built from
+CATALOG_VERSION_HEADER = 'X-Catalog-Version'
+
+# Page sizes for /bot-app/api/products?category=...&limit=...&cursor=...
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
+def parse_fields_query(raw, snapshot: CatalogSnapshot):
+    """Parse the fields parameter; None means full products. Raises ValueError if invalid."""
+    if raw is None:
+        return None
+    fields = parse_fields(raw)
+    if not fields:
+        raise ValueError("fields must list at least one product field")
+    snapshot.check_fields(fields)
+    return fields
+
+def parse_limit_query(raw):
+    """Parse the limit parameter; None when absent. Raises ValueError if out of range."""
+    if raw is None:
+        return None
+    if not raw.isdigit() or not 1 <= int(raw) <= MAX_PAGE_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_LIMIT}")
+    return int(raw)
+
+async def check_signed_request(request):
+    """Apply per-IP rate limiting and HMAC signature checks. Returns an error response or None."""
     
     # ===== RATE LIMITING =====
     client_ip = request.remote
-    if not check_rate_limit(client_ip):
+    if not await check_rate_limit(client_ip):
         logger.warning(f"API: Rate limit exceeded for IP {client_ip}")
-        return web.json_response({"error": "Rate limit exceeded"}, status=429, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
+        return json_response({"error": "Rate limit exceeded"}, status=429, headers=NO_STORE_HEADERS)
     
     # ===== HMAC SIGNATURE VERIFICATION =====
     signature = request.headers.get('X-Signature')
@@ -180,22 +269,14 @@ async def get_products_for_webapp(request):
     
     if not signature or not timestamp:
         logger.warning(f"API: Missing signature or timestamp from {client_ip}")
-        return web.json_response({"error": "Missing signature"}, status=403, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
+        return json_response({"error": "Missing signature"}, status=403, headers=NO_STORE_HEADERS)
     
     # Check timestamp (prevent replay attacks)
     current_time = int(time.time())
     request_time = int(timestamp)
     if abs(current_time - request_time) > 300:  # 5 minutes tolerance
         logger.warning(f"API: Timestamp too old from {client_ip}")
-        return web.json_response({"error": "Request expired"}, status=403, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
+        return json_response({"error": "Request expired"}, status=403, headers=NO_STORE_HEADERS)
     
     # Use Telegram initData as secret (unique per session)
     hmac_secret = init_data if init_data else HMAC_SECRET
@@ -204,94 +285,234 @@ async def get_products_for_webapp(request):
     request_data = f"{request.method}:{request.path}:{timestamp}"
     if not verify_hmac_signature(request_data, signature, hmac_secret):
         logger.warning(f"API: Invalid signature from {client_ip}")
-        return web.json_response({"error": "Invalid signature"}, status=403, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
+        return json_response({"error": "Invalid signature"}, status=403, headers=NO_STORE_HEADERS)
+    
+    return None
+
+async def get_products_for_webapp(request):
+    """Отдает данные о продуктах для Web App, с возможностью фильтрации по категории или по списку id."""
+    error_response = await check_signed_request(request)
+    if error_response is not None:
+        return error_response
     
     category_key = request.query.get('category')
-    logger.info(f"API: Запрос продуктов для категории: {category_key}")
+    logger.debug("API: Запрос продуктов для категории: %s", category_key)
 
     if not products_data:
         logger.warning("API: Данные о продуктах не загружены.")
-        return web.json_response({"error": "Product data not loaded"}, status=500, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
+        return json_response({"error": "Product data not loaded"}, status=500, headers=NO_STORE_HEADERS)
+
+    snapshot = get_catalog_snapshot()
+    # The version a client starts from when it later asks /products/changes
+    version_headers = {CATALOG_VERSION_HEADER: str(snapshot.version)}
+
+    try:
+        fields = parse_fields_query(request.query.get('fields'), snapshot)
+
+        ids_param = request.query.get('ids')
+        if ids_param is not None:
+            product_ids = parse_product_ids(ids_param)
+            if not product_ids or len(product_ids) > MAX_BATCH_PRODUCT_IDS:
+                raise ValueError(f"ids must list 1 to {MAX_BATCH_PRODUCT_IDS} product ids")
+            return cached_response(request, snapshot.products_batch(product_ids, fields), version_headers)
+
+        limit = parse_limit_query(request.query.get('limit'))
+        cursor = request.query.get('cursor')
+        if (limit is not None or cursor) and not category_key:
+            raise ValueError("limit and cursor require category")
+
+        if category_key:
+            if limit is not None or cursor:
+                payload = snapshot.page(category_key, limit or DEFAULT_PAGE_LIMIT, cursor, fields)
+            else:
+                payload = (await snapshot.load_view(fields)).category(category_key)
+            if payload is None:
+                logger.warning(f"API: Категория '{category_key}' не найдена или пуста.")
+                return json_response({"error": "Category not found or empty"}, status=404, headers=NO_STORE_HEADERS)
+            return cached_response(request, payload, version_headers)
+        else:
+            # Если категория не указана, отдаем все продукты, сгруппированные по категориям
+            return cached_response(request, (await snapshot.load_view(fields)).all_products, version_headers)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400, headers=NO_STORE_HEADERS)
 
-    if category_key:
-        products_in_category = products_data.get(category_key, [])
-        if not products_in_category:
-            logger.warning(f"API: Категория '{category_key}' не найдена или пуста.")
-            return web.json_response({"error": "Category not found or empty"}, status=404, headers={
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            })
-        return web.json_response(products_in_category, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
-    else:
-        # Если категория не указана, отдаем все продукты, сгруппированные по категориям
-        return web.json_response(products_data, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
+async def get_product_for_webapp(request):
+    """Отдает один продукт по id."""
+    error_response = await check_signed_request(request)
+    if error_response is not None:
+        return error_response
+
+    if not products_data:
+        logger.warning("API: Данные о продуктах не загружены.")
+        return json_response({"error": "Product data not loaded"}, status=500, headers=NO_STORE_HEADERS)
+
+    product_id = request.match_info['product_id']
+    snapshot = get_catalog_snapshot()
+    payload = snapshot.product(product_id)
+    if payload is None:
+        return json_response({"error": "Product not found"}, status=404, headers=NO_STORE_HEADERS)
+    return cached_response(request, payload, {CATALOG_VERSION_HEADER: str(snapshot.version)})
+
+async def get_catalog_changes(request):
+    """Отдает изменения каталога с версии since или весь каталог, если версия устарела."""
+    error_response = await check_signed_request(request)
+    if error_response is not None:
+        return error_response
+
+    since = request.query.get('since', '')
+    if not since.isdigit():
+        return json_response({"error": "since must be a catalog version"}, status=400, headers=NO_STORE_HEADERS)
+
+    if not products_data:
+        logger.warning("API: Данные о продуктах не загружены.")
+        return json_response({"error": "Product data not loaded"}, status=500, headers=NO_STORE_HEADERS)
+
+    snapshot = get_catalog_snapshot()
+    return cached_response(request, snapshot.changes_since(int(since)),
+                           {CATALOG_VERSION_HEADER: str(snapshot.version)})
+
+async def stream_catalog_events(request):
+    """Поток событий об обновлениях каталога (Server-Sent Events)."""
+    error_response = await check_signed_request(request)
+    if error_response is not None:
+        return error_response
+
+    if not products_data:
+        logger.warning("API: Данные о продуктах не загружены.")
+        return json_response({"error": "Product data not loaded"}, status=500, headers=NO_STORE_HEADERS)
+
+    return await stream_events(request, catalog_event_hub, get_catalog_snapshot())
+
+async def serve_product_image(request):
+    """Отдает изображение продукта нужного размера из локального кеша."""
+    size = request.match_info.get('size', '')
+    if size not in IMAGE_SIZES:
+        return web.Response(status=404, text="Unknown image size")
+
+    product = get_catalog_snapshot().products_by_id.get(request.match_info.get('product_id', ''))
+    if product is None or not has_image(product):
+        return web.Response(status=404, text="Image not found")
+
+    return await image_response(request, image_cache, product['image_url'], size)
+
+async def search_products(request):
+    """Поиск продуктов по названию, описанию и составу."""
+    error_response = await check_signed_request(request)
+    if error_response is not None:
+        return error_response
+
+    if not products_data:
+        logger.warning("API: Данные о продуктах не загружены.")
+        return json_response({"error": "Product data not loaded"}, status=500, headers=NO_STORE_HEADERS)
+
+    snapshot = get_catalog_snapshot()
+    query = request.query.get('q', '').strip()
+    try:
+        if not query:
+            raise ValueError("q must not be empty")
+        fields = parse_fields_query(request.query.get('fields'), snapshot)
+        limit = parse_limit_query(request.query.get('limit')) or DEFAULT_PAGE_LIMIT
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400, headers=NO_STORE_HEADERS)
+
+    return cached_response(request, snapshot.search(query, limit, fields),
+                           {CATALOG_VERSION_HEADER: str(snapshot.version)})
 
 async def get_categories_for_webapp(request):
     """Отдает список категорий для Web App."""
     # Check rate limiting
     if not await check_api_rate_limit(request, "get_categories"):
-        return web.json_response({"error": "Rate limit exceeded"}, status=429, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
+        return json_response({"error": "Rate limit exceeded"}, status=429, headers=NO_STORE_HEADERS)
     
-    logger.info("API: Запрос списка категорий.")
+    logger.debug("API: Запрос списка категорий.")
     if not products_data:
         logger.warning("API: Данные о продуктах не загружены для категорий.")
-        return web.json_response({"error": "Product data not loaded"}, status=500, headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        })
+        return json_response({"error": "Product data not loaded"}, status=500, headers=NO_STORE_HEADERS)
+
+    return cached_response(request, get_catalog_snapshot().categories_list)
 
-    categories_list = []
-    for key, products in products_data.items():
-        if products: # Убедимся, что в категории есть продукты
-            # Берем первое изображение из первого продукта в категории как изображение для категории
-            category_image = products[0].get('image_url', '')
-            categories_list.append({
-                "key": key,
-                "name": products[0].get('category_name', key), # Используем название категории из первого продукта
-                "image": category_image
-            })
-    return web.json_response(categories_list, headers={
-        'Cache-Control': 'no-cache, no-store, must-revalidate',
-        'Pragma': 'no-cache',
-        'Expires': '0'
-    })
+def catalog_loaded() -> bool:
+    """True once a non-empty catalog has been loaded (at startup or by a later reload)."""
+    return bool(products_data)
+
+async def health_check(request):
+    """Liveness probe: the process is up and answering."""
+    return json_response({"status": "ok"}, headers=NO_STORE_HEADERS)
+
+async def readiness_check(request):
+    """Readiness probe: 503 until the catalog is loaded, so no traffic reaches an empty shop."""
+    if not catalog_loaded():
+        return json_response({"status": "loading"}, status=503, headers={**NO_STORE_HEADERS, 'Retry-After': '5'})
+    return json_response({"status": "ready", "version": products_data_version}, headers=NO_STORE_HEADERS)
 
 async def serve_main_app_page(request):
-    """Отдает главный HTML файл Web App."""
-    logger.info(f"API: Serving index.html for Web App entry point: {request.path}")
-    return web.FileResponse(os.path.join(WEB_APP_DIR, 'index.html'))
+    """Отдает главный HTML файл Web App со ссылками на файлы с хешем содержимого."""
+    logger.debug("API: Serving index.html for Web App entry point: %s", request.path)
+    asset = static_assets.get('index.html')
+    if asset is None:
+        raise web.HTTPNotFound(text="index.html not found")
+    # Страница всегда проверяется по ETag: только она знает актуальные имена файлов
+    return asset_response(request, asset, {'Cache-Control': CACHE_REVALIDATE})
 
 async def setup_api_server():
-    """Настраивает и возвращает AioHTTP Web Application Runner."""
+    """Настраивает и возвращает AioHTTP Web Application Runner.
+
+    Каталог загружается в фоне после запуска: сервер сразу принимает соединения, а /ready отвечает 503,
+    пока каталог не загружен.
+    """
+    global static_assets, image_cache
+    config = get_config()
     app = web.Application()
 
+    # Metrics first: its timing covers the other middlewares
+    app.middlewares.append(metrics_middleware)
+
     # Add security headers middleware
     app.middlewares.append(security_headers_middleware)
 
-    # Загружаем данные о продуктах при настройке сервера
-    await load_products_data_for_api()
+    # Читаем файлы Web App в память один раз; изменения на диске подхватываются при запросе
+    static_assets = StaticAssetCache(web_app_dir())
+    logger.debug("API: Директория Web App: %s", static_assets.root)
+    static_assets.load()
+    try:
+        static_assets.write_manifest(ASSET_MANIFEST_FILE)
+    except OSError as e:
+        logger.warning(f"API: Не удалось записать манифест ассетов {ASSET_MANIFEST_FILE}: {e}")
+
+    image_cache = ImageCache(config.IMAGE_CACHE_DIR or DEFAULT_IMAGE_CACHE_DIR, config.IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+    # Следим за обновлениями файла продуктов, пока сервер работает
+    catalog_watcher.add_listener(apply_products_data)
+    catalog_watcher.interval = config.CATALOG_RELOAD_INTERVAL
+
+    # Каталог загружается вне цикла событий, пока сервер уже слушает порт
+    async def start_catalog(app):
+        start_catalog_load()
+        catalog_watcher.start()
+
+    async def stop_catalog(app):
+        global catalog_load_task
+        if catalog_load_task is not None:
+            catalog_load_task.cancel()
+            try:
+                await catalog_load_task
+            except asyncio.CancelledError:
+                pass
+            catalog_load_task = None
+        await catalog_watcher.stop()
+
+    # Открытые потоки событий завершаются до остановки сервера, иначе он ждет их до таймаута
+    async def close_catalog_events(app):
+        catalog_event_hub.close()
+
+    # Сессия для загрузки изображений с сайта пекарни
+    async def close_image_cache(app):
+        await image_cache.close()
+
+    app.on_startup.append(start_catalog)
+    app.on_shutdown.append(close_catalog_events)
+    app.on_cleanup.append(stop_catalog)
+    app.on_cleanup.append(close_image_cache)
 
     # ДОБАВЛЕНО: Перенаправление с корневого пути на '/bot-app/'
     app.router.add_get('/', lambda r: web.HTTPFound('/bot-app/'))
@@ -300,10 +521,25 @@ async def setup_api_server():
     # ИЗМЕНЕНО: Добавлен префикс '/bot-app'
     app.router.add_get('/bot-app/api/products', get_products_for_webapp)
 
+    # Изменения каталога с указанной версии (до маршрута с id, иначе 'changes' примут за id)
+    app.router.add_get('/bot-app/api/products/changes', get_catalog_changes)
+
+    # Один продукт по id (проверка корзины без загрузки всего каталога)
+    app.router.add_get('/bot-app/api/products/{product_id}', get_product_for_webapp)
+
     # 2. Маршрут для получения категорий
     # ИЗМЕНЕНО: Добавлен префикс '/bot-app'
     app.router.add_get('/bot-app/api/categories', get_categories_for_webapp)
     
+    # Поиск продуктов
+    app.router.add_get('/bot-app/api/search', search_products)
+
+    # Поток обновлений каталога для открытых Web App
+    app.router.add_get('/bot-app/api/events', stream_catalog_events)
+    
+    # Изображения продуктов через локальный кеш (до маршрута статических файлов)
+    app.router.add_get('/bot-app/img/{product_id}/{size}', serve_product_image)
+    
     # 3. Маршрут для получения токена аутентификации
     app.router.add_get('/bot-app/api/auth/token', get_auth_token)
 
@@ -313,60 +549,15 @@ async def setup_api_server():
     # 4. Маршрут для статических файлов Web App (CSS, JS, images) внутри /bot-app/
     # Добавляем обработчик для статических файлов с контролем кеширования
     async def serve_static_with_cache_control(request):
-        """Serves static files with proper cache control headers."""
+        """Serves static files from the in-memory asset cache with proper cache control headers."""
         file_path = request.match_info.get('filename', '')
-        full_path = os.path.join(WEB_APP_DIR, file_path)
-        
-        if os.path.exists(full_path) and os.path.isfile(full_path):
-            # Read file content first
-            try:
-                with open(full_path, 'rb') as f:
-                    content = f.read()
-            except Exception as e:
-                logger.error(f"Error reading file {full_path}: {e}")
-                return web.Response(status=500, text="Error reading file")
-            
-            # Определяем тип содержимого на основе расширения файла
-            content_type = 'text/html'
-            if file_path.endswith('.css'):
-                content_type = 'text/css'
-            elif file_path.endswith('.js'):
-                content_type = 'application/javascript'
-            elif file_path.endswith('.png'):
-                content_type = 'image/png'
-            elif file_path.endswith('.jpg') or file_path.endswith('.jpeg'):
-                content_type = 'image/jpeg'
-            elif file_path.endswith('.svg'):
-                content_type = 'image/svg+xml'
-            
-
-            
-            # Check if file has version query parameter (e.g., ?v=1.2.0)
-            query_string = request.query_string
-            has_version = 'v=' in query_string
-            
-            # Create stable content hash for ETag
-            content_hash = create_content_hash(content)
-            
-            if has_version:
-                # Versioned files should be cached for a long time
-                headers = {
-                    'Content-Type': content_type,
-                    'Cache-Control': 'public, max-age=31536000',  # 1 year
-                    'ETag': f'"{content_hash}"'
-                }
-            else:
-                # Non-versioned files should not be cached
-                headers = {
-                    'Content-Type': content_type,
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0'
-                }
-            
-            return web.Response(body=content, headers=headers)
-        else:
+        asset, immutable = static_assets.lookup(file_path)
+        if asset is None:
             return web.Response(status=404, text="File not found")
+
+        # Names with the current content hash (style.1a2b3c4d5e.css) never change;
+        # everything else gets the route cache policy and revalidates via ETag
+        return asset_response(request, asset, {'Cache-Control': CACHE_IMMUTABLE} if immutable else None)
     
     # Маршрут для статических файлов с умным контролем кеширования
     app.router.add_get(r'/bot-app/{filename:.+\.(css|js|png|jpg|jpeg|svg|ico)}', serve_static_with_cache_control)
@@ -387,12 +578,19 @@ async def setup_api_server():
 
     app.router.add_get('/.well-known/security.txt', serve_security_txt)
 
+    # 7. Метрики в формате Prometheus (токен METRICS_TOKEN или только localhost)
+    app.router.add_get('/metrics', metrics_handler)
+
+    # 8. Проверки для балансировщика и systemd: процесс жив / каталог загружен
+    app.router.add_get('/health', health_check)
+    app.router.add_get('/ready', readiness_check)
+
 
         # Настройка CORS для разрешения запросов с вашего домена Web App
     cors = aiohttp_cors.setup(app, defaults={
             "*" : aiohttp_cors.ResourceOptions(
                 allow_credentials=False,  # Disabled for security
-                expose_headers=["Content-Type", "Cache-Control", "ETag"],
+                expose_headers=["Content-Type", "Cache-Control", "ETag", CATALOG_VERSION_HEADER],
                 allow_headers=["Content-Type", "Accept", "Origin"],
                 allow_methods=["GET", "POST", "PUT", "DELETE"]
             )
@@ -410,6 +608,8 @@ async def setup_api_server():
 
 if __name__ == '__main__':
     import asyncio
+    from bot.logging_setup import setup_logging
+    setup_logging()
     async def main_api():
         runner = await setup_api_server()
         site = web.TCPSite(runner, '0.0.0.0', 80)  # nosec B104 - Web server needs to bind to all interfaces
@@ -0,0 +1,296 @@
+"""
+Cart Store
+Shopping carts in SQLite behind a bounded in-memory LRU.
+
+Reads are served from the LRU. Bot handlers preload the user's cart before
+they run, reading one row by primary key through the aiosqlite connection, so
+the synchronous mapping interface is a memory lookup. Changes
+are written behind: they wait in memory and go to the database in one
+transaction every FLUSH_INTERVAL seconds, or as soon as FLUSH_BATCH carts are
+waiting, so a crash loses at most the last few seconds of cart edits. Carts
+not changed for the TTL are dropped from memory and from the database.
+
+Until start() is awaited the store keeps carts in memory only, like the dict
+it replaces (tests, scripts).
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import aiosqlite
+
+from bot import json_codec
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, 'data', 'carts.sqlite3')
+
+# Carts kept in memory; the least recently used go first
+MAX_CACHED_CARTS = 10_000
+# Seconds between write-behind flushes
+FLUSH_INTERVAL = 2.0
+# Waiting changes that trigger a flush before the interval is over
+FLUSH_BATCH = 500
+# Carts not changed for this long are deleted (seconds)
+CART_TTL = 7 * 24 * 3600
+# Seconds between expiry sweeps
+EXPIRY_INTERVAL = 3600
+
+_MISSING = object()
+
+
+class _Entry:
+    __slots__ = ('cart', 'updated_at')
+
+    # cart None: the user has no stored cart
+    def __init__(self, cart: Optional[dict], updated_at: float):
+        self.cart = cart
+        self.updated_at = updated_at
+
+
+class CartStore:
+    """user_id -> {product_id: quantity}; assign a cart back after changing it so it gets saved."""
+
+    def __init__(self, max_cached: int = MAX_CACHED_CARTS, ttl: float = CART_TTL,
+                 flush_interval: float = FLUSH_INTERVAL, flush_batch: int = FLUSH_BATCH):
+        self.max_cached = max_cached
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.path: Optional[str] = None
+        self._cache: 'OrderedDict[int, _Entry]' = OrderedDict()
+        # Changes not yet in the database: cart, or None for a deleted one
+        self._pending: Dict[int, Tuple[Optional[dict], float]] = {}
+        self._flushing: Dict[int, Tuple[Optional[dict], float]] = {}
+        self._db: Optional[aiosqlite.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def started(self) -> bool:
+        return self._db is not None
+
+    # ===== Mapping interface used by the bot =====
+
+    def __getitem__(self, user_id: int) -> dict:
+        entry = self._cache.get(user_id)
+        if entry is not None:
+            self._cache.move_to_end(user_id)
+            if entry.cart is None:
+                raise KeyError(user_id)
+            return entry.cart
+        cart, updated_at = self._load(user_id)
+        if cart is None:
+            raise KeyError(user_id)
+        self._remember(user_id, _Entry(cart, updated_at))
+        return cart
+
+    def get(self, user_id: int, default=None):
+        try:
+            return self[user_id]
+        except KeyError:
+            return default
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id, _MISSING) is not _MISSING
+
+    def __setitem__(self, user_id: int, cart: dict):
+        now = time.time()
+        self._remember(user_id, _Entry(cart, now))
+        self._write(user_id, cart, now)
+
+    def __delitem__(self, user_id: int):
+        if user_id not in self:
+            raise KeyError(user_id)
+        self._cache.pop(user_id, None)
+        self._write(user_id, None, time.time())
+
+    def stats(self) -> dict:
+        return {"cached": len(self._cache), "pending": len(self._pending)}
+
+    # ===== Memory =====
+
+    def _remember(self, user_id: int, entry: _Entry):
+        self._cache[user_id] = entry
+        self._cache.move_to_end(user_id)
+        if not self.started:
+            return
+        # Changed carts stay in _pending until flushed, so eviction loses nothing
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _write(self, user_id: int, cart: Optional[dict], now: float):
+        if not self.started:
+            return
+        self._pending[user_id] = (cart, now)
+        if len(self._pending) >= self.flush_batch and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    def _load(self, user_id: int) -> Tuple[Optional[dict], float]:
+        """Cart not in the LRU: a change waiting for the database, or the stored row.
+
+        The row is read synchronously; handlers avoid that with preload().
+        """
+        for changes in (self._pending, self._flushing):
+            if user_id in changes:
+                return changes[user_id]
+        if self._reader is None:
+            return None, 0.0
+        try:
+            row = self._reader.execute(
+                "SELECT items, updated_at FROM carts WHERE user_id = ? AND updated_at > ?",
+                (user_id, time.time() - self.ttl)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Корзины: не удалось прочитать корзину пользователя {user_id}: {e}")
+            return None, 0.0
+        if row is None:
+            return None, 0.0
+        return json_codec.loads(row[0]), row[1]
+
+    async def preload(self, user_id: int):
+        """Bring a stored cart into the LRU without blocking the event loop.
+
+        A user without a cart is remembered too, so the next lookup does not
+        go to the database either.
+        """
+        if self._db is None:
+            return
+        if user_id in self._cache:
+            self._cache.move_to_end(user_id)
+            return
+        if user_id in self._pending or user_id in self._flushing:
+            return
+        try:
+            async with self._db.execute(
+                "SELECT items, updated_at FROM carts WHERE user_id = ? AND updated_at > ?",
+                (user_id, time.time() - self.ttl)
+            ) as cursor:
+                row = await cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Корзины: не удалось прочитать корзину пользователя {user_id}: {e}")
+            return
+        if user_id in self._cache or user_id in self._pending or user_id in self._flushing:
+            # Changed while the row was being read
+            return
+        if row is None:
+            self._remember(user_id, _Entry(None, time.time()))
+        else:
+            self._remember(user_id, _Entry(json_codec.loads(row[0]), row[1]))
+
+    # ===== Database =====
+
+    async def start(self, path: str = DEFAULT_DB_PATH):
+        """Open the database and start the flush loop."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = await aiosqlite.connect(path, timeout=5)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS carts ("
+            " user_id INTEGER PRIMARY KEY,"
+            " items TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        await self._db.execute("CREATE INDEX IF NOT EXISTS carts_updated_at ON carts (updated_at)")
+        await self._db.commit()
+        # Fallback for a miss outside preload(): handlers read carts without awaiting
+        self._reader = sqlite3.connect(path, timeout=5)
+        self.path = path
+
+        # Carts changed before start are saved with the first flush
+        for user_id, entry in self._cache.items():
+            self._pending.setdefault(user_id, (entry.cart, entry.updated_at))
+        self._closing = False
+        self._flush_requested = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Корзины: хранилище {path} открыто")
+
+    async def _run(self):
+        last_expiry = time.monotonic()
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+            if not self._closing and time.monotonic() - last_expiry >= EXPIRY_INTERVAL:
+                last_expiry = time.monotonic()
+                try:
+                    await self.expire()
+                except sqlite3.Error as e:
+                    logger.error(f"Корзины: не удалось удалить старые корзины: {e}")
+
+    async def flush(self) -> int:
+        """Write waiting changes in one transaction. Returns the number of carts written."""
+        async with self._flush_lock:
+            if not self._pending or self._db is None:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            upserts = []
+            deletes = []
+            for user_id, (cart, updated_at) in batch.items():
+                # An empty cart is the same as no cart
+                if cart:
+                    upserts.append((user_id, json_codec.dumps(cart), updated_at))
+                else:
+                    deletes.append((user_id,))
+            try:
+                await self._db.executemany(
+                    "INSERT OR REPLACE INTO carts (user_id, items, updated_at) VALUES (?, ?, ?)", upserts
+                )
+                await self._db.executemany("DELETE FROM carts WHERE user_id = ?", deletes)
+                await self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Корзины: не удалось сохранить {len(batch)} корзин: {e}. Повторим позже.")
+                await self._db.rollback()
+                for user_id, change in batch.items():
+                    self._pending.setdefault(user_id, change)
+                return 0
+            finally:
+                self._flushing = {}
+            logger.debug("Корзины: сохранено %d, удалено %d", len(upserts), len(deletes))
+            return len(batch)
+
+    async def expire(self, now: Optional[float] = None) -> int:
+        """Drop carts not changed for the TTL. Returns the number of deleted rows."""
+        cutoff = (time.time() if now is None else now) - self.ttl
+        for user_id in [user_id for user_id, entry in self._cache.items() if entry.updated_at <= cutoff]:
+            if user_id not in self._pending:
+                del self._cache[user_id]
+        if self._db is None:
+            return 0
+        async with self._flush_lock:
+            cursor = await self._db.execute("DELETE FROM carts WHERE updated_at <= ?", (cutoff,))
+            await self._db.commit()
+        if cursor.rowcount:
+            logger.info(f"Корзины: удалено {cursor.rowcount} корзин без изменений дольше {self.ttl / 86400:g} дн.")
+        return cursor.rowcount
+
+    async def close(self):
+        """Stop the flush loop, save waiting changes and close the database."""
+        if self._task is not None:
+            # Let a flush in progress finish instead of cancelling it mid-transaction
+            self._closing = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+        if self._db is None:
+            return
+        await self.flush()
+        await self._db.close()
+        self._reader.close()
+        self._db = None
+        self._reader = None
+        logger.info("Корзины: хранилище закрыто")
@@ -0,0 +1,504 @@
+"""
+Catalog Snapshot
+Serializes the products catalog once per load so API handlers only pick bytes,
+and watches products_scraped.json so parser refreshes reach a running server.
+"""
+
+import asyncio
+import base64
+import binascii
+import logging
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional
+
+from bot import json_codec
+from bot.http_cache import BROTLI_QUALITY, DYNAMIC_BROTLI_QUALITY, PrecompressedBody
+from bot.image_proxy import has_image, image_path
+from bot.search import build_search_index
+
+logger = logging.getLogger(__name__)
+
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+# Keys a product can have: the parser output plus category_name used by the category list
+PRODUCT_FIELDS = frozenset((
+    'id', 'name', 'url', 'image_url', 'price', 'short_description', 'weight', 'for_vegans',
+    'availability_days', 'ingredients', 'calories', 'energy_value', 'category_name'
+))
+# What the category grid renders; long texts (ingredients, energy_value, ...) are left out
+GRID_FIELDS = frozenset(('id', 'name', 'price', 'image_url', 'weight', 'for_vegans', 'availability_days'))
+# Field projections kept per snapshot
+MAX_CATALOG_VIEWS = 8
+# Previous catalog versions a client can still get a delta from
+CATALOG_HISTORY_SIZE = 16
+
+_MISSING = object()
+
+
+def serialize_json(data) -> bytes:
+    """Serialize data to compact UTF-8 JSON bytes."""
+    return json_codec.dumps(data)
+
+
+def json_payload(data, brotli_quality: int = BROTLI_QUALITY) -> PrecompressedBody:
+    """Serialize and pre-compress a JSON document."""
+    return PrecompressedBody(serialize_json(data), JSON_CONTENT_TYPE, brotli_quality=brotli_quality)
+
+
+def build_categories_list(products_data: dict) -> List[dict]:
+    """Build the category list shown on the Web App start screen."""
+    categories_list = []
+    for key, products in products_data.items():
+        if products:  # Убедимся, что в категории есть продукты
+            # Берем первое изображение из первого продукта в категории как изображение для категории
+            category_image = products[0].get('image_url', '')
+            if has_image(products[0]) and products[0].get('id') is not None:
+                # Через локальный кеш изображений, как и сетка продуктов
+                category_image = image_path(str(products[0]['id']), category_image)
+            categories_list.append({
+                "key": key,
+                "name": products[0].get('category_name', key),  # Используем название категории из первого продукта
+                "image": category_image
+            })
+    return categories_list
+
+
+def build_products_index(products_data: dict) -> Dict[str, dict]:
+    """Map product id to product across all categories; the first occurrence of an id wins."""
+    index = {}
+    for products in products_data.values():
+        for product in products:
+            product_id = product.get('id')
+            if product_id is not None:
+                index.setdefault(str(product_id), product)
+    return index
+
+
+def parse_product_ids(raw: str) -> List[str]:
+    """Split a comma-separated ids parameter, dropping blanks and duplicates."""
+    ids = []
+    seen = set()
+    for product_id in raw.split(','):
+        product_id = product_id.strip()
+        if product_id and product_id not in seen:
+            seen.add(product_id)
+            ids.append(product_id)
+    return ids
+
+
+def parse_fields(raw: str) -> FrozenSet[str]:
+    """Parse a comma-separated fields parameter into a set of product keys."""
+    return frozenset(field.strip() for field in raw.split(',') if field.strip())
+
+
+def project_product(product: dict, fields: Optional[FrozenSet[str]]) -> dict:
+    """Keep only the given keys of a product, in their original order."""
+    if fields is None:
+        return product
+    return {key: value for key, value in product.items() if key in fields}
+
+
+def encode_cursor(product_id: str) -> str:
+    """Opaque pagination cursor pointing after the given product."""
+    return base64.urlsafe_b64encode(product_id.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> str:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        product_id = base64.b64decode(padded, altchars=b'-_', validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("malformed cursor") from e
+    if not product_id:
+        raise ValueError("malformed cursor")
+    return product_id
+
+
+def _locate_products(products_data: dict) -> Dict[str, tuple]:
+    """Map product id to (category key, product); the first occurrence of an id wins."""
+    located = {}
+    for key, products in products_data.items():
+        for product in products:
+            product_id = product.get('id')
+            if product_id is not None:
+                located.setdefault(str(product_id), (key, product))
+    return located
+
+
+def diff_catalogs(old_data: dict, new_data: dict) -> dict:
+    """Describe how to turn old_data into new_data.
+
+    A product that moved to another category is reported as removed and added;
+    "order" lists the product ids of every category whose order or membership changed.
+    """
+    old_products = _locate_products(old_data)
+    new_products = _locate_products(new_data)
+
+    added = []
+    removed = []
+    changed = []
+    for product_id, (old_key, old_product) in old_products.items():
+        new_entry = new_products.get(product_id)
+        if new_entry is None or new_entry[0] != old_key:
+            removed.append({"category": old_key, "id": product_id})
+            continue
+        new_product = new_entry[1]
+        if new_product == old_product:
+            continue
+        fields = {key: value for key, value in new_product.items() if old_product.get(key, _MISSING) != value}
+        removed_fields = [key for key in old_product if key not in new_product]
+        changed.append({"category": old_key, "id": product_id, "fields": fields, "removed_fields": removed_fields})
+
+    for product_id, (new_key, new_product) in new_products.items():
+        old_entry = old_products.get(product_id)
+        if old_entry is None or old_entry[0] != new_key:
+            added.append({"category": new_key, "product": new_product})
+
+    order = {}
+    for key in list(old_data) + [key for key in new_data if key not in old_data]:
+        old_ids = [str(product.get('id')) for product in old_data.get(key, ())]
+        new_ids = [str(product.get('id')) for product in new_data.get(key, ())]
+        if old_ids != new_ids:
+            order[key] = new_ids
+
+    return {"added": added, "removed": removed, "changed": changed, "order": order}
+
+
+class CatalogView:
+    """Pre-built payloads for one field projection of a snapshot."""
+
+    def __init__(self, products_data: dict, fields: Optional[FrozenSet[str]] = None,
+                 brotli_quality: int = BROTLI_QUALITY):
+        self.fields = fields
+        if fields is None:
+            self.products_data = products_data
+        else:
+            self.products_data = {
+                key: [project_product(product, fields) for product in products]
+                for key, products in products_data.items()
+            }
+
+        self.all_products = json_payload(self.products_data, brotli_quality)
+        self.categories: Dict[str, PrecompressedBody] = {
+            key: json_payload(products, brotli_quality)
+            for key, products in self.products_data.items()
+            if products
+        }
+
+    def category(self, category_key: str) -> Optional[PrecompressedBody]:
+        """Return the pre-built payload for a non-empty category."""
+        return self.categories.get(category_key)
+
+
+class CatalogSnapshot:
+    """Immutable view of one products_scraped.json load with pre-built responses."""
+
+    def __init__(self, products_data: dict, version: Optional[int] = None,
+                 previous: Optional["CatalogSnapshot"] = None):
+        # Shallow copy so later mutation of the source dict cannot leak into served bytes
+        self.products_data = dict(products_data.items())
+        self.source = products_data
+
+        # Versions only grow, even if the file was replaced by one with an older mtime
+        minimum_version = previous.version + 1 if previous is not None else 1
+        self.version = max(version or 0, minimum_version)
+        # (version, products_data) of earlier snapshots, oldest first
+        self.history: tuple = ()
+        if previous is not None:
+            self.history = (previous.history + ((previous.version, previous.products_data),))[-CATALOG_HISTORY_SIZE:]
+        # Deltas from every version in history are built now, while the swap runs off the event loop
+        self._changes: Dict[int, PrecompressedBody] = {
+            old_version: self._changes_payload(old_version, diff_catalogs(old_data, self.products_data))
+            for old_version, old_data in self.history
+        }
+        self._changes[self.version] = self._changes_payload(self.version, diff_catalogs({}, {}))
+        self._resync: Optional[PrecompressedBody] = None
+
+        self.full_view = CatalogView(self.products_data)
+        self.all_products = self.full_view.all_products
+        self.categories = self.full_view.categories
+        self.categories_list = json_payload(build_categories_list(self.products_data))
+        self.products_by_id = build_products_index(self.products_data)
+        located = _locate_products(self.products_data)
+        self._product_categories = {product_id: key for product_id, (key, _) in located.items()}
+        # Search ranks ties by catalog order
+        self._catalog_order = {product_id: position for position, product_id in enumerate(located)}
+        # Only products whose texts changed since the previous snapshot are re-indexed
+        self.search_index = build_search_index(
+            self.products_by_id, previous.search_index if previous is not None else None
+        )
+        # Single-product payloads are built on first request - most products are never asked for
+        self._product_payloads: Dict[str, PrecompressedBody] = {}
+
+        self.product_fields = PRODUCT_FIELDS.union(
+            key for products in self.products_data.values() for product in products for key in product
+        )
+        # Cursor lookups: category -> {product id: position}
+        self._positions: Dict[str, Dict[str, int]] = {
+            key: {str(product.get('id')): position for position, product in enumerate(products)}
+            for key, products in self.products_data.items()
+        }
+        # Projections by field set, least recently used first; the grid one is always built
+        self._views: "OrderedDict[FrozenSet[str], CatalogView]" = OrderedDict()
+        self._views[GRID_FIELDS] = CatalogView(self.products_data, GRID_FIELDS)
+        # Projections being built off the event loop, one build per field set
+        self._pending_views: Dict[FrozenSet[str], "asyncio.Task[CatalogView]"] = {}
+
+    def category(self, category_key: str) -> Optional[PrecompressedBody]:
+        """Return the pre-built payload for a non-empty category."""
+        return self.categories.get(category_key)
+
+    def _changes_payload(self, since: int, diff: dict) -> PrecompressedBody:
+        return json_payload({"version": self.version, "since": since, "full": False, **diff})
+
+    def has_delta(self, since: int) -> bool:
+        """True if changes_since(since) is a delta rather than the full catalog."""
+        return since in self._changes
+
+    def changes_since(self, since: int) -> PrecompressedBody:
+        """Return the delta from version since, or the full catalog if since is not in history."""
+        payload = self._changes.get(since)
+        if payload is not None:
+            return payload
+        if self._resync is None:
+            # Splice the pre-serialized catalog instead of encoding it again
+            body = b'{"version":%d,"full":true,"products":%s}' % (self.version, self.all_products.body)
+            self._resync = PrecompressedBody(body, JSON_CONTENT_TYPE)
+        return self._resync
+
+    def check_fields(self, fields: FrozenSet[str]):
+        """Raise ValueError if fields contains names products do not have."""
+        unknown = fields - self.product_fields
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+
+    def _cached_view(self, fields: Optional[FrozenSet[str]]) -> Optional[CatalogView]:
+        if fields is None:
+            return self.full_view
+        self.check_fields(fields)
+        view = self._views.get(fields)
+        if view is not None:
+            self._views.move_to_end(fields)
+        return view
+
+    def _build_view(self, fields: FrozenSet[str]) -> CatalogView:
+        # Built on request rather than with the snapshot, so use a cheap brotli level
+        return CatalogView(self.products_data, fields, DYNAMIC_BROTLI_QUALITY)
+
+    def _store_view(self, fields: FrozenSet[str], view: CatalogView) -> CatalogView:
+        view = self._views.setdefault(fields, view)
+        while len(self._views) > MAX_CATALOG_VIEWS:
+            del self._views[next(key for key in self._views if key != GRID_FIELDS)]
+        return view
+
+    def view(self, fields: Optional[FrozenSet[str]]) -> CatalogView:
+        """Return the projection for a field set, building and caching it on first use.
+
+        Raises ValueError for field names products do not have, so clients cannot
+        fill the cache with arbitrary combinations. Builds in the calling thread;
+        request handlers use load_view instead.
+        """
+        view = self._cached_view(fields)
+        if view is None:
+            view = self._store_view(fields, self._build_view(fields))
+        return view
+
+    async def load_view(self, fields: Optional[FrozenSet[str]]) -> CatalogView:
+        """Like view, but a missing projection is built in a worker thread.
+
+        Concurrent requests for the same field set share one build.
+        """
+        view = self._cached_view(fields)
+        if view is not None:
+            return view
+        task = self._pending_views.get(fields)
+        if task is None:
+            task = self._pending_views[fields] = asyncio.create_task(self._load_view(fields))
+        # Shielded so one cancelled request does not abort the build the others wait for
+        return await asyncio.shield(task)
+
+    async def _load_view(self, fields: FrozenSet[str]) -> CatalogView:
+        try:
+            view = await asyncio.to_thread(self._build_view, fields)
+            return self._store_view(fields, view)
+        finally:
+            del self._pending_views[fields]
+
+    def page(self, category_key: str, limit: int, cursor: Optional[str] = None,
+             fields: Optional[FrozenSet[str]] = None) -> Optional[PrecompressedBody]:
+        """Return {"items": [...], "next_cursor": ...} for one page of a category.
+
+        Returns None for an unknown category and raises ValueError for a bad
+        cursor or unknown fields.
+        """
+        if fields is not None:
+            self.check_fields(fields)
+        positions = self._positions.get(category_key)
+        if positions is None:
+            return None
+
+        start = 0
+        if cursor:
+            after_id = decode_cursor(cursor)
+            if after_id not in positions:
+                raise ValueError("cursor does not point into this category")
+            start = positions[after_id] + 1
+
+        source = self.products_data[category_key]
+        items = [project_product(product, fields) for product in source[start:start + limit]]
+        end = start + len(items)
+        next_cursor = encode_cursor(str(source[end - 1].get('id'))) if items and end < len(source) else None
+        return PrecompressedBody(serialize_json({"items": items, "next_cursor": next_cursor}),
+                                 JSON_CONTENT_TYPE, brotli_quality=DYNAMIC_BROTLI_QUALITY)
+
+    def search(self, query: str, limit: int, fields: Optional[FrozenSet[str]] = None) -> PrecompressedBody:
+        """Return {"query", "total", "items": [{"category", "product"}, ...]} for a search query."""
+        product_ids = self.search_index.search(query, self._catalog_order)
+        items = [
+            {"category": self._product_categories[product_id],
+             "product": project_product(self.products_by_id[product_id], fields)}
+            for product_id in product_ids[:limit]
+        ]
+        return PrecompressedBody(serialize_json({"query": query, "total": len(product_ids), "items": items}),
+                                 JSON_CONTENT_TYPE, brotli_quality=DYNAMIC_BROTLI_QUALITY)
+
+    def product(self, product_id: str) -> Optional[PrecompressedBody]:
+        """Return the payload for one product, or None if the id is unknown."""
+        payload = self._product_payloads.get(product_id)
+        if payload is None:
+            product = self.products_by_id.get(product_id)
+            if product is None:
+                return None
+            payload = self._product_payloads[product_id] = json_payload(product)
+        return payload
+
+    def products_batch(self, product_ids: List[str],
+                       fields: Optional[FrozenSet[str]] = None) -> PrecompressedBody:
+        """Return {"products": [...], "missing": [...]} for the requested ids, in request order."""
+        products = []
+        missing = []
+        for product_id in product_ids:
+            product = self.products_by_id.get(product_id)
+            if product is None:
+                missing.append(product_id)
+            else:
+                products.append(project_product(product, fields))
+        # Built per request, so use a cheap brotli level instead of the snapshot's maximum
+        return PrecompressedBody(serialize_json({"products": products, "missing": missing}),
+                                 JSON_CONTENT_TYPE, brotli_quality=DYNAMIC_BROTLI_QUALITY)
+
+
+def validate_products_data(data) -> dict:
+    """Check that data looks like {category_key: [product, ...]} with at least one product."""
+    if not isinstance(data, dict):
+        raise ValueError(f"catalog must be an object, got {type(data).__name__}")
+
+    total = 0
+    for key, products in data.items():
+        if not isinstance(products, list):
+            raise ValueError(f"category '{key}' must be a list, got {type(products).__name__}")
+        for product in products:
+            if not isinstance(product, dict):
+                raise ValueError(f"category '{key}' contains a non-object product")
+        total += len(products)
+
+    # The parser writes empty categories when the site is unreachable - never publish that
+    if total == 0:
+        raise ValueError("catalog contains no products")
+    return data
+
+
+def file_version(mtime_ns: int) -> int:
+    """Catalog version for a products file: its mtime in microseconds.
+
+    Every API worker reads the same file, so they all agree on the version.
+    Microseconds keep the number exact in JavaScript.
+    """
+    return mtime_ns // 1000
+
+
+def read_products_file(path: str) -> dict:
+    """Read and validate a products JSON file. Blocking - run it off the event loop."""
+    return validate_products_data(json_codec.load_file(path))
+
+
+class CatalogWatcher:
+    """Polls the products file mtime and publishes each valid new version to listeners."""
+
+    def __init__(self, path: str, interval: float = 10):
+        self.path = path
+        self.interval = interval
+        self._listeners: List[Callable[[dict], Awaitable[None]]] = []
+        self._signature = None
+        self._task: Optional[asyncio.Task] = None
+        # Version of the last published file, see file_version()
+        self.version: Optional[int] = None
+
+    def add_listener(self, listener: Callable[[dict], Awaitable[None]]):
+        """Register a coroutine called with the new products data after each reload."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def check(self) -> bool:
+        """Reload the file if it changed since the last check. Returns True if published."""
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+
+        try:
+            data = await asyncio.to_thread(read_products_file, self.path)
+        except (OSError, ValueError) as e:
+            # JSONDecodeError is a ValueError: the parser may still be writing the file
+            logger.warning(f"Catalog: файл '{self.path}' не применен: {e}")
+            return False
+
+        if self._file_signature() != signature:
+            # Replaced while we were reading: the next check loads the new file under its own version
+            return False
+        self.version = file_version(signature[0])
+
+        for listener in list(self._listeners):
+            try:
+                await listener(data)
+            except Exception as e:
+                logger.error(f"Catalog: ошибка при применении новых данных: {e}")
+
+        logger.info(f"Catalog: данные о продуктах перезагружены из {self.path}")
+        return True
+
+    async def run(self):
+        """Poll forever."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Catalog: ошибка в цикле наблюдения: {e}")
+
+    def start(self):
+        """Start polling; the file as it is now is treated as already loaded."""
+        if self.interval <= 0 or (self._task and not self._task.done()):
+            return
+        self._signature = self._file_signature()
+        self._task = asyncio.create_task(self.run())
+        logger.info(f"Catalog: наблюдение за {self.path} каждые {self.interval} с")
+
+    async def stop(self):
+        """Stop polling."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
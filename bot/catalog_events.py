@@ -0,0 +1,182 @@
+"""
+Catalog Events
+Pushes catalog updates to open Web Apps over Server-Sent Events.
+
+Each update is encoded once and fanned out to per-connection queues. A
+client that cannot keep up does not hold memory: its queue is replaced by
+a single "version" event and the client fetches the delta itself.
+"""
+
+import asyncio
+import logging
+from typing import Optional, Set
+
+from aiohttp import web
+
+from bot.catalog import CatalogSnapshot
+from bot.config import get_config
+from bot.json_codec import json_response
+from bot.security_headers import CACHE_NO_STORE, SECURITY_HEADERS
+
+logger = logging.getLogger(__name__)
+
+# Comment lines keep proxies and mobile networks from closing idle streams (seconds)
+SSE_HEARTBEAT_INTERVAL = 20
+# Events buffered per connection before it is switched to a "version" event
+SSE_QUEUE_SIZE = 8
+# Deltas larger than this are announced as a version change instead of being pushed
+MAX_PUSHED_DELTA_SIZE = 16 * 1024
+# Reconnect delay suggested to clients (milliseconds)
+SSE_RETRY_MS = 5000
+
+_CLOSE = object()
+
+
+def format_event(event: str, data: bytes, event_id: Optional[int] = None) -> bytes:
+    """Encode one SSE message. data must be a single line (compact JSON is)."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: ".encode('utf-8') + data + b"\n\n"
+
+
+def version_event(version: int) -> bytes:
+    """Event telling the client to fetch /products/changes?since=<its version>."""
+    return format_event('version', b'{"version":%d}' % version, version)
+
+
+def snapshot_events(snapshot: CatalogSnapshot, since: Optional[int]) -> bytes:
+    """Events that bring a client at version since up to snapshot."""
+    if since is None or since == snapshot.version:
+        return version_event(snapshot.version)
+    if not snapshot.has_delta(since):
+        return version_event(snapshot.version)
+    body = snapshot.changes_since(since).body
+    if len(body) > MAX_PUSHED_DELTA_SIZE:
+        return version_event(snapshot.version)
+    return format_event('delta', body, snapshot.version)
+
+
+class Subscriber:
+    """One connected client."""
+
+    __slots__ = ('queue', 'overflowed')
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class CatalogEventHub:
+    """Fan-out of catalog events to connected clients with a connection cap."""
+
+    def __init__(self, max_connections: Optional[int] = None):
+        # None: SSE_MAX_CONNECTIONS from the config, read on the first connection
+        self._max_connections = max_connections
+        self._subscribers: Set[Subscriber] = set()
+        self._version: Optional[int] = None
+
+    @property
+    def max_connections(self) -> int:
+        if self._max_connections is None:
+            self._max_connections = get_config().SSE_MAX_CONNECTIONS
+        return self._max_connections
+
+    @property
+    def connections(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[Subscriber]:
+        """Register a client; None when the connection cap is reached."""
+        if len(self._subscribers) >= self.max_connections:
+            return None
+        subscriber = Subscriber()
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, snapshot: CatalogSnapshot, previous_version: Optional[int]):
+        """Send the update from previous_version to every client; never blocks."""
+        self._version = snapshot.version
+        message = snapshot_events(snapshot, previous_version)
+        for subscriber in self._subscribers:
+            self._deliver(subscriber, message)
+        if self._subscribers:
+            logger.info(f"SSE: версия каталога {snapshot.version} отправлена {len(self._subscribers)} клиентам")
+
+    def _deliver(self, subscriber: Subscriber, message):
+        if subscriber.overflowed:
+            return
+        try:
+            subscriber.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow client: drop what it has not read and let it catch up with one request
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.overflowed = True
+            subscriber.queue.put_nowait(None)
+
+    def close(self):
+        """Ask every stream to finish (server shutdown)."""
+        for subscriber in self._subscribers:
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(_CLOSE)
+
+    def next_message(self, subscriber: Subscriber, message):
+        """Resolve a queued item into bytes to write, or _CLOSE."""
+        if message is None:
+            # Overflow marker: announce only the latest version
+            subscriber.overflowed = False
+            return version_event(self._version) if self._version is not None else b''
+        return message
+
+
+async def stream_events(request: web.Request, hub: CatalogEventHub, snapshot: CatalogSnapshot,
+                        heartbeat: float = SSE_HEARTBEAT_INTERVAL) -> web.StreamResponse:
+    """Serve one text/event-stream connection until the client leaves or the server stops."""
+    subscriber = hub.subscribe()
+    if subscriber is None:
+        logger.warning(f"SSE: достигнут лимит подключений ({hub.max_connections})")
+        return json_response({"error": "Too many event stream connections"}, status=503, headers={
+            'Retry-After': str(SSE_RETRY_MS // 1000),
+            'Cache-Control': CACHE_NO_STORE
+        })
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream; charset=utf-8',
+        'Cache-Control': CACHE_NO_STORE,
+        # Reverse proxies must not buffer the stream
+        'X-Accel-Buffering': 'no',
+    })
+    # The security middleware cannot add headers once the stream has started
+    response.headers.update(SECURITY_HEADERS)
+
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    since = int(last_event_id) if last_event_id.isdigit() else None
+
+    try:
+        await response.prepare(request)
+        # write() waits for the transport to drain, so a slow reader only fills its own queue
+        await response.write(f"retry: {SSE_RETRY_MS}\n\n".encode('utf-8') + snapshot_events(snapshot, since))
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                await response.write(b": ping\n\n")
+                continue
+            message = hub.next_message(subscriber, message)
+            if message is _CLOSE:
+                break
+            if message:
+                await response.write(message)
+    except ConnectionResetError:
+        # Client went away (aiohttp's ClientConnectionResetError is a subclass); cancellation propagates
+        pass
+    finally:
+        hub.unsubscribe(subscriber)
+    return response
+
+
+# Global hub for the API process
+catalog_event_hub = CatalogEventHub()
@@ -3,8 +3,6 @@ import logging
 from typing import Optional
 from pathlib import Path
 
-# Configure logging for config module
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class SecureConfig:
@@ -73,20 +71,58 @@ class SecureConfig:
         self.SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
         self.SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))
         self.SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
+        # Email outbox: SQLite file (empty = data/outbox.sqlite3), SMTP connections kept open, attempts per email
+        self.EMAIL_OUTBOX_PATH = os.environ.get('EMAIL_OUTBOX_PATH', '')
+        self.SMTP_WORKERS = int(os.environ.get('SMTP_WORKERS', '2'))
+        self.EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', '8'))
         
         # Security configuration
         self.ENABLE_RATE_LIMITING = os.environ.get('ENABLE_RATE_LIMITING', 'true').lower() == 'true'
         self.RATE_LIMIT_MAX_REQUESTS = int(os.environ.get('RATE_LIMIT_MAX_REQUESTS', '100'))
         self.RATE_LIMIT_WINDOW = int(os.environ.get('RATE_LIMIT_WINDOW', '3600'))  # 1 hour
+        # 'memory' (per process) or 'sqlite' (shared between processes via RATE_LIMIT_DB_PATH)
+        self.RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+        self.RATE_LIMIT_DB_PATH = os.environ.get('RATE_LIMIT_DB_PATH', '')
         
         # Webhook security
         self.ALLOW_WEBHOOKS = os.environ.get('ALLOW_WEBHOOKS', 'false').lower() == 'true'
         self.TRUSTED_DOMAINS = os.environ.get('TRUSTED_DOMAINS', '').split(',')
         self.WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
         
+        # Catalog hot reload (seconds between products file checks, 0 disables)
+        self.CATALOG_RELOAD_INTERVAL = float(os.environ.get('CATALOG_RELOAD_INTERVAL', '10'))
+        # Number of API processes sharing the port via SO_REUSEPORT (1 = API runs in the bot process)
+        self.API_WORKERS = int(os.environ.get('API_WORKERS', '1'))
+        # Open catalog event streams (SSE) allowed per API process
+        self.SSE_MAX_CONNECTIONS = int(os.environ.get('SSE_MAX_CONNECTIONS', '500'))
+        # On-disk cache of proxied product images (empty = data/image_cache)
+        self.IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', '')
+        self.IMAGE_CACHE_MAX_MB = int(os.environ.get('IMAGE_CACHE_MAX_MB', '200'))
+        # Carts: SQLite file (empty = data/carts.sqlite3), carts kept in memory, days an unchanged cart is kept
+        self.CART_DB_PATH = os.environ.get('CART_DB_PATH', '')
+        self.CART_CACHE_SIZE = int(os.environ.get('CART_CACHE_SIZE', '10000'))
+        self.CART_TTL_DAYS = float(os.environ.get('CART_TTL_DAYS', '7'))
+        # Order history (SQLite, empty = data/orders.sqlite3)
+        self.ORDER_JOURNAL_PATH = os.environ.get('ORDER_JOURNAL_PATH', '')
+        # Telegram messages about orders: SQLite file (empty = data/telegram_outbox.sqlite3), bot-wide send rate
+        self.TELEGRAM_OUTBOX_PATH = os.environ.get('TELEGRAM_OUTBOX_PATH', '')
+        self.TELEGRAM_MESSAGES_PER_SECOND = float(os.environ.get('TELEGRAM_MESSAGES_PER_SECOND', '30'))
+        # Output of scripts/build_web_app.py to serve instead of bot/web_app (empty = sources as they are)
+        self.WEB_APP_BUILD_DIR = os.environ.get('WEB_APP_BUILD_DIR', '')
+        # Bearer token for /metrics (empty = /metrics is disabled)
+        self.METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+        # Port of the bot process's own /metrics when API_WORKERS > 1 (0 = not served)
+        self.BOT_METRICS_PORT = int(os.environ.get('BOT_METRICS_PORT', '9101'))
+        
         # Logging configuration
         self.LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
         self.LOG_SECURITY_EVENTS = os.environ.get('LOG_SECURITY_EVENTS', 'true').lower() == 'true'
+        # 'text' or 'json' (one object per line)
+        self.LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+        # Keep one INFO record in N for busy loggers, e.g. 'aiohttp.access=10,bot.api_server=5'
+        self.LOG_SAMPLING = os.environ.get('LOG_SAMPLING', 'aiohttp.access=10')
+        # Optional log file in addition to stderr
+        self.LOG_FILE = os.environ.get('LOG_FILE', '')
         
         # Feature flags
         self.ENABLE_EMAIL_NOTIFICATIONS = os.environ.get('ENABLE_EMAIL_NOTIFICATIONS', 'true').lower() == 'true'
@@ -126,24 +162,28 @@ class SecureConfig:
         except (IndexError, AttributeError):
             return False
 
-# Create global config instance
-try:
-    config = SecureConfig()
-    
-    # Export all config values for backward compatibility
-    BOT_TOKEN = config.BOT_TOKEN
-    BOT_ID = config.BOT_ID
-    BASE_WEBAPP_URL = config.BASE_WEBAPP_URL
-    ADMIN_CHAT_ID = config.ADMIN_CHAT_ID
-    ADMIN_EMAIL = config.ADMIN_EMAIL
-    ADMIN_EMAIL_PASSWORD = config.ADMIN_EMAIL_PASSWORD
-    SMTP_SERVER = config.SMTP_SERVER
-    SMTP_PORT = config.SMTP_PORT
-    SMTP_USE_TLS = config.SMTP_USE_TLS
-    ENABLE_EMAIL_NOTIFICATIONS = config.ENABLE_EMAIL_NOTIFICATIONS
-    
-    logger.info("✅ Configuration module initialized successfully")
-    
-except Exception as e:
-    logger.error(f"❌ Failed to initialize configuration: {e}")
-    raise
\ No newline at end of file
+# Names the module used to export as constants, kept for backward compatibility
+_LEGACY_NAMES = frozenset((
+    'BOT_TOKEN', 'BOT_ID', 'BASE_WEBAPP_URL', 'ADMIN_CHAT_ID', 'ADMIN_EMAIL', 'ADMIN_EMAIL_PASSWORD',
+    'SMTP_SERVER', 'SMTP_PORT', 'SMTP_USE_TLS', 'ENABLE_EMAIL_NOTIFICATIONS'
+))
+
+_config: Optional[SecureConfig] = None
+
+
+def get_config() -> SecureConfig:
+    """The process-wide configuration, built from the environment on first use."""
+    global _config
+    if _config is None:
+        _config = SecureConfig()
+    return _config
+
+
+def __getattr__(name: str):
+    # `from bot.config import config` (and the legacy constants) resolve here,
+    # so importing this module reads nothing and logs nothing
+    if name == 'config':
+        return get_config()
+    if name in _LEGACY_NAMES:
+        return getattr(get_config(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
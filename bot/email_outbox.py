@@ -0,0 +1,377 @@
+"""
+Email Outbox
+Durable queue of outgoing emails delivered by a small pool of SMTP workers.
+
+enqueue() stores the message in SQLite (WAL) and returns, so checkout never
+waits for the mail server. A dispatcher hands due messages to the workers;
+each worker keeps its own authenticated SMTP connection open and reuses it,
+sending everything it has picked up back to back in one thread hop, so a
+burst of orders costs one TLS handshake and one login per worker instead of
+one per email. A connection idle for a while is checked with NOOP before use
+and reopened if the server has dropped it.
+
+A message that fails with a temporary error (SMTPException, network errors)
+is retried with exponential backoff; a message the server rejects for good
+(5xx for the sender, recipient or data) or that runs out of attempts is kept
+in the outbox as failed. Messages still pending at shutdown are sent after
+the next start.
+"""
+
+import asyncio
+import logging
+import os
+import smtplib
+import ssl
+import time
+from email.message import Message
+from email.utils import getaddresses
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+import aiosqlite
+
+from bot.metrics import notification_duration
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, 'data', 'outbox.sqlite3')
+
+# Workers, each with its own SMTP connection
+SMTP_WORKERS = 2
+# Messages a worker sends per thread hop
+SEND_BATCH = 10
+# Attempts before a message is kept as failed; with the backoff below about 2 hours
+MAX_ATTEMPTS = 8
+# Retry delay after the first failure (seconds), doubled each time up to RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 30.0
+RETRY_MAX_DELAY = 3600.0
+# A connection idle longer than this is checked with NOOP before it is used
+NOOP_AFTER_IDLE = 30.0
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS outbox ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " sender TEXT NOT NULL,"
+    " recipients TEXT NOT NULL,"
+    " subject TEXT,"
+    " message BLOB NOT NULL,"
+    " created_at REAL NOT NULL,"
+    " attempts INTEGER NOT NULL DEFAULT 0,"
+    " next_attempt REAL NOT NULL,"
+    " failed INTEGER NOT NULL DEFAULT 0,"
+    " last_error TEXT)",
+    "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (failed, next_attempt)",
+)
+
+
+class SMTPSettings(NamedTuple):
+    """Where and as whom the workers log in."""
+    host: str
+    port: int
+    username: str = ''
+    password: str = ''
+    use_tls: bool = True
+    timeout: float = 30.0
+
+
+class OutgoingEmail(NamedTuple):
+    id: int
+    sender: str
+    recipients: List[str]
+    subject: str
+    message: bytes
+    attempts: int
+
+
+class SendResult(NamedTuple):
+    email: OutgoingEmail
+    error: Optional[Exception]
+    seconds: float
+
+
+def is_permanent(error: Exception) -> bool:
+    """True for rejections that will not change on retry (5xx for the sender, recipients or data)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return error.smtp_code >= 500
+    return not isinstance(error, (smtplib.SMTPException, OSError))
+
+
+class SMTPConnection:
+    """One reusable SMTP session. Blocking: only ever used from one thread at a time."""
+
+    def __init__(self, settings: SMTPSettings, factory: Callable[..., smtplib.SMTP] = smtplib.SMTP):
+        self.settings = settings
+        self.factory = factory
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.opened = 0  # connections opened so far
+
+    def _open(self) -> smtplib.SMTP:
+        settings = self.settings
+        smtp = self.factory(settings.host, settings.port, timeout=settings.timeout)
+        try:
+            smtp.ehlo()
+            if settings.use_tls:
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if settings.username:
+                smtp.login(settings.username, settings.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self.opened += 1
+        logger.info(f"Открыто SMTP соединение с {settings.host}:{settings.port}")
+        return smtp
+
+    def _ensure_open(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > NOOP_AFTER_IDLE:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._open()
+        return self._smtp
+
+    def send_batch(self, emails: List[OutgoingEmail]) -> List[SendResult]:
+        """Send the emails one after another over the open connection."""
+        results = []
+        for email in emails:
+            started = time.perf_counter()
+            try:
+                self._send(email)
+                error = None
+            except Exception as e:
+                error = e
+            results.append(SendResult(email, error, time.perf_counter() - started))
+        return results
+
+    def _send(self, email: OutgoingEmail):
+        for attempt in (1, 2):
+            try:
+                self._ensure_open().sendmail(email.sender, email.recipients, email.message)
+                return
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # The message was refused, the session is still fine
+                raise
+            except smtplib.SMTPServerDisconnected:
+                # The server closed an idle session between NOOP and MAIL: one fresh connection
+                self.close()
+                if attempt == 2:
+                    raise
+            except BaseException:
+                self.close()
+                raise
+            finally:
+                self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        smtp, self._smtp = self._smtp, None
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+
+class EmailOutbox:
+    """Outbox table in SQLite, a dispatcher and a pool of SMTP workers."""
+
+    def __init__(self, workers: int = SMTP_WORKERS, batch_size: int = SEND_BATCH,
+                 max_attempts: int = MAX_ATTEMPTS, retry_base_delay: float = RETRY_BASE_DELAY,
+                 retry_max_delay: float = RETRY_MAX_DELAY,
+                 on_event: Optional[Callable[[str, dict], None]] = None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # Called with e.g. ("email_sent", {"recipient": ..., "subject": ...}) for the security log
+        self.on_event = on_event
+        self.path: Optional[str] = None
+        self.connections: List[SMTPConnection] = []
+        self._db: Optional[aiosqlite.Connection] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._in_flight: Set[int] = set()
+        # Claiming due rows and recording results never interleave, so a sent email is not claimed again
+        self._lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._db is not None
+
+    async def start(self, path: str, settings: SMTPSettings,
+                    factory: Callable[..., smtplib.SMTP] = smtplib.SMTP):
+        """Open the outbox and start the workers. Connections are opened on the first email."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = await aiosqlite.connect(path, timeout=5)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        # NORMAL: a queued email survives a crash of the process
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            await self._db.execute(statement)
+        await self._db.commit()
+        self.path = path
+        self._queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        self.connections = [SMTPConnection(settings, factory) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._work(connection)) for connection in self.connections]
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        counts = await self.counts()
+        logger.info(f"Очередь писем {path} открыта: ожидают отправки {counts['pending']}, "
+                    f"не отправлены {counts['failed']}")
+
+    # ===== Queueing =====
+
+    async def enqueue(self, msg: Message) -> bool:
+        """Store the message for delivery. True once it is safely queued, False if it could not be."""
+        recipients = [address for _, address in getaddresses(msg.get_all('To', []) + msg.get_all('Cc', []))]
+        if not self.started:
+            logger.warning(f"Очередь писем не открыта, письмо для {', '.join(recipients)} не отправлено")
+            return False
+        sender = getaddresses([msg.get('From', '')])[0][1] or self.connections[0].settings.username
+        now = time.time()
+        await self._db.execute(
+            "INSERT INTO outbox (sender, recipients, subject, message, created_at, next_attempt)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (sender, ",".join(recipients), msg.get('Subject', ''), msg.as_bytes(), now, now)
+        )
+        await self._db.commit()
+        self._wake.set()
+        return True
+
+    async def counts(self) -> Dict[str, int]:
+        """Messages waiting to be sent and messages kept as failed."""
+        async with self._db.execute("SELECT failed, COUNT(*) FROM outbox GROUP BY failed") as cursor:
+            rows = dict(await cursor.fetchall())
+        return {'pending': rows.get(0, 0), 'failed': rows.get(1, 0)}
+
+    # ===== Delivery =====
+
+    async def _dispatch(self):
+        while True:
+            self._wake.clear()
+            async with self._lock:
+                async with self._db.execute(
+                    "SELECT id, sender, recipients, subject, message, attempts FROM outbox"
+                    " WHERE failed = 0 AND next_attempt <= ? ORDER BY id LIMIT ?",
+                    (time.time(), len(self._in_flight) + self.workers * self.batch_size)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                for id_, sender, recipients, subject, message, attempts in rows:
+                    if id_ not in self._in_flight:
+                        self._in_flight.add(id_)
+                        self._queue.put_nowait(
+                            OutgoingEmail(id_, sender, recipients.split(","), subject, message, attempts))
+            # Sleep until something is queued, a send finishes or the next retry is due
+            async with self._db.execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE failed = 0 AND next_attempt > ?", (time.time(),)
+            ) as cursor:
+                (next_attempt,) = await cursor.fetchone()
+            timeout = None if next_attempt is None else max(next_attempt - time.time(), 0)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self, connection: SMTPConnection):
+        while True:
+            email = await self._queue.get()
+            if email is None:
+                return
+            batch = [email]
+            stop = False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                email = self._queue.get_nowait()
+                if email is None:
+                    stop = True
+                    break
+                batch.append(email)
+            results = await asyncio.to_thread(connection.send_batch, batch)
+            await self._record(results)
+            if stop:
+                return
+
+    async def _record(self, results: List[SendResult]):
+        async with self._lock:
+            now = time.time()
+            for email, error, seconds in results:
+                notification_duration.labels('email', 'error' if error else 'ok').observe(seconds)
+                recipient = ", ".join(email.recipients)
+                if error is None:
+                    await self._db.execute("DELETE FROM outbox WHERE id = ?", (email.id,))
+                    logger.info(f"Email успешно отправлен на {recipient} с темой '{email.subject}'.")
+                    self._event("email_sent", {"recipient": recipient, "subject": email.subject})
+                    continue
+                attempts = email.attempts + 1
+                retry_at = now + min(self.retry_base_delay * 2 ** (attempts - 1), self.retry_max_delay)
+                failed = is_permanent(error) or attempts >= self.max_attempts
+                await self._db.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt = ?, failed = ?, last_error = ? WHERE id = ?",
+                    (attempts, retry_at, int(failed), f"{type(error).__name__}: {error}", email.id)
+                )
+                self._log_failure(email, recipient, error, attempts, retry_at - now, failed)
+            await self._db.commit()
+            for email, _, _ in results:
+                self._in_flight.discard(email.id)
+            self._wake.set()
+
+    def _log_failure(self, email: OutgoingEmail, recipient: str, error: Exception,
+                     attempts: int, delay: float, failed: bool):
+        if isinstance(error, smtplib.SMTPAuthenticationError):
+            logger.error(f"Ошибка аутентификации SMTP: {error}")
+            logger.error("Убедитесь, что ADMIN_EMAIL_PASSWORD установлен правильно")
+            logger.error("Для Gmail используйте App Password, а не обычный пароль")
+            event = "email_auth_failure"
+        elif isinstance(error, smtplib.SMTPException):
+            logger.error(f"Ошибка SMTP при отправке email на {recipient}: {error}")
+            event = "email_smtp_error"
+        else:
+            logger.error(f"Ошибка при отправке email на {recipient}: {error}")
+            event = "email_error"
+        if failed:
+            logger.error(f"Письмо '{email.subject}' для {recipient} не отправлено после {attempts} попыток")
+        else:
+            logger.info(f"Повторная отправка письма для {recipient} через {delay:.0f} с (попытка {attempts + 1})")
+        self._event(event, {"recipient": recipient, "error": str(error), "error_type": type(error).__name__})
+
+    def _event(self, event: str, details: dict):
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event, details)
+        except Exception as e:
+            logger.error(f"Ошибка при записи события {event}: {e}")
+
+    async def close(self):
+        """Finish the emails being sent, close the SMTP connections and the outbox. Pending emails stay queued."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._tasks:
+            # Emails already handed to the workers are sent; the rest waits for the next start
+            while not self._queue.empty():
+                email = self._queue.get_nowait()
+                self._in_flight.discard(email.id)
+            for _ in self._tasks:
+                self._queue.put_nowait(None)
+            await asyncio.gather(*self._tasks)
+            self._tasks = []
+        for connection in self.connections:
+            await asyncio.to_thread(connection.close)
+        if self._db is None:
+            return
+        await self._db.close()
+        self._db = None
+        logger.info("Очередь писем закрыта")
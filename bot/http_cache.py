@@ -0,0 +1,123 @@
+"""
+HTTP caching helpers for AioHTTP
+Pre-compressed response bodies, ETag validation and Accept-Encoding negotiation.
+"""
+
+import gzip
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from bot.security_headers import create_content_hash
+
+try:
+    import brotli
+except ImportError:  # brotli is optional - gzip is always available
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# For bodies built per request: ~0.1 ms instead of ~5 ms for a 2 KB body, ~10% larger
+DYNAMIC_BROTLI_QUALITY = 5
+
+
+class PrecompressedBody:
+    """Immutable response body with its compressed variants and ETag."""
+
+    __slots__ = ('body', 'gzip_body', 'br_body', 'etag', 'content_type')
+
+    def __init__(self, body: bytes, content_type: str, compress: bool = True,
+                 brotli_quality: int = BROTLI_QUALITY, precompressed: Optional[Dict[str, bytes]] = None):
+        self.body = body
+        self.content_type = content_type
+        self.etag = f'"{create_content_hash(body)}"'
+        # Variants compressed ahead of time ({'gzip': ..., 'br': ...}) are used as they are
+        precompressed = precompressed or {}
+        self.gzip_body = precompressed.get('gzip')
+        self.br_body = precompressed.get('br')
+
+        if compress and len(body) >= MIN_COMPRESS_SIZE:
+            if self.gzip_body is None:
+                gzip_body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+                if len(gzip_body) < len(body):
+                    self.gzip_body = gzip_body
+            if self.br_body is None and brotli is not None:
+                br_body = brotli.compress(body, quality=brotli_quality)
+                if len(br_body) < len(body):
+                    self.br_body = br_body
+
+    def select(self, accept_encoding: str):
+        """Return (encoding, body) for the best variant the client accepts."""
+        accepted = parse_accept_encoding(accept_encoding)
+        if self.br_body is not None and accepted.get('br', 0) > 0:
+            return 'br', self.br_body
+        if self.gzip_body is not None and accepted.get('gzip', 0) > 0:
+            return 'gzip', self.gzip_body
+        return None, self.body
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}."""
+    accepted = {}
+    if not header:
+        return accepted
+
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+
+    # "*" covers codings that were not listed explicitly
+    if '*' in accepted:
+        for coding in ('br', 'gzip'):
+            accepted.setdefault(coding, accepted['*'])
+    return accepted
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def cached_response(request: web.Request, payload: PrecompressedBody,
+                    headers: Optional[Dict[str, str]] = None, status: int = 200) -> web.Response:
+    """Build a response for a pre-compressed payload, honouring If-None-Match."""
+    response_headers = {
+        'ETag': payload.etag,
+        'Vary': 'Accept-Encoding',
+    }
+    if headers:
+        response_headers.update(headers)
+
+    if etag_matches(request.headers.get('If-None-Match'), payload.etag):
+        return web.Response(status=304, headers=response_headers)
+
+    encoding, body = payload.select(request.headers.get('Accept-Encoding', ''))
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+    response_headers['Content-Type'] = payload.content_type
+
+    return web.Response(body=body, status=status, headers=response_headers)
@@ -0,0 +1,281 @@
+"""
+Image Proxy
+Serves product images from a bounded on-disk cache with resized WebP variants.
+
+The original is fetched from the shop once per image URL; grid and detail
+variants are generated from it and kept next to it. Files are evicted least
+recently used first when the cache grows over its limit. Image URLs carry
+a version derived from the source URL, so a response never changes under
+the same URL and can be cached by the WebView for good.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from bot.http_cache import etag_matches
+from bot.security_headers import CACHE_IMMUTABLE, CACHE_REVALIDATE
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional - without it the original image is served for every size
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> bounding box (width, height); originals are 400x500
+IMAGE_SIZES = {
+    'grid': (240, 300),
+    'detail': (400, 500),
+}
+WEBP_QUALITY = 80
+WEBP_CONTENT_TYPE = 'image/webp'
+# Originals larger than this are refused (bytes)
+MAX_SOURCE_IMAGE_SIZE = 5 * 1024 * 1024
+ORIGIN_TIMEOUT = 10.0
+
+_ORIGINAL = 'orig'
+
+
+def image_version(url: str) -> str:
+    """Short version of an image URL (32-bit FNV-1a, hex); script.js computes the same."""
+    value = 0x811c9dc5
+    for char in url:
+        value = ((value ^ ord(char)) * 0x01000193) & 0xffffffff
+    return f"{value:08x}"
+
+
+def image_path(product_id: str, image_url: str, size: str = 'grid') -> str:
+    """Proxy URL of a product image variant."""
+    return f"/bot-app/img/{product_id}/{size}?v={image_version(image_url)}"
+
+
+def has_image(product: dict) -> bool:
+    """True if the product has an image URL the proxy can fetch."""
+    url = product.get('image_url')
+    return isinstance(url, str) and url.startswith(('http://', 'https://'))
+
+
+def resize_image(data: bytes, box: Tuple[int, int]) -> Tuple[bytes, str]:
+    """Fit an image into box and encode it as WebP; returns (bytes, content type).
+
+    Without Pillow, or for data Pillow cannot read, the original is returned.
+    """
+    if Image is None:
+        return data, _sniff_content_type(data)
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image.thumbnail(box)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            output = BytesIO()
+            image.save(output, 'WEBP', quality=WEBP_QUALITY, method=4)
+            return output.getvalue(), WEBP_CONTENT_TYPE
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Images: не удалось преобразовать изображение: {e}")
+        return data, _sniff_content_type(data)
+
+
+def _sniff_content_type(data: bytes) -> str:
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return WEBP_CONTENT_TYPE
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    return 'application/octet-stream'
+
+
+class ImageCache:
+    """Bounded on-disk store of originals and variants with LRU eviction.
+
+    Several API processes may share the directory: files are written via a
+    temporary file and os.replace, and a file removed by another process is
+    simply fetched or generated again.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # File name -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        # One origin fetch / resize per file, however many requests wait for it
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def load(self):
+        """Index files left by earlier runs, oldest use first."""
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        self._entries.clear()
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+        self._total = sum(self._entries.values())
+        self._loaded = True
+        self._evict()
+        logger.info(f"Images: в кеше {len(self._entries)} файлов, {self._total // 1024} КБ")
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def _file_name(self, url: str, size: str) -> str:
+        return f"{hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]}_{size}"
+
+    def _read(self, name: str) -> Optional[bytes]:
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # mtime records the last use, so the LRU order survives restarts
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, name: str, data: bytes):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, os.path.join(self.directory, name))
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def _remember(self, name: str, size: int):
+        self._forget(name)
+        self._entries[name] = size
+        self._total += size
+        self._evict()
+
+    def _forget(self, name: str):
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total -= size
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=ORIGIN_TIMEOUT))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _fetch_origin(self, url: str) -> bytes:
+        session = await self._get_session()
+        async with session.get(url) as response:
+            if response.status != 200:
+                raise OSError(f"origin returned {response.status}")
+            if (response.content_length or 0) > MAX_SOURCE_IMAGE_SIZE:
+                raise OSError("image is too large")
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                data += chunk
+                if len(data) > MAX_SOURCE_IMAGE_SIZE:
+                    raise OSError("image is too large")
+        return bytes(data)
+
+    async def _load_once(self, name: str, produce):
+        """Return the cached file, running produce() to create it at most once at a time.
+
+        The work runs in its own task: a request that goes away (client disconnect)
+        cancels only its own wait, never the load the other requests are waiting for.
+        """
+        task = self._pending.get(name)
+        if task is None:
+            task = asyncio.create_task(self._load(name, produce))
+            self._pending[name] = task
+            task.add_done_callback(lambda done: self._load_done(name, done))
+        return await asyncio.shield(task)
+
+    def _load_done(self, name: str, task: asyncio.Task):
+        if self._pending.get(name) is task:
+            del self._pending[name]
+        # Every waiter may be gone; keep the loop from warning about an unread exception
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, name: str, produce) -> bytes:
+        # The file may also have been created by another API process
+        data = await asyncio.to_thread(self._read, name)
+        if data is not None:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            else:
+                self._remember(name, len(data))
+            return data
+        self._forget(name)
+        data = await produce()
+        await asyncio.to_thread(self._write, name, data)
+        self._remember(name, len(data))
+        return data
+
+    async def original(self, url: str) -> bytes:
+        """The source image, fetched from the origin on first use."""
+        return await self._load_once(self._file_name(url, _ORIGINAL), lambda: self._fetch_origin(url))
+
+    async def variant(self, url: str, size: str) -> Tuple[bytes, str]:
+        """The image resized for size; returns (bytes, content type)."""
+        if not self._loaded:
+            await asyncio.to_thread(self.load)
+        box = IMAGE_SIZES[size]
+
+        async def produce():
+            source = await self.original(url)
+            data, _ = await asyncio.to_thread(resize_image, source, box)
+            return data
+
+        data = await self._load_once(self._file_name(url, size), produce)
+        return data, _sniff_content_type(data)
+
+
+async def image_response(request: web.Request, cache: ImageCache, url: str, size: str) -> web.Response:
+    """Serve one image variant with an ETag; immutable when the URL carries the current version."""
+    version = image_version(url)
+    etag = f'"{version}-{size}"'
+    cache_control = CACHE_IMMUTABLE if request.query.get('v') == version else CACHE_REVALIDATE
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return web.Response(status=304, headers=headers)
+
+    try:
+        data, content_type = await cache.variant(url, size)
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        logger.warning(f"Images: не удалось получить {url}: {e}")
+        return web.Response(status=502, text="Image unavailable")
+
+    headers['Content-Type'] = content_type
+    return web.Response(body=data, headers=headers)
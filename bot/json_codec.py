@@ -0,0 +1,81 @@
+"""
+JSON Codec
+One place for JSON encoding and decoding: orjson when it is installed, the
+standard library otherwise.
+
+Both backends produce the same documents: UTF-8 bytes, non-ASCII characters
+kept as is, no spaces after separators, and two-space indentation for files
+meant to be read by people. orjson.JSONDecodeError subclasses
+json.JSONDecodeError, so callers catch JSONDecodeError whichever backend
+decoded the data.
+"""
+
+import json
+from typing import IO, TYPE_CHECKING, Any, Callable, Mapping, Optional, Union
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - the standard library is used without it
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+JSON_CONTENT_TYPE = 'application/json'
+
+if orjson is not None:
+    # Integer dict keys (user ids in carts) are written as strings, like the json module does
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+    _PRETTY_OPTIONS = _OPTIONS | orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+
+
+def dumps(data: Any, pretty: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """Serialize data to UTF-8 JSON bytes; compact unless pretty is set."""
+    if orjson is not None:
+        return orjson.dumps(data, default=default, option=_PRETTY_OPTIONS if pretty else _OPTIONS)
+    if pretty:
+        text = json.dumps(data, ensure_ascii=False, indent=2, default=default) + '\n'
+    else:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=default)
+    return text.encode('utf-8')
+
+
+def dumps_str(data: Any, pretty: bool = False, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """Serialize data to a JSON string."""
+    return dumps(data, pretty, default).decode('utf-8')
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Parse a JSON document from a string or UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
+
+
+def load(f: IO) -> Any:
+    """Parse a JSON document from a file opened in binary (fastest) or text mode."""
+    return loads(f.read())
+
+
+def dump(data: Any, f: IO[bytes], pretty: bool = False):
+    """Write data as JSON to a file opened in binary mode."""
+    f.write(dumps(data, pretty))
+
+
+def load_file(path: str) -> Any:
+    """Read and parse a JSON file."""
+    with open(path, 'rb') as f:
+        return load(f)
+
+
+def json_response(data: Any, status: int = 200, headers: Optional[Mapping[str, str]] = None) -> 'web.Response':
+    """web.json_response() encoded by this codec."""
+    # Imported here: logging and the parser use this module and have no use for the web server
+    from aiohttp import web
+    return web.Response(body=dumps(data), status=status, headers=headers,
+                        content_type=JSON_CONTENT_TYPE, charset='utf-8')
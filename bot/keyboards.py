@@ -1,9 +1,6 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
-from .config import SecureConfig
-
-# Получаем URL из конфигурации
-config = SecureConfig()
-BASE_WEBAPP_URL = config.BASE_WEBAPP_URL
+# Получаем URL из общей конфигурации процесса
+from .config import get_config
 
 # Удалена клавиатура для возврата в меню (back_to_menu)
 
@@ -11,6 +8,7 @@ def generate_main_menu(cart_items_count: int = 0) -> InlineKeyboardMarkup:
     """
     Генерирует главное меню (inline) с учетом количества товаров в корзине.
     """
+    base_webapp_url = get_config().BASE_WEBAPP_URL
     cart_button_text = (
         f"🛒 Проверить корзину ({cart_items_count})" if cart_items_count > 0 else "🛒 Проверить корзину"
     )
@@ -19,13 +17,13 @@ def generate_main_menu(cart_items_count: int = 0) -> InlineKeyboardMarkup:
         [
             InlineKeyboardButton(
                 text="Наше меню",
-                web_app=WebAppInfo(url=f"{BASE_WEBAPP_URL}?view=categories")
+                web_app=WebAppInfo(url=f"{base_webapp_url}?view=categories")
             )
         ],
         [
             InlineKeyboardButton(
                 text=cart_button_text,
-                web_app=WebAppInfo(url=f"{BASE_WEBAPP_URL}?view=cart")
+                web_app=WebAppInfo(url=f"{base_webapp_url}?view=cart")
             )
         ],
         [
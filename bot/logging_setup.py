@@ -0,0 +1,179 @@
+"""
+Logging Setup
+Shared logging configuration: records are queued on the calling thread and
+formatted and written by a listener thread, so the event loop never waits
+for stdout or the log file.
+
+Messages logged with %-style arguments are formatted only in the listener
+thread, and only if the record was not dropped. Pass values that will not
+change afterwards (ids, counts, copies), not live dicts. Phone numbers and
+e-mail addresses are masked in the final output.
+"""
+
+import atexit
+import datetime
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+from typing import Dict, Optional
+
+from bot import json_codec
+from bot.config import get_config
+
+TEXT_FORMAT = "%(asctime)s - %(process)d - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# +375 (29) 123-45-67, +7 999 123 45 67, 8 (029) 123-45-67, 80291234567, 89991234567.
+# Without a separator after the leading 8 only mobile codes match, so user ids and order numbers are kept
+PHONE_PATTERN = re.compile(
+    r'(?:\+\d{1,3}[\s\-(]*\d{2,3}[\s\-)]*'
+    r'|\b8(?:[\s\-]+\(?\d{2,3}\)?|\(\d{2,3}\)|0(?:25|29|33|44)|9\d{2})[\s\-]*)'
+    r'\d{3}[\s\-]*\d{2}[\s\-]*\d{2}\b'
+)
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+
+
+def redact(text: str) -> str:
+    """Mask phone numbers and e-mail addresses."""
+    if '@' in text:
+        text = EMAIL_PATTERN.sub('[email]', text)
+    return PHONE_PATTERN.sub('[phone]', text)
+
+
+def parse_sampling(spec: str) -> Dict[str, int]:
+    """Parse 'bot.api_server=10,bot.main=5' into {logger name: keep one record in N}."""
+    rates = {}
+    for item in spec.split(','):
+        name, _, rate = item.strip().partition('=')
+        if name and rate.strip().isdigit() and int(rate) > 1:
+            rates[name.strip()] = int(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one INFO/DEBUG record in N per configured logger; warnings and errors always pass.
+
+    A logger inherits the rate of its closest configured parent. Runs on the
+    calling thread before the record is queued, so dropped records cost a dict
+    lookup and an increment.
+    """
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+
+    def _rate_for(self, name: str) -> int:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate_for(record.name)
+        if rate == 1:
+            return True
+        count = self._counters.get(record.name, 0)
+        self._counters[record.name] = count + 1
+        return count % rate == 0
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats the whole record here, on the event loop
+        return record
+
+
+class RedactingFormatter(logging.Formatter):
+    """Text formatter that masks personal data."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed in extra={...} are kept as keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'msg': redact(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = redact(value) if isinstance(value, str) else value
+        if record.exc_info:
+            entry['exc'] = redact(self.formatException(record.exc_info))
+        return json_codec.dumps_str(entry, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: Optional[str] = None, log_format: Optional[str] = None,
+                  sampling: Optional[str] = None, log_file: Optional[str] = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a listener thread. Safe to call more than once.
+
+    Defaults come from LOG_LEVEL, LOG_FORMAT ('text' or 'json'), LOG_SAMPLING and LOG_FILE.
+    """
+    global _listener
+    stop_logging()
+
+    config = get_config()
+    level = (level or config.LOG_LEVEL).upper()
+    log_format = (log_format or config.LOG_FORMAT).lower()
+    log_file = config.LOG_FILE if log_file is None else log_file
+
+    formatter = JsonFormatter() if log_format == 'json' else RedactingFormatter(TEXT_FORMAT)
+    output_handlers = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        output_handlers.append(logging.handlers.WatchedFileHandler(log_file, encoding='utf-8'))
+    for handler in output_handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sampling(config.LOG_SAMPLING if sampling is None else sampling)))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, *output_handlers)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
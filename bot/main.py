@@ -1,10 +1,9 @@
 import asyncio
 import logging
-import json
 import os
 import re
-import smtplib
 import datetime
+from typing import Optional
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
@@ -16,27 +15,46 @@ from aiogram.types import (
 )
 from aiohttp import web  # Импортируем web для TCPSite
 
-from bot.api_server import setup_api_server  # ИЗМЕНЕНО: Абсолютный импорт
-from bot.config import (
-    BOT_TOKEN, BASE_WEBAPP_URL, ADMIN_CHAT_ID, ADMIN_EMAIL, config
-)  # ИЗМЕНЕНО: Абсолютный импорт
+from bot.api_server import setup_api_server, catalog_watcher  # ИЗМЕНЕНО: Абсолютный импорт
+from bot import json_codec
+from bot.cart_store import CartStore, DEFAULT_DB_PATH as DEFAULT_CART_DB_PATH
+from bot.catalog import build_products_index
+from bot.email_outbox import EmailOutbox, SMTPSettings, DEFAULT_DB_PATH as DEFAULT_OUTBOX_PATH
+from bot.order_journal import OrderJournal, DEFAULT_DB_PATH as DEFAULT_ORDER_JOURNAL_PATH
+from bot.order_numbers import OrderNumberAllocator
+from bot.telegram_outbox import TelegramOutbox, DEFAULT_DB_PATH as DEFAULT_TELEGRAM_OUTBOX_PATH
+from bot.metrics import orders_processed, start_metrics_server
+from bot.workers import create_api_supervisor
+from bot.config import get_config  # ИЗМЕНЕНО: Абсолютный импорт
+from bot.logging_setup import setup_logging
 from bot.keyboards import generate_main_menu  # ИЗМЕНЕНО: Абсолютный импорт
 from bot.security_manager import security_manager  # ИЗМЕНЕНО: Добавлен импорт security manager
-from bot.security_middleware import security_middleware, fsm_context_middleware  # ИЗМЕНЕНО: Добавлен импорт security middleware
+from bot.security_middleware import security_middleware, fsm_context_middleware, handler_metrics_middleware  # ИЗМЕНЕНО: Добавлен импорт security middleware
 
 
-# Настраиваем логирование
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Логирование настраивает main(): импорт модуля (тесты, WSGI) не меняет настройки процесса
 logger = logging.getLogger(__name__)
 
 
-# Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
+# Диспетчер нужен при импорте для регистрации обработчиков; бот создается при первом обращении
+bot: Optional[Bot] = None
 dp = Dispatcher()
 
+
+def get_bot() -> Bot:
+    """Возвращает клиент Telegram, создавая его при первом вызове.
+
+    В демо-режиме и в тестах клиент (и его HTTP-сессия) так и не создается.
+    """
+    global bot
+    if bot is None:
+        bot = Bot(token=get_config().BOT_TOKEN)
+    return bot
+
+# Метрики обработчиков (первыми, чтобы учитывать и отклоненные обновления)
+dp.message.middleware(handler_metrics_middleware)
+dp.callback_query.middleware(handler_metrics_middleware)
+
 # Регистрируем security middleware
 dp.message.middleware(security_middleware)
 dp.callback_query.middleware(security_middleware)
@@ -44,21 +62,37 @@ dp.message.middleware(fsm_context_middleware)
 dp.callback_query.middleware(fsm_context_middleware)
 
 
+async def preload_cart_middleware(handler, event, data):
+    """Читает корзину пользователя из базы до обработчика, чтобы обработчик не ждал диск в цикле событий."""
+    user = data.get('event_from_user')
+    if user is not None:
+        await user_carts.preload(user.id)
+    return await handler(event, data)
+
+
+dp.message.middleware(preload_cart_middleware)
+dp.callback_query.middleware(preload_cart_middleware)
+
+
 # Константы и пути к файлам
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PRODUCTS_DATA_FILE = os.path.join(BASE_DIR, 'data', 'products_scraped.json')
 ORDER_COUNTER_FILE = os.path.join(BASE_DIR, 'data', 'order_counter.json')  # ИЗМЕНЕНИЕ: Путь к файлу счетчика
 
-logger.info(f"Ожидаемый путь к файлу данных: {PRODUCTS_DATA_FILE}")
-logger.info(f"Ожидаемый путь к файлу счетчика: {ORDER_COUNTER_FILE}")
-
 
 # Глобальные переменные
 products_data = {}
-order_counter = 0
-last_reset_month = 0
-# ИЗМЕНЕНИЕ: Создаем Lock для безопасной работы с файлом счетчика
-order_counter_lock = asyncio.Lock()
+# Индекс товаров по id и данные, из которых он построен
+products_index = {}
+products_index_source = None
+# Номера заказов: блоки номеров резервируются в файле счетчика (см. bot/order_numbers.py)
+order_numbers = OrderNumberAllocator(ORDER_COUNTER_FILE)
+# История заказов (хранилище открывает main())
+order_journal = OrderJournal()
+# Исходящие письма: отправляются в фоне через постоянные SMTP соединения (запускает main())
+email_outbox = EmailOutbox(on_event=lambda event, details: security_manager._log_security_event(event, details))
+# Сообщения о заказах в Telegram: отправляются в фоне с учетом лимитов Telegram (запускает main())
+telegram_outbox = TelegramOutbox()
 
 
 # Словари для маппинга
@@ -75,8 +109,9 @@ DELIVERY_MAP = {
 }
 
 
-# Словарь для хранения корзин пользователей
-user_carts = {}  # user_id: {product_id: quantity, ...}
+# Корзины пользователей: user_id -> {product_id: quantity, ...}
+# В памяти только недавние корзины, остальные в SQLite (хранилище открывает main())
+user_carts = CartStore()
 
 
 # Функции для загрузки данных
@@ -85,13 +120,13 @@ async def load_products_data():
     global products_data
     if os.path.exists(PRODUCTS_DATA_FILE):
         try:
-            with open(PRODUCTS_DATA_FILE, 'r', encoding='utf-8') as f:
-                products_data = json.load(f)
+            with open(PRODUCTS_DATA_FILE, 'rb') as f:
+                products_data = json_codec.load(f)
             logger.info(f"Данные о продуктах успешно загружены из {PRODUCTS_DATA_FILE}. "
                        f"Найдено категорий: {len(products_data)}")
             for category, products in products_data.items():
                 logger.info(f"Категория '{category}': найдено {len(products)} продуктов.")
-        except json.JSONDecodeError as e:
+        except json_codec.JSONDecodeError as e:
             logger.error(f"Ошибка при чтении JSON-файла '{PRODUCTS_DATA_FILE}': {e}")
             products_data = {}  # Сброс данных, если файл поврежден
         except Exception as e:
@@ -103,131 +138,47 @@ async def load_products_data():
         products_data = {}
 
 
-# ИЗМЕНЕНИЕ: Новая функция для загрузки счетчика заказов из файла
-async def load_order_counter():
-    """Загружает счетчик заказов из файла."""
-    global order_counter, last_reset_month
-    async with order_counter_lock:
-        if os.path.exists(ORDER_COUNTER_FILE):
-            try:
-                with open(ORDER_COUNTER_FILE, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if not content:  # Проверяем, не пустой ли файл
-                        logger.warning(f"Файл счетчика заказов {ORDER_COUNTER_FILE} пустой. "
-                                      f"Создаем новый с начальными значениями.")
-                        order_counter = 0
-                        last_reset_month = datetime.datetime.now().month
-                        # Создаем новый файл с правильной структурой
-                        await save_order_counter({'counter': order_counter, 'month': last_reset_month})
-                    else:
-                        data = json.loads(content)
-                        order_counter = data.get('counter', 0)
-                        last_reset_month = data.get('month', datetime.datetime.now().month)
-
-                        # Проверяем, если месяц в файле отличается от текущего
-                        current_month = datetime.datetime.now().month
-                        if last_reset_month != current_month:
-                            logger.info(f"Месяц в файле ({last_reset_month}) отличается от текущего ({current_month}). "
-                                      f"Счетчик будет сброшен при первом заказе в новом месяце.")
-                            # НЕ сбрасываем счетчик здесь - только при генерации заказа
-                            # last_reset_month остается старым до первого заказа
-                            # Это позволяет сохранить последний счетчик предыдущего месяца
-
-                        logger.info(f"Счетчик заказов успешно загружен из {ORDER_COUNTER_FILE}: "
-                                   f"{order_counter}, Месяц: {last_reset_month}")
-            except (json.JSONDecodeError, FileNotFoundError) as e:
-                logger.warning(f"Файл счетчика заказов не найден или поврежден: {e}. "
-                              f"Начинаем с 0.")
-                order_counter = 0
-                last_reset_month = datetime.datetime.now().month
-                # Создаем новый файл с правильной структурой
-                await save_order_counter({'counter': order_counter, 'month': last_reset_month})
-            except Exception as e:
-                logger.error(f"Неизвестная ошибка при загрузке счетчика заказов: {e}")
-                order_counter = 0
-                last_reset_month = datetime.datetime.now().month
-                # Создаем новый файл с правильной структурой
-                await save_order_counter({'counter': order_counter, 'month': last_reset_month})
-        else:
-            logger.warning(f"Файл счетчика {ORDER_COUNTER_FILE} не найден. Создаем новый.")
-            order_counter = 0
-            last_reset_month = datetime.datetime.now().month
-            # Создаем новый файл с правильной структурой
-            await save_order_counter({'counter': order_counter, 'month': last_reset_month})
-
-
-# ИЗМЕНЕНИЕ: Новая функция для сохранения счетчика заказов в файл
-async def save_order_counter(counter_data):
-    """Сохраняет счетчик заказов в файл."""
-    try:
-        # Создаем директорию, если она не существует
-        os.makedirs(os.path.dirname(ORDER_COUNTER_FILE), exist_ok=True)
-
-        # Используем синхронную операцию записи в файл
-        with open(ORDER_COUNTER_FILE, 'w', encoding='utf-8') as f:
-            json.dump(counter_data, f, ensure_ascii=False, indent=4)
-        logger.info(f"Счетчик заказов успешно сохранен: {counter_data}")
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении счетчика заказов: {e}")
-        raise  # Перебрасываем ошибку, чтобы вызывающий код мог ее обработать
+async def on_products_data_reloaded(new_products_data: dict):
+    """Подменяет данные о продуктах после обновления файла парсером."""
+    global products_data
+    # Подменяем ссылку целиком: уже запущенные обработчики дорабатывают со старыми данными
+    products_data = new_products_data
+    logger.info(f"Данные о продуктах обновлены. Найдено категорий: {len(products_data)}")
+
+
+def get_products_index() -> dict:
+    """Возвращает индекс товаров по id, перестраивая его после замены products_data."""
+    global products_index, products_index_source
+    if products_index_source is not products_data:
+        products_index = build_products_index(products_data)
+        products_index_source = products_data
+    return products_index
+
+
+async def load_order_counter() -> dict:
+    """Читает состояние счетчика заказов (для журнала при запуске)."""
+    state = await order_numbers.load()
+    if not state:
+        logger.warning(f"Счетчик заказов {ORDER_COUNTER_FILE} не найден или пустой. "
+                      f"Нумерация начнется с 1.")
+        return state
+    current_month = datetime.datetime.now().month
+    if state.get('month') != current_month:
+        # Счетчик сбрасывается первым заказом нового месяца, до него в файле остается последний номер
+        logger.info(f"Месяц в файле ({state.get('month')}) отличается от текущего ({current_month}). "
+                   f"Счетчик будет сброшен при первом заказе в новом месяце.")
+    logger.info(f"Счетчик заказов загружен из {ORDER_COUNTER_FILE}: "
+               f"{state.get('counter')}, Месяц: {state.get('month')}")
+    return state
 
 
-# ИЗМЕНЕНИЕ: Функция generate_order_number теперь асинхронная и работает с файлом
 async def generate_order_number():
     """
-    Генерирует уникальный номер заказа, сохраняя счетчик в файле.
+    Генерирует уникальный номер заказа вида #ДДММГГ/NNN.
     """
-    global order_counter, last_reset_month
-
+    now = datetime.datetime.now()
     try:
-        now = datetime.datetime.now()
-        current_month = now.month
-        logger.info(f"Начинаем генерацию номера заказа. Текущий месяц: {current_month}, "
-                   f"последний сброс: {last_reset_month}, счетчик: {order_counter}")
-
-        # Защита от одновременной записи
-        async with order_counter_lock:
-            # Проверяем, если месяц сменился
-            if current_month != last_reset_month:
-                logger.info(f"Сменился месяц. Сбрасываем счетчик заказов с {order_counter} на 0.")
-                order_counter = 0
-                last_reset_month = current_month
-                # Сохраняем обновленный счетчик с новым месяцем
-                try:
-                    await save_order_counter({'counter': order_counter, 'month': last_reset_month})
-                    logger.info(f"Счетчик сброшен и сохранен для нового месяца: {last_reset_month}")
-                except Exception as e:
-                    logger.error(f"Ошибка при сохранении сброшенного счетчика: {e}")
-
-            # Увеличиваем счетчик для нового заказа
-            order_counter += 1
-            logger.info(f"Счетчик увеличен до: {order_counter}")
-
-            # Сохраняем обновленный счетчик в файл
-            try:
-                logger.info("Начинаем сохранение счетчика в файл...")
-                # Убираем таймаут - на Heroku операции могут быть медленными
-                await save_order_counter({'counter': order_counter, 'month': last_reset_month})
-                logger.info(f"Счетчик успешно сохранен в файл: {order_counter}")
-            except Exception as save_error:
-                logger.error(f"Ошибка при сохранении счетчика: {save_error}")
-                logger.error(f"Тип ошибки: {type(save_error).__name__}")
-                # Продолжаем выполнение даже при ошибке сохранения
-                logger.warning("Продолжаем выполнение без сохранения счетчика")
-
-        # Форматируем дату и счетчик
-        day = now.strftime("%d")
-        month = now.strftime("%m")
-        year = now.strftime("%y")
-
-        # Форматируем счетчик до трех знаков
-        order_sequence = str(order_counter).zfill(3)
-        order_number = f"#{day}{month}{year}/{order_sequence}"
-
-        logger.info(f"Сгенерирован номер заказа: {order_number}")
-        logger.info("Функция generate_order_number завершена успешно")
-        return order_number
-
+        sequence = await order_numbers.allocate(now.month)
     except Exception as e:
         logger.error(f"Критическая ошибка при генерации номера заказа: {e}")
         # Возвращаем номер заказа с временной меткой как fallback
@@ -235,6 +186,11 @@ async def generate_order_number():
         logger.warning(f"Используем fallback номер заказа: {fallback_number}")
         return fallback_number
 
+    # Номер в месяце до трех знаков
+    order_number = f"#{now.strftime('%d%m%y')}/{str(sequence).zfill(3)}"
+    logger.info(f"Сгенерирован номер заказа: {order_number}")
+    return order_number
+
 
 # Утилиты для форматирования
 def format_phone_telegram(phone: str) -> str:
@@ -251,8 +207,11 @@ def format_phone_telegram(phone: str) -> str:
 
 # Функции для работы с корзиной
 def get_user_cart(user_id: int) -> dict:
-    """Получает корзину пользователя."""
-    return user_carts.setdefault(user_id, {})
+    """Получает корзину пользователя.
+
+    Пустая корзина не сохраняется: после изменения ее записывает update_cart_item_quantity.
+    """
+    return user_carts.get(user_id, {})
 
 
 def update_cart_item_quantity(user_id: int, product_id: str, quantity: int):
@@ -263,14 +222,23 @@ def update_cart_item_quantity(user_id: int, product_id: str, quantity: int):
             del cart[product_id]
     else:
         cart[product_id] = quantity
-    logger.info(f"Корзина пользователя {user_id} обновлена: {cart}")
+    # Присваивание отмечает корзину для записи в базу
+    user_carts[user_id] = cart
+    # Только счетчики: содержимое корзины в лог не попадает, а отформатированное позже оно было бы уже другим
+    logger.debug("Корзина пользователя %s обновлена: товар %s, количество %s, позиций %d",
+                 user_id, product_id, quantity, len(cart))
 
 
 def clear_user_cart(user_id: int):
     """Очищает корзину пользователя."""
     if user_id in user_carts:
         del user_carts[user_id]
-    logger.info(f"Корзина пользователя {user_id} очищена.")
+    logger.debug("Корзина пользователя %s очищена.", user_id)
+
+
+async def send_telegram_message(chat_id: int, text: str, parse_mode: Optional[str] = None):
+    """Отправляет одно сообщение из очереди Telegram."""
+    await get_bot().send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
 
 
 # ЗАГЛУШКА: Функция для очистки сообщений корзины (если она нужна)
@@ -284,68 +252,35 @@ async def clear_user_cart_messages(chat_id: int):
 
 # ИЗМЕНЕНИЕ: Новая асинхронная функция для отправки email
 async def send_email_notification(recipient_email: str, subject: str, body: str, sender_name: str = "Пекарня Дражина"):
-    """Отправляет email уведомление."""
+    """Ставит email уведомление в очередь; письмо отправляется в фоне."""
+    config = get_config()
     if not config.ENABLE_EMAIL_NOTIFICATIONS:
         logger.info("Email уведомления отключены")
         return
-    
-    try:
-        logger.info(f"Начинаем отправку email на {recipient_email}")
 
+    try:
         msg = MIMEMultipart('alternative')
         msg['Subject'] = subject
-        msg['From'] = f"{sender_name} <{ADMIN_EMAIL}>"
+        msg['From'] = f"{sender_name} <{config.ADMIN_EMAIL}>"
         msg['To'] = recipient_email
 
         msg.attach(MIMEText(body, 'html', 'utf-8'))
 
-        logger.info("Подключаемся к SMTP серверу...")
-        with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as server:
-            if config.SMTP_USE_TLS:
-                logger.info("Запускаем TLS...")
-                server.starttls()
-            logger.info("Авторизуемся на сервере...")
-            server.login(ADMIN_EMAIL, config.ADMIN_EMAIL_PASSWORD)
-            logger.info("Отправляем сообщение...")
-            server.send_message(msg)
-
-        logger.info(f"Email успешно отправлен на {recipient_email} с темой '{subject}'.")
-        
-        # Log security event
-        security_manager._log_security_event("email_sent", {
-            "recipient": recipient_email,
-            "subject": subject
-        })
+        queued = await email_outbox.enqueue(msg)
+        if queued:
+            logger.info(f"Email для {recipient_email} с темой '{subject}' поставлен в очередь отправки")
+        return queued
 
-    except smtplib.SMTPAuthenticationError as e:
-        logger.error(f"Ошибка аутентификации SMTP: {e}")
-        logger.error("Убедитесь, что ADMIN_EMAIL_PASSWORD установлен правильно")
-        logger.error("Для Gmail используйте App Password, а не обычный пароль")
-        
-        # Log security event
-        security_manager._log_security_event("email_auth_failure", {
-            "recipient": recipient_email,
-            "error": str(e)
-        })
-        
-    except smtplib.SMTPException as e:
-        logger.error(f"Ошибка SMTP при отправке email: {e}")
-        
-        # Log security event
-        security_manager._log_security_event("email_smtp_error", {
-            "recipient": recipient_email,
-            "error": str(e)
-        })
-        
     except Exception as e:
-        logger.error(f"Неизвестная ошибка при отправке email на {recipient_email}: {e}")
-        
+        logger.error(f"Не удалось поставить email для {recipient_email} в очередь: {e}")
+
         # Log security event
         security_manager._log_security_event("email_error", {
             "recipient": recipient_email,
             "error": str(e),
             "error_type": type(e).__name__
         })
+        return False
 
 
 # ===============================
@@ -557,16 +492,20 @@ async def delivery_info(message: Message):
 
 
 @dp.message(F.web_app_data)
-async def handle_web_app_data(message: Message):
-    """Обработчик данных из Web App."""
+async def handle_web_app_data(message: Message, web_app_payload: Optional[dict] = None):
+    """Обработчик данных из Web App.
+
+    web_app_payload - документ, уже разобранный SecurityMiddleware; сырую строку
+    разбираем здесь, только если обработчик вызван без него.
+    """
     user_id = message.from_user.id
     web_app_data_raw = message.web_app_data.data
-    logger.info(f"Получены данные из Web App для пользователя {user_id}: {web_app_data_raw}")
+    logger.debug("Получены данные из Web App для пользователя %s: %s", user_id, web_app_data_raw)
 
     try:
-        data = json.loads(web_app_data_raw)
+        data = web_app_payload if web_app_payload is not None else json_codec.loads(web_app_data_raw)
         action = data.get('action')
-        logger.info(f"Действие Web App: {action}")
+        logger.debug("Действие Web App: %s", action)
 
         if action == 'update_cart':
             await _handle_update_cart(message, data, user_id)
@@ -579,7 +518,7 @@ async def handle_web_app_data(message: Message):
             )
             logger.warning(f"Получено неизвестное действие из Web App для пользователя {user_id}: {action}")
 
-    except json.JSONDecodeError:
+    except json_codec.JSONDecodeError:
         logger.error(f"Неверный формат JSON данных из Web App для пользователя {user_id}: {web_app_data_raw}")
         await message.answer(
             "Ошибка обработки данных из Web App. Пожалуйста, попробуйте снова.", 
@@ -612,14 +551,13 @@ async def _handle_update_cart(message: Message, data: dict, user_id: int):
         f"Корзина обновлена. Товаров в корзине: {cart_count}.",
         reply_markup=generate_main_menu(cart_count)
     )
-    logger.info(f"Корзина пользователя {user_id} успешно обновлена из Web App. "
-               f"Текущая корзина: {get_user_cart(user_id)}")
+    logger.info("Корзина пользователя %s обновлена из Web App, товаров: %d", user_id, cart_count)
 
 
 async def _handle_checkout_order(message: Message, data: dict, user_id: int):
     """Обрабатывает оформление заказа из Web App."""
     try:
-        logger.info(f"Начинаем обработку заказа для пользователя {user_id}")
+        logger.debug("Начинаем обработку заказа для пользователя %s", user_id)
 
         order_details = data.get('order_details')
         cart_items = data.get('cart_items')
@@ -633,6 +571,7 @@ async def _handle_checkout_order(message: Message, data: dict, user_id: int):
                 "Ошибка при оформлении заказа. Пожалуйста, попробуйте снова.", 
                 reply_markup=generate_main_menu(sum(get_user_cart(user_id).values()))
             )
+            orders_processed.labels('invalid').inc()
             return
             
         # Проверяем total_amount отдельно с более детальным логированием
@@ -643,6 +582,7 @@ async def _handle_checkout_order(message: Message, data: dict, user_id: int):
                 "❌ Ошибка валидации данных:\n• Field total_amount must be number, got NoneType", 
                 reply_markup=generate_main_menu(sum(get_user_cart(user_id).values()))
             )
+            orders_processed.labels('invalid').inc()
             return
 
         # Проверяем, что корзина не пустая
@@ -652,6 +592,7 @@ async def _handle_checkout_order(message: Message, data: dict, user_id: int):
                 "Корзина пуста. Пожалуйста, добавьте товары в корзину перед оформлением заказа.", 
                 reply_markup=generate_main_menu(sum(get_user_cart(user_id).values()))
             )
+            orders_processed.labels('invalid').inc()
             return
 
         # Проверяем, что сумма заказа больше 0
@@ -661,49 +602,42 @@ async def _handle_checkout_order(message: Message, data: dict, user_id: int):
                 "Сумма заказа должна быть больше нуля. Пожалуйста, добавьте товары в корзину.", 
                 reply_markup=generate_main_menu(sum(get_user_cart(user_id).values()))
             )
+            orders_processed.labels('invalid').inc()
             return
 
-        logger.info(f"Данные заказа валидны. Очищаем корзину пользователя {user_id} перед обработкой...")
+        logger.debug("Данные заказа валидны. Очищаем корзину пользователя %s перед обработкой...", user_id)
         
         # Очищаем корзину ПЕРЕД обработкой заказа, чтобы избежать дублирования
         try:
             clear_user_cart(user_id)
-            logger.info(f"Корзина пользователя {user_id} очищена перед обработкой заказа.")
+            logger.debug("Корзина пользователя %s очищена перед обработкой заказа.", user_id)
         except Exception as e:
             logger.error(f"Ошибка при очистке корзины: {e}")
         
-        logger.info(f"Количество товаров в заказе: {len(cart_items)}")
-        logger.info(f"Сумма заказа: {total_amount}")
-        logger.info(f"Способ доставки: {order_details.get('deliveryMethod')}")
+        logger.debug("Количество товаров в заказе: %s", len(cart_items))
+        logger.debug("Сумма заказа: %s", total_amount)
+        logger.debug("Способ доставки: %s", order_details.get('deliveryMethod'))
         if order_details.get('deliveryMethod') == 'pickup':
-            logger.info(f"Адрес самовывоза: {order_details.get('pickupAddress')}")
-            logger.info(f"Комментарий к самовывозу: {order_details.get('commentPickup')}")
+            logger.debug("Адрес самовывоза: %s", order_details.get('pickupAddress'))
+            logger.debug("Комментарий к самовывозу: %s", order_details.get('commentPickup'))
         elif order_details.get('deliveryMethod') == 'courier':
-            logger.info(f"Город: {order_details.get('city')}, Адрес: {order_details.get('addressLine')}")
-            logger.info(f"Комментарий к доставке: {order_details.get('comment')}")
+            logger.debug("Город: %s, Адрес: %s", order_details.get('city'), order_details.get('addressLine'))
+            logger.debug("Комментарий к доставке: %s", order_details.get('comment'))
 
         order_number = await generate_order_number()
-        logger.info(f"Номер заказа сгенерирован: {order_number}")
-        logger.info("Переходим к отправке уведомлений...")
-
-        # Отправляем уведомления
-        logger.info("Начинаем отправку уведомлений...")
-        try:
-            await _send_order_notifications(order_details, cart_items, total_amount, order_number, user_id)
-            logger.info("Уведомления отправлены успешно")
-        except Exception as notification_error:
-            logger.error(f"Ошибка при отправке уведомлений: {notification_error}")
-            logger.error(f"Тип ошибки: {type(notification_error).__name__}")
-            # Продолжаем выполнение даже если уведомления не отправились
-            logger.info("Продолжаем обработку заказа без уведомлений")
+        logger.info("Заказ %s: пользователь %s, позиций %d, сумма %s, доставка %s",
+                    order_number, user_id, len(cart_items), total_amount, order_details.get('deliveryMethod'))
+        orders_processed.labels('ok').inc()
+        # Запись в журнал идет в фоне: оформление заказа не ждет диска
+        order_journal.append(order_number, user_id, total_amount, order_details, cart_items)
 
-        # Отправляем краткое подтверждение пользователю
+        # Сначала краткое подтверждение пользователю, уведомления - после
         try:
             await message.answer(
                 f"✅ Заказ оформлен! Детали отправлены вам в личные сообщения.",
                 reply_markup=generate_main_menu(sum(get_user_cart(user_id).values()))
             )
-            logger.info(f"Краткий ответ пользователю {user_id} отправлен успешно")
+            logger.debug("Краткий ответ пользователю %s отправлен успешно", user_id)
         except Exception as e:
             logger.error(f"Ошибка при отправке ответа пользователю: {e}")
             # Пытаемся отправить простой ответ без форматирования
@@ -712,8 +646,20 @@ async def _handle_checkout_order(message: Message, data: dict, user_id: int):
             except Exception as e2:
                 logger.error(f"Критическая ошибка при отправке ответа: {e2}")
 
+        # Уведомления только ставятся в очередь и уходят в фоне, после ответа пользователю
+        logger.debug("Ставим уведомления в очередь...")
+        try:
+            await _send_order_notifications(order_details, cart_items, total_amount, order_number, user_id)
+            logger.debug("Уведомления поставлены в очередь")
+        except Exception as notification_error:
+            logger.error(f"Ошибка при отправке уведомлений: {notification_error}")
+            logger.error(f"Тип ошибки: {type(notification_error).__name__}")
+            # Продолжаем выполнение даже если уведомления не отправились
+            logger.info("Продолжаем обработку заказа без уведомлений")
+
     except Exception as e:
         logger.error(f"Критическая ошибка при обработке заказа для пользователя {user_id}: {e}")
+        orders_processed.labels('error').inc()
         await message.answer(
             "Произошла ошибка при оформлении заказа. Пожалуйста, попробуйте позже или свяжитесь с нами.", 
             reply_markup=generate_main_menu(sum(get_user_cart(user_id).values()))
@@ -724,8 +670,8 @@ async def _send_order_notifications(order_details: dict, cart_items: list,
                                   total_amount: float, order_number: str, user_id: int):
     """Отправляет уведомления о новом заказе."""
     try:
-        logger.info(f"Начинаем формирование уведомлений для заказа {order_number}")
-        logger.info(f"Параметры: cart_items={len(cart_items)}, total_amount={total_amount}, user_id={user_id}")
+        logger.debug("Начинаем формирование уведомлений для заказа %s", order_number)
+        logger.debug("Параметры: cart_items=%s, total_amount=%s, user_id=%s", len(cart_items), total_amount, user_id)
 
 
         # Валидация входных данных
@@ -739,46 +685,58 @@ async def _send_order_notifications(order_details: dict, cart_items: list,
         formatted_phone = format_phone_telegram(phone_number)
 
         # Формируем сообщение для Telegram
-        logger.info("Формируем сообщение для Telegram...")
+        logger.debug("Формируем сообщение для Telegram...")
         try:
             telegram_order_summary = _format_telegram_order_summary(
                 order_number, order_details, cart_items, total_amount, 
                 formatted_phone, delivery_text, user_id
             )
-            logger.info("Сообщение для Telegram сформировано")
+            logger.debug("Сообщение для Telegram сформировано")
         except Exception as e:
             logger.error(f"Ошибка при формировании сообщения для Telegram: {e}")
             # Создаем простое сообщение как fallback
             user_link_fallback = f"\n[💬 Написать клиенту](tg://user?id={user_id})" if user_id else ""
             telegram_order_summary = f"*НОВЫЙ ЗАКАЗ {order_number}*\n\nОшибка при формировании детального сообщения. Проверьте логи.{user_link_fallback}"
 
-        # ИЗМЕНЕНИЕ: Отправка сообщения администратору в Telegram
-        if ADMIN_CHAT_ID:
+        # Подтверждение клиенту ставим в очередь первым, чтобы оно ушло раньше сообщения администратору
+        if user_id:
             try:
-                logger.info(f"Отправляем сообщение администратору в Telegram. Chat ID: {ADMIN_CHAT_ID}")
-                await bot.send_message(
-                    chat_id=int(ADMIN_CHAT_ID),
-                    text=telegram_order_summary,
-                    parse_mode=ParseMode.MARKDOWN
+                logger.debug("Ставим в очередь подтверждение заказа клиенту %s в Telegram", user_id)
+                customer_message = _format_customer_telegram_message(
+                    order_number, order_details, cart_items, total_amount, delivery_text
                 )
+                await telegram_outbox.enqueue(user_id, customer_message, ParseMode.MARKDOWN, 'telegram_customer')
+                logger.debug("Подтверждение заказа %s для клиента %s поставлено в очередь", order_number, user_id)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке подтверждения заказа клиенту {user_id} в Telegram: {e}")
+        else:
+            logger.warning("User ID не доступен. Подтверждение заказа в Telegram клиенту не будет отправлено.")
+
+        # ИЗМЕНЕНИЕ: Отправка сообщения администратору в Telegram
+        config = get_config()
+        if config.ADMIN_CHAT_ID:
+            try:
+                logger.debug("Ставим в очередь сообщение администратору в Telegram. Chat ID: %s", config.ADMIN_CHAT_ID)
+                await telegram_outbox.enqueue(int(config.ADMIN_CHAT_ID), telegram_order_summary,
+                                              ParseMode.MARKDOWN, 'telegram_admin')
                 logger.info(f"Заказ {order_number} от пользователя {user_id} "
-                           f"успешно отправлен администратору в Telegram.")
+                           f"поставлен в очередь отправки администратору в Telegram.")
             except Exception as e:
                 logger.error(f"Ошибка при отправке заказа {order_number} "
-                            f"администратору в Telegram. ID чата: {ADMIN_CHAT_ID}. Ошибка: {e}")
+                            f"администратору в Telegram. ID чата: {config.ADMIN_CHAT_ID}. Ошибка: {e}")
         else:
             logger.warning("ADMIN_CHAT_ID не установлен. "
                           "Заказ не будет отправлен администратору в Telegram.")
 
         # ИЗМЕНЕНИЕ: Формируем тело email и отправляем его
-        logger.info("Формируем email уведомление...")
+        logger.debug("Формируем email уведомление...")
         try:
             email_subject = (f"Новый заказ {order_number} от "
                             f"{order_details.get('firstName', '')} {order_details.get('lastName', '')} - "
                             f"{total_amount:.2f} р.")
             email_body = _format_email_body(order_number, order_details, cart_items, 
                                            total_amount, delivery_text)
-            logger.info("Email уведомление сформировано")
+            logger.debug("Email уведомление сформировано")
         except Exception as e:
             logger.error(f"Ошибка при формировании email уведомления: {e}")
             # Создаем простое email как fallback
@@ -794,14 +752,14 @@ async def _send_order_notifications(order_details: dict, cart_items: list,
             </html>
             """
 
-        if ADMIN_EMAIL:
+        if config.ADMIN_EMAIL:
             admin_email_password = os.environ.get("ADMIN_EMAIL_PASSWORD")
             if admin_email_password:
-                logger.info(f"Отправляем email уведомление на {ADMIN_EMAIL}")
-                # Отправляем email синхронно, чтобы дождаться результата
+                logger.debug("Отправляем email уведомление на %s", config.ADMIN_EMAIL)
+                # Письмо только ставится в очередь, SMTP сервер checkout не задерживает
                 try:
-                    await send_email_notification(ADMIN_EMAIL, email_subject, email_body, "Пекарня Дражина")
-                    logger.info("Email администратору отправлен успешно")
+                    await send_email_notification(config.ADMIN_EMAIL, email_subject, email_body, "Пекарня Дражина")
+                    logger.debug("Email администратору поставлен в очередь")
                 except Exception as e:
                     logger.error(f"Ошибка при отправке email администратору: {e}")
             else:
@@ -810,39 +768,21 @@ async def _send_order_notifications(order_details: dict, cart_items: list,
         else:
             logger.warning("ADMIN_EMAIL не установлен. Email уведомление не будет отправлено.")
 
-        # Отправляем подтверждение заказа клиенту в Telegram
-        if user_id:
-            try:
-                logger.info(f"Отправляем подтверждение заказа клиенту {user_id} в Telegram")
-                customer_message = _format_customer_telegram_message(
-                    order_number, order_details, cart_items, total_amount, delivery_text
-                )
-                await bot.send_message(
-                    chat_id=user_id,
-                    text=customer_message,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                logger.info(f"Подтверждение заказа {order_number} успешно отправлено клиенту {user_id} в Telegram")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке подтверждения заказа клиенту {user_id} в Telegram: {e}")
-        else:
-            logger.warning("User ID не доступен. Подтверждение заказа в Telegram клиенту не будет отправлено.")
-
         # Отправляем письмо пользователю
         user_email = order_details.get('email')
         if user_email:
             try:
-                logger.info(f"Отправляем письмо пользователю на {user_email}")
+                logger.debug("Отправляем письмо пользователю на %s", user_email)
                 user_email_subject = f"Вы сделали заказ {order_number} в Telegram боте Пекарни Дражина"
                 user_email_body = _format_user_email_body(order_number, order_details, cart_items, total_amount)
-                asyncio.create_task(send_email_notification(user_email, user_email_subject, user_email_body, "Пекарня Дражина"))
-                logger.info("Задача отправки письма пользователю создана")
+                await send_email_notification(user_email, user_email_subject, user_email_body, "Пекарня Дражина")
+                logger.debug("Письмо пользователю поставлено в очередь")
             except Exception as e:
                 logger.error(f"Ошибка при отправке письма пользователю: {e}")
         else:
             logger.warning("Email пользователя не указан. Письмо пользователю не будет отправлено.")
 
-        logger.info(f"Все уведомления для заказа {order_number} обработаны")
+        logger.debug("Все уведомления для заказа %s обработаны", order_number)
 
     except Exception as e:
         logger.error(f"Критическая ошибка при отправке уведомлений для заказа {order_number}: {e}")
@@ -1159,11 +1099,8 @@ def _format_user_email_body(order_number: str, order_details: dict, cart_items:
         logger.error("Данные продуктов не загружены!")
         products_data = {}
 
-    # Создаем кэш для быстрого поиска товаров по ID
-    products_cache = {}
-    for category_products in products_data.values():
-        for product in category_products:
-            products_cache[product.get('id')] = product
+    # Индекс для быстрого поиска товаров по ID
+    products_cache = get_products_index()
 
     # Формируем строки таблицы для товаров
     table_rows = ""
@@ -1175,7 +1112,7 @@ def _format_user_email_body(order_number: str, order_details: dict, cart_items:
 
             # Получаем полную информацию о товаре из кэша
             product_id = item.get('id')
-            full_product_info = products_cache.get(product_id)
+            full_product_info = products_cache.get(str(product_id))
 
             # Используем полную информацию о товаре или данные из корзины
             product_name = full_product_info.get('name', item.get('name', 'N/A')) if full_product_info else item.get('name', 'N/A')
@@ -1370,18 +1307,53 @@ async def block_text_input(message: Message):
 
 async def main():
     """Главная функция для запуска бота."""
+    # Запись логов в отдельном потоке, чтобы не задерживать обработку событий
+    setup_logging()
+    config = get_config()
+    logger.info(f"Ожидаемый путь к файлу данных: {PRODUCTS_DATA_FILE}")
+    logger.info(f"Ожидаемый путь к файлу счетчика: {ORDER_COUNTER_FILE}")
     logger.info("Загрузка данных о продуктах при запуске бота...")
     await load_products_data()
+    catalog_watcher.add_listener(on_products_data_reloaded)
     # Загружаем счетчик заказов
     await load_order_counter()
+    # Корзины из прошлых запусков
+    user_carts.max_cached = config.CART_CACHE_SIZE
+    user_carts.ttl = config.CART_TTL_DAYS * 86400
+    await user_carts.start(config.CART_DB_PATH or DEFAULT_CART_DB_PATH)
+    await order_journal.start(config.ORDER_JOURNAL_PATH or DEFAULT_ORDER_JOURNAL_PATH)
+    if config.ENABLE_EMAIL_NOTIFICATIONS:
+        email_outbox.workers = config.SMTP_WORKERS
+        email_outbox.max_attempts = config.EMAIL_MAX_ATTEMPTS
+        await email_outbox.start(
+            config.EMAIL_OUTBOX_PATH or DEFAULT_OUTBOX_PATH,
+            SMTPSettings(config.SMTP_SERVER, config.SMTP_PORT, config.ADMIN_EMAIL,
+                         config.ADMIN_EMAIL_PASSWORD, config.SMTP_USE_TLS)
+        )
 
     # Включение хендлера для Web App данных
     dp.message.register(handle_web_app_data, F.web_app_data)
 
-    # Настраиваем API сервер
-    runner = await setup_api_server()
+    # Настраиваем API сервер: в процессе бота или в отдельных процессах (API_WORKERS > 1)
     port = int(os.environ.get("PORT", 5000))
-    site = web.TCPSite(runner, '0.0.0.0', port)  # nosec B104 - Web server needs to bind to all interfaces
+    api_supervisor = create_api_supervisor('0.0.0.0', port)  # nosec B104 - Web server needs to bind to all interfaces
+    if api_supervisor is None:
+        runner = await setup_api_server()
+        site = web.TCPSite(runner, '0.0.0.0', port)  # nosec B104 - Web server needs to bind to all interfaces
+
+    # С API_WORKERS > 1 порт API обслуживают воркеры, метрики бота отдаются на отдельном порту
+    metrics_runner = None
+    if api_supervisor is not None and config.METRICS_TOKEN and config.BOT_METRICS_PORT:
+        metrics_runner = await start_metrics_server('0.0.0.0', config.BOT_METRICS_PORT)  # nosec B104
+
+    async def stop_api_server():
+        if api_supervisor is None:
+            await runner.cleanup()
+        else:
+            await api_supervisor.stop()
+            await catalog_watcher.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
     # Запускаем security monitoring если включено
     security_task = None
@@ -1389,7 +1361,14 @@ async def main():
         security_task = asyncio.create_task(security_monitoring_loop())
         logger.info("🔒 Security monitoring запущен")
 
-    web_server_task = asyncio.create_task(site.start())
+    if api_supervisor is None:
+        web_server_task = asyncio.create_task(site.start())
+    else:
+        # Процессы API следят за файлом продуктов сами, бот - за своей копией
+        catalog_watcher.interval = config.CATALOG_RELOAD_INTERVAL
+        catalog_watcher.start()
+        web_server_task = api_supervisor.start()
+        logger.info(f"API сервер запущен в {api_supervisor.workers} процессах")
     
     # Check if we have a valid bot token
     is_demo_mode = config.BOT_TOKEN == '123456789:demo_token_for_replit_testing'
@@ -1409,11 +1388,17 @@ async def main():
             pass
         finally:
             logger.info("Остановка API сервера...")
-            await runner.cleanup()
+            await stop_api_server()
             logger.info("API сервер остановлен.")
+            await user_carts.close()
+            await order_numbers.release()
+            await order_journal.close()
+            await email_outbox.close()
     else:
         # Full mode with Telegram bot
-        bot_polling_task = asyncio.create_task(dp.start_polling(bot))
+        telegram_outbox.messages_per_second = config.TELEGRAM_MESSAGES_PER_SECOND
+        await telegram_outbox.start(config.TELEGRAM_OUTBOX_PATH or DEFAULT_TELEGRAM_OUTBOX_PATH, send_telegram_message)
+        bot_polling_task = asyncio.create_task(dp.start_polling(get_bot()))
 
         logger.info(f"API сервер запущен на http://0.0.0.0:{port}")
         logger.info("Бот начал опрос...")
@@ -1427,10 +1412,15 @@ async def main():
             pass
         finally:
             logger.info("Остановка API сервера...")
-            await runner.cleanup()
+            await stop_api_server()
             logger.info("API сервер остановлен.")
+            await user_carts.close()
+            await order_numbers.release()
+            await order_journal.close()
+            await email_outbox.close()
+            await telegram_outbox.close()
             logger.info("Закрытие сессии бота...")
-            await bot.session.close()
+            await get_bot().session.close()
             logger.info("Сессия бота закрыта.")
 
 
@@ -1456,7 +1446,7 @@ async def security_monitoring_loop():
             await security_manager.cleanup_old_data()
             
             # Получаем security report
-            report = security_manager.get_security_report()
+            report = await security_manager.get_security_report()
             logger.info(f"🔒 Security report: {report}")
             
             # Ждем 1 час перед следующей проверкой
@@ -0,0 +1,301 @@
+"""
+Metrics
+Counters and histograms exposed in the Prometheus text exposition format.
+
+Everything runs on one event loop, so recording is a plain increment with no
+locks. Label sets are resolved to a child object once and cached, and a
+histogram observation is one bisect plus two additions, so the request path
+allocates nothing per call. Numbers are per process. With API_WORKERS = 1
+the API runs in the bot process and /metrics on the API port has everything.
+With API_WORKERS > 1 /metrics on the API port reaches a worker, which reports
+the http_* and rate limit series of the requests it served; the bot_*,
+orders_processed and notification_duration series live in the bot process
+and are served on BOT_METRICS_PORT (see start_metrics_server).
+"""
+
+import abc
+import bisect
+import hmac
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Sequence, Tuple
+
+from aiohttp import web
+
+from bot.config import get_config
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Request latency buckets (seconds): catalog responses are sub-millisecond, SMTP takes seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Response size buckets (bytes)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Requests that matched no route share one label so unknown paths cannot add series
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; cumulated only when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class _Metric(abc.ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """A child holding the values of one label set."""
+
+    def labels(self, *values: str):
+        """Child for a label set; keep the result to skip the lookup on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Sample lines of every label set."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def value(self, *values: str) -> float:
+        child = self._children.get(values)
+        return child.value if child is not None else 0
+
+    def samples(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def count(self, *values: str) -> int:
+        child = self._children.get(values)
+        return sum(child.counts) if child is not None else 0
+
+    def samples(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Named metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# ===== API =====
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests by route, method and status.', ('route', 'method', 'status'))
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time to build the response, by route.', ('route',))
+http_response_size = registry.histogram(
+    'http_response_size_bytes', 'Response body size as sent, by route.', ('route',), SIZE_BUCKETS)
+rate_limit_rejections = registry.counter(
+    'rate_limit_rejections_total', 'Requests rejected by rate limiting, by scope.', ('scope',))
+
+# ===== BOT =====
+bot_updates = registry.counter(
+    'bot_updates_total', 'Bot updates by handler and result.', ('handler', 'result'))
+bot_handler_duration = registry.histogram(
+    'bot_handler_duration_seconds', 'Bot handler run time, by handler.', ('handler',))
+orders_processed = registry.counter(
+    'orders_processed_total', 'Checkout requests by result.', ('result',))
+notification_duration = registry.histogram(
+    'notification_duration_seconds', 'Time to deliver an order notification, by channel and result.',
+    ('channel', 'result'))
+
+
+def route_label(request: web.Request) -> str:
+    """Route template of a request (/bot-app/api/products/{product_id}), never the raw path."""
+    match_info = request.match_info
+    route = match_info.route if match_info is not None else None
+    resource = route.resource if route is not None else None
+    if resource is None:
+        return UNMATCHED_ROUTE
+    return resource.canonical
+
+
+class _RouteMetrics:
+    __slots__ = ('duration', 'size', 'statuses', 'route', 'method')
+
+    def __init__(self, route: str, method: str):
+        self.route = route
+        self.method = method
+        self.duration = http_request_duration.labels(route)
+        self.size = http_response_size.labels(route)
+        self.statuses: Dict[int, _CounterChild] = {}
+
+    def record(self, status: int, elapsed: float, size: int):
+        counter = self.statuses.get(status)
+        if counter is None:
+            counter = self.statuses[status] = http_requests.labels(self.route, self.method, str(status))
+        counter.inc()
+        self.duration.observe(elapsed)
+        self.size.observe(size)
+
+
+_route_metrics: Dict[Tuple[str, str], _RouteMetrics] = {}
+
+
+def _response_size(response: web.StreamResponse) -> int:
+    if isinstance(response, web.Response):
+        return response.content_length or 0
+    return response.body_length
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]):
+    """Count requests and time them per route; the outermost middleware, so the time is the full handling."""
+    started = time.perf_counter()
+    key = (route_label(request), request.method)
+    metrics = _route_metrics.get(key)
+    if metrics is None:
+        metrics = _route_metrics[key] = _RouteMetrics(*key)
+
+    try:
+        response = await handler(request)
+    except web.HTTPException as e:
+        metrics.record(e.status, time.perf_counter() - started, 0)
+        raise
+    except Exception:
+        metrics.record(500, time.perf_counter() - started, 0)
+        raise
+    metrics.record(response.status, time.perf_counter() - started, _response_size(response))
+    return response
+
+
+def metrics_authorized(request: web.Request) -> bool:
+    """/metrics needs the METRICS_TOKEN bearer token.
+
+    The peer address is not trusted: behind the reverse proxy every request arrives from loopback.
+    """
+    authorization = request.headers.get('Authorization', '')
+    return hmac.compare_digest(authorization.encode('utf-8'), f"Bearer {get_config().METRICS_TOKEN}".encode('utf-8'))
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Serve all metrics in the text exposition format. Without METRICS_TOKEN the endpoint does not exist."""
+    if not get_config().METRICS_TOKEN:
+        raise web.HTTPNotFound()
+    if not metrics_authorized(request):
+        return web.Response(status=403, text="Forbidden")
+    return web.Response(body=registry.render().encode('utf-8'),
+                        headers={'Content-Type': CONTENT_TYPE_LATEST, 'Cache-Control': 'no-store'})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve this process's /metrics on its own port; used by the bot process when the API runs in workers."""
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics: метрики процесса бота доступны на порту {port}")
+    return runner
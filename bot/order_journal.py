@@ -0,0 +1,204 @@
+"""
+Order Journal
+Append-only history of accepted orders in SQLite (WAL).
+
+append() only queues an order, so checkout does not wait for the disk. A
+single writer task takes everything queued since its last commit and writes
+it in one transaction (group commit); under load many orders share one
+fsync. Rows are never updated or deleted (triggers reject it). A record torn
+by a crash is never visible: SQLite drops an incomplete WAL frame on the next
+open, so the journal always ends with the last committed order.
+
+Orders are indexed by number, by user and by time; stream() reads the whole
+journal in keyset-paginated chunks for exports.
+"""
+
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+from typing import AsyncIterator, List, Optional, Tuple
+
+import aiosqlite
+
+from bot import json_codec
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, 'data', 'orders.sqlite3')
+
+# Orders written per transaction at most
+MAX_GROUP = 500
+# Rows fetched per query by stream()
+STREAM_CHUNK = 500
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS orders ("
+    " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " order_number TEXT NOT NULL,"
+    " user_id INTEGER,"
+    " created_at REAL NOT NULL,"
+    " total_amount REAL,"
+    " record TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS orders_number ON orders (order_number)",
+    "CREATE INDEX IF NOT EXISTS orders_user ON orders (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS orders_created ON orders (created_at)",
+    "CREATE TRIGGER IF NOT EXISTS orders_no_update BEFORE UPDATE ON orders"
+    " BEGIN SELECT RAISE(ABORT, 'order journal is append-only'); END",
+    "CREATE TRIGGER IF NOT EXISTS orders_no_delete BEFORE DELETE ON orders"
+    " BEGIN SELECT RAISE(ABORT, 'order journal is append-only'); END",
+)
+
+
+class OrderJournal:
+    """Queue of accepted orders written by one background task, plus indexed queries."""
+
+    def __init__(self, max_group: int = MAX_GROUP):
+        self.max_group = max_group
+        self.path: Optional[str] = None
+        self._db: Optional[aiosqlite.Connection] = None
+        self._reader: Optional[aiosqlite.Connection] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._db is not None
+
+    async def start(self, path: str = DEFAULT_DB_PATH):
+        """Open the journal and start the writer."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = await aiosqlite.connect(path, timeout=5)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        # FULL: a committed order survives a power loss, not only a crash of the process
+        await self._db.execute("PRAGMA synchronous=FULL")
+        for statement in SCHEMA:
+            await self._db.execute(statement)
+        await self._db.commit()
+        # Queries and exports never wait behind the writer's transaction
+        self._reader = await aiosqlite.connect(path, timeout=5)
+        self.path = path
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Журнал заказов {path} открыт")
+
+    # ===== Writing =====
+
+    def append(self, order_number: str, user_id: Optional[int], total_amount: Optional[float],
+               order_details: dict, cart_items: list,
+               created_at: Optional[datetime.datetime] = None) -> 'asyncio.Future[bool]':
+        """Queue an order. The returned future becomes True once it is committed, False if it was not."""
+        future = asyncio.get_running_loop().create_future()
+        if not self.started or self._queue is None:
+            logger.warning(f"Журнал заказов не открыт, заказ {order_number} не записан")
+            future.set_result(False)
+            return future
+        created_at = created_at or datetime.datetime.now()
+        record = {
+            'order_number': order_number,
+            'user_id': user_id,
+            'created_at': created_at.isoformat(timespec='seconds'),
+            'total_amount': total_amount,
+            'order_details': order_details,
+            'cart_items': cart_items,
+        }
+        row = (order_number, user_id, created_at.timestamp(), total_amount, json_codec.dumps_str(record))
+        self._queue.put_nowait((row, future))
+        return future
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            # Group commit: everything queued while the previous commit ran goes in this one
+            group = [item]
+            while len(group) < self.max_group and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    await self._write(group)
+                    return
+                group.append(item)
+            await self._write(group)
+
+    async def _write(self, group: List[Tuple[tuple, asyncio.Future]]):
+        try:
+            await self._db.executemany(
+                "INSERT INTO orders (order_number, user_id, created_at, total_amount, record)"
+                " VALUES (?, ?, ?, ?, ?)", [row for row, _ in group]
+            )
+            await self._db.commit()
+            committed = True
+        except sqlite3.Error as e:
+            logger.error(f"Журнал заказов: не удалось записать {len(group)} заказов: {e}")
+            await self._db.rollback()
+            committed = False
+        for _, future in group:
+            if not future.done():
+                future.set_result(committed)
+        if committed:
+            logger.debug("Журнал заказов: записано %d заказов одной транзакцией", len(group))
+
+    async def close(self):
+        """Write queued orders and close the journal."""
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+        if self._db is None:
+            return
+        await self._db.close()
+        await self._reader.close()
+        self._db = None
+        self._reader = None
+        logger.info("Журнал заказов закрыт")
+
+    # ===== Queries =====
+
+    async def _select(self, where: str, params: tuple, order: str = "seq", limit: Optional[int] = None) -> List[dict]:
+        sql = f"SELECT record FROM orders WHERE {where} ORDER BY {order}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        async with self._reader.execute(sql, params) as cursor:
+            return [json_codec.loads(record) async for (record,) in cursor]
+
+    async def get(self, order_number: str) -> Optional[dict]:
+        """The order with this number (the latest one if a number was ever reused)."""
+        orders = await self._select("order_number = ?", (order_number,), order="seq DESC", limit=1)
+        return orders[0] if orders else None
+
+    async def by_user(self, user_id: int, limit: int = 20) -> List[dict]:
+        """The user's orders, newest first."""
+        return await self._select("user_id = ?", (user_id,), order="created_at DESC, seq DESC", limit=limit)
+
+    async def between(self, start: datetime.datetime, end: datetime.datetime) -> List[dict]:
+        """Orders placed in [start, end), oldest first."""
+        return await self._select("created_at >= ? AND created_at < ?",
+                                  (start.timestamp(), end.timestamp()), order="created_at, seq")
+
+    async def stream(self, start: Optional[datetime.datetime] = None,
+                     end: Optional[datetime.datetime] = None,
+                     chunk: int = STREAM_CHUNK) -> AsyncIterator[dict]:
+        """Every order in journal order, read chunk by chunk; memory use does not grow with the journal."""
+        low = start.timestamp() if start else float('-inf')
+        high = end.timestamp() if end else float('inf')
+        last_seq = 0
+        while True:
+            # Each chunk is its own short query, so an export never holds a read transaction open
+            async with self._reader.execute(
+                "SELECT seq, record FROM orders WHERE seq > ? AND created_at >= ? AND created_at < ?"
+                " ORDER BY seq LIMIT ?", (last_seq, low, high, chunk)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            for seq, record in rows:
+                yield json_codec.loads(record)
+            if len(rows) < chunk:
+                return
+            last_seq = rows[-1][0]
+
+    async def count(self) -> int:
+        async with self._reader.execute("SELECT COUNT(*) FROM orders") as cursor:
+            (total,) = await cursor.fetchone()
+        return total
@@ -0,0 +1,129 @@
+"""
+Order Numbers
+Monthly order sequence shared by every process that takes orders.
+
+The sequence lives in data/order_counter.json as {"counter": N, "month": M}:
+N is the last number handed out (or reserved) in month M, and the first
+order in another month starts again from 1. A process reserves numbers in
+blocks, so a burst of orders costs one file write per block; each write holds
+an exclusive lock on a sidecar .lock file and replaces the JSON atomically
+(temporary file, fsync, rename). All file work runs in a thread.
+
+Numbers a process reserved but did not use are given back on release() if
+nobody reserved after them; after a crash they are skipped.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+from typing import Optional
+
+from bot import json_codec
+
+logger = logging.getLogger(__name__)
+
+# Numbers reserved per file write
+ORDER_BLOCK_SIZE = 10
+
+
+def read_counter_file(path: str) -> dict:
+    """Contents of the counter file; {} if it is missing, empty or corrupt."""
+    try:
+        with open(path, 'rb') as f:
+            content = f.read().strip()
+    except FileNotFoundError:
+        return {}
+    if not content:
+        logger.warning(f"Файл счетчика заказов {path} пустой. Начинаем с 0.")
+        return {}
+    try:
+        data = json_codec.loads(content)
+    except json_codec.JSONDecodeError as e:
+        logger.error(f"Файл счетчика заказов {path} поврежден: {e}. Начинаем с 0.")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_counter_file(path: str, data: dict):
+    """Replace the counter file atomically: readers see the old or the new contents, never a mix."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            json_codec.dump(data, f, pretty=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    # The rename itself survives a power loss only once the directory is synced
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class OrderNumberAllocator:
+    """Hands out order sequence numbers from blocks reserved in the counter file."""
+
+    def __init__(self, path: str, block_size: int = ORDER_BLOCK_SIZE):
+        self.path = path
+        self.block_size = block_size
+        self._lock = asyncio.Lock()
+        self._month: Optional[int] = None
+        self._next = 0
+        self._end = -1  # last reserved number; the block is used up when _next > _end
+
+    def _locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        lock_file = open(f"{self.path}.lock", 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file  # closing the file releases the lock
+
+    def _reserve(self, month: int, count: int) -> int:
+        """Reserve count numbers of month in the file. Returns the first one."""
+        with self._locked():
+            data = read_counter_file(self.path)
+            last = data.get('counter', 0) if data.get('month') == month else 0
+            data.update(counter=last + count, month=month)
+            write_counter_file(self.path, data)
+        return last + 1
+
+    def _release(self, month: int, next_number: int, end: int) -> bool:
+        with self._locked():
+            data = read_counter_file(self.path)
+            if data.get('month') != month or data.get('counter') != end:
+                return False
+            data['counter'] = next_number - 1
+            write_counter_file(self.path, data)
+        return True
+
+    async def load(self) -> dict:
+        """Current state of the counter file, e.g. for start-up logging."""
+        return await asyncio.to_thread(read_counter_file, self.path)
+
+    async def allocate(self, month: int) -> int:
+        """Next sequence number for month (1-12); the first order of a new month gets 1."""
+        async with self._lock:
+            if month != self._month or self._next > self._end:
+                first = await asyncio.to_thread(self._reserve, month, self.block_size)
+                if month != self._month and first == 1:
+                    logger.info(f"Новый месяц ({month}): нумерация заказов начинается с 1")
+                self._month, self._next, self._end = month, first, first + self.block_size - 1
+                logger.debug("Зарезервированы номера заказов %d-%d", first, self._end)
+            number = self._next
+            self._next += 1
+            return number
+
+    async def release(self):
+        """Give back the unused rest of the block, if nobody reserved numbers after it."""
+        async with self._lock:
+            if self._month is None or self._next > self._end:
+                return
+            released = await asyncio.to_thread(self._release, self._month, self._next, self._end)
+            if released:
+                logger.info(f"Возвращены неиспользованные номера заказов {self._next}-{self._end}")
+            self._month, self._end = None, -1
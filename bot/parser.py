@@ -4,11 +4,12 @@ import logging
 from bs4 import BeautifulSoup
 from aiohttp import ClientSession, ClientResponseError
 import asyncio
-import json
 from urllib.parse import urljoin
 import os
 import uuid # Импортируем модуль uuid для генерации уникальных ID (альтернативный метод)
 
+from bot import json_codec
+
 # ===== МЕТОДЫ ГЕНЕРАЦИИ ID ПРОДУКТОВ =====
 # ТЕКУЩИЙ МЕТОД: Использование data-id с веб-страницы
 # - Преимущества: Консистентные ID, надежная работа с корзиной
@@ -19,40 +20,15 @@ import uuid # Импортируем модуль uuid для генерации
 # - Недостатки: Новые ID при каждом запуске, проблемы с корзиной
 # ===== КОНЕЦ МЕТОДОВ ГЕНЕРАЦИИ ID =====
 
-# ===== Блок для отладки логирования - НАЧАЛО =====
-# Удаляем все существующие обработчики для корневого логгера,
-# чтобы гарантировать, что мы не конфликтуем с другими настройками.
-for handler in logging.root.handlers[:]:
-    logging.root.removeHandler(handler)
-
-# Настраиваем логирование с уровнем DEBUG и выводом в консоль
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-)
+# Логирование настраивает запускающий скрипт (bot.logging_setup); для отладки парсера: LOG_LEVEL=DEBUG
 logger = logging.getLogger(__name__)
-logger.debug("Логирование настроено. Это сообщение должно быть видно.")
-# ===== Блок для отладки логирования - КОНЕЦ =====
 
 BASE_URL = "https://drazhin.by/"
 
-# --- ДОБАВЛЕННЫЕ СТРОКИ ДЛЯ ОПРЕДЕЛЕНИЯ ПУТИ К ФАЙЛУ С ОТЛАДКОЙ ---
-current_file_path = os.path.abspath(__file__)
-logger.debug(f"DEBUG PATH: 1. os.path.abspath(__file__) -> {current_file_path}")
-
-current_dir = os.path.dirname(current_file_path)
-logger.debug(f"DEBUG PATH: 2. os.path.dirname(current_file_path) -> {current_dir}")
-
-# Предполагаем, что родительская директория 'bot' это корневая директория проекта
-ROOT_DIR = os.path.dirname(current_dir)
-logger.debug(f"DEBUG PATH: 3. os.path.dirname(current_dir) (ROOT_DIR) -> {ROOT_DIR}")
-
+# Корневая директория проекта - родитель директории 'bot'
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(ROOT_DIR, 'data')
-logger.debug(f"DEBUG PATH: 4. os.path.join(ROOT_DIR, 'data') (DATA_DIR) -> {DATA_DIR}")
-
 OUTPUT_FILE_PATH = os.path.join(DATA_DIR, 'products_scraped.json')
-logger.debug(f"DEBUG PATH: 5. os.path.join(DATA_DIR, 'products_scraped.json') (OUTPUT_FILE_PATH) -> {OUTPUT_FILE_PATH}")
-# --- КОНЕЦ ДОБАВЛЕННЫХ СТРОК С ОТЛАДКОЙ ---
 
 
 async def get_products_from_category_page(session, category_url):
@@ -68,7 +44,7 @@ async def get_products_from_category_page(session, category_url):
         async with session.get(category_url, headers=headers) as response:
             response.raise_for_status() # Вызывает исключение для HTTP ошибок 4xx/5xx
             html_content = await response.text()
-            logger.debug(f"Первые 500 символов полученного HTML для {category_url}:\n{html_content[:500]}")
+            logger.debug("Получено %d символов HTML для %s", len(html_content), category_url)
 
             try:
                 soup = BeautifulSoup(html_content, 'lxml', from_encoding="utf-8")
@@ -344,11 +320,18 @@ async def main():
     # Убедимся, что папка 'data' существует
     os.makedirs(DATA_DIR, exist_ok=True) 
 
-    with open(OUTPUT_FILE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(scraped_data, f, ensure_ascii=False, indent=4)
+    # Пишем во временный файл и атомарно подменяем: работающий сервер перечитывает
+    # этот файл на лету и не должен увидеть его наполовину записанным
+    tmp_file_path = f"{OUTPUT_FILE_PATH}.tmp"
+    # Компактный JSON: файл читают только сервер и бот, при каждом обновлении каталога
+    with open(tmp_file_path, 'wb') as f:
+        json_codec.dump(scraped_data, f)
+    os.replace(tmp_file_path, OUTPUT_FILE_PATH)
     logger.info(f"Данные успешно сохранены в {OUTPUT_FILE_PATH}") 
     logger.info("Парсер завершил работу.")
     # --- КОНЕЦ ИЗМЕНЕННОГО БЛОКА ---
 
 if __name__ == "__main__":
+    from bot.logging_setup import setup_logging
+    setup_logging()
     asyncio.run(main())
@@ -0,0 +1,288 @@
+"""
+Rate Limiter
+Sliding-window-counter rate limiting with O(1) checks and fixed memory per key.
+
+Each key keeps two counters (current and previous fixed window); the request
+rate is estimated as previous * (1 - elapsed fraction) + current. Idle keys
+are evicted by a timing wheel in the memory backend and by an indexed expiry
+column in the SQLite backend, which lets several processes share limits.
+The SQLite backend can wait on another process's lock, so RateLimiter runs
+its calls in a worker thread and the event loop never waits on the file.
+"""
+
+import abc
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Set
+
+from bot.config import get_config
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, 'data', 'rate_limits.sqlite3')
+
+# Granularity of the idle-key timing wheel (seconds)
+WHEEL_TICK = 60
+# Hard cap on tracked keys in memory; the soonest-expiring keys go first
+MAX_KEYS = 100_000
+# How often the SQLite backend purges expired rows (seconds)
+SQLITE_PURGE_INTERVAL = 60
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    count: int  # estimated requests in the window, including this one if allowed
+
+
+def slide_window(window_id: int, current: int, previous: int, now_window_id: int):
+    """Move the two counters forward to now_window_id."""
+    if now_window_id == window_id:
+        return window_id, current, previous
+    if now_window_id == window_id + 1:
+        return now_window_id, 0, current
+    return now_window_id, 0, 0
+
+
+def estimate_count(current: int, previous: int, now: float, window: float) -> float:
+    """Sliding-window estimate of requests in the last `window` seconds."""
+    elapsed_fraction = (now % window) / window
+    return previous * (1 - elapsed_fraction) + current
+
+
+class RateLimitBackend(abc.ABC):
+    """Storage interface for rate limit counters."""
+
+    # True if calls may wait on disk or other processes and must not run on the event loop
+    blocking = False
+
+    @abc.abstractmethod
+    def hit(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        """Count a request for key if it fits under limit."""
+
+    @abc.abstractmethod
+    def stats(self, now: float) -> dict:
+        """Return {'active_keys': ..., 'total_requests': ...}."""
+
+    @abc.abstractmethod
+    def reset(self):
+        """Forget all counters."""
+
+
+class _Counter:
+    __slots__ = ('window_id', 'window', 'current', 'previous', 'slot')
+
+    def __init__(self, window_id: int, window: float):
+        self.window_id = window_id
+        self.window = window
+        self.current = 0
+        self.previous = 0
+        self.slot = None
+
+    def expires_at(self) -> float:
+        # Two windows after the last counted one both counters are zero
+        return (self.window_id + 2) * self.window
+
+
+class MemoryBackend(RateLimitBackend):
+    """Per-process counters with timing-wheel eviction of idle keys."""
+
+    def __init__(self, max_keys: int = MAX_KEYS, tick: float = WHEEL_TICK):
+        self.max_keys = max_keys
+        self.tick = tick
+        self._counters: Dict[str, _Counter] = {}
+        self._wheel: Dict[int, Set[str]] = {}
+        self._cursor: Optional[int] = None
+
+    def _schedule(self, key: str, counter: _Counter):
+        slot = int(counter.expires_at() // self.tick)
+        if slot == counter.slot:
+            return
+        if counter.slot is not None:
+            bucket = self._wheel.get(counter.slot)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._wheel[counter.slot]
+        self._wheel.setdefault(slot, set()).add(key)
+        counter.slot = slot
+
+    def _evict_slot(self, slot: int):
+        for key in self._wheel.pop(slot, ()):
+            counter = self._counters.get(key)
+            if counter is not None and counter.slot == slot:
+                del self._counters[key]
+
+    def _advance(self, now: float):
+        """Evict keys whose wheel slot has passed."""
+        now_slot = int(now // self.tick)
+        if self._cursor is None:
+            self._cursor = now_slot
+        if now_slot <= self._cursor:
+            return
+
+        if now_slot - self._cursor > len(self._wheel):
+            # Long idle gap: walking the occupied slots is cheaper than every tick
+            for slot in [slot for slot in self._wheel if slot < now_slot]:
+                self._evict_slot(slot)
+        else:
+            for slot in range(self._cursor, now_slot):
+                if slot in self._wheel:
+                    self._evict_slot(slot)
+        self._cursor = now_slot
+
+    def _evict_overflow(self):
+        while len(self._counters) > self.max_keys and self._wheel:
+            self._evict_slot(min(self._wheel))
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        self._advance(now)
+        now_window_id = int(now // window)
+
+        counter = self._counters.get(key)
+        if counter is None or counter.window != window:
+            counter = self._counters[key] = _Counter(now_window_id, window)
+
+        counter.window_id, counter.current, counter.previous = slide_window(
+            counter.window_id, counter.current, counter.previous, now_window_id
+        )
+        estimate = estimate_count(counter.current, counter.previous, now, window)
+        allowed = estimate < limit
+        if allowed:
+            counter.current += 1
+
+        self._schedule(key, counter)
+        self._evict_overflow()
+        return RateLimitResult(allowed, int(estimate) + allowed)
+
+    def stats(self, now: float) -> dict:
+        self._advance(now)
+        return {
+            "active_keys": len(self._counters),
+            "total_requests": sum(c.current for c in self._counters.values())
+        }
+
+    def reset(self):
+        self._counters.clear()
+        self._wheel.clear()
+        self._cursor = None
+
+
+class SQLiteBackend(RateLimitBackend):
+    """Counters in a local SQLite file so several processes share the same limits."""
+
+    blocking = True
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " key TEXT PRIMARY KEY,"
+            " window_id INTEGER NOT NULL,"
+            " window REAL NOT NULL,"
+            " current INTEGER NOT NULL,"
+            " previous INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS rate_limits_expires ON rate_limits (expires_at)")
+        self._last_purge = 0.0
+
+    def _purge(self, now: float):
+        if now - self._last_purge < SQLITE_PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self._conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        now_window_id = int(now // window)
+        with self._lock:
+            self._purge(now)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT window_id, window, current, previous FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[1] != window:
+                    window_id, current, previous = now_window_id, 0, 0
+                else:
+                    window_id, current, previous = slide_window(row[0], row[2], row[3], now_window_id)
+
+                estimate = estimate_count(current, previous, now, window)
+                allowed = estimate < limit
+                if allowed:
+                    current += 1
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, window_id, window, current, previous, expires_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, window_id, window, current, previous, (window_id + 2) * window)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return RateLimitResult(allowed, int(estimate) + allowed)
+
+    def stats(self, now: float) -> dict:
+        with self._lock:
+            active_keys, total_requests = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(current), 0) FROM rate_limits WHERE expires_at > ?", (now,)
+            ).fetchone()
+        return {"active_keys": active_keys, "total_requests": total_requests}
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limits")
+
+
+class RateLimiter:
+    """Front end shared by the API and the bot; the backend decides where counters live."""
+
+    def __init__(self, backend: Optional[RateLimitBackend] = None):
+        # None: the backend selected in the config, created on first use
+        self._backend = backend
+
+    @property
+    def backend(self) -> RateLimitBackend:
+        if self._backend is None:
+            self._backend = create_rate_limit_backend()
+        return self._backend
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        """Count a request for key; allowed is False once the limit is reached."""
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.backend.hit, key, limit, window, time.time())
+        return self.backend.hit(key, limit, window, time.time())
+
+    async def stats(self) -> dict:
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.backend.stats, time.time())
+        return self.backend.stats(time.time())
+
+    def reset(self):
+        self.backend.reset()
+
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    """Build the backend selected by RATE_LIMIT_BACKEND ('memory' or 'sqlite')."""
+    config = get_config()
+    if config.RATE_LIMIT_BACKEND == 'sqlite':
+        path = config.RATE_LIMIT_DB_PATH or DEFAULT_DB_PATH
+        try:
+            return SQLiteBackend(path)
+        except sqlite3.Error as e:
+            logger.error(f"Rate limiter: не удалось открыть {path}: {e}. Используем память процесса.")
+    return MemoryBackend()
+
+
+# Global rate limiter instance shared by the API server and the security manager
+rate_limiter = RateLimiter()
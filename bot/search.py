@@ -0,0 +1,211 @@
+"""
+Product Search
+Inverted index over product texts with Russian-aware normalization.
+
+Words are lowercased, ё is folded to е and common Russian endings are
+stripped, so "булочки" finds "Булочка". The last word of a query also
+matches as a prefix for type-ahead. Lookups touch only the postings of
+the query words, never the whole catalog.
+"""
+
+import bisect
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Matches in the name count more than in the description, which counts more than ingredients
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'short_description': 2.0,
+    'ingredients': 1.0,
+}
+# A prefix-only match (type-ahead) is worth less than a full word match
+PREFIX_MATCH_FACTOR = 0.5
+# Bound the work one request can cause
+MAX_QUERY_LENGTH = 100
+MAX_QUERY_TOKENS = 8
+MAX_PREFIX_EXPANSIONS = 200
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+# Noun and adjective endings, longest first; a light stemmer is enough for product names
+_ENDINGS = sorted((
+    'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ах', 'ях', 'ов', 'ев', 'ей', 'ой',
+    'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ых', 'их', 'ом', 'ем', 'ам', 'ям', 'ую', 'юю',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+# Prepositions and conjunctions: ignored in queries ("булочка с маком") unless nothing else is left
+STOP_WORDS = frozenset(('и', 'в', 'во', 'с', 'со', 'на', 'из', 'без', 'для', 'по', 'к', 'а', 'или'))
+
+
+def normalize(text: str) -> str:
+    """Lowercase and fold ё to е."""
+    return text.lower().replace('ё', 'е')
+
+
+def tokenize(text: str) -> List[str]:
+    """Split normalized text into words."""
+    return _TOKEN_PATTERN.findall(normalize(text))
+
+
+def stem(word: str) -> str:
+    """Strip a common Russian ending, keeping at least MIN_STEM_LENGTH letters."""
+    if not word.isalpha():
+        return word
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def product_terms(product: dict) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Return ({stem: weight}, {word: weight}) for one product; each field counts once per term."""
+    stems: Dict[str, float] = {}
+    words: Dict[str, float] = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = product.get(field)
+        if not isinstance(value, str):
+            continue
+        field_words = set(tokenize(value))
+        for word in field_words:
+            words[word] = words.get(word, 0.0) + weight
+        for word_stem in {stem(word) for word in field_words}:
+            stems[word_stem] = stems.get(word_stem, 0.0) + weight
+    return stems, words
+
+
+class SearchIndex:
+    """Postings {term: {product id: weight}} for stems and for whole words (prefix search)."""
+
+    def __init__(self):
+        self._stems: Dict[str, Dict[str, float]] = {}
+        self._words: Dict[str, Dict[str, float]] = {}
+        self._sorted_words: List[str] = []
+        # What each product contributed, so it can be removed without a scan
+        self._product_terms: Dict[str, Tuple[Dict[str, float], Dict[str, float]]] = {}
+        self._indexed: Dict[str, dict] = {}
+        # While updated() runs: postings already copied from the previous index
+        self._copied: Optional[set] = None
+
+    @classmethod
+    def build(cls, products: Dict[str, dict]) -> "SearchIndex":
+        """Index {product id: product} from scratch."""
+        index = cls()
+        for product_id, product in products.items():
+            index._add(product_id, product)
+        index._sorted_words = sorted(index._words)
+        return index
+
+    def updated(self, products: Dict[str, dict]) -> "SearchIndex":
+        """Return a new index for products, re-indexing only products whose texts changed.
+
+        Postings of untouched terms are shared with this index, which is never modified.
+        """
+        index = SearchIndex()
+        index._stems = dict(self._stems)
+        index._words = dict(self._words)
+        index._product_terms = dict(self._product_terms)
+        index._indexed = dict(self._indexed)
+        index._copied = set()
+
+        for product_id in self._indexed.keys() - products.keys():
+            index._remove(product_id)
+        for product_id, product in products.items():
+            old_product = self._indexed.get(product_id)
+            if old_product is not None and _indexed_texts(old_product) == _indexed_texts(product):
+                index._indexed[product_id] = product
+                continue
+            if old_product is not None:
+                index._remove(product_id)
+            index._add(product_id, product)
+
+        index._copied = None
+        if index._words.keys() == self._words.keys():
+            index._sorted_words = self._sorted_words
+        else:
+            index._sorted_words = sorted(index._words)
+        return index
+
+    def _postings_for_update(self, table: Dict[str, Dict[str, float]], term: str) -> Dict[str, float]:
+        # Copy-on-write while updated() runs; build() owns all its postings
+        postings = table.get(term)
+        if self._copied is not None and (id(table), term) not in self._copied:
+            postings = dict(postings) if postings is not None else {}
+            self._copied.add((id(table), term))
+            table[term] = postings
+        elif postings is None:
+            postings = table[term] = {}
+        return postings
+
+    def _add(self, product_id: str, product: dict):
+        stems, words = product_terms(product)
+        for table, terms in ((self._stems, stems), (self._words, words)):
+            for term, weight in terms.items():
+                self._postings_for_update(table, term)[product_id] = weight
+        self._product_terms[product_id] = (stems, words)
+        self._indexed[product_id] = product
+
+    def _remove(self, product_id: str):
+        stems, words = self._product_terms.pop(product_id, ({}, {}))
+        for table, terms in ((self._stems, stems), (self._words, words)):
+            for term in terms:
+                postings = self._postings_for_update(table, term)
+                postings.pop(product_id, None)
+                if not postings:
+                    del table[term]
+        self._indexed.pop(product_id, None)
+
+    def _prefix_matches(self, prefix: str) -> Dict[str, float]:
+        matches: Dict[str, float] = {}
+        start = bisect.bisect_left(self._sorted_words, prefix)
+        for word in self._sorted_words[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not word.startswith(prefix):
+                break
+            for product_id, weight in self._words[word].items():
+                matches[product_id] = max(matches.get(product_id, 0.0), weight * PREFIX_MATCH_FACTOR)
+        return matches
+
+    def _token_matches(self, token: str, prefix: bool) -> Dict[str, float]:
+        matches = dict(self._stems.get(stem(token), {}))
+        if prefix:
+            for product_id, weight in self._prefix_matches(token).items():
+                if weight > matches.get(product_id, 0.0):
+                    matches[product_id] = weight
+        return matches
+
+    def search(self, query: str, order: Optional[Dict[str, int]] = None) -> List[str]:
+        """Return ids of products matching every query word, best first.
+
+        The last word also matches as a prefix. Ties keep the catalog order given in order.
+        """
+        tokens = tokenize(query[:MAX_QUERY_LENGTH])[:MAX_QUERY_TOKENS]
+        tokens = [token for token in tokens if token not in STOP_WORDS] or tokens
+        if not tokens:
+            return []
+
+        scores: Optional[Dict[str, float]] = None
+        for position, token in enumerate(tokens):
+            matches = self._token_matches(token, prefix=position == len(tokens) - 1)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {product_id: score + matches[product_id]
+                          for product_id, score in scores.items() if product_id in matches}
+            if not scores:
+                return []
+
+        order = order or {}
+        return sorted(scores, key=lambda product_id: (-scores[product_id], order.get(product_id, 0)))
+
+
+def _indexed_texts(product: dict) -> Tuple:
+    return tuple(product.get(field) for field in FIELD_WEIGHTS)
+
+
+def build_search_index(products: Dict[str, dict], previous: Optional[SearchIndex] = None) -> SearchIndex:
+    """Index products, reusing previous for products whose texts did not change."""
+    if previous is None:
+        return SearchIndex.build(products)
+    return previous.updated(products)
+
@@ -201,6 +201,7 @@ class BotSecurityMonitor:
 async def security_check(bot_token: str) -> Dict:
     """Perform comprehensive security check."""
     monitor = BotSecurityMonitor(bot_token)
+    rate_limit_stats = await security_manager.rate_limiter.stats()
     
     results = {
         "webhook_security": await monitor.check_webhook_security(),
@@ -213,8 +214,8 @@ async def security_check(bot_token: str) -> Dict:
                                     security_manager.hmac_secret != 'default-secret-key-change-in-production')
         },
         "rate_limiting": {
-            "active_limits": len(security_manager.rate_limit_store),
-            "total_requests": sum(len(requests) for requests in security_manager.rate_limit_store.values())
+            "active_limits": rate_limit_stats["active_keys"],
+            "total_requests": rate_limit_stats["total_requests"]
         }
     }
     
@@ -1,6 +1,6 @@
 """
 Security Headers Middleware for AioHTTP
-Adds comprehensive security headers to all HTTP responses.
+Adds comprehensive security headers and a per-route cache policy to all HTTP responses.
 """
 
 import hashlib
@@ -12,76 +12,129 @@ from aiohttp.web_response import Response
 
 logger = logging.getLogger(__name__)
 
+# Content Security Policy - allows Telegram WebApp functionality and Google Fonts
+CSP_POLICY = (
+    "default-src 'self' https://telegram.org; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://telegram.org; "
+    "style-src 'self' 'unsafe-inline' https://telegram.org https://fonts.googleapis.com; "
+    "font-src 'self' https://telegram.org https://fonts.gstatic.com; "
+    "img-src 'self' data: https: http:; "
+    "connect-src 'self' https://telegram.org; "
+    "frame-src 'none'; "
+    "object-src 'none'; "
+    "base-uri 'self'; "
+    "form-action 'self'; "
+    "upgrade-insecure-requests"
+)
+
+# Permissions Policy - restrict sensitive APIs (removed unrecognized features)
+PERMISSIONS_POLICY = (
+    "geolocation=(), "
+    "microphone=(), "
+    "camera=(), "
+    "payment=(), "
+    "usb=(), "
+    "magnetometer=(), "
+    "gyroscope=(), "
+    "accelerometer=(), "
+    "autoplay=(), "
+    "encrypted-media=(), "
+    "picture-in-picture=()"
+)
+
+# Security headers - constant, built once at import
+SECURITY_HEADERS = {
+    # Prevent clickjacking
+    'X-Frame-Options': 'DENY',
+
+    # Prevent MIME type sniffing
+    'X-Content-Type-Options': 'nosniff',
+
+    # Referrer policy
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
+
+    # Content Security Policy
+    'Content-Security-Policy': CSP_POLICY,
+
+    # Permissions Policy
+    'Permissions-Policy': PERMISSIONS_POLICY,
+
+    # XSS Protection (legacy but still useful)
+    'X-XSS-Protection': '1; mode=block',
+}
+
+HSTS_HEADER = 'max-age=31536000; includeSubDomains; preload'
+
+# ===== CACHE POLICY =====
+# Prevent caching of sensitive data
+CACHE_NO_STORE = 'no-store, no-cache, must-revalidate, proxy-revalidate'
+# May be stored, but must be revalidated with the ETag on every use
+CACHE_REVALIDATE = 'no-cache'
+# Fingerprinted assets never change under the same URL
+CACHE_IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Route prefixes in match order; the first match decides
+CACHE_POLICY_ROUTES = (
+    ('/bot-app/api/auth/', CACHE_NO_STORE),
+    ('/bot-app/api/', CACHE_REVALIDATE),
+)
+
+
+def cache_control_for(request: Request, response: Response) -> str:
+    """Decide the Cache-Control header for a response.
+
+    Errors are never cached. A Cache-Control set by the handler wins (the static
+    handler marks fingerprinted file names immutable); otherwise the route
+    decides: tokens are no-store and everything else revalidates.
+    """
+    if response.status >= 400:
+        return CACHE_NO_STORE
+
+    handler_policy = response.headers.get('Cache-Control')
+    if handler_policy:
+        return handler_policy
+
+    path = request.path
+    for prefix, policy in CACHE_POLICY_ROUTES:
+        if path.startswith(prefix):
+            return policy
+
+    return CACHE_REVALIDATE
+
+
+def apply_security_headers(request: Request, response: web.StreamResponse):
+    """Set the security headers and the cache policy on a response (or an HTTPException)."""
+    response.headers.update(SECURITY_HEADERS)
+
+    cache_control = cache_control_for(request, response)
+    response.headers['Cache-Control'] = cache_control
+    if 'no-store' in cache_control:
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
+    else:
+        response.headers.popall('Pragma', None)
+        response.headers.popall('Expires', None)
+    
+    # Add HSTS header only for HTTPS requests
+    if request.scheme == 'https':
+        response.headers['Strict-Transport-Security'] = HSTS_HEADER
+
+
 @web.middleware
 async def security_headers_middleware(request: Request, handler: Callable[[Request], Awaitable[Response]]) -> Response:
-    """Add security headers to all responses."""
-    
-    # Content Security Policy - allows Telegram WebApp functionality and Google Fonts
-    csp_policy = (
-        "default-src 'self' https://telegram.org; "
-        "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://telegram.org; "
-        "style-src 'self' 'unsafe-inline' https://telegram.org https://fonts.googleapis.com; "
-        "font-src 'self' https://telegram.org https://fonts.gstatic.com; "
-        "img-src 'self' data: https: http:; "
-        "connect-src 'self' https://telegram.org; "
-        "frame-src 'none'; "
-        "object-src 'none'; "
-        "base-uri 'self'; "
-        "form-action 'self'; "
-        "upgrade-insecure-requests"
-    )
-    
-    # Permissions Policy - restrict sensitive APIs (removed unrecognized features)
-    permissions_policy = (
-        "geolocation=(), "
-        "microphone=(), "
-        "camera=(), "
-        "payment=(), "
-        "usb=(), "
-        "magnetometer=(), "
-        "gyroscope=(), "
-        "accelerometer=(), "
-        "autoplay=(), "
-        "encrypted-media=(), "
-        "picture-in-picture=()"
-    )
-    
+    """Add security headers and the route cache policy to all responses."""
     try:
         response = await handler(request)
-    except Exception as e:
+    except web.HTTPException as e:
+        # 404, 403, redirects: keep the status, add the headers
+        apply_security_headers(request, e)
+        raise
+    except Exception:
         # If handler fails, create a basic error response with security headers
+        logger.exception(f"Ошибка при обработке запроса {request.path}")
         response = web.Response(status=500, text="Internal Server Error")
-    
-    # Security headers
-    response.headers.update({
-        # Prevent clickjacking
-        'X-Frame-Options': 'DENY',
-        
-        # Prevent MIME type sniffing
-        'X-Content-Type-Options': 'nosniff',
-        
-        # Referrer policy
-        'Referrer-Policy': 'strict-origin-when-cross-origin',
-        
-        # Content Security Policy
-        'Content-Security-Policy': csp_policy,
-        
-        # Permissions Policy
-        'Permissions-Policy': permissions_policy,
-        
-        # XSS Protection (legacy but still useful)
-        'X-XSS-Protection': '1; mode=block',
-        
-        # Prevent caching of sensitive data
-        'Cache-Control': 'no-store, no-cache, must-revalidate, proxy-revalidate',
-        'Pragma': 'no-cache',
-        'Expires': '0'
-    })
-    
-    # Add HSTS header only for HTTPS requests
-    if request.scheme == 'https':
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains; preload'
-    
+
+    apply_security_headers(request, response)
     return response
 
 def create_content_hash(content: bytes) -> str:
@@ -6,20 +6,24 @@ import logging
 import time
 import base64
 import os
-from collections import defaultdict
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import aiohttp
 
-from bot.config import config
+from bot.config import get_config
+from bot.rate_limiter import rate_limiter
+from bot.metrics import rate_limit_rejections
 
 logger = logging.getLogger(__name__)
 
+# Security events that are part of normal operation
+ROUTINE_SECURITY_EVENTS = frozenset({"bot_interaction", "email_sent"})
+
 class SecurityManager:
     """Comprehensive security manager for the bot."""
     
     def __init__(self):
-        self.rate_limit_store = defaultdict(list)
+        self.rate_limiter = rate_limiter
         self.suspicious_activities = []
         self.security_events = []
         self.last_cleanup = time.time()
@@ -31,6 +35,7 @@ class SecurityManager:
         
     async def validate_webhook_request(self, request_data: dict, signature: str = None) -> bool:
         """Validate incoming webhook request."""
+        config = get_config()
         if not config.ALLOW_WEBHOOKS:
             logger.warning("🚫 Webhook request rejected: webhooks not allowed")
             return False
@@ -57,7 +62,7 @@ class SecurityManager:
             # Create expected signature
             message = json.dumps(data, separators=(',', ':'))
             expected_signature = hmac.new(
-                config.WEBHOOK_SECRET.encode(),
+                get_config().WEBHOOK_SECRET.encode(),
                 message.encode(),
                 hashlib.sha256
             ).hexdigest()
@@ -74,30 +79,24 @@ class SecurityManager:
     
     async def check_rate_limit(self, user_id: int, action: str = "general") -> bool:
         """Check if user has exceeded rate limits."""
+        config = get_config()
         if not config.ENABLE_RATE_LIMITING:
             return True
         
-        current_time = time.time()
-        key = f"{user_id}:{action}"
-        
-        # Clean old entries
-        self.rate_limit_store[key] = [
-            timestamp for timestamp in self.rate_limit_store[key]
-            if current_time - timestamp < config.RATE_LIMIT_WINDOW
-        ]
+        key = f"user:{user_id}:{action}"
+        result = await self.rate_limiter.hit(key, config.RATE_LIMIT_MAX_REQUESTS, config.RATE_LIMIT_WINDOW)
         
         # Check if limit exceeded
-        if len(self.rate_limit_store[key]) >= config.RATE_LIMIT_MAX_REQUESTS:
+        if not result.allowed:
+            rate_limit_rejections.labels('bot').inc()
             logger.warning(f"🚫 Rate limit exceeded for user {user_id}, action: {action}")
             self._log_security_event("rate_limit_exceeded", {
                 "user_id": user_id,
                 "action": action,
-                "current_count": len(self.rate_limit_store[key])
+                "current_count": result.count
             })
             return False
         
-        # Add current request
-        self.rate_limit_store[key].append(current_time)
         return True
     
     def validate_input_data(self, data: dict, expected_structure: dict) -> Tuple[bool, List[str]]:
@@ -153,7 +152,7 @@ class SecurityManager:
         try:
             async with aiohttp.ClientSession() as session:
                 # Get current webhook info
-                webhook_url = f"https://api.telegram.org/bot{config.BOT_TOKEN}/getWebhookInfo"
+                webhook_url = f"https://api.telegram.org/bot{get_config().BOT_TOKEN}/getWebhookInfo"
                 async with session.get(webhook_url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -186,7 +185,7 @@ class SecurityManager:
             }
         
         # Check if webhook URL is trusted
-        if not config.validate_webhook_url(url):
+        if not get_config().validate_webhook_url(url):
             return {
                 "secure": False,
                 "status": "Untrusted webhook domain",
@@ -224,7 +223,7 @@ class SecurityManager:
         """Delete current webhook."""
         try:
             async with aiohttp.ClientSession() as session:
-                delete_url = f"https://api.telegram.org/bot{config.BOT_TOKEN}/deleteWebhook"
+                delete_url = f"https://api.telegram.org/bot{get_config().BOT_TOKEN}/deleteWebhook"
                 async with session.post(delete_url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -245,7 +244,7 @@ class SecurityManager:
     
     def _log_security_event(self, event_type: str, details: dict):
         """Log security event."""
-        if not config.LOG_SECURITY_EVENTS:
+        if not get_config().LOG_SECURITY_EVENTS:
             return
         
         event = {
@@ -255,7 +254,9 @@ class SecurityManager:
         }
         
         self.security_events.append(event)
-        logger.warning(f"🚨 SECURITY EVENT: {event_type} - {details}")
+        # Routine events come with every update - INFO, so LOG_SAMPLING can thin them out
+        level = logging.INFO if event_type in ROUTINE_SECURITY_EVENTS else logging.WARNING
+        logger.log(level, "🚨 SECURITY EVENT: %s - %s", event_type, details, extra={"event_type": event_type})
         
         # Keep only last 1000 events
         if len(self.security_events) > 1000:
@@ -265,16 +266,7 @@ class SecurityManager:
         """Clean up old rate limit and security data."""
         current_time = time.time()
         
-        # Clean rate limit store
-        for key in list(self.rate_limit_store.keys()):
-            self.rate_limit_store[key] = [
-                timestamp for timestamp in self.rate_limit_store[key]
-                if current_time - timestamp < config.RATE_LIMIT_WINDOW
-            ]
-            
-            # Remove empty entries
-            if not self.rate_limit_store[key]:
-                del self.rate_limit_store[key]
+        # Idle rate limit keys are evicted by the rate limiter itself
         
         # Clean old security events (keep last 24 hours)
         cutoff_time = current_time - 86400
@@ -286,13 +278,15 @@ class SecurityManager:
         self.last_cleanup = current_time
         logger.debug("🧹 Security data cleanup completed")
     
-    def get_security_report(self) -> Dict:
+    async def get_security_report(self) -> Dict:
         """Get current security status report."""
+        config = get_config()
+        rate_limit_stats = await self.rate_limiter.stats()
         return {
             "rate_limiting": {
                 "enabled": config.ENABLE_RATE_LIMITING,
-                "active_limits": len(self.rate_limit_store),
-                "total_requests": sum(len(requests) for requests in self.rate_limit_store.values())
+                "active_limits": rate_limit_stats["active_keys"],
+                "total_requests": rate_limit_stats["total_requests"]
             },
             "webhook_security": {
                 "allowed": config.ALLOW_WEBHOOKS,
@@ -1,11 +1,13 @@
 import logging
-from typing import Any, Awaitable, Callable, Dict
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, TelegramObject
 from aiogram.fsm.context import FSMContext
 
+from bot import json_codec
 from bot.security_manager import security_manager
-from bot.config import config
+from bot.metrics import bot_handler_duration, bot_updates
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +41,8 @@ class SecurityMiddleware(BaseMiddleware):
                 logger.warning(f"🚫 Web app data validation failed for user {user_id}: {validation_result[1]}")
                 await self._handle_validation_failure(event, user_id, validation_result[1])
                 return
+            # The handler takes the parsed document instead of decoding the string again
+            data["web_app_payload"] = validation_result[2]
         
         # Log security event
         security_manager._log_security_event("bot_interaction", {
@@ -85,11 +89,10 @@ class SecurityMiddleware(BaseMiddleware):
             return f"callback_{event.data}"
         return "unknown"
     
-    async def _validate_web_app_data(self, data_str: str) -> tuple[bool, list[str]]:
-        """Validate web app data structure."""
+    async def _validate_web_app_data(self, data_str: str) -> tuple[bool, list[str], Optional[dict]]:
+        """Validate web app data structure; the parsed document is returned as the third item."""
         try:
-            import json
-            data = json.loads(data_str)
+            data = json_codec.loads(data_str)
             
             # Define expected structure for different actions
             if "action" in data:
@@ -111,14 +114,15 @@ class SecurityMiddleware(BaseMiddleware):
                 else:
                     expected_structure = {"action": "str"}
                 
-                return security_manager.validate_input_data(data, expected_structure)
+                is_valid, errors = security_manager.validate_input_data(data, expected_structure)
+                return is_valid, errors, data
             else:
-                return False, ["Missing action field"]
+                return False, ["Missing action field"], None
                 
-        except json.JSONDecodeError:
-            return False, ["Invalid JSON format"]
+        except json_codec.JSONDecodeError:
+            return False, ["Invalid JSON format"], None
         except Exception as e:
-            return False, [f"Validation error: {str(e)}"]
+            return False, [f"Validation error: {str(e)}"], None
     
     async def _handle_rate_limit_exceeded(self, event: TelegramObject, user_id: int, action: str):
         """Handle rate limit exceeded."""
@@ -179,6 +183,41 @@ class FSMContextMiddleware(BaseMiddleware):
             return event.from_user.id if event.from_user else None
         return None
 
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Counts and times dispatcher handlers by handler function name."""
+
+    def __init__(self):
+        self._handlers: Dict[str, tuple] = {}
+
+    def _children(self, name: str):
+        children = self._handlers.get(name)
+        if children is None:
+            children = self._handlers[name] = (
+                bot_updates.labels(name, 'ok'), bot_updates.labels(name, 'error'), bot_handler_duration.labels(name)
+            )
+        return children
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        callback = getattr(handler_object, 'callback', None)
+        ok, error, duration = self._children(getattr(callback, '__name__', 'unknown'))
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception:
+            error.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+        ok.inc()
+        return result
+
 # Create middleware instances
 security_middleware = SecurityMiddleware()
 fsm_context_middleware = FSMContextMiddleware()
+handler_metrics_middleware = HandlerMetricsMiddleware()
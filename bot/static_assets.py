@@ -0,0 +1,356 @@
+"""
+Static Asset Cache
+Keeps Web App files in memory with precomputed ETags and compressed variants.
+
+Every file also has a content fingerprint (the start of its SHA-256, which the
+ETag already holds). HTML and CSS files are rendered with references to other
+assets rewritten to fingerprinted names (style.css -> style.1a2b3c4d5e.css),
+so those URLs can be cached for a year: a changed file gets a new URL, an
+unchanged one keeps its URL and stays in the browser cache.
+"""
+
+import logging
+import os
+import posixpath
+import re
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from aiohttp import web
+
+from bot import json_codec
+from bot.http_cache import PrecompressedBody, etag_matches
+
+logger = logging.getLogger(__name__)
+
+# Определяем тип содержимого на основе расширения файла
+CONTENT_TYPES = {
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+    '.html': 'text/html',
+}
+DEFAULT_CONTENT_TYPE = 'text/html'
+
+# Already-compressed formats gain nothing from gzip/brotli
+COMPRESSIBLE_TYPES = {'text/css', 'application/javascript', 'image/svg+xml', 'text/html'}
+
+# Quality 11 costs ~20x the CPU of 9 for ~15% fewer bytes on our JS/CSS,
+# which matters when files are recompressed on every change
+STATIC_BROTLI_QUALITY = 9
+
+# Compressed copies written next to a file by the build step
+PRECOMPRESSED_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+# How often a cached file is re-checked on disk (seconds)
+ASSET_RECHECK_INTERVAL = 2.0
+
+# URL path the Web App directory is served under
+ASSET_URL_PREFIX = '/bot-app/'
+
+# Hex digits of the content hash put into file names
+FINGERPRINT_LENGTH = 10
+FINGERPRINTED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<ext>\.[A-Za-z0-9]+)$'
+                                % FINGERPRINT_LENGTH)
+
+# Files whose references to other assets are rewritten to fingerprinted URLs
+RENDERED_TYPES = {'text/html', 'text/css'}
+HTML_REFERENCE = re.compile(r'(?P<before>\b(?:src|href)=(?P<quote>["\']))(?P<url>[^"\']+)(?P=quote)')
+CSS_REFERENCE = re.compile(r'(?P<before>url\(\s*(?P<quote>["\']?))(?P<url>[^"\')\s]+)(?P=quote)')
+
+
+class StaticAsset:
+    """One file held in memory."""
+
+    __slots__ = ('path', 'payload', 'signature', 'checked_at', 'fingerprint', 'dependencies')
+
+    def __init__(self, path: str, payload: PrecompressedBody, signature: Tuple[int, int],
+                 dependencies: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.payload = payload
+        self.signature = signature
+        self.checked_at = time.monotonic()
+        # The ETag is the quoted SHA-256 of the body
+        self.fingerprint = payload.etag[1:1 + FINGERPRINT_LENGTH]
+        # Rendered files: {asset path: fingerprint it was rendered with}
+        self.dependencies = dependencies or {}
+
+
+def content_type_for(path: str) -> str:
+    """Return the Content-Type for a file name."""
+    return CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), DEFAULT_CONTENT_TYPE)
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_precompressed(full_path: str, signature: Tuple[int, int]) -> Dict[str, bytes]:
+    """Read the file's .gz/.br siblings that are at least as new as the file itself."""
+    variants = {}
+    for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+        sibling = full_path + suffix
+        sibling_signature = _file_signature(sibling)
+        if sibling_signature is None or sibling_signature[0] < signature[0]:
+            continue
+        try:
+            with open(sibling, 'rb') as f:
+                variants[encoding] = f.read()
+        except OSError as e:
+            logger.warning(f"Static: не удалось прочитать {sibling}: {e}")
+    return variants
+
+
+def fingerprinted_path(rel_path: str, fingerprint: str) -> str:
+    """images/logo.svg -> images/logo.<fingerprint>.svg"""
+    stem, ext = posixpath.splitext(rel_path)
+    return f"{stem}.{fingerprint}{ext}"
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single 'bytes=start-end' range. Returns (start, end) inclusive.
+
+    Returns None when the header is absent or not a single byte range (the
+    full body is served then) and raises ValueError when it is unsatisfiable.
+    """
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+    spec = range_header[len('bytes='):].strip()
+    if ',' in spec:
+        return None
+
+    start_str, _, end_str = spec.partition('-')
+    start_str, end_str = start_str.strip(), end_str.strip()
+    if not (start_str or end_str) or not all(part.isdigit() for part in (start_str, end_str) if part):
+        return None
+
+    if not start_str:
+        # Suffix range: the last N bytes
+        length = int(end_str)
+        if length == 0:
+            raise ValueError("range not satisfiable")
+        return max(size - length, 0), size - 1
+
+    start = int(start_str)
+    end = int(end_str) if end_str else size - 1
+    if end_str and end < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class StaticAssetCache:
+    """Serves files from a directory out of memory, re-reading them only when they change."""
+
+    def __init__(self, root: str, recheck_interval: float = ASSET_RECHECK_INTERVAL,
+                 url_prefix: str = ASSET_URL_PREFIX):
+        self.root = os.path.realpath(root)
+        self.recheck_interval = recheck_interval
+        self.url_prefix = url_prefix
+        self._assets: Dict[str, StaticAsset] = {}
+        # Canonical paths found by load(); nothing else is ever read or cached
+        self._known: Set[str] = set()
+        # Files being rendered right now; references back to them are left as they are
+        self._rendering: Set[str] = set()
+
+    def load(self):
+        """Read every file under root into memory. Files added later are served after the next load()."""
+        files = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() in CONTENT_TYPES:
+                    full_path = os.path.join(dirpath, filename)
+                    files[os.path.relpath(full_path, self.root).replace(os.sep, '/')] = full_path
+        self._known = set(files)
+        for rel_path, full_path in files.items():
+            # Rendering a page loads the assets it links to first
+            if rel_path not in self._assets:
+                self._load_asset(rel_path, full_path)
+        logger.info(f"Static: загружено {len(self._assets)} файлов из {self.root}")
+
+    def _load_asset(self, rel_path: str, full_path: str) -> Optional[StaticAsset]:
+        signature = _file_signature(full_path)
+        if signature is None:
+            self._assets.pop(rel_path, None)
+            return None
+        try:
+            with open(full_path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            logger.error(f"Error reading file {full_path}: {e}")
+            return None
+
+        content_type = content_type_for(rel_path)
+        dependencies = None
+        if content_type in RENDERED_TYPES:
+            content, dependencies = self._render(rel_path, content, content_type)
+        compress = content_type in COMPRESSIBLE_TYPES
+        # .gz/.br files from scripts/build_web_app.py match the file only if rendering changed nothing
+        precompressed = _read_precompressed(full_path, signature) if compress and not dependencies else None
+        payload = PrecompressedBody(content, content_type, compress=compress,
+                                    brotli_quality=STATIC_BROTLI_QUALITY, precompressed=precompressed)
+        asset = StaticAsset(full_path, payload, signature, dependencies)
+        self._assets[rel_path] = asset
+        return asset
+
+    def _render(self, rel_path: str, content: bytes, content_type: str) -> Tuple[bytes, Dict[str, str]]:
+        """Rewrite references to known assets into fingerprinted URLs."""
+        try:
+            text = content.decode('utf-8')
+        except UnicodeDecodeError:
+            logger.warning(f"Static: {rel_path} не в UTF-8, ссылки не переписаны")
+            return content, {}
+
+        pattern = HTML_REFERENCE if content_type == 'text/html' else CSS_REFERENCE
+        base_dir = posixpath.dirname(rel_path)
+        dependencies: Dict[str, str] = {}
+
+        def replace(match: re.Match) -> str:
+            url = match.group('url')
+            target = self._reference_target(url, base_dir)
+            if target is None or target in self._rendering:
+                return match.group(0)
+            asset = self.get(target)
+            if asset is None:
+                return match.group(0)
+            dependencies[target] = asset.fingerprint
+            fragment = url[url.index('#'):] if '#' in url else ''
+            hashed_url = self.url_prefix + fingerprinted_path(target, asset.fingerprint) + fragment
+            return match.group('before') + hashed_url + match.group('quote')
+
+        self._rendering.add(rel_path)
+        try:
+            text = pattern.sub(replace, text)
+        finally:
+            self._rendering.discard(rel_path)
+        return text.encode('utf-8'), dependencies
+
+    def _reference_target(self, url: str, base_dir: str) -> Optional[str]:
+        """Asset path a local URL points to, or None for external and special URLs."""
+        path = url.split('#', 1)[0].split('?', 1)[0]
+        if not path or path.startswith('//') or ':' in path:
+            return None
+        if path.startswith(self.url_prefix):
+            path = path[len(self.url_prefix):]
+        elif path.startswith('/'):
+            return None
+        else:
+            path = posixpath.join(base_dir, path)
+        path = posixpath.normpath(path)
+        # Pages (and unknown types, served as HTML) keep their URLs
+        if path.startswith('../') or path == '..' or content_type_for(path) == 'text/html':
+            return None
+        return path
+
+    def _resolve(self, rel_path: str) -> Optional[str]:
+        """Map a request path to a file inside root, refusing anything outside it."""
+        full_path = os.path.realpath(os.path.join(self.root, rel_path))
+        if not full_path.startswith(self.root + os.sep) or not os.path.isfile(full_path):
+            return None
+        return full_path
+
+    def get(self, rel_path: str) -> Optional[StaticAsset]:
+        """Return the cached asset, reloading it if the file changed on disk.
+
+        images//logo.svg and images/./logo.svg are the same asset as images/logo.svg:
+        the cache is keyed by the canonical path only.
+        """
+        asset = self._assets.get(rel_path)
+        if asset is None:
+            rel_path = posixpath.normpath(rel_path)
+            if rel_path not in self._known:
+                return None
+            asset = self._assets.get(rel_path)
+            if asset is None:
+                # Known but not in memory: deleted since, or not reached yet by load()
+                full_path = self._resolve(rel_path)
+                return self._load_asset(rel_path, full_path) if full_path else None
+
+        now = time.monotonic()
+        if now - asset.checked_at >= self.recheck_interval:
+            asset.checked_at = now
+            if _file_signature(asset.path) != asset.signature:
+                return self._load_asset(rel_path, asset.path)
+        # A rendered file is rendered again when an asset it links to changed
+        for dependency, fingerprint in asset.dependencies.items():
+            current = self.get(dependency)
+            if current is None or current.fingerprint != fingerprint:
+                return self._load_asset(rel_path, asset.path)
+        return asset
+
+    def lookup(self, rel_path: str) -> Tuple[Optional[StaticAsset], bool]:
+        """Resolve a request path, fingerprinted or not. Returns (asset, immutable).
+
+        A fingerprinted name is immutable only while the fingerprint matches the
+        current content; an outdated one (a page from before a deploy) still gets
+        the file, but with revalidation, so the new content is never cached under
+        the old URL for a year.
+        """
+        # Fingerprinted names are the hot path: go straight to the file they stand for
+        match = FINGERPRINTED_NAME.match(rel_path)
+        if match:
+            asset = self.get(match.group('stem') + match.group('ext'))
+            if asset is not None:
+                return asset, asset.fingerprint == match.group('fingerprint')
+        return self.get(rel_path), False
+
+    def manifest(self) -> Dict[str, str]:
+        """{asset path: fingerprinted path} for every loaded file except HTML pages."""
+        return {
+            rel_path: fingerprinted_path(rel_path, asset.fingerprint)
+            for rel_path, asset in sorted(self._assets.items())
+            if asset.payload.content_type != 'text/html'
+        }
+
+    def write_manifest(self, path: str):
+        """Write the manifest as JSON, e.g. for a CDN or deploy checks."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            json_codec.dump(self.manifest(), f, pretty=True)
+        os.replace(tmp_path, path)
+
+
+def asset_response(request: web.Request, asset: StaticAsset,
+                   headers: Optional[Dict[str, str]] = None) -> web.Response:
+    """Build a response for a cached asset: 304, 206 range or negotiated full body."""
+    payload = asset.payload
+    response_headers = {
+        'ETag': payload.etag,
+        'Vary': 'Accept-Encoding',
+        'Accept-Ranges': 'bytes',
+    }
+    if headers:
+        response_headers.update(headers)
+
+    if etag_matches(request.headers.get('If-None-Match'), payload.etag):
+        return web.Response(status=304, headers=response_headers)
+
+    response_headers['Content-Type'] = payload.content_type
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or etag_matches(if_range, payload.etag)):
+        size = len(payload.body)
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response_headers['Content-Range'] = f'bytes */{size}'
+            return web.Response(status=416, headers=response_headers)
+        if byte_range is not None:
+            start, end = byte_range
+            # Ranges always refer to the identity body
+            response_headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            return web.Response(status=206, body=payload.body[start:end + 1], headers=response_headers)
+
+    encoding, body = payload.select(request.headers.get('Accept-Encoding', ''))
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+    return web.Response(body=body, headers=response_headers)
@@ -0,0 +1,306 @@
+"""
+Telegram Outbox
+Durable queue of order messages sent by the bot within Telegram's rate limits.
+
+enqueue() stores the message in SQLite (WAL) and returns, so the checkout
+handler answers the customer before any notification goes out. A dispatcher
+task sends the queued messages in the background, several at a time, while
+keeping under Telegram's limits: about 30 messages per second for the whole
+bot (a token bucket that allows short bursts), one message per second to a
+private chat and 20 per minute to a group. Messages to one chat go out one
+at a time and in order.
+
+A 429 answer pauses every send for the retry_after the server asked for, and
+the message is sent again afterwards. Network and server errors are retried
+with exponential backoff; a message Telegram rejects (bad request, bot
+blocked, chat not found) or that runs out of attempts is kept in the outbox
+as failed. While a message waits to be retried, later messages to the same
+chat wait behind it. Messages still pending at shutdown are sent after the
+next start.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Set
+
+import aiosqlite
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter
+
+from bot.metrics import notification_duration
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, 'data', 'telegram_outbox.sqlite3')
+
+# Messages per second for the whole bot, and how many may go out at once after a quiet spell
+MESSAGES_PER_SECOND = 30.0
+BURST = 30
+# Seconds between two messages to one chat: private chats and groups (negative chat ids)
+PRIVATE_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+# Requests to Telegram in flight at once
+MAX_CONCURRENT = 8
+# Attempts before a message is kept as failed; retry delay doubles from RETRY_BASE_DELAY up to RETRY_MAX_DELAY
+MAX_ATTEMPTS = 10
+RETRY_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 600.0
+# Due messages read per dispatcher pass
+FETCH_LIMIT = 200
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS telegram_outbox ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " chat_id INTEGER NOT NULL,"
+    " text TEXT NOT NULL,"
+    " parse_mode TEXT,"
+    " channel TEXT NOT NULL,"
+    " created_at REAL NOT NULL,"
+    " attempts INTEGER NOT NULL DEFAULT 0,"
+    " next_attempt REAL NOT NULL,"
+    " failed INTEGER NOT NULL DEFAULT 0,"
+    " last_error TEXT)",
+    "CREATE INDEX IF NOT EXISTS telegram_outbox_due ON telegram_outbox (failed, next_attempt)",
+    "CREATE INDEX IF NOT EXISTS telegram_outbox_chat ON telegram_outbox (chat_id, id)",
+)
+
+# Called as send(chat_id, text, parse_mode), e.g. a wrapper around Bot.send_message
+SendMessage = Callable[[int, str, Optional[str]], Awaitable[object]]
+
+
+class OutgoingMessage(NamedTuple):
+    id: int
+    chat_id: int
+    text: str
+    parse_mode: Optional[str]
+    channel: str
+    attempts: int
+
+
+class TokenBucket:
+    """rate tokens per second, at most burst saved up."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """Take a token. Returns 0 on success, otherwise the seconds until one is available."""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+def is_permanent(error: Exception) -> bool:
+    """True for errors that a retry will not fix: bad request, bot blocked, chat not found."""
+    return isinstance(error, (TelegramBadRequest, TelegramForbiddenError, TelegramNotFound))
+
+
+def chat_interval(chat_id: int) -> float:
+    return GROUP_CHAT_INTERVAL if chat_id < 0 else PRIVATE_CHAT_INTERVAL
+
+
+class TelegramOutbox:
+    """Outbox table in SQLite and a dispatcher that sends it at the rate Telegram allows."""
+
+    def __init__(self, messages_per_second: float = MESSAGES_PER_SECOND, burst: int = BURST,
+                 max_concurrent: int = MAX_CONCURRENT, max_attempts: int = MAX_ATTEMPTS,
+                 retry_base_delay: float = RETRY_BASE_DELAY, retry_max_delay: float = RETRY_MAX_DELAY):
+        self.messages_per_second = messages_per_second
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.path: Optional[str] = None
+        self._send: Optional[SendMessage] = None
+        self._db: Optional[aiosqlite.Connection] = None
+        self._bucket: Optional[TokenBucket] = None
+        self._wake: Optional[asyncio.Event] = None
+        # Claiming due rows and recording results never interleave, so a sent message is not claimed again
+        self._lock = asyncio.Lock()
+        self._in_flight: Set[int] = set()
+        self._busy_chats: Set[int] = set()
+        self._chat_ready: Dict[int, float] = {}  # monotonic time the chat may get its next message
+        self._paused_until = 0.0  # monotonic time a 429 pause ends
+        self._sending: Set[asyncio.Task] = set()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._db is not None
+
+    async def start(self, path: str, send: SendMessage):
+        """Open the outbox and start sending with send(chat_id, text, parse_mode)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = await aiosqlite.connect(path, timeout=5)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        # NORMAL: a queued message survives a crash of the process
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            await self._db.execute(statement)
+        await self._db.commit()
+        self.path = path
+        self._send = send
+        self._bucket = TokenBucket(self.messages_per_second, self.burst)
+        self._wake = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        counts = await self.counts()
+        logger.info(f"Очередь сообщений Telegram {path} открыта: ожидают отправки {counts['pending']}, "
+                    f"не отправлены {counts['failed']}")
+
+    # ===== Queueing =====
+
+    async def enqueue(self, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                      channel: str = 'telegram') -> bool:
+        """Store the message for sending. True once it is safely queued, False if it could not be.
+
+        channel labels the message in the notification_duration metric.
+        """
+        if not self.started:
+            logger.warning(f"Очередь сообщений Telegram не открыта, сообщение для чата {chat_id} не отправлено")
+            return False
+        now = time.time()
+        await self._db.execute(
+            "INSERT INTO telegram_outbox (chat_id, text, parse_mode, channel, created_at, next_attempt)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (chat_id, text, parse_mode, channel, now, now)
+        )
+        await self._db.commit()
+        self._wake.set()
+        return True
+
+    async def counts(self) -> Dict[str, int]:
+        """Messages waiting to be sent and messages kept as failed."""
+        async with self._db.execute("SELECT failed, COUNT(*) FROM telegram_outbox GROUP BY failed") as cursor:
+            rows = dict(await cursor.fetchall())
+        return {'pending': rows.get(0, 0), 'failed': rows.get(1, 0)}
+
+    # ===== Sending =====
+
+    async def _dispatch(self):
+        while True:
+            self._wake.clear()
+            async with self._lock:
+                wait = await self._start_due()
+            # Sleep until something is queued, a send finishes, or a limit or retry delay runs out
+            async with self._db.execute(
+                "SELECT MIN(next_attempt) FROM telegram_outbox WHERE failed = 0 AND next_attempt > ?", (time.time(),)
+            ) as cursor:
+                (next_attempt,) = await cursor.fetchone()
+            if next_attempt is not None:
+                wait = min(wait, max(next_attempt - time.time(), 0))
+            try:
+                await asyncio.wait_for(self._wake.wait(), None if wait == float('inf') else wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _start_due(self) -> float:
+        """Start sending every due message the limits allow. Returns the seconds until another one could go."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        # A message waiting out a retry delay holds back the later messages to its chat
+        wall_now = time.time()
+        async with self._db.execute(
+            "SELECT id, chat_id, text, parse_mode, channel, attempts FROM telegram_outbox AS message"
+            " WHERE failed = 0 AND next_attempt <= ? AND NOT EXISTS ("
+            "  SELECT 1 FROM telegram_outbox AS earlier WHERE earlier.chat_id = message.chat_id"
+            "  AND earlier.id < message.id AND earlier.failed = 0 AND earlier.next_attempt > ?)"
+            " ORDER BY id LIMIT ?",
+            (wall_now, wall_now, FETCH_LIMIT)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        wait = float('inf')
+        held: Set[int] = set()  # chats whose earliest message cannot go yet; later ones wait behind it
+        for row in rows:
+            message = OutgoingMessage(*row)
+            chat_id = message.chat_id
+            if len(self._sending) >= self.max_concurrent:
+                break  # woken again when a send finishes
+            if message.id in self._in_flight or chat_id in held:
+                continue
+            if chat_id in self._busy_chats:
+                held.add(chat_id)
+                continue
+            chat_wait = self._chat_ready.get(chat_id, 0) - now
+            if chat_wait > 0:
+                held.add(chat_id)
+                wait = min(wait, chat_wait)
+                continue
+            bucket_wait = self._bucket.take(now)
+            if bucket_wait > 0:
+                return min(wait, bucket_wait)
+            self._in_flight.add(message.id)
+            self._busy_chats.add(chat_id)
+            self._chat_ready[chat_id] = now + chat_interval(chat_id)
+            task = asyncio.create_task(self._deliver(message))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+        return wait
+
+    async def _deliver(self, message: OutgoingMessage):
+        started = time.perf_counter()
+        try:
+            await self._send(message.chat_id, message.text, message.parse_mode)
+            error = None
+        except Exception as e:
+            error = e
+        notification_duration.labels(message.channel, 'error' if error else 'ok').observe(time.perf_counter() - started)
+        try:
+            await self._record(message, error)
+        finally:
+            self._in_flight.discard(message.id)
+            self._busy_chats.discard(message.chat_id)
+            self._wake.set()
+
+    async def _record(self, message: OutgoingMessage, error: Optional[Exception]):
+        async with self._lock:
+            if error is None:
+                await self._db.execute("DELETE FROM telegram_outbox WHERE id = ?", (message.id,))
+                await self._db.commit()
+                logger.debug("Сообщение %d отправлено в чат %s", message.id, message.chat_id)
+                return
+            if isinstance(error, TelegramRetryAfter):
+                # Flood control: nothing goes out until the pause is over, the message is not counted as failed
+                self._paused_until = max(self._paused_until, time.monotonic() + error.retry_after)
+                attempts, delay, failed = message.attempts, float(error.retry_after), False
+                logger.warning(f"Telegram просит подождать {error.retry_after} с, отправка приостановлена")
+            else:
+                attempts = message.attempts + 1
+                delay = min(self.retry_base_delay * 2 ** (attempts - 1), self.retry_max_delay)
+                failed = is_permanent(error) or attempts >= self.max_attempts
+                if failed:
+                    logger.error(f"Сообщение для чата {message.chat_id} не отправлено после {attempts} попыток: {error}")
+                else:
+                    logger.warning(f"Ошибка при отправке сообщения в чат {message.chat_id}: {error}. "
+                                   f"Повтор через {delay:.0f} с")
+            await self._db.execute(
+                "UPDATE telegram_outbox SET attempts = ?, next_attempt = ?, failed = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, int(failed), f"{type(error).__name__}: {error}", message.id)
+            )
+            await self._db.commit()
+
+    async def close(self):
+        """Finish the sends in progress and close the outbox. Pending messages stay queued."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._sending:
+            await asyncio.gather(*list(self._sending))
+        if self._db is None:
+            return
+        await self._db.close()
+        self._db = None
+        logger.info("Очередь сообщений Telegram закрыта")
@@ -43,6 +43,25 @@ async function signRequest(method, path, timestamp) {
     return await generateHMACSignature(requestData, secret);
 }
 
+// ===== PRODUCT IMAGES =====
+// Same 32-bit FNV-1a as image_version() in bot/image_proxy.py, so a new image gets a new URL
+function imageVersion(url) {
+    let hash = 0x811c9dc5;
+    for (let i = 0; i < url.length; i++) {
+        hash = Math.imul(hash ^ url.charCodeAt(i), 0x01000193) >>> 0;
+    }
+    return hash.toString(16).padStart(8, '0');
+}
+
+// Product image through the server's image cache ('grid' or 'detail' size)
+function productImageSrc(product, size) {
+    const url = product && product.image_url;
+    if (!url || !/^https?:\/\//.test(url) || product.id === undefined) {
+        return url || '';
+    }
+    return `/bot-app/img/${encodeURIComponent(product.id)}/${size}?v=${imageVersion(url)}`;
+}
+
 // ===== AUTHENTICATION TOKEN =====
 let authToken = null;
 let tokenExpiry = 0;
@@ -228,6 +247,22 @@ function getAllAvailabilityAbbreviations() {
     const CACHE_VERSION = '1.3.108';
 const CACHE_NAME = `bakery-app-v${CACHE_VERSION}`;
 
+// Fingerprinted URLs of the images inserted from here; the server renders them into index.html
+const ASSET_URLS = {};
+const assetUrlsTemplate = document.getElementById('asset-urls');
+if (assetUrlsTemplate) {
+    assetUrlsTemplate.content.querySelectorAll('[data-asset]').forEach(link => {
+        ASSET_URLS[link.dataset.asset] = link.getAttribute('href');
+    });
+}
+
+function assetUrl(path) {
+    return ASSET_URLS[path] || `/bot-app/${path}`;
+}
+
+// Icons not inlined into index.html come from the sprite, fetched on first use
+const SPRITE_URL = assetUrl('sprite.svg');
+
 // Customer data constants (moved here for scope access)
 const CUSTOMER_DATA_KEY = 'customer_data';
 const CUSTOMER_DATA_VERSION = '1.0.0';
@@ -865,7 +900,7 @@ function createIcon(iconName, className = '') {
     const use = document.createElementNS('http://www.w3.org/1999/xlink', 'use');
     
     svg.setAttribute('class', `icon ${className}`);
-    use.setAttributeNS('http://www.w3.org/1999/xlink', 'href', `#${iconName}`);
+    use.setAttributeNS('http://www.w3.org/1999/xlink', 'href', `${SPRITE_URL}#${iconName}`);
     
     svg.appendChild(use);
     return svg;
@@ -1599,10 +1634,10 @@ document.addEventListener('DOMContentLoaded', async () => {
     let currentProductCategory = null; // Для отслеживания категории продукта
 
     const CATEGORY_DISPLAY_MAP = {
-        "category_bakery": { name: "Выпечка", icon: "images/bakery.svg?v=1.3.102&t=1756284000", image: "images/bakery.svg?v=1.3.102&t=1756284000" },
-        "category_croissants": { name: "Круассаны", icon: "images/crouasan.svg?v=1.3.102&t=1756284000", image: "images/crouasan.svg?v=1.3.102&t=1756284000" },
-        "category_artisan_bread": { name: "Ремесленный хлеб", icon: "images/bread1.svg?v=1.3.102&t=1756284000", image: "images/bread1.svg?v=1.3.102&t=1756284000" },
-        "category_desserts": { name: "Десерты", icon: "images/cookie.svg?v=1.3.102&t=1756284000", image: "images/cookie.svg?v=1.3.102&t=1756284000" }
+        "category_bakery": { name: "Выпечка", icon: assetUrl("images/bakery.svg"), image: assetUrl("images/bakery.svg") },
+        "category_croissants": { name: "Круассаны", icon: assetUrl("images/crouasan.svg"), image: assetUrl("images/crouasan.svg") },
+        "category_artisan_bread": { name: "Ремесленный хлеб", icon: assetUrl("images/bread1.svg"), image: assetUrl("images/bread1.svg") },
+        "category_desserts": { name: "Десерты", icon: assetUrl("images/cookie.svg"), image: assetUrl("images/cookie.svg") }
     };
 
     await fetchProductsData();
@@ -1610,6 +1645,126 @@ document.addEventListener('DOMContentLoaded', async () => {
     // 🔄 SETUP AUTOMATIC CART REFRESH EVERY MINUTE
     let autoRefreshInterval;
     
+    // Store previous products data for comparison
+    let previousProductsData = null;
+    
+    // True while the catalog event stream is open; polling is then unnecessary
+    let catalogStreamConnected = false;
+    
+    // Reload products and refresh the product grid if anything changed
+    async function refreshProducts() {
+        await showProductsUpdate(await fetchProductsData());
+    }
+    
+    // Refresh the product grid if newProductsData differs from what was shown last
+    async function showProductsUpdate(newProductsData) {
+        try {
+            // Check if products data has actually changed
+            const hasChanges = checkProductsDataChanges(previousProductsData, newProductsData);
+            
+            if (hasChanges) {
+                // Products data changed, refreshing product grid
+                
+                // 🔄 REFRESH PRODUCT GRID IF ON CATEGORY SCREEN
+                const productsContainer = document.getElementById('products-container');
+                if (productsContainer && !productsContainer.classList.contains('hidden')) {
+                    // User is on a category screen, refresh the product grid
+                    const currentCategory = localStorage.getItem('lastProductCategory');
+                    if (currentCategory) {
+                        // Refreshing product grid for category
+                        await loadProducts(currentCategory);
+                    }
+                }
+                
+                // Update previous data
+                previousProductsData = JSON.parse(JSON.stringify(newProductsData));
+            } else {
+                // No changes in products data, skipping grid refresh
+            }
+        } catch (error) {
+            console.warn('Auto-refresh failed:', error);
+        }
+    }
+    
+    // Apply a pushed delta ({added, removed, changed, order}) to productsData without refetching the catalog
+    function applyCatalogDelta(delta) {
+        const data = {};
+        for (const key in productsData) {
+            data[key] = productsData[key].slice();
+        }
+        
+        for (const { category, id } of delta.removed) {
+            if (data[category]) {
+                data[category] = data[category].filter(product => String(product.id) !== id);
+            }
+        }
+        for (const { category, id, fields, removed_fields } of delta.changed) {
+            const products = data[category] || [];
+            const index = products.findIndex(product => String(product.id) === id);
+            if (index === -1) {
+                return false;
+            }
+            const product = { ...products[index], ...fields };
+            for (const field of removed_fields) {
+                delete product[field];
+            }
+            products[index] = product;
+        }
+        
+        // Added products are placed by "order", which lists every category whose membership changed
+        const added = {};
+        for (const { category, product } of delta.added) {
+            (added[category] = added[category] || []).push(product);
+        }
+        for (const category in delta.order) {
+            const byId = new Map();
+            for (const product of (data[category] || []).concat(added[category] || [])) {
+                byId.set(String(product.id), product);
+            }
+            const ordered = delta.order[category].map(id => byId.get(id));
+            if (ordered.some(product => product === undefined)) {
+                return false;
+            }
+            if (ordered.length > 0) {
+                data[category] = ordered;
+            } else {
+                delete data[category];
+            }
+        }
+        
+        productsData = data;
+        if (Object.keys(cart).length > 0) {
+            renderCart();
+        }
+        return true;
+    }
+    
+    // Bring the catalog up to the version announced by a "delta" or "version" event
+    async function handleCatalogEvent(event, data, version) {
+        if (version === catalogVersion) {
+            return;
+        }
+        const previousVersion = catalogVersion;
+        catalogVersion = version;
+        if (previousVersion === null) {
+            // Every connection starts with the current version
+            return;
+        }
+        if (event === 'delta') {
+            const delta = JSON.parse(data);
+            if (String(delta.since) === previousVersion && applyCatalogDelta(delta)) {
+                if (!document.hidden) {
+                    await showProductsUpdate(productsData);
+                }
+                return;
+            }
+        }
+        // The delta does not apply (or was too large to push): fetch the catalog
+        if (!document.hidden) {
+            await refreshProducts();
+        }
+    }
+    
     // Function to check if app is active and refresh cart if needed
     function setupAutoRefresh() {
         // Clear existing interval if any
@@ -1617,45 +1772,123 @@ document.addEventListener('DOMContentLoaded', async () => {
             clearInterval(autoRefreshInterval);
         }
         
-        // Store previous products data for comparison
-        let previousProductsData = null;
-        
-        // Set up periodic refresh every minute (60000ms)
+        // Set up periodic refresh every minute (60000ms) as a fallback for the event stream
         autoRefreshInterval = setInterval(async () => {
-            // Only refresh if app is active
-            if (!document.hidden) {
-                try {
-                    const newProductsData = await fetchProductsData();
-                    
-                    // Check if products data has actually changed
-                    const hasChanges = checkProductsDataChanges(previousProductsData, newProductsData);
+            // Only refresh if app is active and no catalog updates are pushed
+            if (!document.hidden && !catalogStreamConnected) {
+                await refreshProducts();
+            }
+        }, 60000); // 1 minute
+        
+        // Auto-refresh setup: Cart will refresh every minute when active, grid only when changes detected
+    }
+    
+    // 📡 CATALOG UPDATES PUSHED BY THE SERVER (Server-Sent Events)
+    // EventSource cannot send the signature headers, so the stream is read with fetch
+    let catalogStreamController = null;
+    let catalogStreamRetryDelay = 5000;
+    // Last catalog version announced by the server, kept across reconnects
+    let catalogVersion = null;
+    
+    async function subscribeCatalogEvents() {
+        if (catalogStreamController || !window.ReadableStream || !window.TextDecoder) {
+            return;
+        }
+        const controller = new AbortController();
+        catalogStreamController = controller;
+        
+        try {
+            const token = await getAuthToken();
+            if (!token) {
+                throw new Error('Failed to get authentication token');
+            }
+            
+            const timestamp = Math.floor(Date.now() / 1000);
+            const path = '/bot-app/api/events';
+            const signature = await signRequest('GET', path, timestamp);
+            
+            const headers = {
+                'Accept': 'text/event-stream',
+                'X-Signature': signature,
+                'X-Timestamp': timestamp.toString(),
+                'X-Auth-Token': token,
+                'X-Telegram-Init-Data': getHMACSecret()
+            };
+            if (catalogVersion !== null) {
+                // On reconnect the server answers with the delta from this version when it still has it
+                headers['Last-Event-ID'] = catalogVersion;
+            }
+            const response = await fetch(path, {
+                headers: headers,
+                signal: controller.signal
+            });
+            
+            if (!response.ok || !response.body) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            catalogStreamConnected = true;
+            catalogStreamRetryDelay = 5000;
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+                buffer += decoder.decode(value, { stream: true });
+                
+                // Messages are separated by a blank line; comment lines (": ping") are heartbeats
+                let separator;
+                while ((separator = buffer.indexOf('\n\n')) !== -1) {
+                    const message = buffer.slice(0, separator);
+                    buffer = buffer.slice(separator + 2);
                     
-                    if (hasChanges) {
-                        // Products data changed, refreshing product grid
-                        
-                        // 🔄 REFRESH PRODUCT GRID IF ON CATEGORY SCREEN
-                        const productsContainer = document.getElementById('products-container');
-                        if (productsContainer && !productsContainer.classList.contains('hidden')) {
-                            // User is on a category screen, refresh the product grid
-                            const currentCategory = localStorage.getItem('lastProductCategory');
-                            if (currentCategory) {
-                                // Refreshing product grid for category
-                                await loadProducts(currentCategory);
-                            }
+                    let eventId = '';
+                    let eventName = 'message';
+                    let eventData = '';
+                    for (const line of message.split('\n')) {
+                        if (line.startsWith('id: ')) {
+                            eventId = line.slice(4);
+                        } else if (line.startsWith('event: ')) {
+                            eventName = line.slice(7);
+                        } else if (line.startsWith('data: ')) {
+                            eventData = line.slice(6);
+                        } else if (line.startsWith('retry: ')) {
+                            catalogStreamRetryDelay = parseInt(line.slice(7), 10) || catalogStreamRetryDelay;
                         }
-                        
-                        // Update previous data
-                        previousProductsData = JSON.parse(JSON.stringify(newProductsData));
-                    } else {
-                        // No changes in products data, skipping grid refresh
                     }
-                } catch (error) {
-                    console.warn('Auto-refresh failed:', error);
+                    
+                    if (eventId) {
+                        await handleCatalogEvent(eventName, eventData, eventId);
+                    }
                 }
             }
-        }, 60000); // 1 minute
-        
-        // Auto-refresh setup: Cart will refresh every minute when active, grid only when changes detected
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.warn('Catalog event stream failed, falling back to polling:', error);
+            }
+        } finally {
+            catalogStreamConnected = false;
+            if (catalogStreamController === controller) {
+                catalogStreamController = null;
+                if (!document.hidden) {
+                    // Reconnect with backoff; polling covers the gap
+                    setTimeout(subscribeCatalogEvents, catalogStreamRetryDelay);
+                    catalogStreamRetryDelay = Math.min(catalogStreamRetryDelay * 2, 60000);
+                }
+            }
+        }
+    }
+    
+    function unsubscribeCatalogEvents() {
+        if (catalogStreamController) {
+            const controller = catalogStreamController;
+            catalogStreamController = null;
+            controller.abort();
+        }
     }
     
     // Function to check if products data has changed
@@ -1716,14 +1949,18 @@ document.addEventListener('DOMContentLoaded', async () => {
     
     // Initialize auto-refresh
     setupAutoRefresh();
+    subscribeCatalogEvents();
     
     // Handle page visibility changes to pause/resume auto-refresh
     document.addEventListener('visibilitychange', () => {
         if (document.hidden) {
             console.log('📱 App hidden, pausing auto-refresh');
+            unsubscribeCatalogEvents(); // Hidden WebViews should not hold server connections
         } else {
             console.log('📱 App visible, resuming auto-refresh');
             setupAutoRefresh(); // Restart interval when app becomes visible
+            refreshProducts(); // Catch up on updates missed while hidden
+            subscribeCatalogEvents();
         }
     });
     
@@ -2092,9 +2329,9 @@ document.addEventListener('DOMContentLoaded', async () => {
                 const categoryDisplayName = categoryInfo.name;
                 const categoryIcon = categoryInfo.icon;
 
-                const categoryImageUrl = (productsData[category.key] && productsData[category.key].length > 0)
-                    ? productsData[category.key][0].image_url
-                    : 'https://placehold.co/300x200/cccccc/333333?text=No+Image';
+                const categoryImageUrl = category.image || ((productsData[category.key] && productsData[category.key].length > 0)
+                    ? productImageSrc(productsData[category.key][0], 'grid')
+                    : 'https://placehold.co/300x200/cccccc/333333?text=No+Image');
 
                 const categoryCard = document.createElement('div');
                 categoryCard.className = 'category-card-item';
@@ -2169,7 +2406,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             productCard.innerHTML = `
                 <div class="product-image-container">
-                    <img src="${product.image_url || 'https://placehold.co/300x225/e0e0e0/555?text=Нет+фото'}" 
+                    <img src="${productImageSrc(product, 'grid') || 'https://placehold.co/300x225/e0e0e0/555?text=Нет+фото'}" 
                          alt="${product.name}" 
                          class="product-image clickable-image" 
                          data-product-id="${product.id}"
@@ -2177,7 +2414,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                          onerror="this.onerror=null;this.src='https://placehold.co/300x225/e0e0e0/555?text=Нет+фото';">
                     <div class="product-vegan-icon" style="display: ${product.for_vegans && product.for_vegans !== 'N/A' ? 'block' : 'none'};">
                         <svg class="svg svg-vegan">
-                            <use xlink:href="sprite.svg#vegan"></use>
+                            <use xlink:href="${SPRITE_URL}#vegan"></use>
                         </svg>
                     </div>
                 </div>
@@ -2424,7 +2661,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                 <div class="cart-item-image-container" 
                      style="cursor: ${isAvailable ? 'pointer' : 'default'};" 
                      onclick="${isAvailable ? `showProductScreen('${item.id}', '${productCategory}')` : 'return false;'}">
-                    <img src="${item.image_url || 'https://placehold.co/80x80/cccccc/333333?text=No+Image'}" 
+                    <img src="${productImageSrc(item, 'grid') || 'https://placehold.co/80x80/cccccc/333333?text=No+Image'}" 
                          alt="${item.name}" class="cart-item-image"
                          onerror="this.onerror=null;this.src='https://placehold.co/80x80/cccccc/333333?text=No+Image';">
                     ${!isAvailable ? '<div class="unavailable-label">Недоступен</div>' : ''}
@@ -2455,7 +2692,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                         </div>
                         <button class="btn--noborder bgc-t fc-1 h-fc h-fc-acc-1 pr-0 remove-btn" data-product-id="${item.id}" type="button">
                             <svg class="svg svg-as_close fz-125">
-                                <use xlink:href="#as_close"></use>
+                                <use xlink:href="${SPRITE_URL}#as_close"></use>
                             </svg>
                         </button>
                     </div>
@@ -2567,7 +2804,7 @@ document.addEventListener('DOMContentLoaded', async () => {
         errorContainer.innerHTML = `
             <div class="alert alert-danger d-flex align-items-center" role="alert">
                 <svg class="bi flex-shrink-0 me-2" width="24" height="24" role="img" aria-label="Danger:">
-                    <use xlink:href="#exclamation-triangle-fill"/>
+                    <use xlink:href="${SPRITE_URL}#exclamation-triangle-fill"/>
                 </svg>
                 <div>
                     Удалите недоступные товары из корзины
@@ -3344,7 +3581,7 @@ function addErrorClearingListeners() {
 
     // Wait for background image to load
     const img = new Image();
-            img.src = '/bot-app/images/Hleb.jpg?v=1.3.102&t=1756284000';
+            img.src = assetUrl('images/Hleb.jpg');
     // Safety timeout in case onload never fires
     const loadingSafetyTimeout = setTimeout(() => {
         console.warn('Loading safety timeout reached. Proceeding to initial view.');
@@ -3451,7 +3688,7 @@ function addErrorClearingListeners() {
 
         // Формируем HTML для экрана продукта
         let screenHTML = `
-            <img src="${product.image_url || 'https://placehold.co/400x300/e0e0e0/555?text=Нет+фото'}" 
+            <img src="${productImageSrc(product, 'detail') || 'https://placehold.co/400x300/e0e0e0/555?text=Нет+фото'}" 
                  alt="${product.name}" 
                  class="product-screen-image" 
                  onerror="this.onerror=null;this.src='https://placehold.co/400x300/e0e0e0/555?text=Нет+фото';">
@@ -3510,7 +3747,7 @@ function addErrorClearingListeners() {
                             <div class="vegan fz-100">
                                 <span class="vegan-label">Подходит веганам</span>
                                 <svg class="svg svg-vegan fz-150 ml-50">
-                                    <use xlink:href="sprite.svg#vegan"></use>
+                                    <use xlink:href="${SPRITE_URL}#vegan"></use>
                                 </svg>
                             </div>
                         </div>`;
@@ -0,0 +1,198 @@
+"""
+API Worker Processes
+Runs the AioHTTP API in several processes bound to one port with SO_REUSEPORT.
+
+Every worker builds its own catalog snapshot and watches the products file,
+so a parser update (written atomically with os.replace) reaches all workers
+within CATALOG_RELOAD_INTERVAL. The supervisor lives in the bot process,
+which keeps Telegram polling in exactly one place.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+from bot.config import get_config
+from bot.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# How often the supervisor checks that workers are alive (seconds)
+WORKER_CHECK_INTERVAL = 1.0
+# A worker that dies sooner than this after start counts as a crash loop
+WORKER_MIN_UPTIME = 5.0
+# Restart delay doubles on every quick crash up to this limit (seconds)
+WORKER_MAX_RESTART_DELAY = 30.0
+# How long a worker gets to finish in-flight requests on shutdown (seconds)
+WORKER_STOP_TIMEOUT = 10.0
+
+
+def reuse_port_supported() -> bool:
+    """SO_REUSEPORT is available on Linux and BSD, not on Windows."""
+    return hasattr(socket, 'SO_REUSEPORT')
+
+
+def effective_worker_count(requested: int) -> int:
+    """Number of API processes to run; falls back to 1 without SO_REUSEPORT."""
+    if requested > 1 and not reuse_port_supported():
+        logger.warning("Workers: SO_REUSEPORT недоступен на этой платформе, запускаем один процесс API")
+        return 1
+    return max(requested, 1)
+
+
+async def _serve_api(host: str, port: int):
+    # Imported here so the supervisor process does not load the API module twice
+    from bot.api_server import setup_api_server
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    # A supervisor killed without a chance to stop us must not leave orphans holding the port
+    parent_pid = os.getppid()
+
+    async def watch_parent():
+        while os.getppid() == parent_pid:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+        logger.warning("Workers: процесс-супервизор завершился, останавливаем процесс API")
+        stop_event.set()
+
+    runner = await setup_api_server()
+    site = web.TCPSite(runner, host, port, reuse_port=True)
+    await site.start()
+    logger.info(f"Workers: процесс API слушает http://{host}:{port}")
+    parent_watch_task = asyncio.create_task(watch_parent())
+    try:
+        await stop_event.wait()
+    finally:
+        parent_watch_task.cancel()
+        await runner.cleanup()
+
+
+def serve_api_worker(host: str, port: int):
+    """Entry point of one worker process."""
+    setup_logging()
+    asyncio.run(_serve_api(host, port))
+
+
+class _WorkerSlot:
+    __slots__ = ('process', 'started_at', 'restart_delay', 'restart_at')
+
+    def __init__(self):
+        self.process = None
+        self.started_at = 0.0
+        self.restart_delay = WORKER_CHECK_INTERVAL
+        self.restart_at = 0.0
+
+
+class WorkerSupervisor:
+    """Starts worker processes and restarts the ones that exit."""
+
+    def __init__(self, workers: int, target: Callable = serve_api_worker, args: Tuple = ()):
+        self.workers = workers
+        self.target = target
+        self.args = args
+        # spawn: forking a process that already runs an event loop and the bot session is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self._slots: Dict[int, _WorkerSlot] = {index: _WorkerSlot() for index in range(workers)}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def _spawn(self, index: int):
+        slot = self._slots[index]
+        process = self._context.Process(
+            target=self.target, args=self.args, name=f"api-worker-{index}", daemon=True
+        )
+        process.start()
+        slot.process = process
+        slot.started_at = time.monotonic()
+        logger.info(f"Workers: запущен процесс {process.name} (pid {process.pid})")
+
+    def check(self):
+        """Restart workers that exited; quick crashes back off exponentially."""
+        now = time.monotonic()
+        for index, slot in self._slots.items():
+            process = slot.process
+            if process is not None and process.is_alive():
+                continue
+
+            if process is not None:
+                logger.error(f"Workers: процесс {process.name} (pid {process.pid}) завершился с кодом {process.exitcode}")
+                if now - slot.started_at < WORKER_MIN_UPTIME:
+                    slot.restart_delay = min(slot.restart_delay * 2, WORKER_MAX_RESTART_DELAY)
+                else:
+                    slot.restart_delay = WORKER_CHECK_INTERVAL
+                slot.restart_at = now + slot.restart_delay
+                process.close()
+                slot.process = None
+
+            if not self._stopping and now >= slot.restart_at:
+                self._spawn(index)
+
+    def alive(self) -> int:
+        """Number of running workers."""
+        return sum(1 for slot in self._slots.values() if slot.process is not None and slot.process.is_alive())
+
+    async def run(self):
+        while True:
+            self.check()
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+
+    def start(self) -> asyncio.Task:
+        """Spawn all workers and return the supervising task."""
+        if self._task is None:
+            self._stopping = False
+            for index in self._slots:
+                self._spawn(index)
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self, timeout: float = WORKER_STOP_TIMEOUT):
+        """Ask workers to shut down gracefully, killing the ones that do not."""
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        processes = [slot.process for slot in self._slots.values() if slot.process is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            await asyncio.to_thread(process.join, max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"Workers: процесс {process.name} не остановился, завершаем принудительно")
+                process.kill()
+                await asyncio.to_thread(process.join)
+
+        for slot in self._slots.values():
+            slot.process = None
+        logger.info("Workers: все процессы API остановлены")
+
+
+def create_api_supervisor(host: str, port: int, workers: Optional[int] = None) -> Optional[WorkerSupervisor]:
+    """Supervisor for API_WORKERS processes, or None when the API runs in-process."""
+    config = get_config()
+    count = effective_worker_count(config.API_WORKERS if workers is None else workers)
+    if count <= 1:
+        return None
+    if config.ENABLE_RATE_LIMITING and config.RATE_LIMIT_BACKEND != 'sqlite':
+        logger.warning(
+            "Workers: RATE_LIMIT_BACKEND=memory - каждый процесс считает лимиты отдельно, "
+            "для общих лимитов используйте RATE_LIMIT_BACKEND=sqlite"
+        )
+    return WorkerSupervisor(count, args=(host, port))
@@ -8,7 +8,6 @@ import asyncio
 import logging
 import os
 import sys
-import json
 import time
 from datetime import datetime
 from pathlib import Path
@@ -16,13 +15,12 @@ from pathlib import Path
 # Добавляем корневую директорию в путь для импортов
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from bot import json_codec
 from bot.parser import main as parser_main
+from bot.logging_setup import setup_logging
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-)
+# Настройка логирования: запись в отдельном потоке, JSON, маскирование телефонов и email
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Файл для управления состоянием job
@@ -50,15 +48,14 @@ class ParserJobController:
                 "last_error": None,
                 "created_at": datetime.now().isoformat()
             }
-            with open(self.control_file, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=2, ensure_ascii=False)
+            with open(self.control_file, 'wb') as f:
+                json_codec.dump(default_config, f, pretty=True)
             logger.info(f"Создан файл управления: {self.control_file}")
     
     def load_config(self):
         """Загружает конфигурацию из файла"""
         try:
-            with open(self.control_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return json_codec.load_file(self.control_file)
         except Exception as e:
             logger.error(f"Ошибка загрузки конфигурации: {e}")
             return {"enabled": False}
@@ -66,8 +63,8 @@ class ParserJobController:
     def save_config(self, config):
         """Сохраняет конфигурацию в файл"""
         try:
-            with open(self.control_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
+            with open(self.control_file, 'wb') as f:
+                json_codec.dump(config, f, pretty=True)
         except Exception as e:
             logger.error(f"Ошибка сохранения конфигурации: {e}")
     
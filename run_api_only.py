@@ -7,21 +7,31 @@ import logging
 import os
 from aiohttp import web
 from bot.api_server import setup_api_server
+from bot.workers import create_api_supervisor
+from bot.logging_setup import setup_logging
 
-# Настраиваем логирование
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Настраиваем логирование: запись в отдельном потоке, чтобы не задерживать обработку запросов
+setup_logging()
 logger = logging.getLogger(__name__)
 
 async def main():
     """Запускаем только API сервер"""
     logger.info("Запуск API сервера...")
-    
+    port = int(os.environ.get("PORT", 8080))
+
+    # API_WORKERS > 1: несколько процессов на одном порту (SO_REUSEPORT)
+    supervisor = create_api_supervisor('0.0.0.0', port)
+    if supervisor is not None:
+        logger.info(f"API сервер запускается в {supervisor.workers} процессах на порту {port}")
+        try:
+            await supervisor.start()
+        finally:
+            await supervisor.stop()
+            logger.info("API сервер остановлен.")
+        return
+
     # Настраиваем API сервер
     runner = await setup_api_server()
-    port = int(os.environ.get("PORT", 8080))
     site = web.TCPSite(runner, '0.0.0.0', port)
     
     # Запускаем сервер
@@ -13,12 +13,10 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from bot.parser import main as parser_main
+from bot.logging_setup import setup_logging
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-)
+# Настройка логирования: запись в отдельном потоке, JSON, маскирование телефонов и email
+setup_logging()
 logger = logging.getLogger(__name__)
 
 async def main():
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+JSON Benchmark - Compare the old json-module call sites with bot.json_codec
+
+Runs on the real catalog (data/products_scraped.json by default) and prints
+the time per operation before and after. "after" uses whichever backend
+bot.json_codec picked: install orjson to see its numbers.
+
+Usage:
+    python3 scripts/bench_json.py [path/to/products.json] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot import json_codec  # noqa: E402
+
+DEFAULT_CATALOG = Path(__file__).parent.parent / "data" / "products_scraped.json"
+
+
+def build_cases(catalog_path: Path, temp_dir: str):
+    """(name, before, after) pairs mirroring the call sites json_codec replaced."""
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    products = [product for category in catalog.values() for product in category]
+    cart = products[:5]
+    web_app_data = json.dumps({
+        "action": "checkout_order",
+        "order_details": {"firstName": "Иван", "lastName": "Петров", "phoneNumber": "+375291234567",
+                          "deliveryMethod": "courier", "address": "ул. Ленина, 1"},
+        "cart_items": [{"id": p.get("id"), "name": p.get("name"), "quantity": 2, "price": p.get("price")}
+                       for p in cart],
+        "total_amount": 42.5,
+    }, ensure_ascii=False)
+    error = {"error": "Product not found"}
+    out_path = os.path.join(temp_dir, "products.json")
+
+    def load_before():
+        with open(catalog_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load_after():
+        with open(catalog_path, 'rb') as f:
+            return json_codec.load(f)
+
+    def write_before():
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f, ensure_ascii=False, indent=4)
+
+    def write_after():
+        with open(out_path, 'wb') as f:
+            json_codec.dump(catalog, f)
+
+    return [
+        ("catalog load", load_before, load_after),
+        ("catalog serialize (snapshot)",
+         lambda: json.dumps(catalog, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+         lambda: json_codec.dumps(catalog)),
+        ("product serialize",
+         lambda: json.dumps(products[0], ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+         lambda: json_codec.dumps(products[0])),
+        ("error response body", lambda: json.dumps(error).encode('utf-8'), lambda: json_codec.dumps(error)),
+        # Parsed by the security middleware and again by the handler before; once now
+        ("web_app_data parse",
+         lambda: (json.loads(web_app_data), json.loads(web_app_data)),
+         lambda: json_codec.loads(web_app_data)),
+        ("catalog write (parser)", write_before, write_after),
+    ]
+
+
+def measure(func, repeat: int) -> float:
+    """Best time of `repeat` rounds, per call, in microseconds."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark JSON handling on the real catalog")
+    parser.add_argument("catalog", nargs="?", default=str(DEFAULT_CATALOG), help="products JSON file")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per operation (best is reported)")
+    args = parser.parse_args()
+
+    catalog_path = Path(args.catalog)
+    if not catalog_path.exists():
+        print(f"❌ Catalog file not found: {catalog_path}")
+        return 1
+
+    print(f"📦 Catalog: {catalog_path} ({catalog_path.stat().st_size // 1024} KB)")
+    print(f"⚙️  json_codec backend: {json_codec.BACKEND}")
+    print(f"{'operation':<30} {'before, µs':>12} {'after, µs':>12} {'speedup':>9}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, before, after in build_cases(catalog_path, temp_dir):
+            before_us = measure(before, args.repeat)
+            after_us = measure(after, args.repeat)
+            print(f"{name:<30} {before_us:>12.1f} {after_us:>12.1f} {before_us / after_us:>8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark - Where process start-up time goes
+
+Imports each entry module in a fresh interpreter under `python -X importtime`
+and reports the total import time and the heaviest imports. With --serve it
+also starts run_api_only.py and measures the time until the server answers
+/health (listening) and until /ready answers 200, i.e. until the catalog,
+which loads in the background, is in and the server takes traffic.
+
+Usage:
+    python3 scripts/bench_startup.py                      # bot.main, bot.api_server, parser_job
+    python3 scripts/bench_startup.py bot.api_server --top 20
+    python3 scripts/bench_startup.py --serve
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess  # nosec B404 - runs this repository's own modules
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).parent.parent
+DEFAULT_MODULES = ["bot.main", "bot.api_server", "parser_job"]
+
+
+def import_profile(module: str) -> Tuple[float, Dict[str, int]]:
+    """Import module in a fresh interpreter; returns (wall seconds, {module: cumulative µs})."""
+    started = time.perf_counter()
+    result = subprocess.run(  # nosec B603 - fixed argument list
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - started
+
+    # Children are printed before their parent, indented deeper
+    entries = []
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative_us)))
+
+    cumulative = {}
+    for index, (depth, name, micros) in enumerate(entries):
+        if name == module:
+            cumulative[name] = micros
+            for child_depth, child, child_micros in reversed(entries[:index]):
+                if child_depth <= depth:
+                    break
+                cumulative[child] = child_micros
+            break
+    return wall, cumulative
+
+
+def heaviest(cumulative: Dict[str, int], module: str, top: int) -> List[Tuple[str, int]]:
+    """Largest imports, skipping the module itself and submodules of already listed ones."""
+    listed: List[Tuple[str, int]] = []
+    for name, micros in sorted(cumulative.items(), key=lambda item: item[1], reverse=True):
+        if name == module or any(name.startswith(parent + ".") for parent, _ in listed):
+            continue
+        listed.append((name, micros))
+        if len(listed) == top:
+            break
+    return listed
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _status(port: int, path: str) -> int:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:  # nosec B310
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError):
+        return 0
+
+
+def time_to_ready(timeout: float = 30.0) -> Tuple[float, float]:
+    """Seconds from starting run_api_only.py until it answers at all, and until /ready returns 200."""
+    port = free_port()
+    env = {**os.environ, "PORT": str(port), "API_WORKERS": "1", "CATALOG_RELOAD_INTERVAL": "0"}
+    started = time.perf_counter()
+    process = subprocess.Popen(  # nosec B603 - fixed argument list
+        [sys.executable, "run_api_only.py"], cwd=ROOT_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    listening = None
+    try:
+        while time.perf_counter() - started < timeout:
+            if listening is None and _status(port, "/health") == 200:
+                listening = time.perf_counter() - started
+            if listening is not None and _status(port, "/ready") == 200:
+                return listening, time.perf_counter() - started
+            if process.poll() is not None:
+                raise RuntimeError(f"run_api_only.py exited with code {process.returncode}")
+            time.sleep(0.02)
+        raise TimeoutError(f"/ready did not answer 200 within {timeout:.0f}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure import and start-up time")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="modules to import")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per module (median is reported)")
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    parser.add_argument("--serve", action="store_true", help="also measure time until /ready")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        wall = statistics.median(run[0] for run in runs)
+        cumulative = min((run[1] for run in runs), key=lambda profile: profile.get(module, 0))
+        print(f"\n📦 {module}: import {cumulative.get(module, 0) / 1000:.0f} ms, process {wall * 1000:.0f} ms")
+        for name, micros in heaviest(cumulative, module, args.top):
+            print(f"   {micros / 1000:>8.1f} ms  {name}")
+
+    if args.serve:
+        runs = [time_to_ready() for _ in range(args.repeat)]
+        listening = statistics.median(run[0] for run in runs)
+        ready = statistics.median(run[1] for run in runs)
+        print(f"\n🚦 run_api_only.py: listening after {listening * 1000:.0f} ms, ready after {ready * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
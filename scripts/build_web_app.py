@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Web App Build - Minified, purged and precompressed assets for production
+
+Builds bot/web_app into an output directory (build/web_app by default):
+- main.min.css and style.css are merged into app.css, in the order index.html
+  links them, and selectors that never match anything in index.html or
+  script.js are dropped
+- CSS and JS are minified (comments and indentation removed; JS keeps its line
+  breaks, so automatic semicolon insertion works as before)
+- icons index.html uses are inlined into it, and sprite.svg keeps only the
+  symbols script.js loads (see svg_sprite.py)
+- index.html and CSS links are rendered with fingerprinted asset names,
+  exactly as the server would render them
+- every compressible file gets .gz and .br siblings, which the server sends
+  as they are instead of compressing at start-up
+
+Serve the result with WEB_APP_BUILD_DIR=build/web_app.
+
+Usage:
+    python3 scripts/build_web_app.py
+    python3 scripts/build_web_app.py --output /srv/bakery/web_app --keep-class swiper-
+"""
+
+import argparse
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from bot.http_cache import PrecompressedBody  # noqa: E402
+from bot.static_assets import ASSET_URL_PREFIX, COMPRESSIBLE_TYPES, StaticAssetCache, content_type_for  # noqa: E402
+from svg_sprite import SPRITE_NAME, apply as apply_sprite  # noqa: E402
+
+SOURCE_DIR = ROOT_DIR / "bot" / "web_app"
+DEFAULT_OUTPUT_DIR = ROOT_DIR / "build" / "web_app"
+
+BUNDLE_NAME = "app.css"
+# Files read to decide which CSS selectors are used
+PURGE_SOURCES = ("index.html", "script.js")
+# Not part of the Web App itself
+SKIPPED_FILES = {"openapi.yaml"}
+
+# Precompressed siblings are made once per build, so the slowest settings are fine
+BUILD_BROTLI_QUALITY = 11
+
+
+# ===== CSS =====
+
+def _css_tokens(css: str) -> Iterable[Tuple[str, str]]:
+    """Split CSS into ('string'|'comment'|'code', text) pieces."""
+    index, length = 0, len(css)
+    while index < length:
+        char = css[index]
+        if char in '"\'':
+            end = index + 1
+            while end < length and css[end] != char:
+                end += 2 if css[end] == '\\' else 1
+            yield 'string', css[index:end + 1]
+            index = end + 1
+        elif css.startswith('/*', index):
+            end = css.find('*/', index + 2)
+            end = length if end == -1 else end + 2
+            yield 'comment', css[index:end]
+            index = end
+        else:
+            end = index
+            while end < length and css[end] not in '"\'' and not css.startswith('/*', end):
+                end += 1
+            yield 'code', css[index:end]
+            index = end
+
+
+def license_comments(css: str) -> List[str]:
+    """/*! ... */ comments, which have to stay in the shipped file."""
+    return [text for kind, text in _css_tokens(css) if kind == 'comment' and text.startswith('/*!')]
+
+
+def minify_css(css: str) -> str:
+    """Drop comments and optional whitespace."""
+    # Code around a removed comment is joined before whitespace is squeezed
+    pieces: List[Tuple[str, str]] = []
+    for kind, text in _css_tokens(css):
+        if kind == 'comment':
+            continue
+        if kind == 'code' and pieces and pieces[-1][0] == 'code':
+            pieces[-1] = ('code', pieces[-1][1] + text)
+        else:
+            pieces.append((kind, text))
+
+    parts = []
+    for kind, text in pieces:
+        if kind == 'code':
+            text = re.sub(r'\s+', ' ', text)
+            text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+            text = re.sub(r'(:|\()\s+', r'\1', text)
+            text = re.sub(r'\s+\)', ')', text)
+        parts.append(text)
+    result = ''.join(parts)
+    return re.sub(r';}', '}', result).strip() + '\n'
+
+
+def _split_top_level(text: str, separator: str) -> List[str]:
+    """Split on separator outside parentheses, brackets and strings."""
+    parts, depth, current, quote = [], 0, [], None
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append(''.join(current))
+    return parts
+
+
+def parse_css_blocks(css: str) -> List[Tuple[str, Optional[str]]]:
+    """Top-level (prelude, body) pairs; body is None for statements like @import."""
+    blocks, index, length = [], 0, len(css)
+    while index < length:
+        depth, quote, start = 0, None, index
+        prelude_end = None
+        while index < length:
+            char = css[index]
+            if quote:
+                if char == '\\':
+                    index += 1
+                elif char == quote:
+                    quote = None
+            elif char in '"\'':
+                quote = char
+            elif char == '{':
+                if depth == 0:
+                    prelude_end = index
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+            elif char == ';' and depth == 0:
+                break
+            index += 1
+        if prelude_end is None:
+            statement = css[start:index + 1].strip()
+            if statement and statement != ';':
+                blocks.append((statement, None))
+        else:
+            blocks.append((css[start:prelude_end].strip(), css[prelude_end + 1:index]))
+        index += 1
+    return blocks
+
+
+def used_names(texts: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+    """Words that may be class or id names, and prefixes of names built at runtime ('size-' + x)."""
+    words: Set[str] = set()
+    for text in texts:
+        words.update(re.findall(r'[A-Za-z_][\w-]*', text))
+    prefixes = {word for word in words if word.endswith('-') and len(word) > 2}
+    return words, prefixes
+
+
+def _selector_names(selector: str) -> Set[str]:
+    # Attribute values and :not()/:is()/:has() arguments do not have to be present for a match
+    selector = re.sub(r'\[[^\]]*\]', '', selector)
+    selector = re.sub(r':(?:not|is|where|has|matches|-webkit-any|-moz-any)\([^)]*\)', '', selector)
+    return set(re.findall(r'[.#](-?[_A-Za-z][\w-]*)', selector))
+
+
+def selector_is_used(selector: str, words: Set[str], prefixes: Set[str]) -> bool:
+    """True unless the selector needs a class or id that never appears in the sources."""
+    return all(name in words or any(name.startswith(prefix) for prefix in prefixes)
+               for name in _selector_names(selector))
+
+
+# At-rules whose body is a list of style rules
+NESTED_AT_RULES = ('@media', '@supports', '@layer', '@container', '@document')
+
+
+def purge_css(css: str, words: Set[str], prefixes: Set[str]) -> str:
+    """Drop style rules whose selectors cannot match; @font-face, @keyframes etc. are kept."""
+    output = []
+    for prelude, body in parse_css_blocks(css):
+        if body is None:
+            output.append(prelude if prelude.endswith(';') else prelude + ';')
+        elif prelude.startswith(NESTED_AT_RULES):
+            inner = purge_css(body, words, prefixes)
+            if inner.strip():
+                output.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith('@'):
+            output.append(f"{prelude}{{{body}}}")
+        else:
+            selectors = [selector.strip() for selector in _split_top_level(prelude, ',')]
+            kept = [selector for selector in selectors if selector_is_used(selector, words, prefixes)]
+            if kept:
+                output.append(f"{','.join(kept)}{{{body}}}")
+    return '\n'.join(output)
+
+
+def bundle_css(stylesheets: List[str]) -> str:
+    """Concatenate stylesheets; @charset/@import must come first, so they are moved up."""
+    imports, rules = [], []
+    for css in stylesheets:
+        for prelude, body in parse_css_blocks(css):
+            if body is None and prelude.startswith(('@import', '@charset')):
+                imports.append(prelude if prelude.endswith(';') else prelude + ';')
+            elif body is None:
+                rules.append(prelude if prelude.endswith(';') else prelude + ';')
+            else:
+                rules.append(f"{prelude}{{{body}}}")
+    return '\n'.join(imports + rules)
+
+
+# ===== JS =====
+
+# After these tokens a '/' starts a regular expression, not a division
+_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'instanceof', 'new', 'delete',
+                   'void', 'throw', 'yield', 'await', 'of'}
+_IDENT = re.compile(r'[A-Za-z0-9_$]')
+
+
+def _regex_allowed(previous: str) -> bool:
+    if not previous:
+        return True
+    if previous[-1] in '(,=:[!&|?{};+-*%<>~^':
+        return True
+    word = re.search(r'[A-Za-z_$][\w$]*$', previous)
+    return bool(word and word.group(0) in _REGEX_KEYWORDS)
+
+
+def minify_js(source: str) -> str:
+    """Remove comments, indentation and blank lines; strings, templates and regexes are untouched.
+
+    Line breaks are kept except after '{', ';' and ',' and before '}', where
+    automatic semicolon insertion cannot depend on them.
+    """
+    out: List[str] = []
+    # Open template literals: brace depth of the ${ } expression each one is in
+    template_depths: List[int] = []
+    depth = 0
+    index, length = 0, len(source)
+    pending_space = pending_newline = False
+
+    def emitted() -> str:
+        return out[-1] if out else ''
+
+    def emit(text: str):
+        nonlocal pending_space, pending_newline
+        last = emitted()[-1:] if out else ''
+        first = text[:1]
+        if pending_newline and last and last not in '{;,' and first != '}':
+            out.append('\n')
+        elif (pending_space or pending_newline) and last and (
+                (_IDENT.match(last) and _IDENT.match(first))
+                or (last in '+-/' and first == last)
+                or (last.isdigit() and first == '.')):
+            out.append(' ')
+        pending_space = pending_newline = False
+        out.append(text)
+
+    def read_template(start: int) -> int:
+        """Emit template text from start (after a backtick or '}') up to the closing backtick or '${'."""
+        end = start
+        while end < length:
+            if source[end] == '\\':
+                end += 2
+                continue
+            if source[end] == '`':
+                out.append(source[start:end + 1])
+                return end + 1
+            if source.startswith('${', end):
+                out.append(source[start:end + 2])
+                template_depths.append(depth)
+                return end + 2
+            end += 1
+        out.append(source[start:])
+        return length
+
+    while index < length:
+        char = source[index]
+        if char in ' \t\r\f\v':
+            pending_space = True
+            index += 1
+        elif char == '\n':
+            pending_newline = True
+            index += 1
+        elif source.startswith('//', index):
+            end = source.find('\n', index)
+            index = length if end == -1 else end
+        elif source.startswith('/*', index):
+            end = source.find('*/', index + 2)
+            index = length if end == -1 else end + 2
+            pending_space = True
+        elif char in '"\'':
+            end = index + 1
+            while end < length and source[end] != char and source[end] != '\n':
+                end += 2 if source[end] == '\\' else 1
+            emit(source[index:end + 1])
+            index = end + 1
+        elif char == '`':
+            emit('`')
+            index = read_template(index + 1)
+        elif char == '/' and _regex_allowed(''.join(out[-3:]).rstrip()):
+            end, in_class = index + 1, False
+            while end < length and source[end] != '\n':
+                if source[end] == '\\':
+                    end += 2
+                    continue
+                if source[end] == '[':
+                    in_class = True
+                elif source[end] == ']':
+                    in_class = False
+                elif source[end] == '/' and not in_class:
+                    break
+                end += 1
+            end += 1
+            while end < length and source[end].isalpha():
+                end += 1
+            emit(source[index:end])
+            index = end
+        elif char == '{':
+            depth += 1
+            emit(char)
+            index += 1
+        elif char == '}':
+            if template_depths and template_depths[-1] == depth:
+                # End of a ${ } expression: back to template text
+                template_depths.pop()
+                out.append('}')
+                pending_space = pending_newline = False
+                index = read_template(index + 1)
+            else:
+                depth -= 1
+                emit(char)
+                index += 1
+        else:
+            match = re.compile(r'[A-Za-z0-9_$.]+|.').match(source, index)
+            emit(match.group(0))
+            index = match.end()
+    return ''.join(out).strip() + '\n'
+
+
+# ===== BUILD =====
+
+STYLESHEET_LINK = re.compile(r'[ \t]*<link\b[^>]*\brel="stylesheet"[^>]*>[ \t]*\n?')
+
+
+def _stylesheet_href(link: str) -> Optional[str]:
+    match = re.search(r'\bhref="([^"]+)"', link)
+    if not match:
+        return None
+    href = match.group(1).split('?')[0]
+    if href.startswith(ASSET_URL_PREFIX):
+        return href[len(ASSET_URL_PREFIX):]
+    return None if '//' in href else href
+
+
+def local_stylesheets(html: str) -> List[str]:
+    """Local stylesheets in the order index.html links them."""
+    return [href for href in map(_stylesheet_href, STYLESHEET_LINK.findall(html)) if href]
+
+
+def link_bundle(html: str, stylesheets: List[str], bundle_name: str) -> str:
+    """Replace the links to the bundled stylesheets with one link to the bundle."""
+    replaced = False
+
+    def replace(match: re.Match) -> str:
+        nonlocal replaced
+        if _stylesheet_href(match.group(0)) not in stylesheets:
+            return match.group(0)
+        if replaced:
+            return ''
+        replaced = True
+        indent = re.match(r'[ \t]*', match.group(0)).group(0)
+        return f'{indent}<link rel="stylesheet" href="{ASSET_URL_PREFIX}{bundle_name}">\n'
+
+    return STYLESHEET_LINK.sub(replace, html)
+
+
+def build(source_dir: Path, output_dir: Path, keep: Iterable[str] = ()) -> List[Tuple[str, int, int]]:
+    """Build source_dir into output_dir. Returns (name, source bytes, built bytes) per file."""
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+
+    html = (source_dir / "index.html").read_text(encoding='utf-8')
+    stylesheets = local_stylesheets(html)
+    report = []
+
+    # Merged, purged and minified stylesheet
+    words, prefixes = used_names((source_dir / name).read_text(encoding='utf-8') for name in PURGE_SOURCES)
+    words.update(keep)
+    prefixes.update(name for name in keep if name.endswith('-'))
+    css_sources = [(source_dir / name).read_text(encoding='utf-8') for name in stylesheets]
+    # Comments go first: a quote or brace inside one would confuse the rule parser
+    bundle = minify_css(purge_css(bundle_css([minify_css(css) for css in css_sources]), words, prefixes))
+    licenses = [comment for css in css_sources for comment in license_comments(css)]
+    bundle = ''.join(comment + '\n' for comment in licenses) + bundle
+    (output_dir / BUNDLE_NAME).write_text(bundle, encoding='utf-8')
+    report.append((BUNDLE_NAME, sum(len(css.encode('utf-8')) for css in css_sources), len(bundle.encode('utf-8'))))
+
+    page = link_bundle(html, stylesheets, BUNDLE_NAME)
+    # Critical icons inlined into the page, the rest in a subset sprite
+    sprite_path = source_dir / SPRITE_NAME
+    if sprite_path.is_file():
+        sprite = sprite_path.read_text(encoding='utf-8')
+        page, subset = apply_sprite(page, (source_dir / "script.js").read_text(encoding='utf-8'), sprite)
+        (output_dir / SPRITE_NAME).write_text(subset, encoding='utf-8')
+        report.append((SPRITE_NAME, len(sprite.encode('utf-8')), len(subset.encode('utf-8'))))
+    (output_dir / "index.html").write_text(page, encoding='utf-8')
+
+    # Everything else, scripts minified
+    for path in sorted(source_dir.rglob('*')):
+        rel_path = path.relative_to(source_dir).as_posix()
+        if (not path.is_file() or rel_path in stylesheets or rel_path in SKIPPED_FILES
+                or rel_path in ("index.html", SPRITE_NAME)):
+            continue
+        target = output_dir / rel_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == '.js':
+            source = path.read_text(encoding='utf-8')
+            target.write_text(minify_js(source), encoding='utf-8')
+            report.append((rel_path, len(source.encode('utf-8')), target.stat().st_size))
+        elif path.suffix == '.css':
+            source = path.read_text(encoding='utf-8')
+            target.write_text(minify_css(source), encoding='utf-8')
+            report.append((rel_path, len(source.encode('utf-8')), target.stat().st_size))
+        else:
+            shutil.copyfile(path, target)
+
+    # Fingerprinted links, rendered the way the server renders them
+    assets = StaticAssetCache(str(output_dir))
+    assets.load()
+    for path in sorted(output_dir.rglob('*')):
+        rel_path = path.relative_to(output_dir).as_posix()
+        asset = assets.get(rel_path) if path.is_file() else None
+        if asset is None:
+            continue
+        if asset.dependencies:
+            path.write_bytes(asset.payload.body)
+        if rel_path == "index.html":
+            report.insert(0, (rel_path, len(html.encode('utf-8')), len(asset.payload.body)))
+        write_precompressed(path, asset.payload.body)
+    return report
+
+
+def write_precompressed(path: Path, body: bytes):
+    """Write .gz and .br siblings for compressible files where they are smaller."""
+    content_type = content_type_for(path.name)
+    if content_type not in COMPRESSIBLE_TYPES:
+        return
+    payload = PrecompressedBody(body, content_type, brotli_quality=BUILD_BROTLI_QUALITY)
+    if payload.gzip_body is not None:
+        path.with_name(path.name + '.gz').write_bytes(payload.gzip_body)
+    if payload.br_body is not None:
+        path.with_name(path.name + '.br').write_bytes(payload.br_body)
+
+
+def _compressed_size(path: Path, suffix: str) -> int:
+    sibling = path.with_name(path.name + suffix)
+    return sibling.stat().st_size if sibling.exists() else path.stat().st_size
+
+
+def print_report(report: List[Tuple[str, int, int]], output_dir: Path):
+    print(f"\n{'file':<24}{'source':>10}{'built':>10}{'gzip':>10}{'brotli':>10}")
+    totals = [0, 0, 0, 0]
+    for name, source_size, built_size in report:
+        path = output_dir / name
+        gzip_size, br_size = _compressed_size(path, '.gz'), _compressed_size(path, '.br')
+        print(f"{name:<24}{source_size / 1024:>9.1f}K{built_size / 1024:>9.1f}K"
+              f"{gzip_size / 1024:>9.1f}K{br_size / 1024:>9.1f}K")
+        for position, size in enumerate((source_size, built_size, gzip_size, br_size)):
+            totals[position] += size
+    print(f"{'first load (HTML+CSS+JS)':<24}" + ''.join(f"{size / 1024:>9.1f}K" for size in totals))
+    print(f"\n✅ {output_dir}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the Web App for production")
+    parser.add_argument("--source", type=Path, default=SOURCE_DIR, help="Web App sources")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_DIR, help="output directory (replaced)")
+    parser.add_argument("--keep-class", action="append", default=[], metavar="NAME",
+                        help="class/id never purged; a trailing '-' keeps every name with that prefix")
+    args = parser.parse_args()
+
+    report = build(args.source, args.output, args.keep_class)
+    print_report(report, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Order Export - Order history from the order journal as JSON Lines or CSV
+
+Reads data/orders.sqlite3 (or ORDER_JOURNAL_PATH) chunk by chunk, so memory
+use stays flat however long the history is. Safe to run next to the bot.
+
+Usage:
+    python3 scripts/export_orders.py > orders.jsonl
+    python3 scripts/export_orders.py --since 2025-09-01 --until 2025-10-01 --format csv -o september.csv
+"""
+
+import argparse
+import asyncio
+import csv
+import datetime
+import os
+import sys
+from pathlib import Path
+from typing import IO, Optional
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from bot import json_codec  # noqa: E402
+from bot.order_journal import DEFAULT_DB_PATH, OrderJournal  # noqa: E402
+
+CSV_COLUMNS = ("order_number", "created_at", "user_id", "total_amount", "delivery_method", "items")
+
+
+def _date(value: str) -> datetime.datetime:
+    return datetime.datetime.strptime(value, "%Y-%m-%d")
+
+
+def csv_row(order: dict) -> tuple:
+    """One flat CSV row per order; items as 'product_id x quantity' pairs."""
+    items = "; ".join(f"{item.get('id')} x {item.get('quantity')}" for item in order.get('cart_items') or ())
+    return (order.get('order_number'), order.get('created_at'), order.get('user_id'),
+            order.get('total_amount'), (order.get('order_details') or {}).get('deliveryMethod'), items)
+
+
+async def export(path: str, out: IO[str], output_format: str,
+                 since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None) -> int:
+    """Write orders placed in [since, until) to out. Returns the number of orders."""
+    journal = OrderJournal()
+    await journal.start(path)
+    count = 0
+    try:
+        writer = csv.writer(out) if output_format == "csv" else None
+        if writer:
+            writer.writerow(CSV_COLUMNS)
+        async for order in journal.stream(since, until):
+            if writer:
+                writer.writerow(csv_row(order))
+            else:
+                out.write(json_codec.dumps_str(order) + "\n")
+            count += 1
+    finally:
+        await journal.close()
+    return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export the order journal")
+    parser.add_argument("--db", default=os.environ.get("ORDER_JOURNAL_PATH") or DEFAULT_DB_PATH,
+                        help="order journal file")
+    parser.add_argument("--since", type=_date, help="first day, YYYY-MM-DD")
+    parser.add_argument("--until", type=_date, help="day after the last one, YYYY-MM-DD")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ No order journal at {args.db}", file=sys.stderr)
+        return 1
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        count = asyncio.run(export(args.db, out, args.format, args.since, args.until))
+    finally:
+        if args.output:
+            out.close()
+    print(f"✅ Exported {count} orders", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+SVG Sprite Tool - Which icons the Web App uses and where they come from
+
+Scans index.html and script.js for icon references:
+- `<use xlink:href="sprite.svg#id">` / `href="#id"` in index.html are the
+  critical icons: the build inlines them into the served page, so the first
+  screen needs no sprite request;
+- `${SPRITE_URL}#id` and createIcon*('id') calls in script.js are fetched from
+  the sprite when first shown, and only they are kept in the built sprite.
+
+The full library stays in bot/web_app/sprite.svg; the build
+(build_web_app.py) writes the subset sprite and the page with inlined icons.
+
+Usage:
+    python3 scripts/svg_sprite.py            # referenced, missing and unused symbols
+    python3 scripts/svg_sprite.py --check    # exit 1 if a referenced symbol is missing
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+ROOT_DIR = Path(__file__).parent.parent
+WEBAPP_DIR = ROOT_DIR / "bot" / "web_app"
+SPRITE_NAME = "sprite.svg"
+
+SYMBOL = re.compile(r'<symbol\b[^>]*\bid="(?P<id>[^"]+)"[^>]*>.*?</symbol>', re.S)
+ICON_ID = r'(?P<id>[A-Za-z][\w-]*)'
+# Icon references in markup and script
+REFERENCES = (
+    re.compile(r'(?:/bot-app/)?sprite\.svg#' + ICON_ID),
+    re.compile(r'\$\{SPRITE_URL\}#' + ICON_ID),
+    re.compile(r'<use\b[^>]*\bhref=["\']#' + ICON_ID),
+    re.compile(r'\bcreateIcon\w*\(\s*[\'"]' + ICON_ID + r'[\'"]'),
+)
+INLINE_SPRITE = ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                 'style="display:none" aria-hidden="true">{symbols}</svg>')
+
+
+def parse_symbols(svg: str) -> Dict[str, str]:
+    """{id: <symbol> markup} of a sprite."""
+    return {match.group('id'): match.group(0) for match in SYMBOL.finditer(svg)}
+
+
+def referenced_ids(text: str) -> Set[str]:
+    """Icon ids a page or script refers to."""
+    ids: Set[str] = set()
+    for pattern in REFERENCES:
+        ids.update(match.group('id') for match in pattern.finditer(text))
+    return ids
+
+
+def scan(webapp_dir: Path = WEBAPP_DIR) -> Tuple[Set[str], Set[str], Dict[str, str]]:
+    """(critical ids from index.html, ids used by script.js, symbols of sprite.svg)."""
+    html = (webapp_dir / "index.html").read_text(encoding='utf-8')
+    script = (webapp_dir / "script.js").read_text(encoding='utf-8')
+    symbols = parse_symbols((webapp_dir / SPRITE_NAME).read_text(encoding='utf-8'))
+    return referenced_ids(html), referenced_ids(script), symbols
+
+
+def missing_symbols(webapp_dir: Path = WEBAPP_DIR) -> List[str]:
+    """Referenced ids that sprite.svg does not define."""
+    critical, lazy, symbols = scan(webapp_dir)
+    return sorted((critical | lazy) - set(symbols))
+
+
+def subset_sprite(svg: str, ids: Iterable[str]) -> str:
+    """The sprite with only the given symbols, in their original order."""
+    keep = set(ids)
+    return SYMBOL.sub(lambda match: match.group(0) if match.group('id') in keep else '', svg)
+
+
+def inline_icons(html: str, symbols: Dict[str, str], ids: Iterable[str]) -> str:
+    """Put the given symbols into the page right after <body> and point their references there."""
+    ids = sorted(ids)
+    if not ids:
+        return html
+    inline = INLINE_SPRITE.format(symbols=''.join(symbols[icon_id] for icon_id in ids))
+    html = re.sub(r'(<body\b[^>]*>)', lambda match: match.group(1) + '\n' + inline, html, count=1)
+    pattern = re.compile(r'(?:/bot-app/)?sprite\.svg#(' + '|'.join(map(re.escape, ids)) + r')\b')
+    return pattern.sub(r'#\1', html)
+
+
+def apply(html: str, script: str, sprite: str) -> Tuple[str, str]:
+    """(page with the critical icons inlined, sprite reduced to what script.js loads)."""
+    symbols = parse_symbols(sprite)
+    critical = referenced_ids(html) & set(symbols)
+    lazy = referenced_ids(script) & set(symbols)
+    return inline_icons(html, symbols, critical), subset_sprite(sprite, lazy)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report SVG sprite usage of the Web App")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a referenced symbol is missing")
+    args = parser.parse_args()
+
+    critical, lazy, symbols = scan()
+    missing = sorted((critical | lazy) - set(symbols))
+    unused = sorted(set(symbols) - critical - lazy)
+    sprite = (WEBAPP_DIR / SPRITE_NAME).read_text(encoding='utf-8')
+
+    print(f"🎯 Inlined into index.html ({len(critical)}): {', '.join(sorted(critical)) or '-'}")
+    print(f"💤 Loaded from the sprite ({len(lazy)}): {', '.join(sorted(lazy)) or '-'}")
+    print(f"🗑️  Unused symbols ({len(unused)}): {', '.join(unused) or '-'}")
+    print(f"📦 sprite.svg: {len(sprite.encode('utf-8')) / 1024:.1f}K, "
+          f"subset {len(subset_sprite(sprite, lazy).encode('utf-8')) / 1024:.1f}K")
+    if missing:
+        print(f"❌ Referenced but not in sprite.svg: {', '.join(missing)}")
+        return 1 if args.check else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
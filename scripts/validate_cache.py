@@ -8,6 +8,8 @@ import sys
 from pathlib import Path
 from typing import List, Dict, Tuple
 
+from svg_sprite import missing_symbols
+
 class CacheValidator:
     """Validate cache version consistency"""
     
@@ -51,8 +53,35 @@ class CacheValidator:
             if not file_valid:
                 all_valid = False
         
+        if not self._validate_sprite():
+            all_valid = False
+        
         return all_valid
     
+    def _validate_sprite(self) -> bool:
+        """Check that every icon index.html and script.js use is defined in sprite.svg"""
+        try:
+            missing = missing_symbols(self.webapp_dir)
+        except OSError as e:
+            self.issues.append({
+                'file': str(self.webapp_dir / "sprite.svg"),
+                'type': 'read_error',
+                'message': f'Error reading file: {e}'
+            })
+            return False
+        
+        if missing:
+            self.issues.append({
+                'file': str(self.webapp_dir / "sprite.svg"),
+                'type': 'missing_symbol',
+                'message': f'Found {len(missing)} referenced icons not defined in the sprite',
+                'details': missing
+            })
+            return False
+        
+        print("✅ sprite.svg: all referenced icons defined")
+        return True
+    
     def _validate_file(self, file_path: Path) -> bool:
         """Validate a single file"""
         try:
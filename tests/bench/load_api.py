@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+API Load Generator
+Starts the API server (setup_api_server) in a separate process and drives it
+with HMAC-signed requests the way the Web App sends them, then reports
+requests per second and latency percentiles.
+
+Each run is done twice: with the per-IP rate limiter active (its limit raised
+so it counts every request but never rejects) and with it bypassed. The JSON
+report has a fixed layout and records the commit, so results from different
+commits can be diffed directly.
+
+Usage:
+    python -m tests.bench.load_api
+    python -m tests.bench.load_api --duration 20 --concurrency 100 --output bench.json
+    python -m tests.bench.load_api --rate-limit off
+"""
+
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess  # nosec B404 - reads the current git commit
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+from aiohttp import web
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot import json_codec  # noqa: E402
+from bot.api_server import generate_hmac_signature  # noqa: E402
+
+REPORT_SCHEMA = 1
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Limit used while the rate limiter is measured: every request is counted, none is rejected
+UNLIMITED = 10 ** 12
+
+# (name, method, path, signed, weight) - roughly what one Web App session requests
+DEFAULT_MIX: Tuple[Tuple[str, str, str, bool, int], ...] = (
+    ("products", "GET", "/bot-app/api/products", True, 30),
+    ("products_category", "GET", "/bot-app/api/products?category=category_bakery", True, 15),
+    ("categories", "GET", "/bot-app/api/categories", True, 20),
+    ("static_script", "GET", "/bot-app/script.js", False, 10),
+    ("static_style", "GET", "/bot-app/style.css", False, 10),
+    ("static_index", "GET", "/bot-app/", False, 10),
+    ("auth_token", "GET", "/bot-app/api/auth/token", False, 5),
+)
+BROWSER_HEADERS = {"Accept": "application/json", "Accept-Encoding": "gzip, deflate, br"}
+
+
+def fake_init_data(session_id: int) -> str:
+    """Telegram initData stand-in; the Web App signs requests with its own initData."""
+    return (f"query_id=AAH{session_id:08d}&user=%7B%22id%22%3A{100000 + session_id}%7D"
+            f"&auth_date={int(time.time())}&hash={session_id:064x}")
+
+
+def signed_headers(method: str, path: str, init_data: str) -> Dict[str, str]:
+    """X-Signature over METHOD:path:timestamp (path without the query), as script.js computes it."""
+    timestamp = str(int(time.time()))
+    signature = generate_hmac_signature(f"{method}:{path.split('?')[0]}:{timestamp}", init_data)
+    return {"X-Signature": signature, "X-Timestamp": timestamp, "X-Telegram-Init-Data": init_data}
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds, rounded so reports diff cleanly."""
+    values = sorted(latencies)
+    summary = {
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else 0.0,
+        "mean": sum(values) / len(values) if values else 0.0,
+    }
+    return {key: round(value * 1000, 3) for key, value in summary.items()}
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    bytes: int = 0
+
+    def record(self, status: int, elapsed: float, size: int):
+        self.latencies.append(elapsed)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        self.bytes += size
+
+
+# ===== SERVER =====
+
+def configure_rate_limiting(enabled: bool):
+    """Rate limiter on (limits raised so nothing is rejected) or bypassed entirely."""
+    from bot import api_server
+    from bot.config import config
+
+    config.ENABLE_RATE_LIMITING = enabled
+    if enabled:
+        api_server.RATE_LIMIT_REQUESTS_PER_HOUR = UNLIMITED
+        config.RATE_LIMIT_MAX_REQUESTS = UNLIMITED
+    else:
+        async def allow(ip_address: str) -> bool:
+            return True
+        api_server.check_rate_limit = allow
+
+
+async def start_server(port: int, rate_limit: bool, ready_timeout: float = 60) -> web.AppRunner:
+    """Run setup_api_server() on 127.0.0.1:port and wait until /ready reports the catalog loaded."""
+    from bot.api_server import setup_api_server
+
+    configure_rate_limiting(rate_limit)
+    runner = await setup_api_server()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    deadline = time.monotonic() + ready_timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            async with session.get(f"http://127.0.0.1:{port}/ready") as response:
+                if response.status == 200:
+                    return runner
+            if time.monotonic() > deadline:
+                await runner.cleanup()
+                raise RuntimeError(f"API not ready after {ready_timeout} s")
+            await asyncio.sleep(0.05)
+
+
+def _serve_process(port: int, rate_limit: bool, ready):
+    from bot.logging_setup import setup_logging
+
+    # Per-request logging would measure the log pipeline, not the API
+    setup_logging(level='WARNING', sampling='')
+
+    async def serve():
+        runner = await start_server(port, rate_limit)
+        ready.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(serve())
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ===== CLIENT =====
+
+async def run_load(base_url: str, duration: float, concurrency: int, warmup: float = 1.0,
+                   mix: Sequence[Tuple[str, str, str, bool, int]] = DEFAULT_MIX, seed: int = 1) -> Dict:
+    """Drive base_url with `concurrency` sessions for `duration` seconds after a warm-up."""
+    stats: Dict[str, EndpointStats] = {name: EndpointStats() for name, *_ in mix}
+    names = [entry[0] for entry in mix]
+    weights = [entry[4] for entry in mix]
+    by_name = {entry[0]: entry for entry in mix}
+    rng = random.Random(seed)
+    # Choices are drawn up front so every run (and commit) sends the same sequence
+    plan = rng.choices(names, weights=weights, k=4096)
+
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=False)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=timeout,
+                                     headers=BROWSER_HEADERS, auto_decompress=False) as session:
+        loop = asyncio.get_running_loop()
+        warmup_end = loop.time() + warmup
+        deadline = warmup_end + duration
+
+        async def user(session_id: int):
+            init_data = fake_init_data(session_id)
+            position = session_id * 97
+            while True:
+                now = loop.time()
+                if now >= deadline:
+                    return
+                name = plan[position % len(plan)]
+                position += 1
+                _, method, path, signed, _ = by_name[name]
+                headers = signed_headers(method, path, init_data) if signed else None
+                started = time.perf_counter()
+                try:
+                    async with session.request(method, path, headers=headers, allow_redirects=False) as response:
+                        body = await response.read()
+                        status = response.status
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if now >= warmup_end:
+                        stats[name].errors += 1
+                    continue
+                if now >= warmup_end:
+                    stats[name].record(status, time.perf_counter() - started, len(body))
+
+        await asyncio.gather(*(user(index) for index in range(concurrency)))
+
+    return summarize(stats, duration)
+
+
+def summarize(stats: Dict[str, EndpointStats], duration: float) -> Dict:
+    """Totals, throughput and latency percentiles, overall and per endpoint."""
+    all_latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    endpoints = {}
+    for name in sorted(stats):
+        endpoint = stats[name]
+        all_latencies.extend(endpoint.latencies)
+        for status, count in endpoint.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+        endpoints[name] = {
+            "requests": len(endpoint.latencies),
+            "errors": endpoint.errors,
+            "statuses": dict(sorted(endpoint.statuses.items())),
+            "bytes": endpoint.bytes,
+            "rps": round(len(endpoint.latencies) / duration, 1),
+            "latency_ms": latency_summary(endpoint.latencies),
+        }
+    return {
+        "requests": len(all_latencies),
+        "errors": sum(endpoint.errors for endpoint in stats.values()),
+        "statuses": dict(sorted(statuses.items())),
+        "rps": round(len(all_latencies) / duration, 1),
+        "latency_ms": latency_summary(all_latencies),
+        "endpoints": endpoints,
+    }
+
+
+async def bench(rate_limit: bool, duration: float, concurrency: int, warmup: float) -> Dict:
+    """One run against a freshly started server process."""
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    port = free_port()
+    process = context.Process(target=_serve_process, args=(port, rate_limit, ready), daemon=True)
+    process.start()
+    try:
+        if not await asyncio.to_thread(ready.wait, 60):
+            raise RuntimeError("API server did not start within 60 seconds")
+        return await run_load(f"http://127.0.0.1:{port}", duration, concurrency, warmup)
+    finally:
+        process.terminate()
+        process.join(10)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(  # nosec B603 B607 - fixed argument list
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(label: str, result: Dict):
+    latency = result["latency_ms"]
+    print(f"\n{label}: {result['requests']} requests, {result['rps']} req/s, errors {result['errors']}, "
+          f"statuses {result['statuses']}", file=sys.stderr)
+    print(f"  latency ms: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}",
+          file=sys.stderr)
+    for name, endpoint in result["endpoints"].items():
+        endpoint_latency = endpoint["latency_ms"]
+        print(f"  {name:<18} {endpoint['rps']:>8} req/s  p50 {endpoint_latency['p50']:>7}  "
+              f"p99 {endpoint_latency['p99']:>7}", file=sys.stderr)
+
+
+async def main_async(args) -> Dict:
+    modes = {"on": (True,), "off": (False,), "both": (True, False)}[args.rate_limit]
+    report = {
+        "schema": REPORT_SCHEMA,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "json_backend": json_codec.BACKEND,
+        "params": {"duration": args.duration, "concurrency": args.concurrency, "warmup": args.warmup},
+        "runs": {},
+    }
+    for rate_limit in modes:
+        label = "rate_limit_on" if rate_limit else "rate_limit_off"
+        result = await bench(rate_limit, args.duration, args.concurrency, args.warmup)
+        report["runs"][label] = result
+        print_summary(label, result)
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the API with signed Web App requests")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each run")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent client sessions")
+    parser.add_argument("--rate-limit", choices=("both", "on", "off"), default="both")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    encoded = json_codec.dumps(report, pretty=True)
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(encoded)
+    else:
+        sys.stdout.write(encoded.decode('utf-8'))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
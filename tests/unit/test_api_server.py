@@ -2,20 +2,29 @@ import unittest
 import asyncio
 import json
 import os
+import tempfile
+import threading
 from unittest.mock import AsyncMock, MagicMock, patch, Mock
 from aiohttp import web
-from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop
+from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop, make_mocked_request
+import time
 
 # Import the functions we want to test
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
+from bot import api_server, json_codec
+from bot.catalog import CatalogSnapshot, CatalogWatcher
+from bot.catalog_events import CatalogEventHub
 from bot.api_server import (
     load_products_data_for_api, get_products_for_webapp,
     get_categories_for_webapp, serve_main_app_page, setup_api_server,
     generate_hmac_signature, verify_hmac_signature, generate_auth_token,
-    check_rate_limit, get_auth_token
+    check_rate_limit, get_auth_token, get_catalog_snapshot, apply_products_data, HMAC_SECRET,
+    get_product_for_webapp, get_catalog_changes, search_products, stream_catalog_events, serve_product_image,
+    health_check, readiness_check, read_products_data, MAX_BATCH_PRODUCT_IDS
 )
+from bot.static_assets import StaticAssetCache
 
 
 class TestAPIServer(AioHTTPTestCase):
@@ -64,7 +73,7 @@ class TestAPIServer(AioHTTPTestCase):
 
     @patch('bot.api_server.PRODUCTS_DATA_FILE')
     @patch('builtins.open', create=True)
-    @patch('json.load')
+    @patch('bot.json_codec.load')
     async def test_load_products_data_for_api_success(self, mock_json_load, mock_open, mock_file_path):
         """Test successful loading of products data for API."""
         mock_file_path.return_value = "/test/path/products.json"
@@ -176,21 +185,24 @@ class TestAPIServer(AioHTTPTestCase):
 
         self.assertEqual(response.status, 500)
 
-    @patch('bot.api_server.WEB_APP_DIR')
-    @patch('os.path.join')
-    @patch('aiohttp.web.FileResponse')
-    async def test_serve_main_app_page_success(self, mock_file_response, mock_join, mock_web_app_dir):
-        """Test serving main app page successfully."""
-        mock_web_app_dir.return_value = "/test/web_app"
-        mock_join.return_value = "/test/web_app/index.html"
-        mock_file_response.return_value = web.Response(text="<html></html>")
+    async def test_serve_main_app_page_success(self):
+        """The page is served from the asset cache with fingerprinted asset URLs."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        with open(os.path.join(temp_dir.name, 'index.html'), 'w', encoding='utf-8') as f:
+            f.write('<link rel="stylesheet" href="/bot-app/style.css">')
+        with open(os.path.join(temp_dir.name, 'style.css'), 'w', encoding='utf-8') as f:
+            f.write('body{}')
+        cache = StaticAssetCache(temp_dir.name)
+        cache.load()
 
-        request = MagicMock()
-
-        response = await serve_main_app_page(request)
+        with patch('bot.api_server.static_assets', cache):
+            response = await serve_main_app_page(make_mocked_request('GET', '/bot-app/'))
 
-        mock_join.assert_called_once_with("/test/web_app", "index.html")
-        mock_file_response.assert_called_once_with("/test/web_app/index.html")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        fingerprint = cache.get('style.css').fingerprint
+        self.assertEqual(response.body.decode(), f'<link rel="stylesheet" href="/bot-app/style.{fingerprint}.css">')
 
     @patch('bot.api_server.load_products_data_for_api')
     @patch('aiohttp.web.Application')
@@ -285,17 +297,330 @@ class TestAPIServerErrorHandling(unittest.TestCase):
         with self.assertRaises(Exception):
             await get_categories_for_webapp(request)
 
-    @patch('bot.api_server.WEB_APP_DIR')
-    @patch('os.path.join')
-    async def test_serve_main_app_page_file_not_found(self, mock_join, mock_web_app_dir):
+    async def test_serve_main_app_page_file_not_found(self):
         """Test serving main app page when file not found."""
-        mock_web_app_dir.return_value = "/test/web_app"
-        mock_join.return_value = "/nonexistent/index.html"
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
 
-        request = MagicMock()
+        with patch('bot.api_server.static_assets', StaticAssetCache(temp_dir.name)):
+            with self.assertRaises(web.HTTPNotFound):
+                await serve_main_app_page(make_mocked_request('GET', '/bot-app/'))
+
+
+class TestCatalogResponses(unittest.IsolatedAsyncioTestCase):
+    """Test cases for pre-serialized catalog responses."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_products_data = {
+            "category_bakery": [
+                {"id": "49", "name": "Bread", "image_url": "bread.jpg", "category_name": "🥨 Выпечка"},
+                {"id": "68", "name": "Bun", "image_url": "bun.jpg", "category_name": "🥨 Выпечка"}
+            ]
+        }
 
-        with self.assertRaises(FileNotFoundError):
-            await serve_main_app_page(request)
+    async def test_catalog_reloads_are_applied_by_the_api_process_only(self):
+        """The snapshot listener is registered by setup_api_server, not on import."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        watcher = CatalogWatcher(os.path.join(temp_dir.name, 'products.json'), 0)
+        with patch('bot.api_server.catalog_watcher', watcher), \
+             patch('bot.api_server.load_products_data_for_api', AsyncMock()), \
+             patch('bot.api_server.ASSET_MANIFEST_FILE', os.path.join(temp_dir.name, 'asset-manifest.json')):
+            self.assertEqual(watcher._listeners, [])
+            runner = await setup_api_server()
+            await runner.cleanup()
+        self.assertEqual(watcher._listeners, [apply_products_data])
+
+    async def test_catalog_loads_in_background(self):
+        """The server is set up before the catalog is read; /ready waits for it."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        products_file = os.path.join(temp_dir.name, 'products.json')
+        with open(products_file, 'wb') as f:
+            json_codec.dump(self.test_products_data, f)
+
+        reading = threading.Event()
+        release = threading.Event()
+
+        def slow_read(path):
+            reading.set()
+            release.wait(5)
+            return read_products_data(path)
+
+        request = make_mocked_request('GET', '/ready')
+        with patch('bot.api_server.PRODUCTS_DATA_FILE', products_file), \
+             patch('bot.api_server.read_products_data', slow_read), \
+             patch('bot.api_server.ASSET_MANIFEST_FILE', os.path.join(temp_dir.name, 'asset-manifest.json')), \
+             patch('bot.api_server.catalog_watcher', CatalogWatcher(products_file, 0)), \
+             patch('bot.api_server.catalog_event_hub', CatalogEventHub(max_connections=1)), \
+             patch('bot.api_server.products_data', {}), \
+             patch('bot.api_server.catalog_snapshot', None), \
+             patch('bot.api_server.catalog_load_task', None):
+            runner = await setup_api_server()
+            try:
+                # The event loop keeps running while the file is read in a thread
+                self.assertTrue(await asyncio.to_thread(reading.wait, 5))
+                self.assertEqual((await readiness_check(request)).status, 503)
+                release.set()
+                await asyncio.wait_for(api_server.catalog_load_task, timeout=5)
+                self.assertEqual((await readiness_check(request)).status, 200)
+                self.assertEqual(get_catalog_snapshot().products_data, self.test_products_data)
+            finally:
+                release.set()
+                await runner.cleanup()
+
+    async def test_initial_load_does_not_overwrite_a_newer_reload(self):
+        """A watcher reload arriving while the initial snapshot is built is published last."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        products_file = os.path.join(temp_dir.name, 'products.json')
+        with open(products_file, 'wb') as f:
+            json_codec.dump(self.test_products_data, f)
+        newer_data = {"category_bakery": [{"id": "49", "name": "Новый", "price": "20"}]}
+
+        building = threading.Event()
+        release = threading.Event()
+
+        def slow_snapshot(data, *args):
+            if data is not newer_data:
+                building.set()
+                release.wait(5)
+            return CatalogSnapshot(data, *args)
+
+        with patch('bot.api_server.PRODUCTS_DATA_FILE', products_file), \
+             patch('bot.api_server.CatalogSnapshot', slow_snapshot), \
+             patch('bot.api_server.catalog_event_hub', CatalogEventHub(max_connections=1)), \
+             patch('bot.api_server.products_data', {}), \
+             patch('bot.api_server.catalog_snapshot', None):
+            load = asyncio.create_task(load_products_data_for_api())
+            try:
+                self.assertTrue(await asyncio.to_thread(building.wait, 5))
+                reload = asyncio.create_task(apply_products_data(newer_data, 2))
+                await asyncio.sleep(0.05)
+            finally:
+                release.set()
+            await asyncio.wait_for(asyncio.gather(load, reload), timeout=5)
+            self.assertIs(api_server.products_data, newer_data)
+            self.assertIs(api_server.catalog_snapshot.source, newer_data)
+
+    async def test_initial_load_validates_the_file(self):
+        """A products file without products is not published at startup."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        products_file = os.path.join(temp_dir.name, 'products.json')
+        with open(products_file, 'wb') as f:
+            json_codec.dump({"category_bakery": []}, f)
+
+        with patch('bot.api_server.PRODUCTS_DATA_FILE', products_file), \
+             patch('bot.api_server.catalog_event_hub', CatalogEventHub(max_connections=1)), \
+             patch('bot.api_server.products_data', {}), \
+             patch('bot.api_server.catalog_snapshot', None):
+            await load_products_data_for_api()
+            self.assertEqual(api_server.products_data, {})
+
+    def _signed_request(self, path, headers=None, match_info=None):
+        timestamp = str(int(time.time()))
+        signature = generate_hmac_signature(f"GET:{path.split('?')[0]}:{timestamp}", HMAC_SECRET)
+        request_headers = {'X-Signature': signature, 'X-Timestamp': timestamp}
+        request_headers.update(headers or {})
+        return make_mocked_request('GET', path, headers=request_headers, match_info=match_info or {})
+
+    async def test_products_etag_and_not_modified(self):
+        """Products are served with an ETag and revalidated with 304."""
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            response = await get_products_for_webapp(self._signed_request('/bot-app/api/products'))
+            self.assertEqual(response.status, 200)
+            self.assertEqual(json.loads(response.body), self.test_products_data)
+            etag = response.headers['ETag']
+
+            response = await get_products_for_webapp(self._signed_request(
+                '/bot-app/api/products?category=category_bakery'
+            ))
+            self.assertEqual(json.loads(response.body), self.test_products_data["category_bakery"])
+
+            response = await get_products_for_webapp(self._signed_request(
+                '/bot-app/api/products', {'If-None-Match': etag}
+            ))
+            self.assertEqual(response.status, 304)
+
+    async def test_product_by_id(self):
+        """A single product is served from the id index."""
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            response = await get_product_for_webapp(self._signed_request(
+                '/bot-app/api/products/68', match_info={'product_id': '68'}
+            ))
+            self.assertEqual(response.status, 200)
+            self.assertEqual(json.loads(response.body)["name"], "Bun")
+            self.assertIn('ETag', response.headers)
+
+            response = await get_product_for_webapp(self._signed_request(
+                '/bot-app/api/products/999', match_info={'product_id': '999'}
+            ))
+            self.assertEqual(response.status, 404)
+
+    async def test_product_by_id_requires_signature(self):
+        """The id endpoint is protected like the catalog."""
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            request = make_mocked_request('GET', '/bot-app/api/products/49', match_info={'product_id': '49'})
+            response = await get_product_for_webapp(request)
+            self.assertEqual(response.status, 403)
+
+    async def test_products_batch_by_ids(self):
+        """ids returns the known products in request order and lists unknown ids."""
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            response = await get_products_for_webapp(self._signed_request(
+                '/bot-app/api/products?ids=68,404,49,68'
+            ))
+            self.assertEqual(response.status, 200)
+            body = json.loads(response.body)
+            self.assertEqual([p["id"] for p in body["products"]], ["68", "49"])
+            self.assertEqual(body["missing"], ["404"])
+
+    async def test_products_batch_rejects_bad_ids(self):
+        """Empty or oversized id lists are rejected."""
+        too_many = ','.join(str(i) for i in range(MAX_BATCH_PRODUCT_IDS + 1))
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            for query in ('ids=', 'ids=,,', f'ids={too_many}'):
+                response = await get_products_for_webapp(self._signed_request(f'/bot-app/api/products?{query}'))
+                self.assertEqual(response.status, 400)
+
+    async def test_products_fields_and_pagination(self):
+        """fields projects products, limit/cursor page through a category."""
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            response = await get_products_for_webapp(self._signed_request(
+                '/bot-app/api/products?category=category_bakery&fields=id,price'
+            ))
+            self.assertEqual(json.loads(response.body), [{"id": "49"}, {"id": "68"}])
+
+            response = await get_products_for_webapp(self._signed_request(
+                '/bot-app/api/products?category=category_bakery&fields=id&limit=1'
+            ))
+            page = json.loads(response.body)
+            self.assertEqual(page["items"], [{"id": "49"}])
+
+            response = await get_products_for_webapp(self._signed_request(
+                f'/bot-app/api/products?category=category_bakery&fields=id&limit=1&cursor={page["next_cursor"]}'
+            ))
+            page = json.loads(response.body)
+            self.assertEqual(page, {"items": [{"id": "68"}], "next_cursor": None})
+
+    async def test_products_bad_query_rejected(self):
+        """Unknown fields, bad limits and cursors without a category are 400s."""
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            for query in ('fields=id,secret', 'fields=,', 'category=category_bakery&limit=0',
+                          'category=category_bakery&limit=abc', 'limit=10',
+                          'category=category_bakery&cursor=bm9wZQ'):
+                response = await get_products_for_webapp(self._signed_request(f'/bot-app/api/products?{query}'))
+                self.assertEqual(response.status, 400, query)
+
+    async def test_catalog_changes(self):
+        """Clients pass the version they have and get only what changed."""
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.products_data_version', None), \
+             patch('bot.api_server.catalog_snapshot', None), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            response = await get_products_for_webapp(self._signed_request('/bot-app/api/products'))
+            version = response.headers['X-Catalog-Version']
+
+            new_data = {"category_bakery": [dict(self.test_products_data["category_bakery"][0], price="20")]}
+            await apply_products_data(new_data)
+
+            response = await get_catalog_changes(self._signed_request(f'/bot-app/api/products/changes?since={version}'))
+            self.assertEqual(response.status, 200)
+            delta = json.loads(response.body)
+            self.assertFalse(delta["full"])
+            self.assertEqual(delta["removed"], [{"category": "category_bakery", "id": "68"}])
+            self.assertEqual(delta["changed"][0]["fields"], {"price": "20"})
+            self.assertEqual(response.headers['X-Catalog-Version'], str(delta["version"]))
+
+            response = await get_catalog_changes(self._signed_request('/bot-app/api/products/changes?since=0'))
+            self.assertTrue(json.loads(response.body)["full"])
+
+            response = await get_catalog_changes(self._signed_request('/bot-app/api/products/changes'))
+            self.assertEqual(response.status, 400)
+
+    async def test_search_products(self):
+        """Search returns matching products with their category."""
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            response = await search_products(self._signed_request('/bot-app/api/search?q=bu&fields=id'))
+            self.assertEqual(response.status, 200)
+            body = json.loads(response.body)
+            self.assertEqual(body["total"], 1)
+            self.assertEqual(body["items"], [{"category": "category_bakery", "product": {"id": "68"}}])
+
+            response = await search_products(self._signed_request('/bot-app/api/search?q=%20'))
+            self.assertEqual(response.status, 400)
+
+    async def test_catalog_update_published_to_event_streams(self):
+        """A reloaded catalog is pushed to open event streams; the stream is signed."""
+        hub = CatalogEventHub(max_connections=1)
+        subscriber = hub.subscribe()
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.products_data_version', 3), \
+             patch('bot.api_server.catalog_snapshot', None), \
+             patch('bot.api_server.catalog_event_hub', hub), \
+             patch('bot.api_server.check_rate_limit', return_value=True):
+            get_catalog_snapshot()
+            await apply_products_data({"category_bakery": [{"id": "49", "price": "20"}]}, 7)
+            self.assertTrue(subscriber.queue.get_nowait().startswith(b"id: 7\nevent: delta\n"))
+
+            response = await stream_catalog_events(make_mocked_request('GET', '/bot-app/api/events'))
+            self.assertEqual(response.status, 403)
+
+    async def test_product_image_route(self):
+        """Images are looked up by product id; unknown ids, sizes and missing images are 404."""
+        data = {"category_bakery": [{"id": "49", "image_url": "https://drazhin.by/49.webp"},
+                                    {"id": "68", "image_url": "N/A"}]}
+        with patch('bot.api_server.products_data', data), \
+             patch('bot.api_server.image_response', AsyncMock(return_value=web.Response(status=200))) as served:
+            for product_id, size in (("49", "huge"), ("999", "grid"), ("68", "grid")):
+                request = make_mocked_request('GET', f'/bot-app/img/{product_id}/{size}',
+                                              match_info={'product_id': product_id, 'size': size})
+                self.assertEqual((await serve_product_image(request)).status, 404)
+
+            request = make_mocked_request('GET', '/bot-app/img/49/grid', match_info={'product_id': '49', 'size': 'grid'})
+            self.assertEqual((await serve_product_image(request)).status, 200)
+            self.assertEqual(served.call_args.args[2:], ("https://drazhin.by/49.webp", "grid"))
+
+    async def test_snapshot_rebuilt_when_data_replaced(self):
+        """Replacing products_data invalidates the serialized snapshot."""
+        with patch('bot.api_server.products_data', self.test_products_data):
+            first = get_catalog_snapshot()
+            self.assertIs(get_catalog_snapshot(), first)
+        with patch('bot.api_server.products_data', {"category_other": [{"id": "1"}]}):
+            self.assertIsNot(get_catalog_snapshot(), first)
+
+    async def test_readiness_waits_for_catalog(self):
+        """/ready is 503 until a catalog is loaded; /health answers regardless."""
+        request = make_mocked_request('GET', '/ready')
+        with patch('bot.api_server.products_data', {}):
+            response = await readiness_check(request)
+            self.assertEqual(response.status, 503)
+            self.assertIn('Retry-After', response.headers)
+            self.assertEqual((await health_check(request)).status, 200)
+        with patch('bot.api_server.products_data', self.test_products_data), \
+             patch('bot.api_server.products_data_version', 1234):
+            response = await readiness_check(request)
+            self.assertEqual(response.status, 200)
+            self.assertEqual(json.loads(response.body), {"status": "ready", "version": 1234})
+
+    async def test_apply_products_data_swaps_snapshot(self):
+        """A reloaded catalog replaces data and snapshot together."""
+        with patch('bot.api_server.products_data', {}), patch('bot.api_server.catalog_snapshot', None):
+            old_snapshot = get_catalog_snapshot()
+            await apply_products_data(self.test_products_data)
+
+            self.assertIsNot(get_catalog_snapshot(), old_snapshot)
+            self.assertIn("category_bakery", get_catalog_snapshot().categories)
 
 
 class TestAPISecurity(unittest.TestCase):
@@ -351,11 +676,11 @@ class TestAPISecurity(unittest.TestCase):
         
         # First few requests should be allowed
         for i in range(5):
-            self.assertTrue(check_rate_limit(test_ip))
+            self.assertTrue(asyncio.run(check_rate_limit(test_ip)))
         
         # After many requests, should still be allowed (rate limit is per hour)
         # This test depends on the actual rate limit implementation
-        self.assertTrue(check_rate_limit(test_ip))
+        self.assertTrue(asyncio.run(check_rate_limit(test_ip)))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,140 @@
+"""
+Unit tests for the Web App build step (scripts/build_web_app.py).
+"""
+
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'))
+
+from build_web_app import build, bundle_css, minify_css, minify_js, purge_css, used_names
+
+from bot.static_assets import StaticAssetCache
+
+
+class TestMinify(unittest.TestCase):
+    """Test cases for the CSS and JS minifiers."""
+
+    def test_minify_css(self):
+        """Comments and optional whitespace go; strings, descendant combinators and calc() stay."""
+        css = """/* header's { */
+        .a  >  .b , .c :hover {
+            margin:  0 auto ;
+            width: calc(100% - 10px);
+            content: " a ; b ";
+        }"""
+        self.assertEqual(minify_css(css), '.a>.b,.c :hover{margin:0 auto;width:calc(100% - 10px);content:" a ; b "}\n')
+
+    def test_minify_js_keeps_literals(self):
+        """Strings, templates and regexes are kept byte for byte."""
+        source = (
+            "// comment\n"
+            "const text = 'a  // not a comment';\n"
+            "const html = `<div class=\"x\">  ${ items.map(i => `<b>${i}</b>`).join('') }  </div>`;\n"
+            "const re = /\\/\\*[^/]*\\*\\//g;   /* block */\n"
+            "let total = a / b / c;\n"
+        )
+        minified = minify_js(source)
+        self.assertIn("'a  // not a comment'", minified)
+        self.assertIn("`<div class=\"x\">  ${items.map(i=>`<b>${i}</b>`).join('')}  </div>`", minified)
+        self.assertIn("/\\/\\*[^/]*\\*\\//g", minified)
+        self.assertIn("total=a/b/c", minified)
+        self.assertNotIn("comment\n", minified)
+        self.assertNotIn("block", minified)
+
+    def test_minify_js_keeps_needed_spaces_and_line_breaks(self):
+        """Spaces between words and '+ +' survive; line breaks stay where ASI may need them."""
+        source = "function f(a) {\n    return a + +b\n}\nlet x = 1\n(x)\nlet y = i++\n+j\n"
+        self.assertEqual(minify_js(source), "function f(a){return a+ +b}\nlet x=1\n(x)\nlet y=i++\n+j\n")
+
+
+class TestPurge(unittest.TestCase):
+    """Test cases for CSS purging and bundling."""
+
+    def test_purge_unused_selectors(self):
+        """Rules needing unknown classes are dropped, shared rules lose only the unused selectors."""
+        words, prefixes = used_names(['<div class="card">', "el.classList.add('size-' + size)"])
+        css = minify_css("""
+            .card, .unused { color: red }
+            .size-large { width: 10px }
+            .ghost { color: blue }
+            a:not(.ghost) { color: green }
+            @media (max-width: 600px) { .ghost { display: none } }
+            @keyframes spin { from { opacity: 0 } }
+        """)
+        purged = purge_css(css, words, prefixes)
+        self.assertIn('.card{color:red}', purged)
+        self.assertIn('.size-large{', purged)
+        self.assertIn('a:not(.ghost){', purged)
+        self.assertIn('@keyframes spin{', purged)
+        self.assertNotIn('.unused', purged)
+        self.assertNotIn('@media', purged)
+
+    def test_bundle_moves_imports_first(self):
+        """@import from the second stylesheet ends up before every rule."""
+        bundle = bundle_css(['body{margin:0}', "@import url('font.css');.a{color:red}"])
+        self.assertTrue(bundle.startswith("@import url('font.css');"))
+        self.assertIn('body{margin:0}', bundle)
+
+
+class TestBuild(unittest.TestCase):
+    """Test cases for a full build of a small Web App."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp_dir.name) / 'src'
+        self.output = Path(self.tmp_dir.name) / 'out'
+        (self.source / 'images').mkdir(parents=True)
+        (self.source / 'index.html').write_text(
+            '<link rel="stylesheet" href="/bot-app/main.min.css">\n'
+            '<link rel="stylesheet" href="/bot-app/style.css">\n'
+            '<div class="card"></div><script src="/bot-app/script.js"></script>\n', encoding='utf-8')
+        (self.source / 'main.min.css').write_text('.card{padding:0}.unused{color:red}' * 40, encoding='utf-8')
+        (self.source / 'style.css').write_text(
+            ".card {\n    background: url('/bot-app/images/bg.svg');\n}\n" * 40, encoding='utf-8')
+        (self.source / 'script.js').write_text("// app\nconsole.log('bakery');\n" * 100, encoding='utf-8')
+        (self.source / 'images' / 'bg.svg').write_text('<svg></svg>', encoding='utf-8')
+        self.report = build(self.source, self.output)
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.tmp_dir.cleanup()
+
+    def test_output_layout(self):
+        """One stylesheet, minified script, fingerprinted links and precompressed siblings."""
+        html = (self.output / 'index.html').read_text(encoding='utf-8')
+        self.assertEqual(html.count('rel="stylesheet"'), 1)
+        self.assertRegex(html, r'href="/bot-app/app\.[0-9a-f]{10}\.css"')
+        self.assertRegex(html, r'src="/bot-app/script\.[0-9a-f]{10}\.js"')
+        self.assertFalse((self.output / 'main.min.css').exists())
+        self.assertFalse((self.output / 'style.css').exists())
+
+        css = (self.output / 'app.css').read_text(encoding='utf-8')
+        self.assertNotIn('.unused', css)
+        self.assertRegex(css, r"url\('/bot-app/images/bg\.[0-9a-f]{10}\.svg'\)")
+
+        script = (self.output / 'script.js').read_bytes()
+        self.assertNotIn(b'// app', script)
+        self.assertEqual(gzip.decompress((self.output / 'script.js.gz').read_bytes()), script)
+        self.assertEqual({name for name, _, _ in self.report}, {'index.html', 'app.css', 'script.js'})
+
+    def test_server_uses_build_output(self):
+        """The asset cache serves the built files unchanged, with the precompressed bodies."""
+        cache = StaticAssetCache(str(self.output))
+        cache.load()
+        css = cache.get('app.css')
+        self.assertEqual(css.payload.body, (self.output / 'app.css').read_bytes())
+        self.assertEqual(css.payload.gzip_body, (self.output / 'app.css.gz').read_bytes())
+        # Links rendered at build time point at the current fingerprints
+        html = cache.get('index.html').payload.body.decode()
+        self.assertIn(f'/bot-app/app.{css.fingerprint}.css', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
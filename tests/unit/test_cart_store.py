@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot import json_codec
+from bot.cart_store import CartStore
+
+
+class TestCartStore(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the SQLite-backed cart store."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'carts.sqlite3')
+
+    async def open_store(self, **kwargs) -> CartStore:
+        store = CartStore(flush_interval=60, **kwargs)
+        await store.start(self.path)
+        self.addAsyncCleanup(store.close)
+        return store
+
+    def rows(self) -> dict:
+        with sqlite3.connect(self.path) as conn:
+            return {user_id: json_codec.loads(items)
+                    for user_id, items in conn.execute("SELECT user_id, items FROM carts")}
+
+    def test_memory_only_until_started(self):
+        """Without start() the store is a plain in-memory mapping and touches no files."""
+        store = CartStore(max_cached=1)
+        store[1] = {'bread': 2}
+        store[2] = {}
+        self.assertEqual(store[1], {'bread': 2})
+        self.assertIn(2, store)
+        del store[2]
+        self.assertNotIn(2, store)
+        with self.assertRaises(KeyError):
+            del store[2]
+        self.assertFalse(os.path.exists(self.path))
+
+    async def test_carts_survive_restart(self):
+        """Carts written by one store are read back by the next one; empty carts are not kept."""
+        store = await self.open_store()
+        store[1] = {'bread': 2, 'cake': 1}
+        store[2] = {'bread': 1}
+        store[3] = {}
+        await store.close()
+
+        store = await self.open_store()
+        self.assertEqual(store[1], {'bread': 2, 'cake': 1})
+        self.assertEqual(store.get(2), {'bread': 1})
+        self.assertNotIn(3, store)
+
+    async def test_preload_reads_off_the_event_loop(self):
+        """Preloaded carts, and the absence of one, are then read from memory without the sync reader."""
+        store = await self.open_store()
+        store[1] = {'bread': 2}
+        await store.close()
+
+        store = await self.open_store()
+        await store.preload(1)
+        await store.preload(2)
+        reader = store._reader
+        store._reader = None
+        try:
+            self.assertEqual(store[1], {'bread': 2})
+            self.assertNotIn(2, store)
+            store[2] = {'cake': 1}
+            self.assertEqual(store[2], {'cake': 1})
+        finally:
+            store._reader = reader
+
+    async def test_lru_is_bounded_and_loses_nothing(self):
+        """Only max_cached carts stay in memory; evicted ones are read from pending changes or the database."""
+        store = await self.open_store(max_cached=2)
+        for user_id in range(10):
+            store[user_id] = {'bread': user_id + 1}
+        self.assertEqual(store.stats(), {'cached': 2, 'pending': 10})
+        self.assertEqual(store[0], {'bread': 1})
+
+        self.assertEqual(await store.flush(), 10)
+        self.assertEqual(len(self.rows()), 10)
+        self.assertEqual(store[5], {'bread': 6})
+        self.assertEqual(store.stats(), {'cached': 2, 'pending': 0})
+
+    async def test_flush_writes_latest_change(self):
+        """Changes are batched: only the last state of a cart and deletions reach the database."""
+        store = await self.open_store()
+        store[1] = {'bread': 1}
+        store[1] = {'bread': 3}
+        store[2] = {'cake': 1}
+        await store.flush()
+        del store[2]
+        self.assertEqual(set(self.rows()), {1, 2})
+
+        await store.flush()
+        self.assertEqual(self.rows(), {1: {'bread': 3}})
+
+    async def test_batch_size_triggers_flush(self):
+        """Reaching flush_batch writes without waiting for the interval."""
+        store = await self.open_store(flush_batch=3)
+        for user_id in range(3):
+            store[user_id] = {'bread': 1}
+        for _ in range(50):
+            if len(self.rows()) == 3:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(len(self.rows()), 3)
+
+    async def test_idle_carts_expire(self):
+        """Carts not changed for the TTL are deleted from memory and the database."""
+        store = await self.open_store(ttl=3600)
+        store[1] = {'bread': 1}
+        await store.flush()
+        self.assertEqual(await store.expire(now=time.time() + 60), 0)
+
+        self.assertEqual(await store.expire(now=time.time() + 3601), 1)
+        self.assertEqual(self.rows(), {})
+        self.assertEqual(store.stats()['cached'], 0)
+        self.assertNotIn(1, store)
+
+
+if __name__ == '__main__':
+    unittest.main()
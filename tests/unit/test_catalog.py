@@ -0,0 +1,397 @@
+import unittest
+import asyncio
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+from unittest.mock import patch
+
+from aiohttp.test_utils import make_mocked_request
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.catalog import (
+    CATALOG_HISTORY_SIZE, GRID_FIELDS, MAX_CATALOG_VIEWS, CatalogSnapshot, CatalogWatcher,
+    build_products_index, decode_cursor, diff_catalogs, encode_cursor, parse_fields,
+    parse_product_ids, serialize_json, validate_products_data
+)
+from bot.http_cache import (
+    PrecompressedBody, cached_response, etag_matches, parse_accept_encoding
+)
+
+
+class TestCatalogSnapshot(unittest.TestCase):
+    """Test cases for pre-serialized catalog snapshots."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.products_data = {
+            "category_bakery": [
+                {
+                    "id": "49",
+                    "name": "Завиванец с маком",
+                    "price": "18",
+                    "image_url": "bakery.jpg",
+                    "category_name": "🥨 Выпечка",
+                    "ingredients": "мука пшеничная в/с, закваска, молоко " * 20
+                }
+            ],
+            "category_desserts": []
+        }
+
+    def test_snapshot_serializes_each_category_once(self):
+        """Non-empty categories get their own pre-built payload."""
+        snapshot = CatalogSnapshot(self.products_data)
+
+        self.assertIn("category_bakery", snapshot.categories)
+        self.assertIsNone(snapshot.category("category_desserts"))
+        self.assertIsNone(snapshot.category("missing"))
+
+        body = json.loads(snapshot.category("category_bakery").body)
+        self.assertEqual(body, self.products_data["category_bakery"])
+        self.assertEqual(json.loads(snapshot.all_products.body), self.products_data)
+
+    def test_categories_list(self):
+        """Category list uses the first product of each non-empty category."""
+        snapshot = CatalogSnapshot(self.products_data)
+        categories = json.loads(snapshot.categories_list.body)
+
+        self.assertEqual(categories, [{
+            "key": "category_bakery",
+            "name": "🥨 Выпечка",
+            "image": "bakery.jpg"
+        }])
+
+    def test_snapshot_is_isolated_from_source(self):
+        """Adding categories to the source dict does not change the snapshot."""
+        snapshot = CatalogSnapshot(self.products_data)
+        self.products_data["category_new"] = [{"id": "1"}]
+
+        self.assertNotIn("category_new", snapshot.products_data)
+        self.assertNotIn(b"category_new", snapshot.all_products.body)
+
+    def test_products_index(self):
+        """Products are indexed by string id; the first occurrence wins."""
+        index = build_products_index({
+            "category_a": [{"id": "1", "name": "first"}, {"name": "no id"}],
+            "category_b": [{"id": 1, "name": "duplicate"}, {"id": 2}]
+        })
+        self.assertEqual(set(index), {"1", "2"})
+        self.assertEqual(index["1"]["name"], "first")
+
+    def test_product_payload_is_cached(self):
+        """Single-product payloads are built once per snapshot."""
+        snapshot = CatalogSnapshot(self.products_data)
+        payload = snapshot.product("49")
+        self.assertEqual(json.loads(payload.body)["name"], "Завиванец с маком")
+        self.assertIs(snapshot.product("49"), payload)
+        self.assertIsNone(snapshot.product("1"))
+
+    def test_parse_product_ids(self):
+        """Blank entries and duplicates are dropped, order is kept."""
+        self.assertEqual(parse_product_ids(" 68, 49,,68 "), ["68", "49"])
+        self.assertEqual(parse_product_ids(""), [])
+
+    def test_field_projection(self):
+        """Projected views keep only the requested keys and are cached per field set."""
+        snapshot = CatalogSnapshot(self.products_data)
+        fields = parse_fields("id, name,price")
+        view = snapshot.view(fields)
+
+        products = json.loads(view.category("category_bakery").body)
+        self.assertEqual(products, [{"id": "49", "name": "Завиванец с маком", "price": "18"}])
+        self.assertIs(snapshot.view(fields), view)
+        self.assertIs(snapshot.view(None), snapshot.full_view)
+        self.assertLess(len(view.all_products.body), len(snapshot.all_products.body))
+
+        with self.assertRaises(ValueError):
+            snapshot.view(frozenset({"id", "password"}))
+
+    def test_grid_view_prebuilt_and_kept(self):
+        """The grid projection is built with the snapshot and never evicted."""
+        snapshot = CatalogSnapshot(self.products_data)
+        grid = snapshot.view(GRID_FIELDS)
+        for field in ("url", "ingredients", "calories", "energy_value", "short_description",
+                      "category_name", "weight", "for_vegans", "availability_days", "image_url"):
+            snapshot.view(frozenset({"id", field}))
+        self.assertLessEqual(len(snapshot._views), MAX_CATALOG_VIEWS)
+        self.assertIs(snapshot.view(GRID_FIELDS), grid)
+
+    def test_pagination(self):
+        """Pages follow the category order and the last page has no cursor."""
+        products = [{"id": str(i), "name": f"p{i}", "price": "1"} for i in range(5)]
+        snapshot = CatalogSnapshot({"category_bakery": products})
+
+        page = json.loads(snapshot.page("category_bakery", 2).body)
+        self.assertEqual([p["id"] for p in page["items"]], ["0", "1"])
+
+        page = json.loads(snapshot.page("category_bakery", 2, page["next_cursor"], frozenset({"id"})).body)
+        self.assertEqual(page["items"], [{"id": "2"}, {"id": "3"}])
+
+        page = json.loads(snapshot.page("category_bakery", 2, page["next_cursor"]).body)
+        self.assertEqual([p["id"] for p in page["items"]], ["4"])
+        self.assertIsNone(page["next_cursor"])
+
+        self.assertIsNone(snapshot.page("missing", 2))
+        with self.assertRaises(ValueError):
+            snapshot.page("category_bakery", 2, encode_cursor("404"))
+
+    def test_cursor_round_trip(self):
+        """Cursors are opaque but reversible; garbage is rejected."""
+        self.assertEqual(decode_cursor(encode_cursor("49")), "49")
+        with self.assertRaises(ValueError):
+            decode_cursor("!!!")
+
+    def test_serialize_json_keeps_cyrillic(self):
+        """Serialized JSON is compact UTF-8, not \\u escapes."""
+        body = serialize_json({"name": "Хлеб"})
+        self.assertEqual(body, '{"name":"Хлеб"}'.encode('utf-8'))
+
+
+class TestCatalogChanges(unittest.TestCase):
+    """Test cases for catalog versions and deltas."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.old_data = {
+            "category_bakery": [
+                {"id": "49", "name": "Завиванец", "price": "18", "weight": "100"},
+                {"id": "68", "name": "Булочка", "price": "2"}
+            ],
+            "category_desserts": [{"id": "70", "name": "Эклер", "price": "5"}]
+        }
+        self.new_data = {
+            "category_bakery": [
+                {"id": "49", "name": "Завиванец", "price": "19"},
+                {"id": "71", "name": "Багет", "price": "4"}
+            ],
+            "category_desserts": [
+                {"id": "70", "name": "Эклер", "price": "5"},
+                {"id": "68", "name": "Булочка", "price": "2"}
+            ]
+        }
+
+    def test_diff_catalogs(self):
+        """Added, removed, changed and moved products are reported."""
+        diff = diff_catalogs(self.old_data, self.new_data)
+
+        self.assertEqual(diff["changed"], [{
+            "category": "category_bakery", "id": "49",
+            "fields": {"price": "19"}, "removed_fields": ["weight"]
+        }])
+        self.assertEqual(sorted((p["category"], p["product"]["id"]) for p in diff["added"]),
+                         [("category_bakery", "71"), ("category_desserts", "68")])
+        self.assertEqual(diff["removed"], [{"category": "category_bakery", "id": "68"}])
+        self.assertEqual(diff["order"], {"category_bakery": ["49", "71"], "category_desserts": ["70", "68"]})
+
+    def test_identical_catalogs(self):
+        """An unchanged catalog produces an empty diff."""
+        diff = diff_catalogs(self.old_data, json.loads(json.dumps(self.old_data)))
+        self.assertEqual(diff, {"added": [], "removed": [], "changed": [], "order": {}})
+
+    def test_versions_only_grow(self):
+        """A snapshot is never older than the one it replaces."""
+        first = CatalogSnapshot(self.old_data, version=1000)
+        self.assertEqual(first.version, 1000)
+        self.assertEqual(CatalogSnapshot(self.new_data, version=2000, previous=first).version, 2000)
+        self.assertEqual(CatalogSnapshot(self.new_data, version=500, previous=first).version, 1001)
+        self.assertEqual(CatalogSnapshot(self.new_data).version, 1)
+
+    def test_changes_since(self):
+        """Known versions get a delta; unknown ones get the full catalog."""
+        first = CatalogSnapshot(self.old_data, version=1000)
+        second = CatalogSnapshot(self.new_data, version=2000, previous=first)
+
+        delta = json.loads(second.changes_since(1000).body)
+        self.assertFalse(delta["full"])
+        self.assertEqual((delta["since"], delta["version"]), (1000, 2000))
+        self.assertEqual(delta["changed"][0]["fields"], {"price": "19"})
+
+        self.assertEqual(json.loads(second.changes_since(2000).body)["changed"], [])
+
+        resync = json.loads(second.changes_since(1).body)
+        self.assertTrue(resync["full"])
+        self.assertEqual(resync["products"], self.new_data)
+        self.assertIs(second.changes_since(3), second.changes_since(1))
+
+    def test_history_is_bounded(self):
+        """Only the last CATALOG_HISTORY_SIZE versions can be diffed against."""
+        snapshot = CatalogSnapshot(self.old_data, version=1)
+        for version in range(2, CATALOG_HISTORY_SIZE + 3):
+            snapshot = CatalogSnapshot(self.old_data, version=version, previous=snapshot)
+
+        self.assertEqual(len(snapshot.history), CATALOG_HISTORY_SIZE)
+        self.assertTrue(json.loads(snapshot.changes_since(1).body)["full"])
+        self.assertFalse(json.loads(snapshot.changes_since(3).body)["full"])
+
+
+class TestHttpCache(unittest.TestCase):
+    """Test cases for ETag and Accept-Encoding handling."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.payload = PrecompressedBody(b'{"data": "' + b'x' * 4096 + b'"}', 'application/json')
+
+    def test_precompressed_variants(self):
+        """Large bodies get a gzip variant that decompresses to the original."""
+        self.assertIsNotNone(self.payload.gzip_body)
+        self.assertEqual(gzip.decompress(self.payload.gzip_body), self.payload.body)
+        self.assertTrue(self.payload.etag.startswith('"'))
+
+    def test_small_body_not_compressed(self):
+        """Tiny bodies are served as-is."""
+        payload = PrecompressedBody(b'[]', 'application/json')
+        self.assertIsNone(payload.gzip_body)
+        self.assertIsNone(payload.br_body)
+        self.assertEqual(payload.select('gzip, br'), (None, b'[]'))
+
+    def test_parse_accept_encoding(self):
+        """q-values and wildcards are parsed."""
+        self.assertEqual(parse_accept_encoding('gzip, br;q=0'), {'gzip': 1.0, 'br': 0.0})
+        self.assertEqual(parse_accept_encoding('*;q=0.5')['gzip'], 0.5)
+        self.assertEqual(parse_accept_encoding(''), {})
+
+    def test_select_respects_q_zero(self):
+        """An encoding refused with q=0 is never chosen."""
+        encoding, body = self.payload.select('gzip;q=0')
+        self.assertIsNone(encoding)
+        self.assertEqual(body, self.payload.body)
+
+    def test_etag_matches(self):
+        """If-None-Match uses weak comparison and supports lists and '*'."""
+        etag = self.payload.etag
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(f'W/{etag}', etag))
+        self.assertTrue(etag_matches(f'"other", {etag}', etag))
+        self.assertTrue(etag_matches('*', etag))
+        self.assertFalse(etag_matches('"other"', etag))
+        self.assertFalse(etag_matches(None, etag))
+
+    def test_cached_response_gzip(self):
+        """Clients accepting gzip get the compressed body."""
+        request = make_mocked_request('GET', '/bot-app/api/products', headers={'Accept-Encoding': 'gzip'})
+        response = cached_response(request, self.payload, {'Cache-Control': 'no-cache'})
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['ETag'], self.payload.etag)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(response.body, self.payload.gzip_body)
+
+    def test_cached_response_not_modified(self):
+        """A matching If-None-Match returns 304 without a body."""
+        request = make_mocked_request('GET', '/bot-app/api/products', headers={
+            'If-None-Match': self.payload.etag
+        })
+        response = cached_response(request, self.payload)
+
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.headers['ETag'], self.payload.etag)
+        self.assertIsNone(response.body)
+
+    @patch('bot.http_cache.brotli', None)
+    def test_without_brotli(self):
+        """Brotli is optional; gzip is used when it is not installed."""
+        payload = PrecompressedBody(b'a' * 2048, 'text/plain')
+        self.assertIsNone(payload.br_body)
+        self.assertEqual(payload.select('br, gzip')[0], 'gzip')
+
+
+class TestCatalogViewLoading(unittest.IsolatedAsyncioTestCase):
+    """Test cases for projections requested by API handlers."""
+
+    async def test_load_view_builds_once_off_the_loop(self):
+        """Concurrent requests for a new field set share one build in a worker thread."""
+        snapshot = CatalogSnapshot({"category_bakery": [{"id": "1", "name": "p", "price": "1"}]})
+        fields = parse_fields("id,name")
+        build_threads = []
+        build_view = snapshot._build_view
+
+        def tracking_build(build_fields):
+            build_threads.append(threading.get_ident())
+            return build_view(build_fields)
+
+        with patch.object(snapshot, '_build_view', side_effect=tracking_build):
+            views = await asyncio.gather(*(snapshot.load_view(fields) for _ in range(3)))
+
+        self.assertEqual(len(build_threads), 1)
+        self.assertNotEqual(build_threads[0], threading.get_ident())
+        self.assertIs(views[0], views[1])
+        self.assertIs(views[0], views[2])
+        self.assertIs(await snapshot.load_view(fields), views[0])
+        self.assertIs(await snapshot.load_view(GRID_FIELDS), snapshot.view(GRID_FIELDS))
+        self.assertEqual(snapshot._pending_views, {})
+
+
+class TestCatalogWatcher(unittest.IsolatedAsyncioTestCase):
+    """Test cases for hot reload of the products file."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'products_scraped.json')
+        self.received = []
+
+        async def listener(data):
+            self.received.append(data)
+
+        self.watcher = CatalogWatcher(self.path, interval=0.01)
+        self.watcher.add_listener(listener)
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.tmp_dir.cleanup()
+
+    def _write(self, content):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+
+    async def test_reload_on_change(self):
+        """Each new version of the file is published once."""
+        self._write({"category_bakery": [{"id": "1"}]})
+        self.assertTrue(await self.watcher.check())
+        self.assertFalse(await self.watcher.check())
+
+        self._write({"category_bakery": [{"id": "1"}, {"id": "2"}]})
+        self.assertTrue(await self.watcher.check())
+        self.assertEqual(len(self.received), 2)
+        self.assertEqual(len(self.received[-1]["category_bakery"]), 2)
+        self.assertEqual(self.watcher.version, os.stat(self.path).st_mtime_ns // 1000)
+
+    async def test_invalid_file_is_not_published(self):
+        """Broken JSON and empty catalogs keep the previous data."""
+        self._write('{"category_bakery": [')
+        self.assertFalse(await self.watcher.check())
+
+        self._write({"category_bakery": [], "category_desserts": []})
+        self.assertFalse(await self.watcher.check())
+        self.assertEqual(self.received, [])
+
+    async def test_missing_file(self):
+        """A missing file is not an error."""
+        self.assertFalse(await self.watcher.check())
+
+    async def test_start_skips_current_file(self):
+        """The file loaded at startup is not published again."""
+        self._write({"category_bakery": [{"id": "1"}]})
+        self.watcher.start()
+        try:
+            self.assertFalse(await self.watcher.check())
+        finally:
+            await self.watcher.stop()
+
+    def test_validate_products_data(self):
+        """Structure is validated before a reload is applied."""
+        self.assertTrue(validate_products_data({"c": [{"id": "1"}]}))
+        with self.assertRaises(ValueError):
+            validate_products_data([])
+        with self.assertRaises(ValueError):
+            validate_products_data({"c": {"id": "1"}})
+        with self.assertRaises(ValueError):
+            validate_products_data({"c": ["1"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
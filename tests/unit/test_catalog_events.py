@@ -0,0 +1,158 @@
+import unittest
+import asyncio
+import json
+import os
+import sys
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.catalog import CatalogSnapshot
+from bot.catalog_events import (
+    SSE_QUEUE_SIZE, CatalogEventHub, snapshot_events, stream_events, version_event
+)
+
+
+def _parse_event(message: bytes) -> dict:
+    fields = {}
+    for line in message.decode('utf-8').strip().split('\n'):
+        name, _, value = line.partition(': ')
+        fields[name] = value
+    return fields
+
+
+class TestCatalogEventHub(unittest.IsolatedAsyncioTestCase):
+    """Test cases for catalog event fan-out."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.first = CatalogSnapshot({"category_bakery": [{"id": "49", "name": "Bread", "price": "10"}]}, 5)
+        self.second = CatalogSnapshot(
+            {"category_bakery": [{"id": "49", "name": "Bread", "price": "12"}]}, 6, self.first
+        )
+
+    def test_snapshot_events(self):
+        """Known versions get the delta, unknown ones only the new version."""
+        event = _parse_event(snapshot_events(self.second, 5))
+        self.assertEqual(event["event"], "delta")
+        self.assertEqual(event["id"], "6")
+        self.assertEqual(json.loads(event["data"])["changed"][0]["fields"], {"price": "12"})
+
+        self.assertEqual(snapshot_events(self.second, 1), version_event(6))
+        self.assertEqual(snapshot_events(self.second, None), version_event(6))
+
+    async def test_publish_reaches_every_subscriber(self):
+        """One encoded event is queued for each connection."""
+        hub = CatalogEventHub(max_connections=10)
+        subscribers = [hub.subscribe() for _ in range(3)]
+        hub.publish(self.second, 5)
+        messages = [subscriber.queue.get_nowait() for subscriber in subscribers]
+        self.assertTrue(all(message is messages[0] for message in messages))
+
+        hub.unsubscribe(subscribers[0])
+        self.assertEqual(hub.connections, 2)
+
+    async def test_connection_cap(self):
+        """Connections beyond the cap are refused."""
+        hub = CatalogEventHub(max_connections=2)
+        self.assertIsNotNone(hub.subscribe())
+        self.assertIsNotNone(hub.subscribe())
+        self.assertIsNone(hub.subscribe())
+
+    async def test_slow_subscriber_is_coalesced(self):
+        """A full queue is replaced by one version event instead of growing."""
+        hub = CatalogEventHub(max_connections=1)
+        subscriber = hub.subscribe()
+        for _ in range(SSE_QUEUE_SIZE + 5):
+            hub.publish(self.second, 5)
+        self.assertEqual(subscriber.queue.qsize(), 1)
+
+        message = hub.next_message(subscriber, subscriber.queue.get_nowait())
+        self.assertEqual(message, version_event(6))
+        hub.publish(self.second, 5)
+        self.assertEqual(subscriber.queue.qsize(), 1)
+
+
+class TestEventStream(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the text/event-stream handler."""
+
+    async def asyncSetUp(self):
+        """Start a server with one event stream route."""
+        self.snapshot = CatalogSnapshot({"category_bakery": [{"id": "49", "price": "10"}]}, 5)
+        self.hub = CatalogEventHub(max_connections=1)
+        self.handler_task = None
+        self.handler_cancelled = asyncio.Event()
+
+        async def handler(request):
+            self.handler_task = asyncio.current_task()
+            try:
+                return await stream_events(request, self.hub, self.snapshot, heartbeat=0.05)
+            except asyncio.CancelledError:
+                self.handler_cancelled.set()
+                raise
+
+        app = web.Application()
+        app.router.add_get('/events', handler)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def _read_message(self, response) -> bytes:
+        return await asyncio.wait_for(response.content.readuntil(b"\n\n"), timeout=2)
+
+    async def test_stream(self):
+        """The stream announces the version, pushes updates, pings and closes on shutdown."""
+        response = await self.client.get('/events')
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/event-stream'))
+        self.assertEqual(response.headers['X-Accel-Buffering'], 'no')
+
+        self.assertTrue((await self._read_message(response)).startswith(b"retry: "))
+        self.assertEqual(await self._read_message(response), version_event(5))
+
+        # A second client is over the cap
+        refused = await self.client.get('/events')
+        self.assertEqual(refused.status, 503)
+        self.assertIn('Retry-After', refused.headers)
+
+        self.assertEqual(await self._read_message(response), b": ping\n\n")
+
+        new_snapshot = CatalogSnapshot({"category_bakery": [{"id": "49", "price": "12"}]}, 6, self.snapshot)
+        self.hub.publish(new_snapshot, 5)
+        message = await self._read_message(response)
+        while message == b": ping\n\n":
+            message = await self._read_message(response)
+        self.assertEqual(_parse_event(message)["event"], "delta")
+
+        self.hub.close()
+        self.assertEqual(await asyncio.wait_for(response.content.read(), timeout=2), b"")
+        self.assertEqual(self.hub.connections, 0)
+
+    async def test_resume_from_last_event_id(self):
+        """A reconnecting client gets the delta from the version it had."""
+        self.snapshot = CatalogSnapshot({"category_bakery": [{"id": "49", "price": "12"}]}, 6, self.snapshot)
+        response = await self.client.get('/events', headers={'Last-Event-ID': '5'})
+        await self._read_message(response)
+        event = _parse_event(await self._read_message(response))
+        self.assertEqual(event["event"], "delta")
+        self.assertEqual(event["id"], "6")
+        response.close()
+
+    async def test_cancellation_propagates(self):
+        """Cancelling the handler is not swallowed and still frees the connection slot."""
+        response = await self.client.get('/events')
+        await self._read_message(response)
+        self.assertEqual(self.hub.connections, 1)
+
+        self.handler_task.cancel()
+        await asyncio.wait_for(self.handler_cancelled.wait(), timeout=2)
+        self.assertEqual(self.hub.connections, 0)
+        response.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
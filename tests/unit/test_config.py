@@ -1,6 +1,7 @@
 import unittest
 import os
 from unittest.mock import patch
+import subprocess
 import sys
 import tempfile
 import shutil
@@ -159,6 +160,29 @@ class TestConfig(unittest.TestCase):
         
         self.assertEqual(config.SMTP_SERVER, test_server)
 
+    def test_config_built_once_on_first_use(self):
+        """Importing the module builds nothing; every access shares one SecureConfig."""
+        os.environ['BOT_TOKEN'] = "123:lazy"
+
+        import importlib
+        import config
+        importlib.reload(config)
+
+        self.assertIsNone(config._config)
+        self.assertIs(config.config, config.get_config())
+        self.assertEqual(config.BOT_TOKEN, "123:lazy")
+        with patch.object(config, 'SecureConfig') as secure_config:
+            config.get_config()
+            secure_config.assert_not_called()
+
+    def test_importers_read_config_on_use(self):
+        """Importing the bot, the API and their helpers does not build the configuration."""
+        code = ("import bot.main, bot.keyboards, bot.api_server, bot.workers, bot.logging_setup, bot.config; "
+                "print(bot.config._config is None)")
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(os.path.dirname(__file__), '..', '..'),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'True')
+
     def test_admin_chat_id_invalid_value(self):
         """Test that invalid ADMIN_CHAT_ID raises ValueError."""
         os.environ['ADMIN_CHAT_ID'] = "invalid_id"
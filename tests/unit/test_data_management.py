@@ -1,5 +1,6 @@
 import unittest
 import asyncio
+import datetime
 import json
 import os
 import tempfile
@@ -11,9 +12,10 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from bot.main import (
-    load_products_data, load_order_counter, save_order_counter,
+    load_products_data, load_order_counter,
     generate_order_number
 )
+from bot.order_numbers import OrderNumberAllocator, read_counter_file
 
 
 class TestDataManagement(unittest.TestCase):
@@ -60,7 +62,7 @@ class TestDataManagement(unittest.TestCase):
 
     @patch('bot.main.PRODUCTS_DATA_FILE')
     @patch('builtins.open', create=True)
-    @patch('json.load')
+    @patch('bot.json_codec.load')
     def test_load_products_data_success(self, mock_json_load, mock_open, mock_file_path):
         """Test successful loading of products data."""
         mock_file_path.return_value = "/test/path/products.json"
@@ -87,7 +89,7 @@ class TestDataManagement(unittest.TestCase):
 
     @patch('bot.main.PRODUCTS_DATA_FILE')
     @patch('builtins.open', create=True)
-    @patch('json.load')
+    @patch('bot.json_codec.load')
     def test_load_products_data_json_decode_error(self, mock_json_load, mock_open, mock_file_path):
         """Test handling JSON decode errors in products data."""
         mock_file_path.return_value = "/test/path/products.json"
@@ -102,7 +104,7 @@ class TestDataManagement(unittest.TestCase):
 
     @patch('bot.main.PRODUCTS_DATA_FILE')
     @patch('builtins.open', create=True)
-    @patch('json.load')
+    @patch('bot.json_codec.load')
     def test_load_products_data_general_exception(self, mock_json_load, mock_open, mock_file_path):
         """Test handling general exceptions in products data loading."""
         mock_file_path.return_value = "/test/path/products.json"
@@ -115,122 +117,70 @@ class TestDataManagement(unittest.TestCase):
         mock_open.assert_called_once()
         mock_json_load.assert_called_once()
 
-    @patch('bot.main.ORDER_COUNTER_FILE')
-    @patch('builtins.open', create=True)
-    @patch('json.load')
-    def test_load_order_counter_success(self, mock_json_load, mock_open, mock_file_path):
+    def _order_numbers(self, content=None):
+        """Allocator on a temporary counter file with the given raw contents."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, 'order_counter.json')
+        if content is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        return OrderNumberAllocator(path)
+
+    def test_load_order_counter_success(self):
         """Test successful loading of order counter."""
-        mock_file_path.return_value = "/test/path/counter.json"
-        mock_json_load.return_value = self.test_order_counter_data
-        mock_file = MagicMock()
-        mock_open.return_value.__enter__.return_value = mock_file
-
-        # Mock the file content to avoid async loop issues
-        mock_file.read.return_value = json.dumps(self.test_order_counter_data)
+        with patch('bot.main.order_numbers', self._order_numbers(json.dumps({"counter": 42, "month": 8}))):
+            result = asyncio.run(load_order_counter())
 
-        result = asyncio.run(load_order_counter())
+        self.assertEqual(result, {"counter": 42, "month": 8})
 
-        self.assertEqual(result["counter"], 42)
-        self.assertEqual(result["last_reset_month"], 8)
-        mock_open.assert_called_once()
-
-    @patch('bot.main.ORDER_COUNTER_FILE')
-    @patch('builtins.open', create=True)
-    def test_load_order_counter_file_not_found(self, mock_open, mock_file_path):
+    def test_load_order_counter_file_not_found(self):
         """Test handling when order counter file is not found."""
-        mock_file_path.return_value = "/nonexistent/path/counter.json"
-        mock_open.side_effect = FileNotFoundError()
+        with patch('bot.main.order_numbers', self._order_numbers()):
+            result = asyncio.run(load_order_counter())
 
-        result = asyncio.run(load_order_counter())
+        self.assertEqual(result, {})
 
-        # Should return default values
-        self.assertEqual(result["counter"], 0)
-        self.assertEqual(result["last_reset_month"], 0)
-
-    @patch('bot.main.ORDER_COUNTER_FILE')
-    @patch('builtins.open', create=True)
-    def test_load_order_counter_json_decode_error(self, mock_open, mock_file_path):
+    def test_load_order_counter_json_decode_error(self):
         """Test handling JSON decode errors in order counter."""
-        mock_file_path.return_value = "/test/path/counter.json"
-        mock_file = MagicMock()
-        mock_open.return_value.__enter__.return_value = mock_file
-        # Mock invalid JSON content
-        mock_file.read.return_value = "invalid json content"
-
-        result = asyncio.run(load_order_counter())
-
-        # Should return default values
-        self.assertEqual(result["counter"], 0)
-        self.assertEqual(result["last_reset_month"], 0)
-
-    @patch('bot.main.ORDER_COUNTER_FILE')
-    @patch('builtins.open', create=True)
-    @patch('json.dump')
-    def test_save_order_counter_success(self, mock_json_dump, mock_open, mock_file_path):
-        """Test successful saving of order counter."""
-        mock_file_path.return_value = "/test/path/counter.json"
-        mock_file = MagicMock()
-        mock_open.return_value.__enter__.return_value = mock_file
-        test_data = {"counter": 100, "last_reset_month": 8}
+        with patch('bot.main.order_numbers', self._order_numbers("invalid json content")):
+            result = asyncio.run(load_order_counter())
 
-        asyncio.run(save_order_counter(test_data))
-
-        mock_open.assert_called_once()
-        mock_json_dump.assert_called_once_with(test_data, mock_file, ensure_ascii=False, indent=4)
+        self.assertEqual(result, {})
 
-    @patch('bot.main.ORDER_COUNTER_FILE')
-    @patch('builtins.open', create=True)
-    def test_save_order_counter_file_error(self, mock_open, mock_file_path):
-        """Test handling file errors when saving order counter."""
-        mock_file_path.return_value = "/test/path/counter.json"
-        mock_open.side_effect = PermissionError("Permission denied")
+    def test_generate_order_number_success(self):
+        """Test successful order number generation."""
+        month = datetime.datetime.now().month
+        order_numbers = self._order_numbers(json.dumps({"counter": 42, "month": month}))
 
-        test_data = {"counter": 100, "last_reset_month": 8}
+        with patch('bot.main.order_numbers', order_numbers):
+            result = asyncio.run(generate_order_number())
 
-        # Should handle the error gracefully
-        asyncio.run(save_order_counter(test_data))
+        self.assertRegex(result, r"^#\d{6}/043$")
+        # The whole block is reserved in the file at once
+        self.assertEqual(read_counter_file(order_numbers.path)["counter"], 42 + order_numbers.block_size)
 
-        mock_open.assert_called_once()
+    def test_generate_order_number_month_reset(self):
+        """Test order number generation with month reset."""
+        previous_month = (datetime.datetime.now().month - 2) % 12 + 1
+        order_numbers = self._order_numbers(json.dumps({"counter": 100, "month": previous_month}))
 
-    @patch('bot.main.load_order_counter')
-    @patch('bot.main.save_order_counter')
-    def test_generate_order_number_success(self, mock_save, mock_load):
-        """Test successful order number generation."""
-        mock_load.return_value = {"counter": 42, "last_reset_month": 8}
-        
-        result = asyncio.run(generate_order_number())
+        with patch('bot.main.order_numbers', order_numbers):
+            result = asyncio.run(generate_order_number())
 
-        self.assertIsInstance(result, str)
-        self.assertTrue(result.startswith("#"))
-        mock_save.assert_called_once()
+        # Counter should reset to 1 for new month
+        self.assertTrue(result.endswith("/001"))
+        self.assertEqual(read_counter_file(order_numbers.path)["month"], datetime.datetime.now().month)
 
-    @patch('bot.main.load_order_counter')
-    @patch('bot.main.save_order_counter')
-    def test_generate_order_number_month_reset(self, mock_save, mock_load):
-        """Test order number generation with month reset."""
-        # Simulate month change
-        mock_load.return_value = {"counter": 100, "last_reset_month": 7}  # Previous month
-        
-        result = asyncio.run(generate_order_number())
+    def test_generate_order_number_corrupt_file(self):
+        """A corrupt counter file starts the month from 1 and is replaced."""
+        order_numbers = self._order_numbers("{\"counter\": 4")
 
-        self.assertIsInstance(result, str)
-        self.assertTrue(result.startswith("#"))
-        # Counter should reset to 1 for new month
-        self.assertIn("1", result)
-
-    @patch('bot.main.load_order_counter')
-    @patch('bot.main.save_order_counter')
-    def test_generate_order_number_year_change(self, mock_save, mock_load):
-        """Test order number generation with year change."""
-        # Simulate year change
-        mock_load.return_value = {"counter": 100, "last_reset_month": 12}  # December
-        
-        result = asyncio.run(generate_order_number())
+        with patch('bot.main.order_numbers', order_numbers):
+            result = asyncio.run(generate_order_number())
 
-        self.assertIsInstance(result, str)
-        self.assertTrue(result.startswith("#"))
-        # Counter should reset to 1 for new year
-        self.assertIn("1", result)
+        self.assertTrue(result.endswith("/001"))
+        self.assertEqual(read_counter_file(order_numbers.path)["counter"], order_numbers.block_size)
 
 
 class TestDataValidation(unittest.TestCase):
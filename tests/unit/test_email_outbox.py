@@ -0,0 +1,230 @@
+import asyncio
+import base64
+import os
+import smtplib
+import sys
+import tempfile
+import unittest
+from email.mime.text import MIMEText
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot import email_outbox as outbox_module
+from bot.email_outbox import EmailOutbox, SMTPSettings, is_permanent
+
+
+class LocalSMTPServer:
+    """Minimal ESMTP server on 127.0.0.1 that records what it receives (AUTH PLAIN, no TLS)."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self.fail_data = 0  # next DATA commands answered with 451
+        self.reject = set()  # recipients answered with 550
+        self.drop_after_message = False  # close the session after each message
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._session, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _session(self, reader, writer):
+        self.connections += 1
+        reply = lambda line: writer.write(line.encode() + b"\r\n")  # noqa: E731
+        reply("220 localhost ESMTP")
+        sender, recipients = None, []
+        while line := await reader.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                reply("250-localhost")
+                reply("250 AUTH PLAIN")
+            elif verb == "AUTH":
+                _, username, password = base64.b64decode(command.split()[2]).split(b"\0")
+                self.logins += 1
+                reply("235 Authentication successful" if password == b"secret" else "535 Bad credentials")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip("<>"), []
+                reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command[8:].strip("<>")
+                if recipient in self.reject:
+                    reply("550 No such user")
+                else:
+                    recipients.append(recipient)
+                    reply("250 OK")
+            elif verb == "DATA":
+                reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while (chunk := await reader.readline()) != b".\r\n":
+                    data += chunk
+                if self.fail_data:
+                    self.fail_data -= 1
+                    reply("451 Try again later")
+                else:
+                    self.messages.append((sender, recipients, data))
+                    reply("250 Queued")
+                    if self.drop_after_message:
+                        await writer.drain()
+                        break
+            elif verb in ("RSET", "NOOP"):
+                reply("250 OK")
+            elif verb == "QUIT":
+                reply("221 Bye")
+                await writer.drain()
+                break
+            else:
+                reply("502 Not implemented")
+            await writer.drain()
+        writer.close()
+
+
+def email(number: int, to: str = "customer@example.com") -> MIMEText:
+    msg = MIMEText(f"Заказ #{number}", 'html', 'utf-8')
+    msg['Subject'] = f"Заказ #{number}"
+    msg['From'] = "Пекарня Дражина <shop@example.com>"
+    msg['To'] = to
+    return msg
+
+
+class TestEmailOutbox(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the email outbox against a local SMTP server."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'outbox.sqlite3')
+        self.server = LocalSMTPServer()
+        await self.server.start()
+        self.addAsyncCleanup(self.server.stop)
+        self.settings = SMTPSettings('127.0.0.1', self.server.port, 'shop@example.com', 'secret',
+                                     use_tls=False, timeout=5)
+
+    async def open_outbox(self, settings=None, **kwargs) -> EmailOutbox:
+        kwargs.setdefault('retry_base_delay', 0.05)
+        outbox = EmailOutbox(**kwargs)
+        await outbox.start(self.path, settings or self.settings)
+        self.addAsyncCleanup(outbox.close)
+        return outbox
+
+    async def wait_until(self, condition, timeout=5.0):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not await condition():
+            self.assertLess(loop.time(), deadline, "timed out")
+            await asyncio.sleep(0.01)
+
+    async def delivered(self, outbox):
+        await self.wait_until(lambda: self._pending_is(outbox, 0))
+
+    async def _pending_is(self, outbox, pending):
+        return (await outbox.counts())['pending'] == pending
+
+    async def test_connection_is_reused(self):
+        """A burst of emails goes out over one connection and one login per worker."""
+        outbox = await self.open_outbox(workers=1)
+        for number in range(20):
+            self.assertTrue(await outbox.enqueue(email(number)))
+        await self.delivered(outbox)
+
+        self.assertEqual(len(self.server.messages), 20)
+        self.assertEqual((self.server.connections, self.server.logins), (1, 1))
+        sender, recipients, data = self.server.messages[0]
+        self.assertEqual((sender, recipients), ("shop@example.com", ["customer@example.com"]))
+        self.assertIn(b"Subject:", data)
+
+    async def test_temporary_failure_is_retried(self):
+        """A 4xx answer is retried with backoff until the email goes through."""
+        self.server.fail_data = 2
+        events = []
+        outbox = await self.open_outbox(workers=1, on_event=lambda event, details: events.append(event))
+        await outbox.enqueue(email(1))
+        await self.delivered(outbox)
+
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(events, ["email_smtp_error", "email_smtp_error", "email_sent"])
+        self.assertEqual(self.server.connections, 1)
+
+    async def test_permanent_failure_is_kept(self):
+        """A rejected recipient does not block the queue and is kept as failed."""
+        self.server.reject.add("nobody@example.com")
+        outbox = await self.open_outbox(workers=1)
+        await outbox.enqueue(email(1, to="nobody@example.com"))
+        await outbox.enqueue(email(2))
+        await self.wait_until(lambda: self._counts_are(outbox, {'pending': 0, 'failed': 1}))
+        self.assertEqual([recipients for _, recipients, _ in self.server.messages], [["customer@example.com"]])
+
+    async def _counts_are(self, outbox, counts):
+        return await outbox.counts() == counts
+
+    async def test_attempts_are_limited(self):
+        """An email that keeps failing is kept as failed after max_attempts."""
+        self.server.fail_data = 100
+        outbox = await self.open_outbox(max_attempts=3)
+        await outbox.enqueue(email(1))
+        await self.wait_until(lambda: self._counts_are(outbox, {'pending': 0, 'failed': 1}))
+        self.assertEqual(self.server.fail_data, 97)
+
+    async def test_reconnects_after_server_drops_connection(self):
+        """A session closed by the server is reopened for the next email."""
+        self.server.drop_after_message = True
+        outbox = await self.open_outbox(workers=1)
+        for number in range(3):
+            await outbox.enqueue(email(number))
+            await self.delivered(outbox)
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 3)
+
+    async def test_idle_connection_is_checked(self):
+        """After NOOP_AFTER_IDLE the connection is checked and reused if still alive."""
+        outbox = await self.open_outbox(workers=1)
+        with patch.object(outbox_module, 'NOOP_AFTER_IDLE', 0):
+            await outbox.enqueue(email(1))
+            await self.delivered(outbox)
+            await outbox.enqueue(email(2))
+            await self.delivered(outbox)
+        self.assertEqual((len(self.server.messages), self.server.connections), (2, 1))
+
+    async def test_queue_survives_restart(self):
+        """Emails queued while the server is unreachable are sent after the next start."""
+        unreachable = self.settings._replace(port=1)
+        outbox = await self.open_outbox(unreachable, retry_max_delay=60)
+        await outbox.enqueue(email(1))
+        await outbox.enqueue(email(2))
+        await self.wait_until(lambda: self._attempted(outbox))
+        await outbox.close()
+        self.assertEqual(self.server.messages, [])
+
+        outbox = await self.open_outbox(retry_base_delay=0)
+        await self.delivered(outbox)
+        self.assertEqual(len(self.server.messages), 2)
+
+    async def _attempted(self, outbox):
+        async with outbox._db.execute("SELECT MIN(attempts) FROM outbox") as cursor:
+            (attempts,) = await cursor.fetchone()
+        return attempts > 0
+
+    async def test_enqueue_before_start(self):
+        """Without start() an email is reported as not queued."""
+        self.assertFalse(await EmailOutbox().enqueue(email(1)))
+
+
+class TestIsPermanent(unittest.TestCase):
+    """Test cases for telling permanent SMTP errors from temporary ones."""
+
+    def test_classification(self):
+        self.assertTrue(is_permanent(smtplib.SMTPRecipientsRefused({"a@b.c": (550, b"No such user")})))
+        self.assertFalse(is_permanent(smtplib.SMTPRecipientsRefused({"a@b.c": (450, b"Mailbox busy")})))
+        self.assertTrue(is_permanent(smtplib.SMTPDataError(554, b"Spam")))
+        self.assertFalse(is_permanent(smtplib.SMTPDataError(451, b"Try again")))
+        self.assertFalse(is_permanent(smtplib.SMTPAuthenticationError(535, b"Bad credentials")))
+        self.assertFalse(is_permanent(ConnectionRefusedError()))
+
+
+if __name__ == '__main__':
+    unittest.main()
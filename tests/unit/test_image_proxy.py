@@ -0,0 +1,132 @@
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+from io import BytesIO
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer, make_mocked_request
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.image_proxy import Image, ImageCache, image_path, image_response, image_version
+
+# Smallest valid WebP header is enough when Pillow is not installed
+FAKE_WEBP = b'RIFF\x1a\x00\x00\x00WEBPVP8 ' + b'\x00' * 200
+
+
+def _make_image() -> bytes:
+    if Image is None:
+        return FAKE_WEBP
+    output = BytesIO()
+    Image.new('RGB', (400, 500), (200, 120, 40)).save(output, 'WEBP')
+    return output.getvalue()
+
+
+class TestImageCache(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the product image cache."""
+
+    async def asyncSetUp(self):
+        """Start a local stand-in for the shop's image host."""
+        self.image = _make_image()
+        self.origin_requests = 0
+
+        async def origin(request):
+            self.origin_requests += 1
+            await asyncio.sleep(0.01)
+            if request.match_info['name'] == 'missing.webp':
+                return web.Response(status=404)
+            return web.Response(body=self.image, content_type='image/webp')
+
+        app = web.Application()
+        app.router.add_get('/images/{name}', origin)
+        self.origin = TestServer(app)
+        await self.origin.start_server()
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ImageCache(self.temp_dir.name, max_bytes=10 * 1024 * 1024)
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+        await self.origin.close()
+        self.temp_dir.cleanup()
+
+    def _url(self, name: str) -> str:
+        return str(self.origin.make_url(f'/images/{name}'))
+
+    async def test_original_fetched_once(self):
+        """Concurrent and later requests share one origin fetch."""
+        url = self._url('bread.webp')
+        results = await asyncio.gather(*(self.cache.variant(url, 'grid') for _ in range(5)))
+        await self.cache.variant(url, 'detail')
+        self.assertEqual(self.origin_requests, 1)
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(results[0][1], 'image/webp')
+
+        # A new process finds the files on disk
+        cache = ImageCache(self.temp_dir.name, max_bytes=10 * 1024 * 1024)
+        self.assertEqual(await cache.variant(url, 'grid'), results[0])
+        self.assertEqual(self.origin_requests, 1)
+
+    async def test_cancelled_request_does_not_fail_others(self):
+        """A client that disconnects mid-fetch does not cancel the fetch for the other requests."""
+        url = self._url('bread.webp')
+        first = asyncio.create_task(self.cache.original(url))
+        others = [asyncio.create_task(self.cache.original(url)) for _ in range(3)]
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await asyncio.gather(*others), [self.image] * 3)
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        self.assertEqual(self.origin_requests, 1)
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    async def test_grid_variant_is_resized(self):
+        """The grid size fits the bounding box and is WebP."""
+        data, content_type = await self.cache.variant(self._url('bread.webp'), 'grid')
+        with Image.open(BytesIO(data)) as image:
+            self.assertLessEqual(image.size, (240, 300))
+            self.assertEqual(image.format, 'WEBP')
+
+    async def test_lru_eviction(self):
+        """The least recently used files go first when the cache is over its limit."""
+        self.cache.max_bytes = len(self.image) * 2
+        first, second = self._url('a.webp'), self._url('b.webp')
+        await self.cache.original(first)
+        await self.cache.original(second)
+        await self.cache.original(first)
+        await self.cache.original(self._url('c.webp'))
+
+        self.assertLessEqual(self.cache.total_bytes, self.cache.max_bytes)
+        self.assertEqual(len(os.listdir(self.temp_dir.name)), 2)
+        await self.cache.original(first)
+        self.assertEqual(self.origin_requests, 3)
+        await self.cache.original(second)
+        self.assertEqual(self.origin_requests, 4)
+
+    async def test_image_response(self):
+        """Versioned URLs are immutable, revalidation uses the ETag, origin errors are 502."""
+        url = self._url('bread.webp')
+        request = make_mocked_request('GET', image_path('49', url))
+        response = await image_response(request, self.cache, url, 'grid')
+        self.assertEqual(response.status, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+        request = make_mocked_request('GET', '/bot-app/img/49/grid', headers={'If-None-Match': response.headers['ETag']})
+        response = await image_response(request, self.cache, url, 'grid')
+        self.assertEqual(response.status, 304)
+        self.assertNotIn('immutable', response.headers['Cache-Control'])
+
+        missing = self._url('missing.webp')
+        response = await image_response(make_mocked_request('GET', '/'), self.cache, missing, 'grid')
+        self.assertEqual(response.status, 502)
+
+    def test_image_version(self):
+        """The version changes with the source URL and matches the client's hash."""
+        self.assertEqual(image_version(""), "811c9dc5")
+        self.assertNotEqual(image_version("a.webp"), image_version("b.webp"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot import json_codec
+
+
+class TestJsonCodec(unittest.TestCase):
+    """Test cases for the shared JSON codec."""
+
+    def setUp(self):
+        self.data = {"Хлеб": [{"id": "49", "price": "4.50 р.", "for_vegans": True, "weight": None}], 7: [1.5]}
+
+    def test_dumps_matches_stdlib_compact_output(self):
+        """Output is compact UTF-8 with non-ASCII text kept as is, whichever backend runs."""
+        expected = json.dumps(self.data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.assertEqual(json_codec.dumps(self.data), expected)
+        self.assertEqual(json_codec.dumps_str(self.data), expected.decode('utf-8'))
+
+    def test_round_trip(self):
+        """Strings, bytes and files parse back to the same document."""
+        encoded = json_codec.dumps(self.data)
+        decoded = json.loads(encoded)
+        self.assertEqual(json_codec.loads(encoded), decoded)
+        self.assertEqual(json_codec.loads(encoded.decode('utf-8')), decoded)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'data.json')
+            with open(path, 'wb') as f:
+                json_codec.dump(self.data, f, pretty=True)
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            self.assertTrue(text.startswith('{\n  "Хлеб"'))
+            self.assertTrue(text.endswith('}\n'))
+            self.assertEqual(json_codec.load_file(path), decoded)
+
+    def test_decode_error(self):
+        """Invalid input raises JSONDecodeError, which is also a ValueError."""
+        with self.assertRaises(json_codec.JSONDecodeError):
+            json_codec.loads('{"action": ')
+        with self.assertRaises(ValueError):
+            json_codec.loads(b'')
+
+    def test_default(self):
+        """Unknown types go through default when one is given."""
+        self.assertEqual(json_codec.dumps_str({"value": {1}}, default=list), '{"value":[1]}')
+        with self.assertRaises(TypeError):
+            json_codec.dumps({"value": {1}})
+
+    def test_json_response(self):
+        """json_response() sets the body, status and JSON content type."""
+        response = json_codec.json_response({"error": "Product not found"}, status=404,
+                                            headers={'Cache-Control': 'no-store'})
+        self.assertEqual(response.status, 404)
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(response.charset, 'utf-8')
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+        self.assertEqual(json.loads(response.body), {"error": "Product not found"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,8 @@ from unittest.mock import patch, MagicMock
 # Add the bot directory to the path so we can import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'bot'))
 
-from bot.keyboards import generate_main_menu, BASE_WEBAPP_URL
+from bot.config import get_config
+from bot.keyboards import generate_main_menu
 
 
 class TestKeyboards(unittest.TestCase):
@@ -14,9 +15,10 @@ class TestKeyboards(unittest.TestCase):
 
     def test_base_webapp_url_format(self):
         """Test that BASE_WEBAPP_URL has correct format."""
-        self.assertIsInstance(BASE_WEBAPP_URL, str)
-        self.assertIn('herokuapp.com', BASE_WEBAPP_URL)
-        self.assertTrue(BASE_WEBAPP_URL.endswith('/bot-app/'))
+        base_webapp_url = get_config().BASE_WEBAPP_URL
+        self.assertIsInstance(base_webapp_url, str)
+        self.assertIn('herokuapp.com', base_webapp_url)
+        self.assertTrue(base_webapp_url.endswith('/bot-app/'))
 
     def test_generate_main_menu_empty_cart(self):
         """Test main menu generation with empty cart."""
@@ -0,0 +1,63 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot import json_codec
+from bot.api_server import verify_hmac_signature
+from bot.config import config
+from tests.bench.load_api import (
+    UNLIMITED, fake_init_data, free_port, percentile, run_load, signed_headers, start_server
+)
+
+
+class TestLoadBench(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the API load generator."""
+
+    def test_signed_headers(self):
+        """Signatures cover method, path without the query and timestamp, keyed by initData."""
+        init_data = fake_init_data(7)
+        headers = signed_headers('GET', '/bot-app/api/products?category=category_bakery', init_data)
+        self.assertEqual(headers['X-Telegram-Init-Data'], init_data)
+        self.assertTrue(verify_hmac_signature(
+            f"GET:/bot-app/api/products:{headers['X-Timestamp']}", headers['X-Signature'], init_data
+        ))
+
+    def test_percentile(self):
+        """Nearest-rank percentiles."""
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(values, 0.50), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    async def test_short_run_against_local_server(self):
+        """Every request of the mix is accepted by a real server, rate limiter included."""
+        products = {"category_bakery": [{"id": "49", "name": "Bread", "price": "4.50 р.", "category_name": "Выпечка"}]}
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        products_file = os.path.join(temp_dir.name, 'products.json')
+        with open(products_file, 'wb') as f:
+            json_codec.dump(products, f)
+
+        with patch('bot.api_server.PRODUCTS_DATA_FILE', products_file), \
+             patch('bot.api_server.RATE_LIMIT_REQUESTS_PER_HOUR', UNLIMITED), \
+             patch.object(config, 'ENABLE_RATE_LIMITING', True), \
+             patch.object(config, 'RATE_LIMIT_MAX_REQUESTS', UNLIMITED):
+            port = free_port()
+            runner = await start_server(port, rate_limit=True)
+            try:
+                result = await run_load(f"http://127.0.0.1:{port}", duration=0.3, concurrency=4, warmup=0.1)
+            finally:
+                await runner.cleanup()
+
+        self.assertGreater(result['requests'], 0)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(list(result['statuses']), ['200'])
+        self.assertEqual(set(result['latency_ms']), {'p50', 'p95', 'p99', 'max', 'mean'})
+
+
+if __name__ == '__main__':
+    unittest.main()
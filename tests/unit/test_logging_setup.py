@@ -0,0 +1,119 @@
+import unittest
+import json
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.logging_setup import (
+    JsonFormatter, LazyQueueHandler, SamplingFilter, parse_sampling, redact, setup_logging, stop_logging
+)
+
+
+def _record(name="bot.test", level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestRedaction(unittest.TestCase):
+    """Test cases for masking personal data."""
+
+    def test_redact_phones_and_emails(self):
+        """Phone numbers in common formats and e-mails are masked; ids are kept."""
+        self.assertEqual(redact("Телефон: +375 (29) 123-45-67"), "Телефон: [phone]")
+        self.assertEqual(redact("tel 80291234567, +375291234567"), "tel [phone], [phone]")
+        self.assertEqual(redact("8 (029) 123-45-67 или 89991234567"), "[phone] или [phone]")
+        self.assertEqual(redact("mail ivan.petrov+cake@mail.ru"), "mail [email]")
+        self.assertEqual(redact("Заказ 2024-0042 пользователя 123456789"), "Заказ 2024-0042 пользователя 123456789")
+
+
+    def test_user_ids_starting_with_8_are_kept(self):
+        """Telegram user ids and order numbers that start with 8 are not phone numbers."""
+        for text in ("Пользователь 8123456789 открыл корзину", "user_id=8912345678", "Заказ 80012345678"):
+            self.assertEqual(redact(text), text)
+
+
+class TestSampling(unittest.TestCase):
+    """Test cases for per-logger sampling."""
+
+    def test_parse_sampling(self):
+        """Invalid entries and rate 1 are ignored."""
+        self.assertEqual(parse_sampling("aiohttp.access=10, bot.main=2,bad,x=1,y=z"),
+                         {"aiohttp.access": 10, "bot.main": 2})
+
+    def test_keeps_one_in_n(self):
+        """INFO records are thinned per logger, children inherit, warnings always pass."""
+        sampling = SamplingFilter({"aiohttp": 3})
+        kept = [sampling.filter(_record("aiohttp.access")) for _ in range(9)]
+        self.assertEqual(kept.count(True), 3)
+        self.assertTrue(all(sampling.filter(_record("aiohttp.access", logging.WARNING)) for _ in range(3)))
+        self.assertTrue(all(sampling.filter(_record("bot.main")) for _ in range(3)))
+
+
+class TestFormatting(unittest.TestCase):
+    """Test cases for lazy, structured records."""
+
+    def test_queue_handler_does_not_format(self):
+        """Records are queued with their arguments; formatting happens in the listener."""
+        queued = []
+
+        class ListQueue:
+            def put_nowait(self, item):
+                queued.append(item)
+
+        handler = LazyQueueHandler(ListQueue())
+        handler.handle(_record())
+        self.assertEqual(queued[0].msg, "hello %s")
+        self.assertEqual(queued[0].args, ("world",))
+
+    def test_json_formatter(self):
+        """Extra fields become keys and personal data is masked."""
+        line = JsonFormatter().format(_record(msg="email %s", args=("a@b.by",), order="42", phone="+375291234567"))
+        entry = json.loads(line)
+        self.assertEqual(entry["msg"], "email [email]")
+        self.assertEqual(entry["order"], "42")
+        self.assertEqual(entry["phone"], "[phone]")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "bot.test")
+
+
+class TestSetupLogging(unittest.TestCase):
+    """Test cases for the queue/listener pipeline."""
+
+    def setUp(self):
+        """Detach the test runner's handlers so setup_logging does not close them."""
+        self.root = logging.getLogger()
+        self.saved_handlers = self.root.handlers[:]
+        self.saved_level = self.root.level
+        for handler in self.saved_handlers:
+            self.root.removeHandler(handler)
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        stop_logging()
+        for handler in self.root.handlers[:]:
+            self.root.removeHandler(handler)
+        for handler in self.saved_handlers:
+            self.root.addHandler(handler)
+        self.root.setLevel(self.saved_level)
+        self.temp_dir.cleanup()
+
+    def test_records_written_by_listener(self):
+        """Records reach the log file as JSON once the listener is flushed."""
+        log_file = os.path.join(self.temp_dir.name, "bot.log")
+        setup_logging(level="INFO", log_format="json", sampling="", log_file=log_file)
+        logging.getLogger("bot.test").info("order %s for %s", "42", "+375 29 123-45-67")
+        logging.getLogger("bot.test").debug("not written")
+        stop_logging()
+
+        with open(log_file, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["msg"], "order 42 for [phone]")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 import asyncio
+import datetime
 import json
 import os
+import tempfile
 from unittest.mock import AsyncMock, MagicMock, patch, Mock
 from aiogram.types import Message, CallbackQuery, User, Chat
 from aiogram.types.web_app_info import WebAppInfo
@@ -11,13 +13,14 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from bot.main import (
-    load_products_data, load_order_counter, save_order_counter,
+    load_products_data, load_order_counter,
     generate_order_number, format_phone_telegram, get_user_cart,
     update_cart_item_quantity, clear_user_cart, clear_user_cart_messages,
     send_email_notification, _handle_update_cart, _handle_checkout_order,
     _send_order_notifications, _format_telegram_order_summary,
     _format_email_body, _format_user_email_body
 )
+from bot.order_numbers import OrderNumberAllocator
 
 
 class TestMainBotFunctions(unittest.TestCase):
@@ -44,7 +47,7 @@ class TestMainBotFunctions(unittest.TestCase):
 
     @patch('bot.main.PRODUCTS_DATA_FILE')
     @patch('builtins.open', create=True)
-    @patch('json.load')
+    @patch('bot.json_codec.load')
     def test_load_products_data_success(self, mock_json_load, mock_open, mock_file_path):
         """Test successful loading of products data."""
         mock_file_path.return_value = "/test/path/products.json"
@@ -65,7 +68,7 @@ class TestMainBotFunctions(unittest.TestCase):
 
     @patch('bot.main.PRODUCTS_DATA_FILE')
     @patch('builtins.open', create=True)
-    @patch('json.load')
+    @patch('bot.json_codec.load')
     def test_load_products_data_file_not_found(self, mock_json_load, mock_open, mock_file_path):
         """Test handling when products data file is not found."""
         mock_file_path.return_value = "/nonexistent/path/products.json"
@@ -76,61 +79,40 @@ class TestMainBotFunctions(unittest.TestCase):
         # Should handle the error gracefully
         mock_json_load.assert_not_called()
 
-    @patch('bot.main.ORDER_COUNTER_FILE')
-    @patch('builtins.open', create=True)
-    @patch('json.load')
-    def test_load_order_counter_success(self, mock_json_load, mock_open, mock_file_path):
+    def _order_numbers(self, counter_data=None):
+        """Allocator on a temporary counter file, optionally with contents."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, 'order_counter.json')
+        if counter_data is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(counter_data, f)
+        return OrderNumberAllocator(path)
+
+    def test_load_order_counter_success(self):
         """Test successful loading of order counter."""
-        mock_file_path.return_value = "/test/path/counter.json"
-        mock_data = {"counter": 42, "last_reset_month": 8}
-        mock_json_load.return_value = mock_data
-        mock_file = MagicMock()
-        mock_open.return_value.__enter__.return_value = mock_file
-
-        result = asyncio.run(load_order_counter())
+        with patch('bot.main.order_numbers', self._order_numbers({"counter": 42, "month": 8})):
+            result = asyncio.run(load_order_counter())
 
         self.assertEqual(result["counter"], 42)
-        self.assertEqual(result["last_reset_month"], 8)
+        self.assertEqual(result["month"], 8)
 
-    @patch('bot.main.ORDER_COUNTER_FILE')
-    @patch('builtins.open', create=True)
-    def test_load_order_counter_file_not_found(self, mock_open, mock_file_path):
+    def test_load_order_counter_file_not_found(self):
         """Test handling when order counter file is not found."""
-        mock_file_path.return_value = "/nonexistent/path/counter.json"
-        mock_open.side_effect = FileNotFoundError()
-
-        result = asyncio.run(load_order_counter())
+        with patch('bot.main.order_numbers', self._order_numbers()):
+            result = asyncio.run(load_order_counter())
 
-        # Should return default values
-        self.assertEqual(result["counter"], 0)
-        self.assertEqual(result["last_reset_month"], 0)
-
-    @patch('bot.main.ORDER_COUNTER_FILE')
-    @patch('builtins.open', create=True)
-    @patch('json.dump')
-    def test_save_order_counter_success(self, mock_json_dump, mock_open, mock_file_path):
-        """Test successful saving of order counter."""
-        mock_file_path.return_value = "/test/path/counter.json"
-        mock_file = MagicMock()
-        mock_open.return_value.__enter__.return_value = mock_file
-        test_data = {"counter": 100, "last_reset_month": 8}
-
-        asyncio.run(save_order_counter(test_data))
-
-        mock_open.assert_called_once()
-        mock_json_dump.assert_called_once_with(test_data, mock_file, ensure_ascii=False, indent=4)
+        self.assertEqual(result, {})
 
-    @patch('bot.main.load_order_counter')
-    @patch('bot.main.save_order_counter')
-    def test_generate_order_number(self, mock_save, mock_load):
+    def test_generate_order_number(self):
         """Test order number generation."""
-        mock_load.return_value = {"counter": 42, "last_reset_month": 8}
-        
-        result = asyncio.run(generate_order_number())
+        month = datetime.datetime.now().month
+        with patch('bot.main.order_numbers', self._order_numbers({"counter": 42, "month": month})):
+            result = asyncio.run(generate_order_number())
 
         self.assertIsInstance(result, str)
         self.assertTrue(result.startswith("#"))
-        mock_save.assert_called_once()
+        self.assertTrue(result.endswith("/043"))
 
     def test_format_phone_telegram(self):
         """Test phone number formatting for Telegram."""
@@ -191,11 +173,10 @@ class TestMainBotFunctions(unittest.TestCase):
         # Should not raise any exceptions
         mock_bot.delete_message.assert_not_called()
 
-    @patch('bot.main.smtplib.SMTP')
-    def test_send_email_notification_success(self, mock_smtp):
-        """Test successful email notification sending."""
-        mock_smtp_instance = MagicMock()
-        mock_smtp.return_value.__enter__.return_value = mock_smtp_instance
+    @patch('bot.main.email_outbox')
+    def test_send_email_notification_success(self, mock_outbox):
+        """Test successful email notification queueing."""
+        mock_outbox.enqueue = AsyncMock(return_value=True)
 
         result = asyncio.run(send_email_notification(
             "test@example.com",
@@ -204,13 +185,16 @@ class TestMainBotFunctions(unittest.TestCase):
             "Test Sender"
         ))
 
-        # The function doesn't return anything, so we just check it doesn't raise an exception
-        mock_smtp_instance.send_message.assert_called_once()
-
-    @patch('bot.main.smtplib.SMTP')
-    def test_send_email_notification_failure(self, mock_smtp):
-        """Test email notification sending failure."""
-        mock_smtp.side_effect = Exception("SMTP Error")
+        self.assertTrue(result)
+        mock_outbox.enqueue.assert_called_once()
+        msg = mock_outbox.enqueue.call_args[0][0]
+        self.assertEqual(msg['To'], "test@example.com")
+        self.assertEqual(msg['Subject'], "Test Subject")
+
+    @patch('bot.main.email_outbox')
+    def test_send_email_notification_failure(self, mock_outbox):
+        """Test email notification queueing failure."""
+        mock_outbox.enqueue = AsyncMock(side_effect=Exception("Outbox Error"))
 
         result = asyncio.run(send_email_notification(
             "test@example.com",
@@ -0,0 +1,151 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer, make_mocked_request
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.metrics import (
+    MetricsRegistry, bot_updates, http_request_duration, http_requests,
+    metrics_handler, metrics_middleware, orders_processed, start_metrics_server
+)
+from bot.security_middleware import HandlerMetricsMiddleware
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for counters, histograms and the text format."""
+
+    def test_render(self):
+        """Counters and cumulative histogram buckets are rendered in exposition format."""
+        registry = MetricsRegistry()
+        requests = registry.counter('requests_total', 'Requests.', ('route',))
+        latency = registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+        requests.labels('/a"b').inc()
+        requests.labels('/a"b').inc(2)
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value)
+
+        text = registry.render()
+        self.assertIn('# TYPE requests_total counter\n', text)
+        self.assertIn('requests_total{route="/a\\"b"} 3\n', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn('latency_seconds_sum 5.55\n', text)
+        self.assertIn('latency_seconds_count 3\n', text)
+
+    def test_label_count_and_duplicates(self):
+        """Wrong label counts and duplicate names are programming errors."""
+        registry = MetricsRegistry()
+        counter = registry.counter('a_total', 'A.', ('x',))
+        with self.assertRaises(ValueError):
+            counter.labels('1', '2')
+        with self.assertRaises(ValueError):
+            registry.counter('a_total', 'A.')
+
+
+class TestMetricsMiddleware(unittest.IsolatedAsyncioTestCase):
+    """Test cases for API request metrics."""
+
+    async def test_requests_recorded_by_route_template(self):
+        """Requests are labelled with the route template, not the raw path."""
+        async def product(request):
+            return web.json_response({"id": request.match_info['product_id']})
+
+        app = web.Application(middlewares=[metrics_middleware])
+        app.router.add_get('/test-metrics/{product_id}', product)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            before = http_requests.value('/test-metrics/{product_id}', 'GET', '200')
+            for product_id in ('1', '2'):
+                response = await client.get(f'/test-metrics/{product_id}')
+                self.assertEqual(response.status, 200)
+            response = await client.get('/test-metrics-missing')
+            self.assertEqual(response.status, 404)
+        finally:
+            await client.close()
+
+        self.assertEqual(http_requests.value('/test-metrics/{product_id}', 'GET', '200'), before + 2)
+        self.assertGreaterEqual(http_request_duration.count('/test-metrics/{product_id}'), 2)
+        self.assertGreaterEqual(http_requests.value('unmatched', 'GET', '404'), 1)
+
+    async def test_metrics_endpoint_protected(self):
+        """/metrics needs the token; without one it is not served at all, even to loopback clients."""
+        with patch('bot.metrics.get_config') as get_config:
+            config = get_config.return_value
+            config.METRICS_TOKEN = 'secret'
+            response = await metrics_handler(make_mocked_request('GET', '/metrics'))
+            self.assertEqual(response.status, 403)
+            response = await metrics_handler(make_mocked_request(
+                'GET', '/metrics', headers={'Authorization': 'Bearer secret'}
+            ))
+            self.assertEqual(response.status, 200)
+            self.assertIn(b'# TYPE http_requests_total counter', response.body)
+
+            response = await metrics_handler(make_mocked_request(
+                'GET', '/metrics', headers={'Authorization': 'Bearer other'}
+            ))
+            self.assertEqual(response.status, 403)
+
+            # Behind the reverse proxy every request comes from loopback
+            config.METRICS_TOKEN = ''
+            for headers in ({}, {'Authorization': 'Bearer '}):
+                request = make_mocked_request('GET', '/metrics', headers=headers)
+                with patch.object(type(request), 'remote', '127.0.0.1'):
+                    with self.assertRaises(web.HTTPNotFound):
+                        await metrics_handler(request)
+
+
+    async def test_bot_process_metrics_server(self):
+        """The bot process serves its own series on a separate port when the API runs in workers."""
+        orders_processed.labels('success').inc()
+        with patch('bot.metrics.get_config') as get_config:
+            get_config.return_value.METRICS_TOKEN = 'secret'
+            runner = await start_metrics_server('127.0.0.1', 0)
+            try:
+                host, port = runner.addresses[0][:2]
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(f'http://{host}:{port}/metrics',
+                                           headers={'Authorization': 'Bearer secret'}) as response:
+                        self.assertEqual(response.status, 200)
+                        body = await response.text()
+                    async with session.get(f'http://{host}:{port}/metrics') as response:
+                        self.assertEqual(response.status, 403)
+            finally:
+                await runner.cleanup()
+        self.assertIn('orders_processed_total{result="success"}', body)
+
+
+class TestBotMetricsMiddleware(unittest.IsolatedAsyncioTestCase):
+    """Test cases for dispatcher handler metrics."""
+
+    async def test_handler_results_counted(self):
+        """Handlers are counted by name and result."""
+        async def cb_test_metrics_handler():
+            pass
+
+        class HandlerObject:
+            callback = cb_test_metrics_handler
+
+        middleware = HandlerMetricsMiddleware()
+
+        async def ok(event, data):
+            return "done"
+
+        async def fail(event, data):
+            raise RuntimeError("boom")
+
+        self.assertEqual(await middleware(ok, object(), {'handler': HandlerObject()}), "done")
+        with self.assertRaises(RuntimeError):
+            await middleware(fail, object(), {'handler': HandlerObject()})
+        self.assertEqual(bot_updates.value('cb_test_metrics_handler', 'ok'), 1)
+        self.assertEqual(bot_updates.value('cb_test_metrics_handler', 'error'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import datetime
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'))
+
+from bot import json_codec
+from bot.order_journal import OrderJournal
+from export_orders import export
+
+ITEMS = [{"id": "49", "name": "Bread", "quantity": 2}]
+DETAILS = {"deliveryMethod": "pickup", "firstName": "Ivan"}
+
+
+class TestOrderJournal(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the order journal."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'orders.sqlite3')
+
+    async def open_journal(self, path=None) -> OrderJournal:
+        journal = OrderJournal()
+        await journal.start(path or self.path)
+        self.addAsyncCleanup(journal.close)
+        return journal
+
+    async def test_group_commit(self):
+        """Orders queued together are committed in one transaction and survive a restart."""
+        journal = await self.open_journal()
+        with patch.object(journal, '_write', wraps=journal._write) as write:
+            results = await asyncio.gather(*(
+                journal.append(f"#161026/{number:03d}", number % 3, 9.0, DETAILS, ITEMS) for number in range(1, 51)
+            ))
+        self.assertEqual(results, [True] * 50)
+        self.assertEqual(write.call_count, 1)
+        await journal.close()
+
+        journal = await self.open_journal()
+        self.assertEqual(await journal.count(), 50)
+
+    async def test_indexed_queries(self):
+        """Orders are found by number, by user (newest first) and by date range."""
+        journal = await self.open_journal()
+        day = datetime.datetime(2025, 9, 13, 12, 0)
+        await journal.append("#130925/001", 7, 9.0, DETAILS, ITEMS, created_at=day)
+        await journal.append("#140925/001", 8, 4.5, DETAILS, ITEMS, created_at=day + datetime.timedelta(days=1))
+        await journal.append("#150925/001", 7, 12.0, DETAILS, ITEMS, created_at=day + datetime.timedelta(days=2))
+
+        order = await journal.get("#140925/001")
+        self.assertEqual(order['user_id'], 8)
+        self.assertEqual(order['cart_items'], ITEMS)
+        self.assertEqual(order['created_at'], '2025-09-14T12:00:00')
+        self.assertIsNone(await journal.get("#000000/000"))
+
+        self.assertEqual([o['order_number'] for o in await journal.by_user(7)], ["#150925/001", "#130925/001"])
+        orders = await journal.between(datetime.datetime(2025, 9, 14), datetime.datetime(2025, 9, 16))
+        self.assertEqual([o['order_number'] for o in orders], ["#140925/001", "#150925/001"])
+
+    async def test_stream_reads_in_chunks(self):
+        """stream() returns every order in journal order, across chunk boundaries."""
+        journal = await self.open_journal()
+        await asyncio.gather(*(journal.append(f"#{number}", 1, 1.0, DETAILS, ITEMS) for number in range(7)))
+        numbers = [order['order_number'] async for order in journal.stream(chunk=3)]
+        self.assertEqual(numbers, [f"#{number}" for number in range(7)])
+
+    async def test_append_only(self):
+        """Journal rows cannot be changed or deleted."""
+        journal = await self.open_journal()
+        await journal.append("#1", 1, 1.0, DETAILS, ITEMS)
+        with sqlite3.connect(self.path) as conn:
+            with self.assertRaises(sqlite3.IntegrityError):
+                conn.execute("DELETE FROM orders")
+            with self.assertRaises(sqlite3.IntegrityError):
+                conn.execute("UPDATE orders SET total_amount = 0")
+
+    async def test_torn_final_record_is_dropped(self):
+        """A crash in the middle of the last commit leaves every earlier order readable."""
+        journal = await self.open_journal()
+        for number in range(3):
+            self.assertTrue(await journal.append(f"#{number}", 1, 1.0, DETAILS, ITEMS))
+
+        # Copy the files as a crash would leave them, with the end of the last commit missing
+        crashed = os.path.join(self.temp_dir.name, 'crashed.sqlite3')
+        shutil.copyfile(self.path, crashed)
+        with open(self.path + '-wal', 'rb') as f:
+            wal = f.read()
+        with open(crashed + '-wal', 'wb') as f:
+            f.write(wal[:-100])
+
+        recovered = await self.open_journal(crashed)
+        self.assertEqual([o['order_number'] async for o in recovered.stream()], ["#0", "#1"])
+        self.assertTrue(await recovered.append("#3", 1, 1.0, DETAILS, ITEMS))
+        self.assertEqual(await recovered.count(), 3)
+
+    async def test_append_before_start(self):
+        """Without start() an order is reported as not written instead of failing checkout."""
+        journal = OrderJournal()
+        self.assertFalse(await journal.append("#1", 1, 1.0, DETAILS, ITEMS))
+
+    async def test_export(self):
+        """scripts/export_orders.py writes JSON Lines or CSV."""
+        journal = await self.open_journal()
+        await journal.append("#130925/001", 7, 9.0, DETAILS, ITEMS, created_at=datetime.datetime(2025, 9, 13))
+        await journal.append("#140925/001", 8, 4.5, DETAILS, ITEMS, created_at=datetime.datetime(2025, 9, 14))
+
+        out = io.StringIO()
+        self.assertEqual(await export(self.path, out, "jsonl", since=datetime.datetime(2025, 9, 14)), 1)
+        self.assertEqual(json_codec.loads(out.getvalue())['order_number'], "#140925/001")
+
+        out = io.StringIO()
+        self.assertEqual(await export(self.path, out, "csv"), 2)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "order_number,created_at,user_id,total_amount,delivery_method,items")
+        self.assertEqual(lines[1], "#130925/001,2025-09-13T00:00:00,7,9.0,pickup,49 x 2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.order_numbers import OrderNumberAllocator, read_counter_file, write_counter_file
+
+
+def allocate_numbers(path: str, month: int, count: int, block_size: int) -> list:
+    """Allocate count numbers in a separate process."""
+    async def run():
+        allocator = OrderNumberAllocator(path, block_size=block_size)
+        return [await allocator.allocate(month) for _ in range(count)]
+    return asyncio.run(run())
+
+
+class TestOrderNumberAllocator(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the order number allocator."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'order_counter.json')
+
+    async def test_block_reservation(self):
+        """A block of numbers costs one file write."""
+        allocator = OrderNumberAllocator(self.path, block_size=5)
+        with patch('bot.order_numbers.write_counter_file', wraps=write_counter_file) as write:
+            numbers = [await allocator.allocate(9) for _ in range(7)]
+
+        self.assertEqual(numbers, [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(read_counter_file(self.path), {'counter': 10, 'month': 9})
+
+    async def test_month_reset_and_release(self):
+        """A new month starts from 1; release() gives back the unused rest of the block."""
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'counter': 57, 'month': 8, 'last_order': 'kept'}, f)
+        allocator = OrderNumberAllocator(self.path, block_size=10)
+
+        self.assertEqual(await allocator.allocate(8), 58)
+        self.assertEqual(await allocator.allocate(9), 1)
+        self.assertEqual(await allocator.allocate(9), 2)
+        await allocator.release()
+
+        self.assertEqual(read_counter_file(self.path), {'counter': 2, 'month': 9, 'last_order': 'kept'})
+        self.assertEqual(await OrderNumberAllocator(self.path).allocate(9), 3)
+
+    async def test_release_keeps_later_reservations(self):
+        """Numbers are not given back once another allocator reserved after them."""
+        first = OrderNumberAllocator(self.path, block_size=10)
+        second = OrderNumberAllocator(self.path, block_size=10)
+        self.assertEqual(await first.allocate(9), 1)
+        self.assertEqual(await second.allocate(9), 11)
+        await first.release()
+
+        self.assertEqual(read_counter_file(self.path)['counter'], 20)
+
+    async def test_concurrent_orders_get_distinct_numbers(self):
+        """Orders placed at the same time in one process never share a number."""
+        allocator = OrderNumberAllocator(self.path, block_size=3)
+        numbers = await asyncio.gather(*(allocator.allocate(9) for _ in range(20)))
+        self.assertEqual(sorted(numbers), list(range(1, 21)))
+
+    def test_processes_get_distinct_numbers(self):
+        """Processes sharing the counter file never hand out the same number."""
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(3) as pool:
+            results = pool.starmap(allocate_numbers, [(self.path, 9, 20, 3)] * 3)
+
+        numbers = [number for result in results for number in result]
+        self.assertEqual(len(set(numbers)), 60)
+        # Each process reserved 7 blocks of 3
+        self.assertEqual(read_counter_file(self.path)['counter'], 63)
+        self.assertLessEqual(max(numbers), 63)
+
+    def test_interrupted_write_keeps_previous_file(self):
+        """A write that fails before the rename leaves the old counter intact."""
+        write_counter_file(self.path, {'counter': 5, 'month': 9})
+        with patch('bot.order_numbers.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                write_counter_file(self.path, {'counter': 15, 'month': 9})
+
+        self.assertEqual(read_counter_file(self.path), {'counter': 5, 'month': 9})
+
+
+if __name__ == '__main__':
+    unittest.main()
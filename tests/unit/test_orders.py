@@ -1,7 +1,9 @@
 import unittest
 import asyncio
+import datetime
 import json
 import os
+import tempfile
 from unittest.mock import AsyncMock, MagicMock, patch, Mock
 from aiogram.types import Message, User, Chat
 
@@ -15,6 +17,7 @@ from bot.main import (
     _format_email_body, _format_user_email_body, format_phone_telegram,
     _format_customer_telegram_message, _get_pickup_details
 )
+from bot.order_numbers import OrderNumberAllocator
 
 
 class TestOrderProcessing(unittest.TestCase):
@@ -95,35 +98,38 @@ class TestOrderProcessing(unittest.TestCase):
         clear_user_cart(self.test_user_id)
         self.assertNotIn(self.test_user_id, user_carts)
 
-    @patch('bot.main.load_order_counter')
-    @patch('bot.main.save_order_counter')
-    def test_generate_order_number_success(self, mock_save, mock_load):
+    def _order_numbers(self, counter_data):
+        """Allocator on a temporary counter file."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, 'order_counter.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(counter_data, f)
+        return OrderNumberAllocator(path)
+
+    def test_generate_order_number_success(self):
         """Test successful order number generation."""
-        mock_load.return_value = {"counter": 42, "last_reset_month": 8}
-        
-        result = asyncio.run(generate_order_number())
+        month = datetime.datetime.now().month
+        with patch('bot.main.order_numbers', self._order_numbers({"counter": 42, "month": month})):
+            result = asyncio.run(generate_order_number())
 
         self.assertIsInstance(result, str)
         self.assertTrue(result.startswith("#"))
-        # Note: The actual function may not include the exact counter in the format
-        # Just verify it's a valid order number format
         # Accept dynamic day and month, verify overall pattern
         self.assertRegex(result, r"#\d{6}/\d{3}")
-        mock_save.assert_called_once()
+        self.assertTrue(result.endswith("/043"))
 
-    @patch('bot.main.load_order_counter')
-    @patch('bot.main.save_order_counter')
-    def test_generate_order_number_month_reset(self, mock_save, mock_load):
+    def test_generate_order_number_month_reset(self):
         """Test order number generation with month reset."""
         # Simulate month change
-        mock_load.return_value = {"counter": 100, "last_reset_month": 7}  # Previous month
-        
-        result = asyncio.run(generate_order_number())
+        previous_month = (datetime.datetime.now().month - 2) % 12 + 1
+        with patch('bot.main.order_numbers', self._order_numbers({"counter": 100, "month": previous_month})):
+            result = asyncio.run(generate_order_number())
 
         self.assertIsInstance(result, str)
         self.assertTrue(result.startswith("#"))
         # Counter should reset to 1 for new month
-        self.assertIn("1", result)
+        self.assertTrue(result.endswith("/001"))
 
     def test_total_amount_validation_none_value(self):
         """Test that total_amount None validation works properly."""
@@ -150,11 +156,10 @@ class TestOrderProcessing(unittest.TestCase):
             call_args = mock_message.answer.call_args[0][0]
             self.assertIn("total_amount must be number, got NoneType", call_args)
 
-    @patch('bot.main.smtplib.SMTP')
-    def test_send_email_notification_success(self, mock_smtp):
-        """Test successful email notification sending."""
-        mock_smtp_instance = MagicMock()
-        mock_smtp.return_value.__enter__.return_value = mock_smtp_instance
+    @patch('bot.main.email_outbox')
+    def test_send_email_notification_success(self, mock_outbox):
+        """Test successful email notification queueing."""
+        mock_outbox.enqueue = AsyncMock(return_value=True)
 
         result = asyncio.run(send_email_notification(
             "test@example.com",
@@ -163,13 +168,16 @@ class TestOrderProcessing(unittest.TestCase):
             "Test Sender"
         ))
 
-        # The function doesn't return anything, so we just check it doesn't raise an exception
-        mock_smtp_instance.send_message.assert_called_once()
+        self.assertTrue(result)
+        mock_outbox.enqueue.assert_called_once()
+        msg = mock_outbox.enqueue.call_args[0][0]
+        self.assertEqual(msg['To'], "test@example.com")
+        self.assertEqual(msg['Subject'], "Test Subject")
 
-    @patch('bot.main.smtplib.SMTP')
-    def test_send_email_notification_failure(self, mock_smtp):
-        """Test email notification sending failure."""
-        mock_smtp.side_effect = Exception("SMTP Error")
+    @patch('bot.main.email_outbox')
+    def test_send_email_notification_failure(self, mock_outbox):
+        """Test email notification queueing failure."""
+        mock_outbox.enqueue = AsyncMock(side_effect=Exception("Outbox Error"))
 
         result = asyncio.run(send_email_notification(
             "test@example.com",
@@ -210,6 +218,24 @@ class TestOrderProcessing(unittest.TestCase):
         mock_clear_cart.assert_called_once_with(self.test_user_id)
         mock_message.answer.assert_called()
 
+    @patch('bot.main.generate_order_number')
+    @patch('bot.main._send_order_notifications')
+    @patch('bot.main.generate_main_menu')
+    @patch('bot.main.get_user_cart')
+    def test_handle_checkout_order_replies_before_notifications(self, mock_get_cart, mock_menu,
+                                                                mock_send_notifications, mock_generate_order):
+        """The customer gets the checkout reply before any notification is queued."""
+        calls = []
+        mock_message = MagicMock()
+        mock_message.answer = AsyncMock(side_effect=lambda *args, **kwargs: calls.append('answer'))
+        mock_send_notifications.side_effect = lambda *args: calls.append('notifications')
+        mock_generate_order.return_value = "#110825/001"
+        mock_get_cart.return_value = {}
+
+        asyncio.run(_handle_checkout_order(mock_message, self.test_order_data, self.test_user_id))
+
+        self.assertEqual(calls, ['answer', 'notifications'])
+
     @patch('bot.main.generate_main_menu')
     @patch('bot.main.get_user_cart')
     def test_handle_checkout_order_incomplete_data(self, mock_get_cart, mock_menu):
@@ -313,11 +339,11 @@ class TestOrderProcessing(unittest.TestCase):
         mock_message.answer.assert_called()
 
     @patch('bot.main.send_email_notification')
-    @patch('bot.main.bot')
-    def test_send_order_notifications_success(self, mock_bot, mock_send_email):
-        """Test successful order notifications sending."""
+    @patch('bot.main.telegram_outbox')
+    def test_send_order_notifications_success(self, mock_outbox, mock_send_email):
+        """Test successful order notifications queueing."""
         mock_send_email.return_value = True
-        mock_bot.send_message = AsyncMock()
+        mock_outbox.enqueue = AsyncMock(return_value=True)
 
         result = asyncio.run(_send_order_notifications(
             self.test_order_details, self.test_cart_items, 105.0, "#110825/001", self.test_user_id
@@ -326,14 +352,17 @@ class TestOrderProcessing(unittest.TestCase):
         # The function returns None on success, not True
         self.assertIsNone(result)
         mock_send_email.assert_called()
-        mock_bot.send_message.assert_called()
+        # The customer's confirmation is queued before the admin message
+        chat_id, text, parse_mode, channel = mock_outbox.enqueue.call_args_list[0][0]
+        self.assertEqual((chat_id, channel), (self.test_user_id, 'telegram_customer'))
+        self.assertIn("#110825/001", text)
 
     @patch('bot.main.send_email_notification')
-    @patch('bot.main.bot')
-    def test_send_order_notifications_email_failure(self, mock_bot, mock_send_email):
+    @patch('bot.main.telegram_outbox')
+    def test_send_order_notifications_email_failure(self, mock_outbox, mock_send_email):
         """Test order notifications when email fails."""
         mock_send_email.return_value = False
-        mock_bot.send_message = AsyncMock()
+        mock_outbox.enqueue = AsyncMock(return_value=True)
 
         result = asyncio.run(_send_order_notifications(
             self.test_order_details, self.test_cart_items, 105.0, "#110825/001", self.test_user_id
@@ -341,7 +370,7 @@ class TestOrderProcessing(unittest.TestCase):
 
         # The function returns False on email failure
         self.assertFalse(result)
-        mock_bot.send_message.assert_called()  # Telegram message should still be sent
+        mock_outbox.enqueue.assert_called()  # Telegram message should still be queued
 
     @patch('bot.main.send_email_notification')
     @patch('bot.main.bot')
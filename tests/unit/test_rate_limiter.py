@@ -0,0 +1,157 @@
+import unittest
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from unittest.mock import AsyncMock, patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.rate_limiter import MemoryBackend, RateLimitBackend, SQLiteBackend, RateLimiter, estimate_count
+from bot.security import BotSecurityMonitor, security_check
+from bot.security_manager import security_manager
+
+
+class BackendContract:
+    """Behaviour shared by every rate limit backend."""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.backend = self.make_backend()
+
+    def test_limit_within_window(self):
+        """Exactly `limit` requests pass in a fresh window."""
+        results = [self.backend.hit("ip:1", 5, 60, 1000.0 + i).allowed for i in range(7)]
+        self.assertEqual(results, [True] * 5 + [False] * 2)
+
+    def test_keys_are_independent(self):
+        """One key hitting its limit does not affect another."""
+        for i in range(3):
+            self.backend.hit("a", 3, 60, 1000.0)
+        self.assertFalse(self.backend.hit("a", 3, 60, 1000.0).allowed)
+        self.assertTrue(self.backend.hit("b", 3, 60, 1000.0).allowed)
+
+    def test_previous_window_is_weighted(self):
+        """Requests of the previous window count proportionally to its overlap."""
+        for i in range(10):
+            self.backend.hit("k", 10, 100, 100.0)
+        # Halfway through the next window half of the previous 10 still count
+        results = [self.backend.hit("k", 10, 100, 250.0).allowed for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+
+    def test_old_windows_are_forgotten(self):
+        """Two windows later the key starts from zero."""
+        for i in range(10):
+            self.backend.hit("k", 10, 100, 100.0)
+        self.assertTrue(self.backend.hit("k", 10, 100, 320.0).allowed)
+
+    def test_stats_and_reset(self):
+        """Stats count live keys; reset forgets everything."""
+        self.backend.hit("a", 10, 60, 1000.0)
+        self.backend.hit("b", 10, 60, 1000.0)
+        self.assertEqual(self.backend.stats(1000.0)["active_keys"], 2)
+        self.backend.reset()
+        self.assertEqual(self.backend.stats(1000.0)["active_keys"], 0)
+
+
+class TestMemoryBackend(BackendContract, unittest.TestCase):
+    """Test cases for the in-process backend."""
+
+    def make_backend(self):
+        return MemoryBackend(tick=10)
+
+    def test_idle_keys_are_evicted(self):
+        """The timing wheel drops keys once both windows are over."""
+        for i in range(100):
+            self.backend.hit(f"ip:{i}", 10, 60, 1000.0)
+        self.assertEqual(len(self.backend._counters), 100)
+
+        self.backend.hit("other", 10, 60, 1000.0 + 200)
+        self.assertEqual(list(self.backend._counters), ["other"])
+
+    def test_active_key_is_not_evicted(self):
+        """A key that keeps hitting is rescheduled instead of evicted."""
+        for t in range(0, 600, 30):
+            self.assertTrue(self.backend.hit("busy", 100, 60, 1000.0 + t).allowed)
+        self.assertIn("busy", self.backend._counters)
+
+    def test_max_keys(self):
+        """Memory stays bounded under many distinct keys."""
+        backend = MemoryBackend(max_keys=50, tick=10)
+        for i in range(500):
+            backend.hit(f"ip:{i}", 10, 60, 1000.0 + i)
+        self.assertLessEqual(len(backend._counters), 50)
+
+
+class TestSQLiteBackend(BackendContract, unittest.TestCase):
+    """Test cases for the shared SQLite backend."""
+
+    def make_backend(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, 'rate_limits.sqlite3')
+        return SQLiteBackend(self.path)
+
+    def test_limits_shared_between_connections(self):
+        """Two backends on the same file (two processes) share counters."""
+        other = SQLiteBackend(self.path)
+        for i in range(3):
+            self.backend.hit("shared", 4, 60, 1000.0)
+        self.assertTrue(other.hit("shared", 4, 60, 1000.0).allowed)
+        self.assertFalse(self.backend.hit("shared", 4, 60, 1000.0).allowed)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the rate limiter front end."""
+
+    async def test_hit_uses_current_time(self):
+        """RateLimiter passes wall-clock time to the backend."""
+        limiter = RateLimiter(MemoryBackend())
+        self.assertTrue((await limiter.hit("x", 1, 3600)).allowed)
+        self.assertFalse((await limiter.hit("x", 1, 3600)).allowed)
+        self.assertEqual((await limiter.stats())["active_keys"], 1)
+
+    async def test_sqlite_backend_runs_off_the_event_loop(self):
+        """A SQLite hit waiting on another process's lock does not block the event loop."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'rate_limits.sqlite3')
+            limiter = RateLimiter(SQLiteBackend(path))
+            other_process = sqlite3.connect(path, isolation_level=None)
+            other_process.execute("BEGIN IMMEDIATE")
+            hit = asyncio.create_task(limiter.hit("x", 1, 3600))
+            # The loop keeps running while the hit waits for the lock
+            await asyncio.sleep(0.2)
+            self.assertFalse(hit.done())
+            other_process.execute("COMMIT")
+            self.assertTrue((await hit).allowed)
+            other_process.close()
+            limiter.backend._conn.close()
+
+    async def test_security_check_reports_limiter_stats(self):
+        """security_check reads the counters from the shared rate limiter."""
+        limiter = RateLimiter(MemoryBackend())
+        await limiter.hit("ip:1", 5, 60)
+        await limiter.hit("ip:1", 5, 60)
+        await limiter.hit("ip:2", 5, 60)
+        with patch.object(security_manager, 'rate_limiter', limiter), \
+                patch.object(BotSecurityMonitor, 'check_webhook_security', AsyncMock(return_value={"secure": True})), \
+                patch.object(BotSecurityMonitor, 'monitor_bot_activity', AsyncMock(return_value={"secure": True})):
+            results = await security_check("123:token")
+        self.assertEqual(results["rate_limiting"], {"active_limits": 2, "total_requests": 3})
+
+    def test_backend_interface_is_abstract(self):
+        """A backend must implement every storage method."""
+        with self.assertRaises(TypeError):
+            RateLimitBackend()
+
+    def test_estimate_count(self):
+        """The estimate blends the previous window by the remaining fraction."""
+        self.assertEqual(estimate_count(2, 10, 125.0, 100), 2 + 10 * 0.75)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.search import SearchIndex, build_search_index, normalize, stem, tokenize
+
+
+class TestNormalization(unittest.TestCase):
+    """Test cases for query and text normalization."""
+
+    def test_normalize_folds_yo(self):
+        """ё and е are the same letter for search."""
+        self.assertEqual(normalize("Ёжик Тёмный"), "ежик темный")
+        self.assertEqual(tokenize("Хлеб «Три семечки», 300г"), ["хлеб", "три", "семечки", "300г"])
+
+    def test_stem(self):
+        """Word forms of one noun share a stem; short words are kept."""
+        self.assertEqual(stem("булочка"), stem("булочки"))
+        self.assertEqual(stem("булочка"), stem("булочкой"))
+        self.assertEqual(stem("маком"), "мак")
+        self.assertEqual(stem("мак"), "мак")
+        self.assertEqual(stem("300г"), "300г")
+
+
+class TestSearchIndex(unittest.TestCase):
+    """Test cases for the product search index."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.products = {
+            "49": {"id": "49", "name": "Завиванец с маком", "ingredients": "мука, мак, сахар"},
+            "68": {"id": "68", "name": "Булочка с корицей", "ingredients": "мука, корица"},
+            "70": {"id": "70", "name": "Эклер", "short_description": "С маковой начинкой",
+                   "ingredients": "мука, яйцо"},
+            "71": {"id": "71", "name": "Круассан", "ingredients": "мука, масло сливочное, мёд"},
+        }
+        self.index = SearchIndex.build(self.products)
+
+    def test_word_forms_match(self):
+        """Inflected queries find products."""
+        self.assertEqual(self.index.search("булочки"), ["68"])
+        self.assertEqual(self.index.search("БУЛОЧКОЙ"), ["68"])
+
+    def test_yo_folding(self):
+        """A query with е finds text with ё and vice versa."""
+        self.assertEqual(self.index.search("мед"), ["71"])
+        self.assertEqual(self.index.search("мёд"), ["71"])
+
+    def test_prefix_for_last_word(self):
+        """The last word matches as a prefix, earlier words must be complete."""
+        self.assertEqual(self.index.search("круа"), ["71"])
+        self.assertEqual(self.index.search("круа масло"), [])
+        self.assertEqual(self.index.search("масло круа"), ["71"])
+
+    def test_rank_by_field(self):
+        """Name matches rank above description and ingredient matches."""
+        self.assertEqual(self.index.search("мак"), ["49", "70"])
+        self.assertEqual(self.index.search("мука", order={"71": 0, "70": 1, "68": 2, "49": 3}),
+                         ["71", "70", "68", "49"])
+
+    def test_all_words_required(self):
+        """Every query word must match; stop words are ignored."""
+        self.assertEqual(self.index.search("булочка с маком"), [])
+        self.assertEqual(self.index.search("завиванец с маком"), ["49"])
+        self.assertEqual(self.index.search("  "), [])
+
+    def test_incremental_update_matches_full_build(self):
+        """An updated index answers like one built from scratch and leaves the old one intact."""
+        new_products = dict(self.products)
+        del new_products["68"]
+        new_products["70"] = dict(self.products["70"], short_description="С ванильным кремом")
+        new_products["72"] = {"id": "72", "name": "Булочка с маком"}
+
+        updated = build_search_index(new_products, self.index)
+        rebuilt = SearchIndex.build(new_products)
+        order = {product_id: position for position, product_id in enumerate(new_products)}
+        for query in ("мак", "булочка", "корица", "ванил", "мука", "крем"):
+            self.assertEqual(updated.search(query, order), rebuilt.search(query, order), query)
+
+        self.assertEqual(self.index.search("булочка"), ["68"])
+        self.assertEqual(self.index.search("мак"), ["49", "70"])
+        # Unchanged products keep their postings without re-indexing
+        self.assertIs(updated._product_terms["49"], self.index._product_terms["49"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,12 +12,15 @@ import asyncio
 import time
 from unittest.mock import patch, MagicMock, AsyncMock
 import aiohttp
-from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop
+from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop, make_mocked_request
 
 # Add the bot directory to the path so we can import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'bot'))
 
-from security_headers import security_headers_middleware, create_content_hash
+from security_headers import (
+    security_headers_middleware, create_content_hash,
+    CACHE_IMMUTABLE, CACHE_NO_STORE, CACHE_REVALIDATE
+)
 from security_manager import SecurityManager
 from config import config
 
@@ -116,6 +119,78 @@ class TestSecurityHeaders(unittest.TestCase):
         self.assertIn('X-Frame-Options', response.headers)
 
 
+class TestCachePolicy(unittest.IsolatedAsyncioTestCase):
+    """Test the per-route cache policy applied by the security headers middleware."""
+
+    async def _cache_headers(self, path, response=None):
+        request = make_mocked_request('GET', path)
+
+        async def handler(req):
+            return response or aiohttp.web.Response(text="test", status=200)
+
+        result = await security_headers_middleware(request, handler)
+        return result.headers
+
+    async def test_immutable_from_handler(self):
+        """Fingerprinted assets marked immutable by the handler are cached for a year."""
+        response = aiohttp.web.Response(text="x", headers={'Cache-Control': CACHE_IMMUTABLE})
+        headers = await self._cache_headers('/bot-app/script.1a2b3c4d5e.js', response)
+        self.assertEqual(headers['Cache-Control'], CACHE_IMMUTABLE)
+        self.assertNotIn('Pragma', headers)
+        self.assertNotIn('Expires', headers)
+
+    async def test_version_query_is_not_immutable(self):
+        """A ?v= query says nothing about the content, so the asset still revalidates."""
+        headers = await self._cache_headers('/bot-app/script.js?v=1.3.100')
+        self.assertEqual(headers['Cache-Control'], CACHE_REVALIDATE)
+
+    async def test_unversioned_asset_revalidates(self):
+        """Assets without a version revalidate via ETag."""
+        headers = await self._cache_headers('/bot-app/script.js')
+        self.assertEqual(headers['Cache-Control'], CACHE_REVALIDATE)
+
+    async def test_catalog_revalidates(self):
+        """Catalog JSON revalidates."""
+        headers = await self._cache_headers('/bot-app/api/products')
+        self.assertEqual(headers['Cache-Control'], CACHE_REVALIDATE)
+
+    async def test_token_is_no_store(self):
+        """Auth tokens are never stored."""
+        headers = await self._cache_headers('/bot-app/api/auth/token')
+        self.assertEqual(headers['Cache-Control'], CACHE_NO_STORE)
+        self.assertEqual(headers['Pragma'], 'no-cache')
+
+    async def test_errors_are_no_store(self):
+        """Error responses are never cached, even on cacheable routes."""
+        response = aiohttp.web.Response(status=404, headers={'Cache-Control': CACHE_IMMUTABLE})
+        headers = await self._cache_headers('/bot-app/script.js?v=1', response)
+        self.assertEqual(headers['Cache-Control'], CACHE_NO_STORE)
+
+    async def test_http_exceptions_keep_their_status(self):
+        """HTTPNotFound and friends pass through with the headers instead of becoming 500."""
+        request = make_mocked_request('GET', '/nope')
+
+        async def handler(req):
+            raise aiohttp.web.HTTPNotFound()
+
+        with self.assertRaises(aiohttp.web.HTTPNotFound) as raised:
+            await security_headers_middleware(request, handler)
+        self.assertEqual(raised.exception.headers['Cache-Control'], CACHE_NO_STORE)
+        self.assertEqual(raised.exception.headers['X-Frame-Options'], 'DENY')
+
+    async def test_handler_policy_wins(self):
+        """An explicit Cache-Control from the handler is kept."""
+        response = aiohttp.web.Response(text="x", headers={'Cache-Control': 'private, max-age=60'})
+        headers = await self._cache_headers('/bot-app/api/products', response)
+        self.assertEqual(headers['Cache-Control'], 'private, max-age=60')
+
+    async def test_security_headers_still_added(self):
+        """The constant security header block is applied to cacheable responses too."""
+        headers = await self._cache_headers('/bot-app/script.js?v=1')
+        self.assertEqual(headers['X-Frame-Options'], 'DENY')
+        self.assertIn('default-src', headers['Content-Security-Policy'])
+
+
 class TestSecurityManager(unittest.TestCase):
     """Test security manager functionality."""
 
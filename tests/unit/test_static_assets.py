@@ -0,0 +1,237 @@
+import unittest
+import gzip
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+from aiohttp.test_utils import make_mocked_request
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot import json_codec
+from bot.static_assets import StaticAssetCache, asset_response, fingerprinted_path, parse_range
+
+
+class TestStaticAssetCache(unittest.TestCase):
+    """Test cases for the in-memory static asset cache."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp_dir.name, 'web_app')
+        os.makedirs(os.path.join(self.root, 'images'))
+        self.script = b'console.log("bakery");\n' * 200
+        self._write('script.js', self.script)
+        self._write('images/logo.svg', b'<svg></svg>')
+        self._write('secret.txt', b'not served')
+
+        self.cache = StaticAssetCache(self.root, recheck_interval=0)
+        self.cache.load()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, content):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(content)
+
+    def test_load_reads_known_types(self):
+        """Known asset types are loaded with content types and ETags."""
+        asset = self.cache.get('script.js')
+        self.assertEqual(asset.payload.body, self.script)
+        self.assertEqual(asset.payload.content_type, 'application/javascript')
+        self.assertEqual(gzip.decompress(asset.payload.gzip_body), self.script)
+        self.assertEqual(self.cache.get('images/logo.svg').payload.content_type, 'image/svg+xml')
+
+    def test_disk_is_not_read_again(self):
+        """Unchanged files are served from memory."""
+        cache = StaticAssetCache(self.root, recheck_interval=3600)
+        cache.load()
+        with patch('builtins.open', side_effect=AssertionError("file re-read")):
+            self.assertIsNotNone(cache.get('script.js'))
+
+    def test_reload_on_change(self):
+        """A changed file is re-read on the next request."""
+        old_etag = self.cache.get('script.js').payload.etag
+        self._write('script.js', b'console.log("new");')
+
+        asset = self.cache.get('script.js')
+        self.assertEqual(asset.payload.body, b'console.log("new");')
+        self.assertNotEqual(asset.payload.etag, old_etag)
+
+    def test_missing_and_outside_root(self):
+        """Missing files and paths escaping the root are not served."""
+        self.assertIsNone(self.cache.get('missing.js'))
+        self.assertIsNone(self.cache.get('../web_app/../secret.js'))
+        with open(os.path.join(self.tmp_dir.name, 'outside.js'), 'wb') as f:
+            f.write(b'x')
+        self.assertIsNone(self.cache.get('../outside.js'))
+
+    def test_new_file_is_served_after_load(self):
+        """Files added after load are served once load() runs again."""
+        self._write('new.css', b'body{}')
+        self.assertIsNone(self.cache.get('new.css'))
+        self.cache.load()
+        self.assertEqual(self.cache.get('new.css').payload.body, b'body{}')
+
+    def test_path_variants_share_one_entry(self):
+        """Spellings of the same path are served from one entry and never add new ones."""
+        asset = self.cache.get('images/logo.svg')
+        assets = dict(self.cache._assets)
+        for variant in ('images//logo.svg', 'images///logo.svg', './images/logo.svg', 'images/../images/logo.svg'):
+            self.assertIs(self.cache.get(variant), asset)
+        self.assertEqual(self.cache._assets, assets)
+
+
+class TestFingerprints(unittest.TestCase):
+    """Test cases for fingerprinted asset names and rendered pages."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+        os.makedirs(os.path.join(self.root, 'images'))
+        self._write('index.html', '<link href="/bot-app/style.css?v=1.3.108&t=1" rel="stylesheet">'
+                                  '<img src="images/logo.svg"><a href="https://t.me/x"></a>'
+                                  '<svg><use xlink:href="sprite.svg#cart"></use></svg><a href="about.html"></a>')
+        self._write('style.css', "body{background:url('/bot-app/images/bg.jpg')}.x{background:url(missing.png)}")
+        self._write('images/logo.svg', '<svg></svg>')
+        self._write('images/bg.jpg', 'jpeg')
+        self._write('sprite.svg', '<svg><symbol id="cart"/></svg>')
+        self.cache = StaticAssetCache(self.root, recheck_interval=0)
+        self.cache.load()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, text):
+        with open(os.path.join(self.root, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def _hashed(self, rel_path):
+        return '/bot-app/' + fingerprinted_path(rel_path, self.cache.get(rel_path).fingerprint)
+
+    def test_page_links_fingerprinted_assets(self):
+        """Local asset links get content hashes; external links, pages and fragments are kept."""
+        page = self.cache.get('index.html').payload.body.decode()
+        self.assertIn(f'href="{self._hashed("style.css")}"', page)
+        self.assertIn(f'src="{self._hashed("images/logo.svg")}"', page)
+        self.assertIn(f'xlink:href="{self._hashed("sprite.svg")}#cart"', page)
+        self.assertIn('href="https://t.me/x"', page)
+        self.assertIn('href="about.html"', page)
+
+    def test_css_links_fingerprinted_assets(self):
+        """url() references in CSS are rewritten; unknown files are left alone."""
+        css = self.cache.get('style.css').payload.body.decode()
+        self.assertIn(f"url('{self._hashed('images/bg.jpg')}')", css)
+        self.assertIn('url(missing.png)', css)
+
+    def test_lookup(self):
+        """Current fingerprints are immutable, outdated ones revalidate, plain names revalidate."""
+        name = self._hashed('style.css')[len('/bot-app/'):]
+        self.assertEqual(self.cache.lookup(name), (self.cache.get('style.css'), True))
+        self.assertEqual(self.cache.lookup('style.0123456789.css'), (self.cache.get('style.css'), False))
+        self.assertEqual(self.cache.lookup('style.css'), (self.cache.get('style.css'), False))
+        self.assertEqual(self.cache.lookup('gone.0123456789.css'), (None, False))
+
+    def test_fingerprinted_lookup_skips_filesystem(self):
+        """A fingerprinted name is served from memory without touching the disk."""
+        cache = StaticAssetCache(self.root, recheck_interval=3600)
+        cache.load()
+        name = fingerprinted_path('style.css', cache.get('style.css').fingerprint)
+        with patch('os.path.realpath', side_effect=AssertionError("resolved")), \
+                patch('os.path.isfile', side_effect=AssertionError("stat")):
+            self.assertEqual(cache.lookup(name), (cache.get('style.css'), True))
+
+    def test_change_propagates_to_pages(self):
+        """A changed image changes the CSS linking it and the page linking that CSS."""
+        old_css_url = self._hashed('style.css')
+        old_logo_url = self._hashed('images/logo.svg')
+        self._write('images/bg.jpg', 'new jpeg')
+
+        page = self.cache.get('index.html').payload.body.decode()
+        self.assertNotIn(old_css_url, page)
+        self.assertIn(self._hashed('style.css'), page)
+        # Unchanged files keep their URLs, so browsers keep them cached
+        self.assertIn(old_logo_url, page)
+
+    def test_manifest(self):
+        """The manifest maps every asset except pages to its fingerprinted name."""
+        manifest_path = os.path.join(self.root, 'asset-manifest.json')
+        self.cache.write_manifest(manifest_path)
+        with open(manifest_path, 'rb') as f:
+            manifest = json_codec.load(f)
+        self.assertEqual(set(manifest), {'style.css', 'images/logo.svg', 'images/bg.jpg', 'sprite.svg'})
+        self.assertEqual(manifest['sprite.svg'], self._hashed('sprite.svg')[len('/bot-app/'):])
+
+
+class TestAssetResponse(unittest.TestCase):
+    """Test cases for conditional, compressed and range responses."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.body = b'0123456789' * 100
+        with open(os.path.join(self.tmp_dir.name, 'style.css'), 'wb') as f:
+            f.write(self.body)
+        cache = StaticAssetCache(self.tmp_dir.name)
+        cache.load()
+        self.asset = cache.get('style.css')
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.tmp_dir.cleanup()
+
+    def _response(self, headers):
+        request = make_mocked_request('GET', '/bot-app/style.css', headers=headers)
+        return asset_response(request, self.asset, {'Cache-Control': 'no-cache'})
+
+    def test_not_modified(self):
+        """Matching If-None-Match returns 304."""
+        response = self._response({'If-None-Match': self.asset.payload.etag})
+        self.assertEqual(response.status, 304)
+
+    def test_gzip_negotiation(self):
+        """gzip is used when accepted."""
+        response = self._response({'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.body), self.body)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+    def test_range(self):
+        """A single byte range returns 206 with the identity bytes."""
+        response = self._response({'Range': 'bytes=10-19', 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.body, self.body[10:20])
+        self.assertEqual(response.headers['Content-Range'], 'bytes 10-19/1000')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_range_unsatisfiable(self):
+        """A range past the end returns 416."""
+        response = self._response({'Range': 'bytes=5000-'})
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.headers['Content-Range'], 'bytes */1000')
+
+    def test_if_range_mismatch_sends_full_body(self):
+        """A stale If-Range gets the whole file."""
+        response = self._response({'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.body, self.body)
+
+    def test_parse_range(self):
+        """Byte range parsing."""
+        self.assertEqual(parse_range('bytes=0-', 100), (0, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('items=0-1', 100))
+        self.assertIsNone(parse_range('bytes=abc', 100))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Unit tests for SVG sprite subsetting (scripts/svg_sprite.py).
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'))
+
+from svg_sprite import apply, missing_symbols, parse_symbols, referenced_ids, subset_sprite
+
+SPRITE = (
+    '<svg xmlns="http://www.w3.org/2000/svg">'
+    '<symbol id="arrow-back" viewBox="0 0 18 8"><path d="M0 0"/></symbol>\n'
+    '<symbol viewBox="0 0 32 32" id="cart"><path d="M1 1"/></symbol>\n'
+    '<symbol id="unused"><path d="M2 2"/></symbol>'
+    '</svg>'
+)
+HTML = '<body class="app">\n<svg><use xlink:href="sprite.svg#arrow-back"></use></svg>\n</body>'
+SCRIPT = "const a = createIconWithColor('cart', '#fff');\nel.innerHTML = `<use href=\"${SPRITE_URL}#ghost\">`;"
+
+
+class TestSvgSprite(unittest.TestCase):
+    """Test cases for finding, subsetting and inlining sprite symbols."""
+
+    def test_referenced_ids(self):
+        """Markup, sprite URL and createIcon references are all found."""
+        self.assertEqual(referenced_ids(HTML), {'arrow-back'})
+        self.assertEqual(referenced_ids(SCRIPT), {'cart', 'ghost'})
+        self.assertEqual(referenced_ids('<use href="#local"/>'), {'local'})
+
+    def test_subset_sprite(self):
+        """Only the requested symbols are kept."""
+        subset = subset_sprite(SPRITE, {'cart'})
+        self.assertEqual(set(parse_symbols(subset)), {'cart'})
+        self.assertTrue(subset.startswith('<svg xmlns="http://www.w3.org/2000/svg">'))
+
+    def test_apply_inlines_critical_icons(self):
+        """Icons of the page are inlined and referenced locally; the sprite keeps script icons."""
+        html, sprite = apply(HTML, SCRIPT, SPRITE)
+        self.assertIn('<body class="app">\n<svg xmlns=', html)
+        self.assertIn('<symbol id="arrow-back"', html)
+        self.assertIn('xlink:href="#arrow-back"', html)
+        self.assertNotIn('sprite.svg#', html)
+        self.assertEqual(set(parse_symbols(sprite)), {'cart'})
+
+    def test_missing_symbols(self):
+        """Ids referenced but not defined in sprite.svg are reported."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            webapp_dir = Path(tmp_dir)
+            (webapp_dir / 'index.html').write_text(HTML, encoding='utf-8')
+            (webapp_dir / 'script.js').write_text(SCRIPT, encoding='utf-8')
+            (webapp_dir / 'sprite.svg').write_text(SPRITE, encoding='utf-8')
+            self.assertEqual(missing_symbols(webapp_dir), ['ghost'])
+
+    def test_web_app_icons_are_defined(self):
+        """Every icon the Web App refers to exists in its sprite."""
+        self.assertEqual(missing_symbols(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot import telegram_outbox as outbox_module
+from bot.telegram_outbox import TelegramOutbox, TokenBucket
+
+METHOD = SendMessage(chat_id=1, text="x")
+
+
+class FakeTelegram:
+    """Records sends with their time; errors[chat_id] are raised, one per send, before it succeeds."""
+
+    def __init__(self):
+        self.sent = []
+        self.errors = {}
+        self.delay = 0.0
+
+    async def send(self, chat_id, text, parse_mode):
+        await asyncio.sleep(self.delay)
+        errors = self.errors.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((time.monotonic(), chat_id, text, parse_mode))
+
+
+class TestTelegramOutbox(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the Telegram outbox."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'telegram_outbox.sqlite3')
+        self.telegram = FakeTelegram()
+        for name, value in (('PRIVATE_CHAT_INTERVAL', 0.1), ('GROUP_CHAT_INTERVAL', 0.3)):
+            patcher = patch.object(outbox_module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def open_outbox(self, **kwargs) -> TelegramOutbox:
+        kwargs.setdefault('retry_base_delay', 0.05)
+        outbox = TelegramOutbox(**kwargs)
+        await outbox.start(self.path, self.telegram.send)
+        self.addAsyncCleanup(outbox.close)
+        return outbox
+
+    async def wait_until_sent(self, outbox, failed=0, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while await outbox.counts() != {'pending': 0, 'failed': failed}:
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            await asyncio.sleep(0.01)
+
+    async def test_enqueue_returns_before_sending(self):
+        """enqueue() does not wait for Telegram; the message goes out in the background."""
+        self.telegram.delay = 0.2
+        outbox = await self.open_outbox()
+        started = time.monotonic()
+        self.assertTrue(await outbox.enqueue(7, "*Заказ*", "Markdown", 'telegram_customer'))
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(self.telegram.sent, [])
+        await self.wait_until_sent(outbox)
+        self.assertEqual(self.telegram.sent[0][1:], (7, "*Заказ*", "Markdown"))
+
+    async def test_per_chat_interval_and_order(self):
+        """Messages to one chat keep their order and are spaced; other chats are not held up."""
+        outbox = await self.open_outbox()
+        for number in range(3):
+            await outbox.enqueue(7, f"to 7: {number}")
+        await outbox.enqueue(-100, "to group")
+        await outbox.enqueue(8, "to 8")
+        await self.wait_until_sent(outbox)
+
+        to_seven = [(at, text) for at, chat_id, text, _ in self.telegram.sent if chat_id == 7]
+        self.assertEqual([text for _, text in to_seven], ["to 7: 0", "to 7: 1", "to 7: 2"])
+        gaps = [later[0] - earlier[0] for earlier, later in zip(to_seven, to_seven[1:])]
+        self.assertTrue(all(gap >= 0.09 for gap in gaps), gaps)
+        # The other chats did not wait behind chat 7
+        self.assertLess(self.telegram.sent.index(next(s for s in self.telegram.sent if s[1] == 8)), 3)
+
+    async def test_global_rate(self):
+        """No more than the bucket allows goes out across all chats."""
+        outbox = await self.open_outbox(messages_per_second=20, burst=2)
+        for chat_id in range(1, 9):
+            await outbox.enqueue(chat_id, "hi")
+        await self.wait_until_sent(outbox)
+        times = [at for at, _, _, _ in self.telegram.sent]
+        # 2 at once, then one every 50 ms
+        self.assertGreaterEqual(times[-1] - times[0], 6 * 0.05 * 0.9)
+
+    async def test_retry_after_pauses_sending(self):
+        """A 429 pauses every send for retry_after and the message is sent afterwards."""
+        self.telegram.errors[7] = [TelegramRetryAfter(METHOD, "Flood control exceeded", retry_after=1)]
+        outbox = await self.open_outbox()
+        started = time.monotonic()
+        await outbox.enqueue(7, "first")
+        await asyncio.sleep(0.05)
+        await outbox.enqueue(8, "second")
+        await self.wait_until_sent(outbox)
+        self.assertEqual([chat_id for _, chat_id, _, _ in self.telegram.sent], [7, 8])
+        self.assertGreaterEqual(self.telegram.sent[0][0] - started, 0.95)
+
+    async def test_errors(self):
+        """Network errors are retried; a blocked bot is kept as failed without blocking others."""
+        self.telegram.errors[7] = [TelegramNetworkError(METHOD, "timeout"), TelegramNetworkError(METHOD, "timeout")]
+        self.telegram.errors[9] = [TelegramForbiddenError(METHOD, "bot was blocked by the user")]
+        outbox = await self.open_outbox()
+        await outbox.enqueue(9, "blocked")
+        await outbox.enqueue(7, "flaky")
+        await self.wait_until_sent(outbox, failed=1)
+        self.assertEqual([chat_id for _, chat_id, _, _ in self.telegram.sent], [7])
+
+    async def test_retry_keeps_chat_order(self):
+        """A message waiting to be retried is not overtaken by later messages to the same chat."""
+        self.telegram.errors[7] = [TelegramNetworkError(METHOD, "timeout")]
+        outbox = await self.open_outbox(retry_base_delay=0.3)
+        await outbox.enqueue(7, "first")
+        await outbox.enqueue(7, "second")
+        await outbox.enqueue(8, "other chat")
+        await self.wait_until_sent(outbox)
+        self.assertEqual([text for _, _, text, _ in self.telegram.sent], ["other chat", "first", "second"])
+
+    async def test_queue_survives_restart(self):
+        """Messages not sent before close() are sent after the next start."""
+        outbox = TelegramOutbox()
+        await outbox.start(self.path, self.telegram.send)
+        outbox._dispatcher.cancel()  # stopped before anything went out
+        await outbox.enqueue(7, "queued")
+        await outbox.close()
+        self.assertEqual(self.telegram.sent, [])
+
+        outbox = await self.open_outbox()
+        await self.wait_until_sent(outbox)
+        self.assertEqual(self.telegram.sent[0][2], "queued")
+
+    async def test_enqueue_before_start(self):
+        """Without start() a message is reported as not queued."""
+        self.assertFalse(await TelegramOutbox().enqueue(7, "hi"))
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test cases for the send rate bucket."""
+
+    def test_take(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        now = bucket._updated
+        self.assertEqual(bucket.take(now), 0)
+        self.assertEqual(bucket.take(now), 0)
+        self.assertAlmostEqual(bucket.take(now), 0.1)
+        self.assertEqual(bucket.take(now + 0.1), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
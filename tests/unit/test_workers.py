@@ -0,0 +1,58 @@
+import unittest
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bot.workers import WorkerSupervisor, create_api_supervisor, effective_worker_count
+
+
+class TestWorkerSupervisor(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the API worker supervisor."""
+
+    async def test_start_and_stop(self):
+        """All workers start and are terminated on stop."""
+        supervisor = WorkerSupervisor(2, target=time.sleep, args=(30,))
+        supervisor.start()
+        try:
+            self.assertEqual(supervisor.alive(), 2)
+        finally:
+            await supervisor.stop(timeout=5)
+        self.assertEqual(supervisor.alive(), 0)
+
+    async def test_dead_worker_is_restarted_with_backoff(self):
+        """A worker that crashes right after start is restarted after a delay."""
+        supervisor = WorkerSupervisor(1, target=sys.exit, args=(3,))
+        supervisor.start()
+        try:
+            slot = supervisor._slots[0]
+            slot.process.join(10)
+
+            supervisor.check()
+            self.assertIsNone(slot.process)
+            self.assertGreater(slot.restart_at, time.monotonic())
+            self.assertEqual(slot.restart_delay, 2.0)
+
+            slot.restart_at = 0
+            supervisor.check()
+            self.assertIsNotNone(slot.process)
+        finally:
+            await supervisor.stop(timeout=5)
+
+    def test_worker_count(self):
+        """One worker means the API stays in-process."""
+        self.assertEqual(effective_worker_count(0), 1)
+        self.assertEqual(effective_worker_count(4), 4)
+        self.assertIsNone(create_api_supervisor('127.0.0.1', 8080, workers=1))
+        self.assertEqual(create_api_supervisor('127.0.0.1', 8080, workers=3).workers, 3)
+
+    @patch('bot.workers.reuse_port_supported', return_value=False)
+    def test_no_reuse_port(self, mock_supported):
+        """Without SO_REUSEPORT only one process can bind the port."""
+        self.assertEqual(effective_worker_count(4), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()